@@ -0,0 +1,559 @@
+"""
+ベンチマーク実行スクリプト
+
+負荷試験用データベースを規模別に生成（キャッシュ）し、主要な解析・出力・
+整合性チェック・モデル取得処理の所要時間を計測してJSONに保存する。
+保存した結果同士を比較して、コミット間の性能変化を確認できる。
+
+実行例:
+    python -m benchmarks.run_benchmarks --scales tiny small
+    python -m benchmarks.run_benchmarks --scales medium --cases export
+    python -m benchmarks.run_benchmarks --scales records_1m --cases export.export_to_excel
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import gc
+import importlib
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+import warnings
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.load_test_data import LOAD_TEST_SCALES, generate_load_test_data
+
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCHMARK_DIR, 'data')
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+
+# 規模プリセット（負荷試験データの規模に、短時間で回せる tiny と
+# Excel出力の計測用にアリ類記録約100万件の records_1m を追加）
+BENCHMARK_SCALES = {
+    'tiny': dict(num_parent_sites=10, num_survey_sites=200,
+                 num_events=1_000, num_species=50),
+    'records_1m': dict(num_parent_sites=50, num_survey_sites=2_500,
+                       num_events=50_000, num_species=300),
+    **LOAD_TEST_SCALES,
+}
+
+# 比較時に劣化とみなす中央値の増加率
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+
+class BenchmarkCase:
+    """ベンチマーク項目"""
+
+    def __init__(self, name: str, group: str,
+                 func: Callable[[Dict[str, Any]], Any],
+                 max_rows: Optional[Dict[str, int]] = None,
+                 requires: Optional[List[str]] = None):
+        """
+        初期化
+
+        Args:
+            name: 項目名（例: 'analysis.calculate_diversity_indices'）
+            group: 分類（models / analysis / map / export / integrity）
+            func: 計測対象の処理（コンテキストを受け取る）
+            max_rows: テーブル行数の上限（超える規模ではスキップ）
+            requires: 必要な任意の依存パッケージ（読み込めない場合はスキップ）
+        """
+        self.name = name
+        self.group = group
+        self.func = func
+        self.max_rows = max_rows or {}
+        self.requires = requires or []
+
+    def skip_reason(self, table_counts: Dict[str, int]) -> Optional[str]:
+        """
+        規模が上限を超える場合はスキップ理由を返す
+
+        Args:
+            table_counts: テーブルごとの行数
+
+        Returns:
+            str: スキップ理由（実行する場合はNone）
+        """
+        for module in self.requires:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                return f"{module} を読み込めません"
+        for table, limit in self.max_rows.items():
+            if table_counts.get(table, 0) > limit:
+                return f"{table} が {table_counts[table]:,} 行（上限 {limit:,} 行）"
+        return None
+
+
+def _build_cases() -> List[BenchmarkCase]:
+    """
+    ベンチマーク項目の一覧を作成
+
+    Returns:
+        List[BenchmarkCase]: ベンチマーク項目
+    """
+    cases = [
+        # モデルの一覧取得（結果を全件dict化するため大規模では上限を設ける）
+        BenchmarkCase('models.ParentSite.get_all', 'models',
+                      lambda ctx: ctx['parent_site'].get_all()),
+        BenchmarkCase('models.SurveySite.get_all', 'models',
+                      lambda ctx: ctx['survey_site'].get_all()),
+        BenchmarkCase('models.Species.get_all', 'models',
+                      lambda ctx: ctx['species'].get_all()),
+        BenchmarkCase('models.SurveyEvent.get_all', 'models',
+                      lambda ctx: ctx['survey_event'].get_all(),
+                      max_rows={'survey_events': 1_000_000}),
+        BenchmarkCase('models.Vegetation.get_all', 'models',
+                      lambda ctx: ctx['vegetation'].get_all(),
+                      max_rows={'vegetation_data': 1_000_000}),
+        BenchmarkCase('models.AntRecord.get_all', 'models',
+                      lambda ctx: ctx['ant_record'].get_all(),
+                      max_rows={'ant_records': 5_000_000}),
+
+        # 統計解析
+        BenchmarkCase('analysis.calculate_diversity_indices', 'analysis',
+                      lambda ctx: ctx['analysis'].calculate_diversity_indices()),
+        BenchmarkCase('analysis.calculate_richness_estimators', 'analysis',
+                      lambda ctx: ctx['analysis'].calculate_richness_estimators(n_bootstrap=50),
+                      max_rows={'survey_sites': 20_000}),
+        BenchmarkCase('analysis.calculate_hill_profiles', 'analysis',
+                      lambda ctx: ctx['analysis'].calculate_hill_profiles(
+                          orders=np.linspace(0, 3, 50))),
+        BenchmarkCase('analysis.calculate_hill_profiles.standardized', 'analysis',
+                      lambda ctx: ctx['analysis'].calculate_hill_profiles(
+                          orders=np.linspace(0, 3, 50), standardize=True)),
+        BenchmarkCase('analysis.create_species_accumulation_curve', 'analysis',
+                      lambda ctx: ctx['analysis'].create_species_accumulation_curve(),
+                      max_rows={'survey_events': 100_000}),
+        BenchmarkCase('analysis.compute_ordination.pcoa', 'analysis',
+                      lambda ctx: ctx['ordination'].compute_ordination('pcoa', use_cache=False),
+                      max_rows={'survey_sites': 20_000}),
+        BenchmarkCase('analysis.compute_ordination.nmds.parent', 'analysis',
+                      lambda ctx: ctx['ordination'].compute_ordination(
+                          'nmds', site_type='parent', n_init=4, use_cache=False),
+                      max_rows={'parent_sites': 1_000}),
+        BenchmarkCase('analysis.mantel_test.parent', 'analysis',
+                      lambda ctx: ctx['ordination'].mantel_test(
+                          'braycurtis', 'vegetation', 'geographic', site_type='parent'),
+                      max_rows={'parent_sites': 3_000}),
+
+        # 地図・距離（総当たりのため調査地数で上限を設ける）
+        BenchmarkCase('map.get_distance_matrix.parent', 'map',
+                      lambda ctx: ctx['map'].get_distance_matrix('parent'),
+                      max_rows={'parent_sites': 1_000}),
+        BenchmarkCase('map.get_distance_matrix.survey', 'map',
+                      lambda ctx: ctx['map'].get_distance_matrix('survey'),
+                      max_rows={'survey_sites': 500}),
+        BenchmarkCase('map.perform_hierarchical_clustering', 'map',
+                      lambda ctx: ctx['map'].perform_hierarchical_clustering(5)),
+        BenchmarkCase('map.create_dendrogram', 'map',
+                      lambda ctx: ctx['map'].create_dendrogram()),
+        BenchmarkCase('map.perform_hierarchical_clustering.braycurtis', 'map',
+                      lambda ctx: ctx['map'].perform_hierarchical_clustering(
+                          5, method='average', distance='braycurtis')),
+        BenchmarkCase('map.create_site_map.geojson', 'map',
+                      lambda ctx: ctx['map'].create_site_map(show_diversity=True,
+                                                             render_mode='geojson',
+                                                             use_cache=False)),
+        BenchmarkCase('map.create_site_map.cluster', 'map',
+                      lambda ctx: ctx['map'].create_site_map(show_diversity=True,
+                                                             render_mode='cluster',
+                                                             use_cache=False)),
+        BenchmarkCase('map.create_diversity_surface_map.kde', 'map',
+                      lambda ctx: ctx['map'].create_diversity_surface_map(
+                          'shannon_index', method='kde', use_cache=False)),
+        BenchmarkCase('map.create_diversity_surface_map.idw', 'map',
+                      lambda ctx: ctx['map'].create_diversity_surface_map(
+                          'shannon_index', method='idw', use_cache=False)),
+        BenchmarkCase('map.create_heatmap.species_richness', 'map',
+                      lambda ctx: ctx['map'].create_heatmap('species_richness',
+                                                            use_cache=False)),
+        BenchmarkCase('map.create_heatmap.shannon_index', 'map',
+                      lambda ctx: ctx['map'].create_heatmap('shannon_index',
+                                                            use_cache=False)),
+
+        # データ出力
+        BenchmarkCase('export.export_ant_matrix.presence', 'export',
+                      lambda ctx: ctx['export'].export_ant_matrix('presence')),
+        BenchmarkCase('export.export_ant_matrix.count', 'export',
+                      lambda ctx: ctx['export'].export_ant_matrix('count')),
+        BenchmarkCase('export.export_ant_matrix.count.streaming', 'export',
+                      lambda ctx: ctx['export'].export_ant_matrix('count', streaming=True)),
+        BenchmarkCase('export.export_vegetation_matrix', 'export',
+                      lambda ctx: ctx['export'].export_vegetation_matrix()),
+        BenchmarkCase('export.export_vegetation_matrix.streaming', 'export',
+                      lambda ctx: ctx['export'].export_vegetation_matrix(streaming=True)),
+        BenchmarkCase('export.export_table_columnar.ant_records.parquet', 'export',
+                      lambda ctx: ctx['export'].export_table_columnar('ant_records', 'parquet'),
+                      requires=['pyarrow']),
+        BenchmarkCase('export.export_community_long.parquet', 'export',
+                      lambda ctx: ctx['export'].export_community_long('parquet'),
+                      requires=['pyarrow']),
+        BenchmarkCase('export.export_beta_diversity.braycurtis.condensed', 'export',
+                      lambda ctx: ctx['export'].export_beta_diversity('braycurtis', 'condensed'),
+                      max_rows={'survey_sites': 20_000}),
+        BenchmarkCase('export.export_beta_diversity.jaccard.condensed', 'export',
+                      lambda ctx: ctx['export'].export_beta_diversity('jaccard', 'condensed'),
+                      max_rows={'survey_sites': 20_000}),
+        BenchmarkCase('export.export_dwca', 'export',
+                      lambda ctx: ctx['export'].export_dwca()),
+        BenchmarkCase('export.export_to_excel', 'export',
+                      lambda ctx: ctx['export'].export_to_excel(),
+                      max_rows={'ant_records': 250_000}),
+        BenchmarkCase('export.export_to_excel.streaming', 'export',
+                      lambda ctx: ctx['export'].export_to_excel(streaming=True),
+                      max_rows={'ant_records': 2_500_000}),
+
+        # 整合性チェック
+        BenchmarkCase('integrity.run_all_checks', 'integrity',
+                      lambda ctx: ctx['integrity'].run_all_checks()),
+    ]
+    return cases
+
+
+def prepare_database(scale: str, seed: int = 42, regenerate: bool = False) -> str:
+    """
+    規模別のベンチマーク用データベースを用意（既存ファイルは再利用）
+
+    Args:
+        scale: 規模プリセット名
+        seed: 乱数シード
+        regenerate: 既存ファイルがあっても再生成するか
+
+    Returns:
+        str: データベースファイルのパス
+    """
+    if scale not in BENCHMARK_SCALES:
+        raise ValueError(f"未知の規模です: {scale}")
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    db_path = os.path.join(DATA_DIR, f'{scale}_seed{seed}.db')
+
+    if regenerate or not os.path.exists(db_path):
+        print(f"\n[{scale}] ベンチマーク用データベースを生成中: {db_path}")
+        generate_load_test_data(db_path, seed=seed, overwrite=True,
+                                **BENCHMARK_SCALES[scale])
+
+    return db_path
+
+
+def _count_tables(conn) -> Dict[str, int]:
+    """主要テーブルの行数を取得"""
+    tables = ['parent_sites', 'survey_sites', 'survey_events', 'vegetation_data',
+              'species_master', 'ant_records']
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in tables}
+
+
+def _create_context(conn, export_dir: str) -> Dict[str, Any]:
+    """
+    計測対象のモデル・コントローラーを生成（生成時間は計測に含めない）
+
+    Args:
+        conn: データベース接続
+        export_dir: 出力先の一時ディレクトリ
+
+    Returns:
+        Dict: 名前 → インスタンス
+    """
+    from models.parent_site import ParentSite
+    from models.survey_site import SurveySite
+    from models.species import Species
+    from models.survey_event import SurveyEvent
+    from models.vegetation import Vegetation
+    from models.ant_record import AntRecord
+    from controllers.analysis_controller import AnalysisController
+    from controllers.export_controller import ExportController
+    from controllers.map_controller import MapController
+    from controllers.ordination_controller import OrdinationController
+    from utils.integrity_checker import IntegrityChecker
+
+    return {
+        'parent_site': ParentSite(conn),
+        'survey_site': SurveySite(conn),
+        'species': Species(conn),
+        'survey_event': SurveyEvent(conn),
+        'vegetation': Vegetation(conn),
+        'ant_record': AntRecord(conn),
+        'analysis': AnalysisController(conn),
+        'ordination': OrdinationController(conn, cache_dir=export_dir),
+        'export': ExportController(conn, export_dir=export_dir),
+        'map': MapController(conn, map_dir=export_dir),
+        'integrity': IntegrityChecker(conn),
+    }
+
+
+def _clear_directory(path: str) -> None:
+    """出力ファイルを削除（ディスク使用量を抑えるため1回ごとに消す）"""
+    for name in os.listdir(path):
+        os.remove(os.path.join(path, name))
+
+
+def time_case(case: BenchmarkCase, context: Dict[str, Any], export_dir: str,
+              repeat: int = 3, warmup: int = 1,
+              max_seconds: float = 60.0) -> Dict[str, Any]:
+    """
+    1項目の所要時間を計測
+
+    Args:
+        case: ベンチマーク項目
+        context: モデル・コントローラー
+        export_dir: 出力先の一時ディレクトリ
+        repeat: 計測回数
+        warmup: 計測前の空実行回数
+        max_seconds: 1回がこの秒数を超えたら残りの繰り返しを打ち切る
+
+    Returns:
+        Dict: 計測結果（各回の秒数と統計量）
+    """
+    for _ in range(warmup):
+        started = time.perf_counter()
+        case.func(context)
+        _clear_directory(export_dir)
+        if time.perf_counter() - started > max_seconds:
+            break
+
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        case.func(context)
+        times.append(time.perf_counter() - started)
+        _clear_directory(export_dir)
+
+        if times[-1] > max_seconds:
+            break
+
+    return {
+        'status': 'ok',
+        'times': [round(t, 6) for t in times],
+        'min': round(min(times), 6),
+        'median': round(statistics.median(times), 6),
+        'mean': round(statistics.mean(times), 6),
+        'stdev': round(statistics.stdev(times), 6) if len(times) > 1 else 0.0,
+    }
+
+
+def run_benchmarks(scales: List[str], case_filters: Optional[List[str]] = None,
+                   repeat: int = 3, warmup: int = 1, max_seconds: float = 60.0,
+                   seed: int = 42, regenerate: bool = False,
+                   ignore_limits: bool = False) -> Dict[str, Any]:
+    """
+    ベンチマークを実行
+
+    Args:
+        scales: 規模プリセット名のリスト
+        case_filters: 項目名・分類名の部分一致フィルタ（Noneの場合は全項目）
+        repeat: 計測回数
+        warmup: 計測前の空実行回数
+        max_seconds: 1回がこの秒数を超えたら残りの繰り返しを打ち切る
+        seed: データ生成の乱数シード
+        regenerate: データベースを再生成するか
+        ignore_limits: 規模上限によるスキップを行わない
+
+    Returns:
+        Dict: 実行環境情報と計測結果
+    """
+    from models.database import Database
+
+    cases = [case for case in _build_cases()
+             if not case_filters
+             or any(f in case.name or f == case.group for f in case_filters)]
+    if not cases:
+        raise ValueError("該当するベンチマーク項目がありません")
+
+    report = {
+        'environment': collect_environment(),
+        'settings': {
+            'scales': scales, 'repeat': repeat, 'warmup': warmup,
+            'max_seconds': max_seconds, 'seed': seed,
+        },
+        'results': [],
+    }
+
+    for scale in scales:
+        db_path = prepare_database(scale, seed=seed, regenerate=regenerate)
+        database = Database(db_path)
+        conn = database.connect()
+        export_dir = tempfile.mkdtemp(prefix='ant_benchmark_')
+
+        try:
+            table_counts = _count_tables(conn)
+            context = _create_context(conn, export_dir)
+            print(f"\n[{scale}] " + ', '.join(
+                f"{table}={count:,}" for table, count in table_counts.items()))
+
+            for case in cases:
+                entry = {'scale': scale, 'case': case.name, 'group': case.group,
+                         'table_counts': table_counts}
+
+                reason = None if ignore_limits else case.skip_reason(table_counts)
+                if reason is not None:
+                    entry.update(status='skipped', reason=reason)
+                    print(f"  - {case.name:<48} スキップ（{reason}）")
+                else:
+                    try:
+                        entry.update(time_case(case, context, export_dir,
+                                               repeat, warmup, max_seconds))
+                        print(f"  ✓ {case.name:<48} 中央値 {entry['median']:.4f}秒"
+                              f"（最小 {entry['min']:.4f}秒, {len(entry['times'])}回）")
+                    except Exception as e:
+                        entry.update(status='error', reason=f"{type(e).__name__}: {e}")
+                        print(f"  ⚠ {case.name:<48} エラー: {e}")
+
+                report['results'].append(entry)
+
+        finally:
+            database.close()
+            shutil.rmtree(export_dir, ignore_errors=True)
+
+    return report
+
+
+def _git(*args) -> Optional[str]:
+    """gitコマンドの出力を取得（git管理外の場合はNone）"""
+    try:
+        return subprocess.run(['git', *args], cwd=BENCHMARK_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def collect_environment() -> Dict[str, Any]:
+    """
+    実行環境情報を収集
+
+    Returns:
+        Dict: コミット・Python/SQLite/ライブラリのバージョン等
+    """
+    status = _git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git('rev-parse', 'HEAD'),
+        'git_dirty': bool(status) if status is not None else None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'sqlite': sqlite3.sqlite_version,
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def save_report(report: Dict[str, Any], output_path: Optional[str] = None) -> str:
+    """
+    計測結果をJSONに保存
+
+    Args:
+        report: run_benchmarks() の戻り値
+        output_path: 保存先（Noneの場合は results/<日時>_<コミット>.json）
+
+    Returns:
+        str: 保存したファイルのパス
+    """
+    if output_path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        environment = report['environment']
+        commit = (environment['git_commit'] or 'nogit')[:8]
+        if environment['git_dirty']:
+            commit += '-dirty'
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output_path = os.path.join(RESULTS_DIR, f'{timestamp}_{commit}.json')
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    return output_path
+
+
+def compare_reports(base_path: str, target_path: str,
+                    threshold: float = DEFAULT_REGRESSION_THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    2つの計測結果を比較して中央値の変化を表示
+
+    Args:
+        base_path: 基準となる結果ファイル
+        target_path: 比較対象の結果ファイル
+        threshold: 劣化とみなす中央値の増加率
+
+    Returns:
+        List[Dict]: 項目ごとの比較結果（ratio = 比較対象 / 基準）
+    """
+    with open(base_path, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(target_path, encoding='utf-8') as f:
+        target = json.load(f)
+
+    base_results = {(r['scale'], r['case']): r for r in base['results']
+                    if r['status'] == 'ok'}
+
+    print(f"基準:   {base_path}（{base['environment'].get('git_commit')}）")
+    print(f"比較:   {target_path}（{target['environment'].get('git_commit')}）\n")
+
+    rows = []
+    for result in target['results']:
+        key = (result['scale'], result['case'])
+        if result['status'] != 'ok' or key not in base_results:
+            continue
+
+        base_median = base_results[key]['median']
+        ratio = result['median'] / base_median if base_median > 0 else float('inf')
+        rows.append({'scale': key[0], 'case': key[1], 'base': base_median,
+                     'target': result['median'], 'ratio': ratio})
+
+        mark = '⚠' if ratio > 1 + threshold else '✓'
+        print(f"  {mark} [{key[0]}] {key[1]:<48} "
+              f"{base_median:.4f}秒 → {result['median']:.4f}秒（×{ratio:.2f}）")
+
+    regressions = sum(1 for row in rows if row['ratio'] > 1 + threshold)
+    print(f"\n  比較 {len(rows)} 項目 / 劣化 {regressions} 項目"
+          f"（閾値 +{threshold:.0%}）")
+
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='解析・出力処理のベンチマークを実行します')
+    parser.add_argument('--scales', nargs='+', default=['tiny', 'small'],
+                        choices=list(BENCHMARK_SCALES), help='計測する規模')
+    parser.add_argument('--cases', nargs='+',
+                        help='項目名または分類（models/analysis/map/export/integrity）で絞り込み')
+    parser.add_argument('--repeat', type=int, default=3, help='計測回数')
+    parser.add_argument('--warmup', type=int, default=1, help='計測前の空実行回数')
+    parser.add_argument('--max-seconds', type=float, default=60.0,
+                        help='1回がこの秒数を超えたら繰り返しを打ち切る')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--regenerate', action='store_true',
+                        help='ベンチマーク用データベースを再生成する')
+    parser.add_argument('--ignore-limits', action='store_true',
+                        help='規模上限によるスキップを行わない')
+    parser.add_argument('--output', help='結果JSONの保存先')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'TARGET'),
+                        help='2つの結果JSONを比較する')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help='劣化とみなす中央値の増加率')
+    args = parser.parse_args()
+
+    # 日本語フォントが無い環境のグリフ欠落警告で計測ログが埋もれないようにする
+    warnings.filterwarnings('ignore', message='Glyph .* missing from font')
+
+    if args.compare:
+        compare_reports(args.compare[0], args.compare[1], args.threshold)
+    else:
+        report = run_benchmarks(args.scales, args.cases, repeat=args.repeat,
+                                warmup=args.warmup, max_seconds=args.max_seconds,
+                                seed=args.seed, regenerate=args.regenerate,
+                                ignore_limits=args.ignore_limits)
+        print(f"\n✓ 結果を保存しました: {save_report(report, args.output)}")
@@ -0,0 +1,576 @@
+"""
+アリ類群集・植生データ管理システム
+コマンドライン（バッチ）実行エントリーポイント
+
+GUI（tkinter / TkAgg）を読み込まずに出力・解析・地図作成・整合性チェックを実行する。
+サブコマンドごとに必要なモジュールだけを読み込むため、cron 等から並列に起動できる。
+
+実行例:
+    python cli.py export ant-matrix --value-type count
+    python cli.py export excel --export-dir /srv/exports/nightly
+    python cli.py export snapshot --format parquet
+    python cli.py export changes --checkpoint-name lab-a
+    python cli.py export dwca --id-prefix urn:example:ants
+    python cli.py diversity --output exports/diversity.csv
+    python cli.py diversity --estimators --bootstrap 200 --output exports/richness.csv
+    python cli.py plot accumulation --output exports/accumulation.svg
+    python cli.py plot ordination --ordination nmds --site-type parent --output exports/nmds.png
+    python cli.py plot hill --standardize --output exports/hill_profile.png
+    python cli.py mantel --x braycurtis --y vegetation --z geographic --site-type parent
+    python cli.py map sites --diversity
+    python cli.py map surface --metric shannon_index --method idw
+    python cli.py tiles prefetch --min-zoom 8 --max-zoom 15
+    python cli.py check --fail-on high
+"""
+import argparse
+import configparser
+import os
+import sys
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, PROJECT_ROOT)
+
+# 画面の無いサーバーでも描画できるよう、GUI用バックエンドではなくAggを使う
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+
+# 終了コード
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_ISSUES_FOUND = 2
+
+# 散布図に指定できる植生データの列
+VEGETATION_VARIABLES = ['basal_area', 'avg_tree_height', 'avg_herb_height',
+                        'soil_temperature', 'canopy_coverage', 'sasa_coverage',
+                        'herb_coverage', 'litter_coverage', 'light_condition',
+                        'soil_moisture', 'vegetation_complexity']
+
+# ヒートマップに指定できる指標（utils.diversity.DIVERSITY_INDICES と同じ）
+HEATMAP_METRICS = ['species_richness', 'total_individuals', 'shannon_index',
+                   'simpson_index', 'pielou_evenness', 'berger_parker_dominance']
+
+
+def load_config(config_path: str) -> configparser.ConfigParser:
+    """
+    設定ファイルを読み込み
+
+    Args:
+        config_path: 設定ファイルのパス
+
+    Returns:
+        ConfigParser: 設定（ファイルが無い場合は空）
+    """
+    config = configparser.ConfigParser()
+    if Path(config_path).exists():
+        config.read(config_path, encoding='utf-8')
+    return config
+
+
+def open_database(args, config):
+    """
+    データベースに接続（GUIと同じ Database クラスを使用）
+
+    Args:
+        args: コマンドライン引数
+        config: 設定
+
+    Returns:
+        (Database, 接続)
+    """
+    from models.database import Database
+
+    db_path = args.db or config.get('Database', 'path', fallback='data/ant_database.db')
+    if not Path(db_path).exists():
+        raise ValueError(f"データベースが見つかりません: {db_path}")
+
+    query_profiler = None
+    if args.profile:
+        from utils.query_profiler import create_query_profiler
+        if not config.has_section('Logging'):
+            config.add_section('Logging')
+        config.set('Logging', 'query_profiling', 'True')
+        query_profiler = create_query_profiler(config)
+
+    db = Database(db_path, query_profiler=query_profiler)
+    conn = db.connect()
+
+    # 並列実行時に書き込みロックで即座に失敗しないよう待機時間を設定
+    conn.execute(f"PRAGMA busy_timeout = {int(args.busy_timeout * 1000)}")
+
+    return db, conn
+
+
+def get_export_dir(args, config) -> str:
+    """出力先ディレクトリ（--export-dir ＞ config.ini ＞ exports）"""
+    return args.export_dir or config.get('Export', 'export_dir', fallback='exports')
+
+
+def cmd_export(args, conn, config) -> int:
+    """データ出力"""
+    from controllers.export_controller import ExportController
+
+    controller = ExportController(conn, export_dir=get_export_dir(args, config))
+
+    if args.target == 'ant-matrix':
+        filepath = controller.export_ant_matrix(
+            value_type=args.value_type, start_date=args.start_date,
+            end_date=args.end_date, site_ids=args.site_ids,
+            streaming=args.streaming)
+    elif args.target == 'vegetation':
+        filepath = controller.export_vegetation_matrix(
+            start_date=args.start_date, end_date=args.end_date,
+            site_ids=args.site_ids, streaming=args.streaming)
+    elif args.target == 'combined':
+        filepath = controller.export_combined_data(
+            include_diversity=not args.no_diversity,
+            include_estimators=not args.no_estimators,
+            n_bootstrap=args.bootstrap, n_jobs=args.jobs)
+    elif args.target == 'snapshot':
+        filepath = controller.export_snapshot(fmt=args.format)
+    elif args.target == 'community-long':
+        filepath = controller.export_community_long(fmt=args.format)
+    elif args.target == 'dwca':
+        filepath = controller.export_dwca(
+            id_prefix=args.id_prefix or config.get('DarwinCore', 'id_prefix', fallback='ant-db'),
+            basis_of_record=args.basis_of_record or config.get(
+                'DarwinCore', 'basis_of_record', fallback='HumanObservation'))
+    elif args.target == 'beta':
+        filepath = controller.export_beta_diversity(metric=args.metric, layout=args.layout,
+                                                    n_jobs=args.jobs)
+    elif args.target == 'changes':
+        filepath = controller.export_changes(name=args.checkpoint_name,
+                                             update_checkpoint=not args.keep_checkpoint)
+    else:
+        filepath = controller.export_to_excel(include_all_sheets=not args.basic_sheets,
+                                              streaming=args.streaming)
+
+    print(filepath)
+    return EXIT_OK
+
+
+def cmd_diversity(args, conn, config) -> int:
+    """種多様度指数の計算"""
+    from controllers.analysis_controller import AnalysisController
+
+    diversity_df = AnalysisController(conn).calculate_diversity_indices(
+        args.site_id, include_estimators=args.estimators, n_bootstrap=args.bootstrap,
+        n_jobs=args.jobs)
+
+    if diversity_df.empty:
+        print("⚠ 多様度データがありません", file=sys.stderr)
+        return EXIT_OK
+
+    if args.output:
+        output_dir = os.path.dirname(args.output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        diversity_df.to_csv(args.output, encoding='utf-8-sig', index=False)
+        print(args.output)
+    else:
+        print(diversity_df.to_csv(index=False), end='')
+
+    return EXIT_OK
+
+
+def cmd_plot(args, conn, config) -> int:
+    """グラフを画像ファイル（PNG / SVG / PDF）に出力"""
+    from utils.figure_utils import save_figure
+
+    if args.kind == 'dendrogram':
+        from controllers.map_controller import MapController
+        fig = MapController(conn, map_dir=get_export_dir(args, config)).create_dendrogram(
+            site_type=args.site_type, method=args.method)
+    elif args.kind == 'ordination':
+        from controllers.ordination_controller import OrdinationController
+        controller = OrdinationController(conn)
+        ordination = controller.compute_ordination(args.ordination, args.metric, args.site_type,
+                                                   n_init=args.n_init, n_jobs=args.jobs,
+                                                   use_cache=not args.no_cache)
+        vectors = None if args.no_vectors else controller.fit_vegetation_vectors(ordination)
+        fig = controller.create_ordination_plot(ordination, vectors)
+        if ordination['method'] == 'nmds':
+            print(f"stress: {ordination['stress']:.4f}", file=sys.stderr)
+    else:
+        from controllers.analysis_controller import AnalysisController
+        controller = AnalysisController(conn)
+        if args.kind == 'diversity':
+            fig = controller.create_diversity_comparison()
+        elif args.kind == 'accumulation':
+            fig = controller.create_species_accumulation_curve()
+        elif args.kind == 'hill':
+            result = controller.calculate_hill_profiles(
+                orders=args.orders, standardize=args.standardize, coverage=args.coverage,
+                n_jobs=args.jobs)
+            fig = controller.create_hill_profile_plot(result)
+            if result['coverage'] is not None:
+                print(f"被覆率: {result['coverage']:.4f}", file=sys.stderr)
+        else:
+            if not args.x or not args.y:
+                raise ValueError("散布図には --x と --y を指定してください")
+            fig = controller.create_scatter_plot(args.x, args.y, args.x, args.y,
+                                                 show_regression=not args.no_regression)
+
+    print(save_figure(fig, args.output, dpi=args.dpi))
+    return EXIT_OK
+
+
+def cmd_mantel(args, conn, config) -> int:
+    """Mantel検定（--z を指定した場合は部分Mantel検定）"""
+    from controllers.ordination_controller import OrdinationController
+
+    def show_progress(done, total):
+        print(f"\r並べ替え {done:,} / {total:,}", end='', file=sys.stderr, flush=True)
+
+    controller = OrdinationController(conn)
+    result = controller.mantel_test(args.x, args.y, args.z, site_type=args.site_type,
+                                    method=args.method, permutations=args.permutations,
+                                    alternative=args.alternative, n_jobs=args.jobs,
+                                    progress=None if args.quiet else show_progress)
+    if not args.quiet:
+        print(file=sys.stderr)
+
+    print(f"r={result['r']:.6f}\tp={result['p_value']:.6f}\tn={result['n']}")
+    if args.output:
+        from utils.figure_utils import save_figure
+        print(save_figure(controller.create_mantel_plot(result), args.output, dpi=args.dpi))
+    return EXIT_OK
+
+
+def cmd_map(args, conn, config) -> int:
+    """地図の作成"""
+    from controllers.map_controller import MapController
+    from utils.tile_cache import tile_settings_from_config
+
+    settings = tile_settings_from_config(config)
+    controller = MapController(conn, map_dir=get_export_dir(args, config), **settings)
+
+    if args.kind == 'sites':
+        filepath = controller.create_site_map(show_parent=not args.no_parent,
+                                              show_survey=not args.no_survey,
+                                              show_diversity=args.diversity,
+                                              render_mode=args.render_mode,
+                                              use_cache=not args.no_cache)
+    elif args.kind == 'heatmap':
+        filepath = controller.create_heatmap(metric=args.metric, weighting=args.weighting,
+                                             normalization=args.normalization,
+                                             use_cache=not args.no_cache)
+    elif args.kind == 'surface':
+        filepath = controller.create_diversity_surface_map(
+            metric=args.metric, method=args.method, bandwidth_km=args.bandwidth_km,
+            resolution=args.resolution, render=args.render, use_cache=not args.no_cache)
+    else:
+        filepath = controller.create_cluster_map(n_clusters=args.n_clusters,
+                                                 method=args.cluster_method,
+                                                 distance=args.distance,
+                                                 site_type=args.site_type,
+                                                 use_cache=not args.no_cache)
+
+    print(filepath)
+    if settings['tile_server'] is not None:
+        print("⚠ オフライン表示です。地図を開く前に python cli.py tiles serve を起動してください",
+              file=sys.stderr)
+    return EXIT_OK
+
+
+def cmd_tiles(args, conn, config) -> int:
+    """オフライン地図用タイルの取得・配信"""
+    from controllers.map_controller import MapController
+    from utils.tile_cache import (DEFAULT_REQUEST_INTERVAL, USER_AGENT, TileCache,
+                                  TileServer)
+
+    cache_path = args.cache or config.get('Map', 'tile_cache', fallback='data/map_tiles.mbtiles')
+
+    if args.action == 'serve':
+        port = args.port or config.getint('Map', 'tile_server_port', fallback=8765)
+        server = TileServer(cache_path, port=port)
+        print(f"✓ タイルサーバーを起動しました: {server.base_url}（Ctrl+C で終了）",
+              file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return EXIT_OK
+
+    cache = TileCache(cache_path)
+    try:
+        if args.action == 'prefetch':
+            controller = MapController(conn, map_dir=get_export_dir(args, config))
+            bounds = (tuple(args.bbox) if args.bbox
+                      else controller.get_site_bounds(margin_km=args.margin_km))
+            tile_url = args.tile_url or config.get(
+                'Map', 'tile_server', fallback='https://tile.openstreetmap.org/{z}/{x}/{y}.png')
+
+            assets = cache.prefetch_assets(MapController.map_asset_urls())
+            print(f"地図表示用ファイル: 取得 {assets['downloaded']}件, 失敗 {assets['failed']}件",
+                  file=sys.stderr)
+
+            def progress(done, total):
+                if done % 100 == 0 or done == total:
+                    print(f"  {done:,} / {total:,} 枚", file=sys.stderr)
+
+            result = cache.prefetch_tiles(
+                tile_url, bounds, args.min_zoom, args.max_zoom,
+                max_tiles=args.max_tiles, progress=progress,
+                request_interval=config.getfloat('Map', 'tile_request_interval',
+                                                 fallback=DEFAULT_REQUEST_INTERVAL),
+                user_agent=config.get('Map', 'tile_user_agent', fallback=USER_AGENT))
+            print(f"タイル: 全{result['total']:,}枚（取得 {result['downloaded']:,}, "
+                  f"取得済み {result['skipped']:,}, 失敗 {result['failed']:,}）")
+            if result['rate_limited']:
+                print("⚠ タイルサーバーから取得の制限（429）を受けたため中止しました。"
+                      "時間をおいて再実行してください", file=sys.stderr)
+
+        info = cache.get_info()
+        print(f"{cache_path}: 静的ファイル {info['assets']}件")
+        for zoom, count in info['tiles_by_zoom'].items():
+            print(f"  ズーム {zoom}: {count:,}枚")
+    finally:
+        cache.close()
+    return EXIT_OK
+
+
+def cmd_check(args, conn, config) -> int:
+    """データ整合性チェック"""
+    from utils.integrity_checker import IntegrityChecker
+
+    result = IntegrityChecker(conn).run_all_checks()
+
+    for issue in result['issues']:
+        print(f"[{issue['severity']}] {issue['type']} {issue['table']}: {issue['message']}")
+    print(f"{result['status']}: {result['total_issues']}件の問題", file=sys.stderr)
+
+    if args.fail_on == 'any' and result['issues']:
+        return EXIT_ISSUES_FOUND
+    if args.fail_on == 'high' and any(i['severity'] == 'high' for i in result['issues']):
+        return EXIT_ISSUES_FOUND
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    コマンドライン引数の定義を作成
+
+    Returns:
+        ArgumentParser: 引数パーサー
+    """
+    parser = argparse.ArgumentParser(
+        description='アリ類群集・植生データ管理システム（コマンドライン実行）')
+    parser.add_argument('--config', default='config.ini', help='設定ファイル')
+    parser.add_argument('--db', help='データベースファイル（省略時は config.ini の [Database] path）')
+    parser.add_argument('--export-dir', help='出力先ディレクトリ（省略時は config.ini の [Export] export_dir）')
+    parser.add_argument('--busy-timeout', type=float, default=30.0,
+                        help='データベースのロック待ち時間（秒）')
+    parser.add_argument('--profile', action='store_true',
+                        help='SQLの実行時間を計測し、スロークエリをログに記録する')
+    parser.add_argument('--trace', metavar='JSON',
+                        help='処理時間のトレースをJSONに出力する')
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    # export
+    export_parser = subparsers.add_parser('export', help='データを出力')
+    export_parser.add_argument('target',
+                               choices=['ant-matrix', 'vegetation', 'combined', 'excel',
+                                        'snapshot', 'community-long', 'changes', 'dwca',
+                                        'beta'])
+    export_parser.add_argument('--value-type', choices=['presence', 'count'],
+                               default='presence', help='群集行列の値（在不在 / 個体数）')
+    export_parser.add_argument('--start-date', help='開始日（YYYY-MM-DD）')
+    export_parser.add_argument('--end-date', help='終了日（YYYY-MM-DD）')
+    export_parser.add_argument('--site-ids', type=int, nargs='+', help='調査地ID')
+    export_parser.add_argument('--streaming', action='store_true',
+                               help='群集行列・植生データ・Excelを1行ずつ書き出す（大規模データ向け、メモリ使用量が一定）')
+    export_parser.add_argument('--format', choices=['parquet', 'feather'], default='parquet',
+                               help='スナップショット・縦持ち群集データの形式（pyarrow が必要）')
+    export_parser.add_argument('--no-diversity', action='store_true',
+                               help='統合データに多様度を含めない')
+    export_parser.add_argument('--no-estimators', action='store_true',
+                               help='統合データに種数推定値（Chao1・ACE・Chao2・ジャックナイフ）を含めない')
+    export_parser.add_argument('--bootstrap', type=int, default=100,
+                               help='種数推定値の信頼区間のブートストラップ反復回数（0 で計算しない）')
+    export_parser.add_argument('--basic-sheets', action='store_true',
+                               help='Excelに基本シート（親調査地・調査地・イベント）のみ出力')
+    export_parser.add_argument('--id-prefix',
+                               help='Darwin Core Archive の eventID / occurrenceID の接頭辞'
+                                    '（省略時は config.ini の [DarwinCore] id_prefix）')
+    export_parser.add_argument('--basis-of-record',
+                               choices=['HumanObservation', 'PreservedSpecimen', 'MaterialSample'],
+                               help='Darwin Core Archive の basisOfRecord')
+    export_parser.add_argument('--metric', choices=['braycurtis', 'jaccard', 'sorensen'],
+                               default='braycurtis', help='群集非類似度の指標')
+    export_parser.add_argument('--layout', choices=['square', 'condensed'], default='square',
+                               help='群集非類似度の出力形式（正方行列CSV / 上三角の .npy）')
+    export_parser.add_argument('--jobs', type=int, default=1,
+                               help='群集非類似度・ブートストラップの計算の並列数（-1 は全コア）')
+    export_parser.add_argument('--checkpoint-name', default='default',
+                               help='差分出力のチェックポイント名（出力先ごとに分ける）')
+    export_parser.add_argument('--keep-checkpoint', action='store_true',
+                               help='差分出力後にチェックポイントを進めない')
+    export_parser.set_defaults(handler=cmd_export)
+
+    # diversity
+    diversity_parser = subparsers.add_parser('diversity', help='種多様度指数を計算')
+    diversity_parser.add_argument('--site-id', type=int, help='調査地ID（省略時は全調査地）')
+    diversity_parser.add_argument('--output', help='出力CSV（省略時は標準出力）')
+    diversity_parser.add_argument('--estimators', action='store_true',
+                                  help='種数推定値（Chao1・ACE・Chao2・ジャックナイフ）と信頼区間を含める')
+    diversity_parser.add_argument('--bootstrap', type=int, default=100,
+                                  help='信頼区間のブートストラップ反復回数（0 で計算しない）')
+    diversity_parser.add_argument('--jobs', type=int, default=-1, help='並列数（-1 は全コア）')
+    diversity_parser.set_defaults(handler=cmd_diversity)
+
+    # plot
+    plot_parser = subparsers.add_parser('plot', help='グラフを画像ファイルに出力')
+    plot_parser.add_argument('kind',
+                             choices=['diversity', 'accumulation', 'scatter', 'dendrogram',
+                                      'ordination', 'hill'])
+    plot_parser.add_argument('--output', required=True,
+                             help='出力ファイル（拡張子 .png / .svg / .pdf で形式を判定）')
+    plot_parser.add_argument('--dpi', type=int, default=150, help='解像度（PNGのみ）')
+    plot_parser.add_argument('--x', choices=VEGETATION_VARIABLES, help='散布図のX軸（植生データの列）')
+    plot_parser.add_argument('--y', choices=VEGETATION_VARIABLES, help='散布図のY軸（植生データの列）')
+    plot_parser.add_argument('--no-regression', action='store_true', help='回帰直線を表示しない')
+    plot_parser.add_argument('--site-type', choices=['survey', 'parent'], default='survey',
+                             help='樹形図・序列化の対象')
+    plot_parser.add_argument('--method', choices=['ward', 'single', 'complete', 'average'],
+                             default='ward', help='樹形図の結合方法')
+    plot_parser.add_argument('--ordination', choices=['pcoa', 'nmds'], default='pcoa',
+                             help='序列化の方法')
+    plot_parser.add_argument('--metric', choices=['braycurtis', 'jaccard', 'sorensen'],
+                             default='braycurtis', help='序列化に使う群集非類似度の指標')
+    plot_parser.add_argument('--n-init', type=int, default=10, help='NMDS の初期配置の数')
+    plot_parser.add_argument('--jobs', type=int, default=-1,
+                             help='序列化・Hill数の標準化の計算の並列数（-1 は全コア）')
+    plot_parser.add_argument('--no-vectors', action='store_true',
+                             help='序列化の図に植生のベクトルを表示しない')
+    plot_parser.add_argument('--no-cache', action='store_true',
+                             help='保存済みの序列化の結果を使わずに計算する')
+    plot_parser.add_argument('--orders', type=float, nargs='+',
+                             help='Hill数の次数 q（省略時は 0〜3 を 0.1 刻み）')
+    plot_parser.add_argument('--standardize', action='store_true',
+                             help='Hill数を標本被覆率で標準化する')
+    plot_parser.add_argument('--coverage', type=float,
+                             help='標準化の目標の被覆率（省略時は調査地の被覆率の最小値）')
+    plot_parser.set_defaults(handler=cmd_plot)
+
+    # mantel
+    mantel_distances = ['braycurtis', 'jaccard', 'sorensen', 'geographic', 'vegetation']
+    mantel_parser = subparsers.add_parser('mantel', help='距離行列の相関（Mantel検定）')
+    mantel_parser.add_argument('--x', choices=mantel_distances, default='braycurtis',
+                               help='並べ替える距離（群集の非類似度など）')
+    mantel_parser.add_argument('--y', choices=mantel_distances, default='geographic',
+                               help='比較する距離')
+    mantel_parser.add_argument('--z', choices=mantel_distances,
+                               help='影響を除く距離（指定すると部分Mantel検定）')
+    mantel_parser.add_argument('--site-type', choices=['survey', 'parent'], default='survey',
+                               help='検定の対象')
+    mantel_parser.add_argument('--method', choices=['pearson', 'spearman'], default='pearson',
+                               help='相関係数の種類')
+    mantel_parser.add_argument('--permutations', type=int, default=999, help='並べ替えの回数')
+    mantel_parser.add_argument('--alternative', choices=['greater', 'less', 'two-sided'],
+                               default='greater', help='対立仮説')
+    mantel_parser.add_argument('--jobs', type=int, default=-1, help='並列数（-1 は全コア）')
+    mantel_parser.add_argument('--output', help='並べ替え分布の図（.png / .svg / .pdf）')
+    mantel_parser.add_argument('--dpi', type=int, default=150, help='解像度（PNGのみ）')
+    mantel_parser.add_argument('--quiet', action='store_true', help='進捗を表示しない')
+    mantel_parser.set_defaults(handler=cmd_mantel)
+
+    # map
+    map_parser = subparsers.add_parser('map', help='地図（HTML）を作成')
+    map_parser.add_argument('kind', choices=['sites', 'heatmap', 'surface', 'clusters'])
+    map_parser.add_argument('--no-parent', action='store_true', help='親調査地を表示しない')
+    map_parser.add_argument('--no-survey', action='store_true', help='調査地を表示しない')
+    map_parser.add_argument('--diversity', action='store_true', help='種数で色分けする')
+    map_parser.add_argument('--render-mode', choices=['auto', 'markers', 'geojson', 'cluster'],
+                            default='auto',
+                            help='調査地の描画方法（auto: 2000地点を超えるとgeojson）')
+    map_parser.add_argument('--metric', choices=HEATMAP_METRICS,
+                            default='species_richness', help='ヒートマップの指標')
+    map_parser.add_argument('--weighting', choices=['none', 'events', 'log_individuals'],
+                            default='none',
+                            help='ヒートマップの重み（調査イベント数 / log(1+総個体数)）')
+    map_parser.add_argument('--normalization', choices=['max', 'minmax', 'rank', 'none'],
+                            default='max', help='ヒートマップの強度の正規化')
+    map_parser.add_argument('--method', choices=['kde', 'idw'], default='kde',
+                            help='サーフェスの計算方法（カーネル密度 / 逆距離加重補間）')
+    map_parser.add_argument('--bandwidth-km', type=float,
+                            help='サーフェスのバンド幅（km。省略時は調査地の範囲の1/25）')
+    map_parser.add_argument('--resolution', type=int, default=200,
+                            help='サーフェスの格子の長い辺のセル数')
+    map_parser.add_argument('--render', choices=['image', 'contour'], default='image',
+                            help='サーフェスの表示（画像 / 等値線）')
+    map_parser.add_argument('--n-clusters', type=int, default=3, help='クラスタ数')
+    map_parser.add_argument('--cluster-method', choices=['kmeans', 'hierarchical'],
+                            default='kmeans', help='クラスタリングの手法')
+    map_parser.add_argument('--distance',
+                            choices=['geographic', 'braycurtis', 'jaccard', 'sorensen'],
+                            default='geographic',
+                            help='階層的クラスタリングの距離（地理的距離 / 群集の非類似度）')
+    map_parser.add_argument('--site-type', choices=['survey', 'parent'], default='survey')
+    map_parser.add_argument('--no-cache', action='store_true',
+                            help='生成済みの地図を再利用せず作り直す')
+    map_parser.set_defaults(handler=cmd_map)
+
+    # tiles
+    tiles_parser = subparsers.add_parser('tiles', help='オフライン地図用タイルの取得・配信')
+    tiles_parser.add_argument('action', choices=['prefetch', 'serve', 'info'])
+    tiles_parser.add_argument('--cache', help='タイルキャッシュ（省略時は config.ini の [Map] tile_cache）')
+    tiles_parser.add_argument('--min-zoom', type=int, default=8, help='取得する最小ズームレベル')
+    tiles_parser.add_argument('--max-zoom', type=int, default=14, help='取得する最大ズームレベル')
+    tiles_parser.add_argument('--bbox', type=float, nargs=4,
+                              metavar=('SOUTH', 'WEST', 'NORTH', 'EAST'),
+                              help='取得範囲（省略時は調査地を囲む範囲）')
+    tiles_parser.add_argument('--margin-km', type=float, default=2.0,
+                              help='調査地を囲む範囲を広げる距離（km）')
+    tiles_parser.add_argument('--max-tiles', type=int, default=5000,
+                              help='取得するタイル数の上限')
+    tiles_parser.add_argument('--tile-url', help='取得元のURL（省略時は config.ini の [Map] tile_server）')
+    tiles_parser.add_argument('--port', type=int, help='配信するポート（省略時は config.ini の [Map] tile_server_port）')
+    tiles_parser.set_defaults(handler=cmd_tiles)
+
+    # check
+    check_parser = subparsers.add_parser('check', help='データ整合性チェック')
+    check_parser.add_argument('--fail-on', choices=['never', 'high', 'any'], default='never',
+                              help=f'問題検出時に終了コード {EXIT_ISSUES_FOUND} で終了する条件')
+    check_parser.set_defaults(handler=cmd_check)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    """
+    メイン処理
+
+    Args:
+        argv: コマンドライン引数（Noneの場合は sys.argv）
+
+    Returns:
+        int: 終了コード
+    """
+    args = build_parser().parse_args(argv)
+    config = load_config(args.config)
+
+    if args.trace:
+        from utils import perf_trace
+        perf_trace.enable()
+
+    db = None
+    try:
+        db, conn = open_database(args, config)
+        return args.handler(args, conn, config)
+
+    except Exception as e:
+        print(f"✗ エラーが発生しました: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+    finally:
+        if db is not None:
+            db.close()
+        if args.trace:
+            perf_trace.export_traces(args.trace)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
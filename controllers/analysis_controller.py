@@ -3,11 +3,19 @@
 """
 import pandas as pd
 import numpy as np
-from scipy import stats
-from typing import Dict, List, Tuple, Optional, Any
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('TkAgg')  # GUI用バックエンド
+from typing import TYPE_CHECKING, Dict, List, Optional, Any
+from models.site_species_summary import SiteSpeciesSummary
+from utils.beta_diversity import fetch_community_matrix
+from utils.diversity import fetch_site_counts, grouped_diversity
+from utils.figure_utils import create_figure, finalize_figure
+from utils.hill import (DEFAULT_ORDERS, DEFAULT_DRAWS, hill_numbers, sample_coverage,
+                        standardized_hill_numbers)
+from utils.richness import (RICHNESS_ESTIMATORS, DEFAULT_BOOTSTRAP, fetch_site_frequencies,
+                            site_matrices, pooled_matrices, estimate_richness)
+from utils.perf_trace import span, traced
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
 
 
 class AnalysisController:
@@ -21,89 +29,172 @@ class AnalysisController:
             db_connection: データベース接続
         """
         self.conn = db_connection
-        
-        # 日本語フォント設定
-        plt.rcParams['font.sans-serif'] = ['Yu Gothic', 'MS Gothic', 'DejaVu Sans']
-        plt.rcParams['axes.unicode_minus'] = False
+        self.summary = SiteSpeciesSummary(db_connection)
     
-    def calculate_diversity_indices(self, site_id: Optional[int] = None) -> pd.DataFrame:
+    @traced('analysis.diversity_indices')
+    def calculate_diversity_indices(self, site_id: Optional[int] = None,
+                                    include_estimators: bool = False,
+                                    n_bootstrap: int = DEFAULT_BOOTSTRAP,
+                                    n_jobs: Optional[int] = -1,
+                                    frequencies: Optional[Dict[str, np.ndarray]] = None
+                                    ) -> pd.DataFrame:
         """
         種多様度指数を計算
         
         Args:
             site_id: 調査地ID（Noneの場合は全調査地）
+            include_estimators: 種数推定値（Chao1等）と信頼区間の列を含めるか
+            n_bootstrap: 信頼区間のブートストラップ反復回数
+            n_jobs: ブートストラップの並列数（-1 は全コア）
+            frequencies: 取得済みの fetch_site_frequencies の戻り値
+                         （指定した場合は集計テーブルを読み直さない。site_id は無視する）
             
         Returns:
             DataFrame: 多様度指数のデータフレーム
+                       （推定値を含める場合・frequencies を指定した場合の種数は、
+                        推定量と同じく個体数が1以上の種の数）
         """
-        # データ取得
-        sql = """
-            SELECT 
-                se.survey_site_id,
-                ss.name as site_name,
+        # 推定値を含める場合は、指数と推定量を同じ取得データから計算する
+        if include_estimators and frequencies is None:
+            with span('analysis.diversity_indices.fetch') as sp:
+                frequencies = fetch_site_frequencies(self.conn, site_id)
+                sp.set(rows=len(frequencies['site_id']))
+        
+        # データ取得（調査地×種 集計テーブルから、ID・個体数のみ配列で）
+        if frequencies is not None:
+            site_ids, counts = frequencies['site_id'], frequencies['count']
+        else:
+            with span('analysis.diversity_indices.fetch') as sp:
+                site_ids, counts = fetch_site_counts(self.conn, site_id)
+                sp.set(rows=len(site_ids))
+        
+        if len(site_ids) == 0:
+            return pd.DataFrame()
+        
+        # 調査地ごとの指数を配列演算でまとめて計算
+        with span('analysis.diversity_indices.compute', sites=len(np.unique(site_ids))):
+            indices = grouped_diversity(site_ids, counts)
+        
+        # 調査地名は集計行ではなく調査地ごとに1回だけ取得
+        names_df = pd.read_sql_query("""
+            SELECT
+                ss.id as site_id,
                 ps.name as parent_site_name,
-                ar.species_id,
-                SUM(ar.count) as total_count
-            FROM ant_records ar
-            JOIN survey_events se ON ar.survey_event_id = se.id
-            JOIN survey_sites ss ON se.survey_site_id = ss.id
+                ss.name as site_name
+            FROM survey_sites ss
             JOIN parent_sites ps ON ss.parent_site_id = ps.id
-            WHERE ar.deleted_at IS NULL
+        """, self.conn)
+        
+        result = pd.DataFrame({
+            'site_id': indices['group_id'],
+            'species_richness': indices['species_richness'],
+            'total_individuals': indices['total_individuals'],
+            'shannon_index': indices['shannon_index'].round(3),
+            'simpson_index': indices['simpson_index'].round(3),
+            'pielou_evenness': indices['pielou_evenness'].round(3),
+            'berger_parker_dominance': indices['berger_parker_dominance'].round(3),
+        })
+        result = result.merge(names_df, on='site_id', how='inner')
+        
+        result = result[['site_id', 'parent_site_name', 'site_name', 'species_richness',
+                         'total_individuals', 'shannon_index', 'simpson_index',
+                         'pielou_evenness', 'berger_parker_dominance']]
+        
+        if include_estimators:
+            estimators = self.calculate_richness_estimators(site_id, n_bootstrap, n_jobs=n_jobs,
+                                                            frequencies=frequencies)
+            result = result.merge(estimators, on='site_id', how='left')
+        
+        return result
+    
+    @traced('analysis.richness_estimators')
+    def calculate_richness_estimators(self, site_id: Optional[int] = None,
+                                      n_bootstrap: int = DEFAULT_BOOTSTRAP,
+                                      level: float = 0.95,
+                                      n_jobs: Optional[int] = -1,
+                                      frequencies: Optional[Dict[str, np.ndarray]] = None
+                                      ) -> pd.DataFrame:
         """
+        調査地ごとの種数推定値（Chao1・ACE・Chao2・ジャックナイフ）と信頼区間を計算
         
-        params = []
-        if site_id is not None:
-            sql += " AND se.survey_site_id = ?"
-            params.append(site_id)
+        Chao1・ACE は個体数から、Chao2・ジャックナイフは調査イベントを標本単位とした
+        出現頻度から推定する。全調査地を (調査地 × 種) の行列にまとめて計算する。
         
-        sql += " GROUP BY se.survey_site_id, ar.species_id"
-        
-        df = pd.read_sql_query(sql, self.conn, params=params)
+        Args:
+            site_id: 調査地ID（Noneの場合は全調査地）
+            n_bootstrap: 信頼区間のブートストラップ反復回数（0 の場合は信頼区間を計算しない）
+            level: 信頼水準
+            n_jobs: ブートストラップの並列数（-1 は全コア）
+            frequencies: 取得済みの fetch_site_frequencies の戻り値
+                         （指定した場合は集計テーブルを読み直さない。site_id は無視する）
+            
+        Returns:
+            DataFrame: site_id, n_events（調査イベント数）と、推定量ごとの
+                       推定値・下限（_lower）・上限（_upper）
+        """
+        if frequencies is None:
+            with span('analysis.richness_estimators.fetch') as sp:
+                frequencies = fetch_site_frequencies(self.conn, site_id)
+                sp.set(rows=len(frequencies['site_id']))
         
-        if df.empty:
+        if len(frequencies['site_id']) == 0:
             return pd.DataFrame()
         
-        # 調査地ごとに計算
-        results = []
+        matrices = site_matrices(frequencies)
+        with span('analysis.richness_estimators.compute', sites=len(matrices['site_id']),
+                  bootstrap=n_bootstrap):
+            estimates = estimate_richness(matrices, n_bootstrap, level, n_jobs)
         
-        for site_id in df['survey_site_id'].unique():
-            site_data = df[df['survey_site_id'] == site_id]
-            site_name = site_data['site_name'].iloc[0]
-            parent_name = site_data['parent_site_name'].iloc[0]
-            
-            counts = site_data['total_count'].values
-            total = counts.sum()
-            
-            # 種数
-            species_richness = len(counts)
-            
-            # Shannon多様度指数
-            proportions = counts / total
-            shannon = -np.sum(proportions * np.log(proportions))
-            
-            # Simpson多様度指数
-            simpson = 1 - np.sum(proportions ** 2)
-            
-            # Pielou均等度
-            pielou = shannon / np.log(species_richness) if species_richness > 1 else 0
-            
-            # Berger-Parker優占度
-            berger_parker = np.max(counts) / total
+        result = pd.DataFrame({'site_id': matrices['site_id'], 'n_events': matrices['n_units']})
+        return pd.concat([result, self._estimator_columns(estimates)], axis=1)
+    
+    @traced('analysis.pooled_richness')
+    def calculate_pooled_richness(self, n_bootstrap: int = DEFAULT_BOOTSTRAP,
+                                  level: float = 0.95,
+                                  n_jobs: Optional[int] = -1,
+                                  frequencies: Optional[Dict[str, np.ndarray]] = None
+                                  ) -> Dict[str, Any]:
+        """
+        全調査地をまとめた（プールした）種数推定値と信頼区間を計算
+        
+        Args:
+            n_bootstrap: 信頼区間のブートストラップ反復回数
+            level: 信頼水準
+            n_jobs: ブートストラップの並列数（-1 は全コア）
+            frequencies: 取得済みの fetch_site_frequencies の戻り値
+                         （調査地ごとの推定と同じデータを使う場合に指定）
             
-            results.append({
-                'site_id': site_id,
-                'parent_site_name': parent_name,
-                'site_name': site_name,
-                'species_richness': species_richness,
-                'total_individuals': int(total),
-                'shannon_index': round(shannon, 3),
-                'simpson_index': round(simpson, 3),
-                'pielou_evenness': round(pielou, 3),
-                'berger_parker_dominance': round(berger_parker, 3)
-            })
-        
-        return pd.DataFrame(results)
+        Returns:
+            Dict: species_richness, total_individuals, n_events と、推定量ごとの
+                  推定値・下限（_lower）・上限（_upper）（データが無い場合は空）
+        """
+        if frequencies is None:
+            frequencies = fetch_site_frequencies(self.conn)
+        if len(frequencies['site_id']) == 0:
+            return {}
+        
+        matrices = pooled_matrices(frequencies)
+        estimates = estimate_richness(matrices, n_bootstrap, level, n_jobs)
+        
+        result = {
+            # 種数は推定量と同じく、個体数が1以上の種の数
+            'species_richness': int(matrices['abundance'].shape[1]),
+            'total_individuals': int(estimates['n_individuals'][0]),
+            'n_events': int(matrices['n_units'][0]),
+        }
+        result.update(self._estimator_columns(estimates).iloc[0].to_dict())
+        return result
+    
+    @staticmethod
+    def _estimator_columns(estimates: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """推定値・信頼区間を小数2桁に丸めたデータフレーム"""
+        columns = {}
+        for name in RICHNESS_ESTIMATORS:
+            for key in (name, f'{name}_lower', f'{name}_upper'):
+                columns[key] = np.round(estimates[key], 2)
+        return pd.DataFrame(columns)
     
+    @traced('analysis.correlation')
     def calculate_correlation(self, var1_name: str, var2_name: str,
                             method: str = 'pearson') -> Dict[str, Any]:
         """
@@ -128,7 +219,8 @@ class AnalysisController:
             AND vd.{var2_name} IS NOT NULL
         """
         
-        df = pd.read_sql_query(sql, self.conn)
+        with span('analysis.correlation.fetch'):
+            df = pd.read_sql_query(sql, self.conn)
         
         if len(df) < 3:
             raise ValueError("データが不足しています（最低3件必要）")
@@ -136,10 +228,14 @@ class AnalysisController:
         x = df[var1_name].values
         y = df[var2_name].values
         
-        if method == 'pearson':
-            corr, p_value = stats.pearsonr(x, y)
-        else:
-            corr, p_value = stats.spearmanr(x, y)
+        # scipy.stats は読み込みが重いため使用時に読み込む
+        from scipy import stats
+        
+        with span('analysis.correlation.compute'):
+            if method == 'pearson':
+                corr, p_value = stats.pearsonr(x, y)
+            else:
+                corr, p_value = stats.spearmanr(x, y)
         
         return {
             'correlation': round(corr, 4),
@@ -149,9 +245,10 @@ class AnalysisController:
             'method': method
         }
     
+    @traced('analysis.scatter_plot')
     def create_scatter_plot(self, var1_name: str, var2_name: str,
                           var1_label: str, var2_label: str,
-                          show_regression: bool = True) -> plt.Figure:
+                          show_regression: bool = True) -> 'Figure':
         """
         散布図を作成
         
@@ -170,34 +267,36 @@ class AnalysisController:
         df = result['data']
         
         # 図の作成
-        fig, ax = plt.subplots(figsize=(8, 6))
-        
-        x = df[var1_name].values
-        y = df[var2_name].values
-        
-        # 散布図
-        ax.scatter(x, y, alpha=0.6, s=50)
-        
-        # 回帰直線
-        if show_regression and len(x) > 2:
-            z = np.polyfit(x, y, 1)
-            p = np.poly1d(z)
-            x_line = np.linspace(x.min(), x.max(), 100)
-            ax.plot(x_line, p(x_line), "r--", alpha=0.8, linewidth=2)
-        
-        # ラベル設定
-        ax.set_xlabel(var1_label, fontsize=12)
-        ax.set_ylabel(var2_label, fontsize=12)
-        ax.set_title(f'{var1_label} vs {var2_label}\n'
-                    f'相関係数: {result["correlation"]:.3f} (p={result["p_value"]:.3f})',
-                    fontsize=14)
-        
-        ax.grid(True, alpha=0.3)
-        plt.tight_layout()
+        with span('analysis.scatter_plot.render'):
+            fig, ax = create_figure(figsize=(8, 6))
+            
+            x = df[var1_name].values
+            y = df[var2_name].values
+            
+            # 散布図
+            ax.scatter(x, y, alpha=0.6, s=50)
+            
+            # 回帰直線
+            if show_regression and len(x) > 2:
+                z = np.polyfit(x, y, 1)
+                p = np.poly1d(z)
+                x_line = np.linspace(x.min(), x.max(), 100)
+                ax.plot(x_line, p(x_line), "r--", alpha=0.8, linewidth=2)
+            
+            # ラベル設定
+            ax.set_xlabel(var1_label, fontsize=12)
+            ax.set_ylabel(var2_label, fontsize=12)
+            ax.set_title(f'{var1_label} vs {var2_label}\n'
+                        f'相関係数: {result["correlation"]:.3f} (p={result["p_value"]:.3f})',
+                        fontsize=14)
+            
+            ax.grid(True, alpha=0.3)
+            finalize_figure(fig)
         
         return fig
     
-    def create_diversity_comparison(self) -> plt.Figure:
+    @traced('analysis.diversity_comparison')
+    def create_diversity_comparison(self) -> 'Figure':
         """
         調査地間の種多様度比較グラフを作成
         
@@ -214,27 +313,29 @@ class AnalysisController:
             diversity_df = diversity_df.nlargest(10, 'shannon_index')
         
         # 図の作成
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
-        
-        # Shannon指数
-        ax1.barh(diversity_df['site_name'], diversity_df['shannon_index'], 
-                color='steelblue', alpha=0.7)
-        ax1.set_xlabel('Shannon多様度指数', fontsize=11)
-        ax1.set_title('Shannon多様度指数の比較', fontsize=13, fontweight='bold')
-        ax1.grid(axis='x', alpha=0.3)
-        
-        # 種数
-        ax2.barh(diversity_df['site_name'], diversity_df['species_richness'], 
-                color='coral', alpha=0.7)
-        ax2.set_xlabel('種数', fontsize=11)
-        ax2.set_title('種数の比較', fontsize=13, fontweight='bold')
-        ax2.grid(axis='x', alpha=0.3)
-        
-        plt.tight_layout()
+        with span('analysis.diversity_comparison.render'):
+            fig, (ax1, ax2) = create_figure(figsize=(14, 6), ncols=2)
+            
+            # Shannon指数
+            ax1.barh(diversity_df['site_name'], diversity_df['shannon_index'], 
+                    color='steelblue', alpha=0.7)
+            ax1.set_xlabel('Shannon多様度指数', fontsize=11)
+            ax1.set_title('Shannon多様度指数の比較', fontsize=13, fontweight='bold')
+            ax1.grid(axis='x', alpha=0.3)
+            
+            # 種数
+            ax2.barh(diversity_df['site_name'], diversity_df['species_richness'], 
+                    color='coral', alpha=0.7)
+            ax2.set_xlabel('種数', fontsize=11)
+            ax2.set_title('種数の比較', fontsize=13, fontweight='bold')
+            ax2.grid(axis='x', alpha=0.3)
+            
+            finalize_figure(fig)
         
         return fig
     
-    def create_species_accumulation_curve(self) -> plt.Figure:
+    @traced('analysis.species_accumulation')
+    def create_species_accumulation_curve(self) -> 'Figure':
         """
         種数累積曲線を作成
         
@@ -254,7 +355,8 @@ class AnalysisController:
             ORDER BY se.survey_date
         """
         
-        df = pd.read_sql_query(sql, self.conn)
+        with span('analysis.species_accumulation.fetch'):
+            df = pd.read_sql_query(sql, self.conn)
         
         if df.empty:
             raise ValueError("データがありません")
@@ -265,47 +367,188 @@ class AnalysisController:
             FROM ant_records
             WHERE deleted_at IS NULL
         """
-        all_species = pd.read_sql_query(all_species_sql, self.conn)
+        with span('analysis.species_accumulation.fetch'):
+            all_species = pd.read_sql_query(all_species_sql, self.conn)
         
         # 累積種数を計算
         cumulative_species = []
         seen_species = set()
         
-        for idx, row in df.iterrows():
-            # このイベントで出現した種
-            event_species_sql = f"""
-                SELECT DISTINCT species_id
-                FROM ant_records
-                WHERE survey_event_id = {row['id']}
-                AND deleted_at IS NULL
-            """
-            event_species = pd.read_sql_query(event_species_sql, self.conn)
+        with span('analysis.species_accumulation.compute', events=len(df)):
+            for _, row in df.iterrows():
+                # このイベントで出現した種
+                event_species_sql = f"""
+                    SELECT DISTINCT species_id
+                    FROM ant_records
+                    WHERE survey_event_id = {row['id']}
+                    AND deleted_at IS NULL
+                """
+                event_species = pd.read_sql_query(event_species_sql, self.conn)
+                
+                for species_id in event_species['species_id']:
+                    seen_species.add(species_id)
+                
+                cumulative_species.append(len(seen_species))
+        
+        # 図の作成
+        with span('analysis.species_accumulation.render'):
+            fig, ax = create_figure(figsize=(10, 6))
             
-            for species_id in event_species['species_id']:
-                seen_species.add(species_id)
+            ax.plot(range(1, len(cumulative_species) + 1), cumulative_species, 
+                   marker='o', linewidth=2, markersize=5, color='forestgreen')
             
-            cumulative_species.append(len(seen_species))
+            # 最大種数の参照線
+            ax.axhline(y=len(all_species), color='red', linestyle='--', 
+                      alpha=0.5, label=f'全種数: {len(all_species)}')
+            
+            ax.set_xlabel('調査イベント数', fontsize=12)
+            ax.set_ylabel('累積種数', fontsize=12)
+            ax.set_title('種数累積曲線', fontsize=14, fontweight='bold')
+            ax.grid(True, alpha=0.3)
+            ax.legend()
+            
+            finalize_figure(fig)
         
-        # 図の作成
-        fig, ax = plt.subplots(figsize=(10, 6))
+        return fig
+    
+    @traced('analysis.hill_profiles')
+    def calculate_hill_profiles(self, orders: Optional[List[float]] = None,
+                                standardize: bool = False, coverage: Optional[float] = None,
+                                n_draws: int = DEFAULT_DRAWS,
+                                n_jobs: Optional[int] = -1) -> Dict[str, Any]:
+        """
+        全調査地の Hill 数による多様度プロファイル（次数 q ごとの有効種数）を計算
         
-        ax.plot(range(1, len(cumulative_species) + 1), cumulative_species, 
-               marker='o', linewidth=2, markersize=5, color='forestgreen')
+        群集行列（疎行列）に対して全調査地 × 全次数をまとめて配列演算で計算する。
         
-        # 最大種数の参照線
-        ax.axhline(y=len(all_species), color='red', linestyle='--', 
-                  alpha=0.5, label=f'全種数: {len(all_species)}')
+        Args:
+            orders: 次数 q のリスト（Noneの場合は 0〜3 を 0.1 刻み）
+            standardize: 標本被覆率を揃えて比べるか（被覆率による標準化）
+            coverage: 標準化の目標の被覆率（Noneの場合は調査地の被覆率の最小値）
+            n_draws: 標準化の間引きの回数
+            n_jobs: 標準化の並列数（-1 は全コア）
+            
+        Returns:
+            Dict: orders, sites（site_id, parent_site_name, site_name, coverage）,
+                  profiles（調査地 × 次数）, pooled（全調査地をまとめたプロファイル）,
+                  coverage（標準化の目標の被覆率。標準化しない場合は None）
+        """
+        orders = DEFAULT_ORDERS if orders is None else np.asarray(orders, dtype=np.float64)
+        if len(orders) == 0 or np.any(orders < 0):
+            raise ValueError("次数 q は0以上の値を1つ以上指定してください")
+        
+        with span('analysis.hill_profiles.fetch'):
+            site_ids, _, community = fetch_community_matrix(self.conn)
+        
+        if community.shape[0] == 0:
+            raise ValueError("多様度データがありません")
+        
+        # 全調査地をまとめた群集（1行）
+        pooled = np.asarray(community.sum(axis=0))
+        
+        with span('analysis.hill_profiles.compute', sites=community.shape[0],
+                  orders=len(orders)):
+            if standardize:
+                result = standardized_hill_numbers(community, orders, coverage,
+                                                   n_draws=n_draws, n_jobs=n_jobs)
+                profiles = result['profiles']
+                site_coverage = result['site_coverage']
+                coverage = result['coverage']
+                pooled_profile = standardized_hill_numbers(
+                    pooled, orders, coverage, n_draws=n_draws, n_jobs=n_jobs)['profiles'][0]
+            else:
+                profiles = hill_numbers(community, orders)
+                site_coverage = sample_coverage(community)
+                coverage = None
+                pooled_profile = hill_numbers(pooled, orders)[0]
+        
+        names_df = pd.read_sql_query("""
+            SELECT
+                ss.id as site_id,
+                ps.name as parent_site_name,
+                ss.name as site_name
+            FROM survey_sites ss
+            JOIN parent_sites ps ON ss.parent_site_id = ps.id
+        """, self.conn)
+        sites = names_df.set_index('site_id').reindex(site_ids).reset_index()
+        sites['coverage'] = site_coverage.round(3)
+        
+        return {'orders': orders, 'sites': sites, 'profiles': profiles,
+                'pooled': pooled_profile, 'coverage': coverage}
+    
+    def create_hill_profile_plot(self, result: Dict[str, Any],
+                                 max_lines: int = 20) -> 'Figure':
+        """
+        Hill 数による多様度プロファイルの図を作成
         
-        ax.set_xlabel('調査イベント数', fontsize=12)
-        ax.set_ylabel('累積種数', fontsize=12)
-        ax.set_title('種数累積曲線', fontsize=14, fontweight='bold')
-        ax.grid(True, alpha=0.3)
-        ax.legend()
+        調査地が max_lines 以下の場合は調査地ごとの線、多い場合は中央値と
+        25〜75%・5〜95% の範囲を表示し、全調査地をまとめたプロファイルを重ねる。
         
-        plt.tight_layout()
+        Args:
+            result: calculate_hill_profiles の戻り値
+            max_lines: 調査地ごとの線を描く調査地数の上限
+            
+        Returns:
+            Figure: matplotlibのFigureオブジェクト
+        """
+        orders = result['orders']
+        profiles = result['profiles']
+        # 被覆率が目標に届かず標準化できなかった調査地は除く
+        valid = ~np.isnan(profiles).any(axis=1)
+        profiles = profiles[valid]
+        names = result['sites']['site_name'][valid].fillna('')
+        
+        if len(profiles) == 0:
+            raise ValueError("プロファイルを計算できた調査地がありません")
+        
+        with span('analysis.hill_profiles.render'):
+            fig, (ax1, ax2) = create_figure(figsize=(14, 6), ncols=2)
+            
+            # 調査地ごとのプロファイル
+            if len(profiles) <= max_lines:
+                for name, profile in zip(names, profiles):
+                    ax1.plot(orders, profile, linewidth=1.2, alpha=0.8, label=name)
+                if len(profiles) <= 10:
+                    ax1.legend(fontsize=8)
+            else:
+                low, q25, median, q75, high = np.percentile(profiles, [5, 25, 50, 75, 95], axis=0)
+                ax1.fill_between(orders, low, high, color='steelblue', alpha=0.15,
+                                 label='5〜95%')
+                ax1.fill_between(orders, q25, q75, color='steelblue', alpha=0.35,
+                                 label='25〜75%')
+                ax1.plot(orders, median, color='steelblue', linewidth=2, label='中央値')
+                ax1.legend()
+            ax1.set_xlabel('次数 q', fontsize=11)
+            ax1.set_ylabel('有効種数（Hill数）', fontsize=11)
+            ax1.set_title(f'調査地ごとのプロファイル（{len(profiles):,}地点）',
+                          fontsize=13, fontweight='bold')
+            ax1.grid(alpha=0.3)
+            
+            # 全調査地をまとめたプロファイル
+            ax2.plot(orders, result['pooled'], color='forestgreen', linewidth=2,
+                     marker='o', markersize=3)
+            ax2.set_xlabel('次数 q', fontsize=11)
+            ax2.set_ylabel('有効種数（Hill数）', fontsize=11)
+            ax2.set_title('全調査地をまとめたプロファイル', fontsize=13, fontweight='bold')
+            ax2.grid(alpha=0.3)
+            
+            # 整数の次数に目盛り（q = 0, 1, 2 は種数・exp(Shannon)・Simpson の逆数）
+            special = {0: '0\n種数', 1: '1\nexp(Shannon)', 2: '2\n1/Simpson'}
+            ticks = np.arange(np.ceil(orders.min()), np.floor(orders.max()) + 1).astype(int)
+            for ax in (ax1, ax2):
+                ax.set_xticks(ticks)
+                ax.set_xticklabels([special.get(tick, str(tick)) for tick in ticks])
+            
+            title = 'Hill数による多様度プロファイル'
+            if result['coverage'] is not None:
+                title += f"（被覆率 {result['coverage']:.1%} で標準化）"
+            fig.suptitle(title, fontsize=14, fontweight='bold')
+            
+            finalize_figure(fig)
         
         return fig
     
+    @traced('analysis.vegetation_summary')
     def get_vegetation_summary_stats(self) -> pd.DataFrame:
         """
         植生データの基本統計量を取得
@@ -2,14 +2,41 @@
 データ出力コントローラー
 """
 import pandas as pd
+import csv
+import json
 import os
+import zipfile
 from datetime import datetime
 from typing import Optional, List, Dict, Any
+from models.site_species_summary import SiteSpeciesSummary
+from models.export_checkpoint import ExportCheckpoint
+from utils.beta_diversity import fetch_community_matrix, pairwise_dissimilarity
+from utils.perf_trace import span, traced
+from utils.richness import DEFAULT_BOOTSTRAP
 
 
 class ExportController:
     """データ出力管理クラス"""
     
+    # ストリーミング出力で一度に取得する行数
+    STREAM_CHUNK_SIZE = 5000
+    
+    # 列指向形式（Parquet / Feather）で一度に書き出す行数（Parquetの行グループ）
+    COLUMNAR_ROW_GROUP_SIZE = 100_000
+    
+    # 列指向形式と拡張子
+    COLUMNAR_FORMATS = {'parquet': '.parquet', 'feather': '.feather'}
+    
+    # Excelの1シートの最大行数（見出し行を含む）
+    EXCEL_MAX_ROWS = 1_048_576
+    
+    # 非類似度を正方行列のCSVで出力する調査地数の上限（超える場合は condensed 形式）
+    BETA_SQUARE_MAX_SITES = 5000
+    
+    # スナップショットに含めるテーブル（論理削除されていない行のみ）
+    SNAPSHOT_TABLES = ['parent_sites', 'survey_sites', 'survey_events',
+                       'vegetation_data', 'species_master', 'ant_records']
+    
     def __init__(self, db_connection, export_dir='exports'):
         """
         初期化
@@ -20,15 +47,19 @@ class ExportController:
         """
         self.conn = db_connection
         self.export_dir = export_dir
+        self.summary = SiteSpeciesSummary(db_connection)
+        self.checkpoints = ExportCheckpoint(db_connection)
         
         # ディレクトリが存在しない場合は作成
         if not os.path.exists(export_dir):
             os.makedirs(export_dir)
     
+    @traced('export.ant_matrix')
     def export_ant_matrix(self, value_type='presence', 
                          start_date: Optional[str] = None,
                          end_date: Optional[str] = None,
-                         site_ids: Optional[List[int]] = None) -> str:
+                         site_ids: Optional[List[int]] = None,
+                         streaming: bool = False) -> str:
         """
         アリ類群集行列を出力
         
@@ -37,10 +68,16 @@ class ExportController:
             start_date: 開始日（YYYY-MM-DD）
             end_date: 終了日（YYYY-MM-DD）
             site_ids: 出力する調査地IDのリスト
+            streaming: Trueの場合、pandasのピボットを使わず1調査地ずつ書き出す
+                      （調査地数に関わらずメモリ使用量が一定）
             
         Returns:
             str: 出力ファイルパス
         """
+        if streaming:
+            return self._export_ant_matrix_streaming(value_type, start_date,
+                                                     end_date, site_ids)
+        
         # データ取得クエリ
         sql = """
             SELECT 
@@ -52,7 +89,7 @@ class ExportController:
             JOIN survey_sites ss ON se.survey_site_id = ss.id
             JOIN parent_sites ps ON ss.parent_site_id = ps.id
             JOIN species_master sm ON ar.species_id = sm.id
-            WHERE ar.deleted_at IS NULL
+            WHERE ar.deleted_at IS NULL AND se.deleted_at IS NULL
         """
         
         params = []
@@ -73,30 +110,33 @@ class ExportController:
         sql += " ORDER BY site_name, species_name"
         
         # データフレーム作成
-        df = pd.read_sql_query(sql, self.conn, params=params)
+        with span('export.ant_matrix.fetch') as sp:
+            df = pd.read_sql_query(sql, self.conn, params=params)
+            sp.set(rows=len(df))
         
         if df.empty:
             raise ValueError("出力するデータがありません")
         
         # ピボットテーブル作成
-        if value_type == 'presence':
-            # 在不在（0/1）
-            pivot_df = df.pivot_table(
-                index='site_name',
-                columns='species_name',
-                values='count',
-                aggfunc=lambda x: 1,  # 出現していれば1
-                fill_value=0
-            )
-        else:
-            # 個体数
-            pivot_df = df.pivot_table(
-                index='site_name',
-                columns='species_name',
-                values='count',
-                aggfunc='sum',
-                fill_value=0
-            )
+        with span('export.ant_matrix.reshape'):
+            if value_type == 'presence':
+                # 在不在（0/1）
+                pivot_df = df.pivot_table(
+                    index='site_name',
+                    columns='species_name',
+                    values='count',
+                    aggfunc=lambda x: 1,  # 出現していれば1
+                    fill_value=0
+                )
+            else:
+                # 個体数
+                pivot_df = df.pivot_table(
+                    index='site_name',
+                    columns='species_name',
+                    values='count',
+                    aggfunc='sum',
+                    fill_value=0
+                )
         
         # ファイル名生成
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -104,14 +144,221 @@ class ExportController:
         filepath = os.path.join(self.export_dir, filename)
         
         # CSV出力（UTF-8 with BOM for Excel）
-        pivot_df.to_csv(filepath, encoding='utf-8-sig')
+        with span('export.ant_matrix.write'):
+            pivot_df.to_csv(filepath, encoding='utf-8-sig')
         
         return filepath
     
+    def _export_ant_matrix_streaming(self, value_type: str,
+                                     start_date: Optional[str],
+                                     end_date: Optional[str],
+                                     site_ids: Optional[List[int]]) -> str:
+        """
+        アリ類群集行列を1調査地（1行）ずつ書き出す
+        
+        種名の列順を先に確定し、調査地を名前順に1件ずつ集計して書き出すため、
+        行列全体やピボット用のDataFrameをメモリに持たない。
+        出力形式（行・列の並び、値）は export_ant_matrix と同じ。
+        期間指定が無い場合は調査地×種 集計テーブルから読み出す。
+        いずれの経路でも、論理削除された記録・調査イベントの記録は含めない
+        （調査地の論理削除は問わない）。
+        
+        Args:
+            value_type: 値のタイプ ('presence': 在不在, 'count': 個体数)
+            start_date: 開始日（YYYY-MM-DD）
+            end_date: 終了日（YYYY-MM-DD）
+            site_ids: 出力する調査地IDのリスト
+            
+        Returns:
+            str: 出力ファイルパス
+        """
+        site_filter = ''
+        site_params = []
+        if site_ids:
+            placeholders = ','.join('?' * len(site_ids))
+            site_filter = f" AND {{site_column}} IN ({placeholders})"
+            site_params = list(site_ids)
+        
+        if start_date or end_date:
+            # 期間指定あり: 調査地ごとに記録を集計
+            date_filter = ''
+            date_params = []
+            if start_date:
+                date_filter += " AND date(se.survey_date) >= ?"
+                date_params.append(start_date)
+            if end_date:
+                date_filter += " AND date(se.survey_date) <= ?"
+                date_params.append(end_date)
+            
+            species_sql = f"""
+                SELECT DISTINCT ar.species_id
+                FROM ant_records ar
+                JOIN survey_events se ON ar.survey_event_id = se.id
+                WHERE ar.deleted_at IS NULL AND se.deleted_at IS NULL{date_filter}
+                {site_filter.format(site_column='se.survey_site_id')}
+            """
+            species_params = date_params + site_params
+            site_sql = f"""
+                SELECT ar.species_id, SUM(ar.count)
+                FROM survey_events se
+                JOIN ant_records ar ON ar.survey_event_id = se.id
+                WHERE se.survey_site_id = ?
+                AND ar.deleted_at IS NULL AND se.deleted_at IS NULL{date_filter}
+                GROUP BY ar.species_id
+            """
+            site_sql_params = date_params
+        else:
+            # 期間指定なし: 集計テーブルを主キーで引く
+            species_sql = f"""
+                SELECT DISTINCT species_id
+                FROM site_species_summary
+                WHERE 1 = 1{site_filter.format(site_column='survey_site_id')}
+            """
+            species_params = site_params
+            site_sql = """
+                SELECT species_id, total_count
+                FROM site_species_summary
+                WHERE survey_site_id = ?
+            """
+            site_sql_params = []
+        
+        cursor = self.conn.cursor()
+        
+        # 列（種名）の並びを先に確定する（同名の種は1列にまとめる）
+        with span('export.ant_matrix.fetch', step='species'):
+            cursor.execute(f"""
+                SELECT id, name FROM species_master
+                WHERE id IN ({species_sql})
+            """, species_params)
+            species_rows = cursor.fetchall()
+        
+        if not species_rows:
+            raise ValueError("出力するデータがありません")
+        
+        species_names = sorted({row[1] for row in species_rows})
+        name_index = {name: i for i, name in enumerate(species_names)}
+        column_index = {row[0]: name_index[row[1]] for row in species_rows}
+        presence = value_type == 'presence'
+        
+        # 調査地は名前順（ピボットの行順と同じ）
+        sites_sql = """
+            SELECT ss.id, ss.name || ' (' || ps.name || ')' as site_name
+            FROM survey_sites ss
+            JOIN parent_sites ps ON ss.parent_site_id = ps.id
+            WHERE 1 = 1
+        """
+        if site_ids:
+            sites_sql += site_filter.format(site_column='ss.id')
+        sites_sql += " ORDER BY site_name, ss.id"
+        
+        with span('export.ant_matrix.fetch', step='sites'):
+            sites = cursor.execute(sites_sql, site_params).fetchall()
+        
+        def matrix_rows():
+            current_site = None
+            values = None
+            for site_id, site_name in sites:
+                cursor.execute(site_sql, [site_id] + site_sql_params)
+                records = cursor.fetchall()
+                if not records:
+                    continue
+                
+                # 同名の調査地は1行にまとめる
+                if site_name != current_site:
+                    if current_site is not None:
+                        yield [current_site] + values
+                    current_site = site_name
+                    values = [0] * len(species_names)
+                
+                for species_id, total in records:
+                    if presence:
+                        values[column_index[species_id]] = 1
+                    else:
+                        values[column_index[species_id]] += total or 0
+            
+            if current_site is not None:
+                yield [current_site] + values
+        
+        # ファイル名生成
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"ant_matrix_{value_type}_{timestamp}.csv"
+        filepath = os.path.join(self.export_dir, filename)
+        
+        with span('export.ant_matrix.write', streaming=True) as sp:
+            rows = self._write_csv_rows(filepath, ['site_name'] + species_names,
+                                        matrix_rows())
+            sp.set(rows=rows, columns=len(species_names))
+        
+        return filepath
+    
+    def _iter_cursor(self, cursor):
+        """
+        カーソルの結果を STREAM_CHUNK_SIZE 件ずつ取得して1行ずつ返す
+        
+        Args:
+            cursor: 実行済みのカーソル
+        """
+        while True:
+            rows = cursor.fetchmany(self.STREAM_CHUNK_SIZE)
+            if not rows:
+                break
+            yield from rows
+    
+    def _write_csv_rows(self, filepath: str, header: List[str], rows) -> int:
+        """
+        ヘッダーと行をCSVに書き出す（UTF-8 with BOM for Excel）
+        
+        Args:
+            filepath: 出力ファイルパス
+            header: 列名
+            rows: 行のイテラブル
+            
+        Returns:
+            int: 書き出した行数（ヘッダーを除く）
+        """
+        count = 0
+        with open(filepath, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f, lineterminator=os.linesep)
+            writer.writerow(header)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        return count
+    
+    def _find_float_columns(self, sql: str, params: List, header: List[str]) -> List[int]:
+        """
+        pandas の read_sql_query で float64 になる整数列の位置を取得
+        
+        整数に NULL や実数が混ざる列は pandas では float64 として読み込まれ「4.0」と
+        出力されるため、ストリーミング出力でもこれらの列の整数を float にして書式を揃える。
+        
+        Args:
+            sql: 出力するクエリ
+            params: クエリのパラメータ
+            header: クエリの列名
+            
+        Returns:
+            List[int]: 該当する列の位置
+        """
+        checks = []
+        for name in header:
+            column = '"' + name.replace('"', '""') + '"'
+            checks.append(f"""
+                MAX(typeof({column}) = 'integer')
+                AND MAX(typeof({column}) = 'real' OR {column} IS NULL)
+                AND NOT MAX(typeof({column}) IN ('text', 'blob'))""")
+        
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT {','.join(checks)} FROM ({sql})", params)
+        flags = cursor.fetchone()
+        return [i for i, flag in enumerate(flags) if flag]
+    
+    @traced('export.vegetation_matrix')
     def export_vegetation_matrix(self, 
                                 start_date: Optional[str] = None,
                                 end_date: Optional[str] = None,
-                                site_ids: Optional[List[int]] = None) -> str:
+                                site_ids: Optional[List[int]] = None,
+                                streaming: bool = False) -> str:
         """
         植生データ行列を出力
         
@@ -119,6 +366,7 @@ class ExportController:
             start_date: 開始日
             end_date: 終了日
             site_ids: 出力する調査地IDのリスト
+            streaming: Trueの場合、DataFrameを作らずカーソルから直接書き出す
             
         Returns:
             str: 出力ファイルパス
@@ -163,29 +411,66 @@ class ExportController:
             sql += f" AND se.survey_site_id IN ({placeholders})"
             params.extend(site_ids)
         
+        # 列の型の確認（ストリーミング時）は並び順が不要なため ORDER BY 前のクエリで行う
+        unordered_sql = sql
         sql += " ORDER BY se.survey_date DESC"
         
-        df = pd.read_sql_query(sql, self.conn, params=params)
-        
-        if df.empty:
-            raise ValueError("出力するデータがありません")
-        
         # ファイル名生成
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"vegetation_data_{timestamp}.csv"
         filepath = os.path.join(self.export_dir, filename)
         
+        if streaming:
+            cursor = self.conn.cursor()
+            cursor.execute(sql, params)
+            header = [column[0] for column in cursor.description]
+            float_columns = self._find_float_columns(unordered_sql, params, header)
+            
+            def iter_rows():
+                for row in self._iter_cursor(cursor):
+                    if float_columns:
+                        row = list(row)
+                        for i in float_columns:
+                            if row[i] is not None:
+                                row[i] = float(row[i])
+                    yield row
+            
+            with span('export.vegetation_matrix.write') as sp:
+                rows = self._write_csv_rows(filepath, header, iter_rows())
+                sp.set(rows=rows)
+            
+            if rows == 0:
+                os.remove(filepath)
+                raise ValueError("出力するデータがありません")
+            
+            return filepath
+        
+        with span('export.vegetation_matrix.fetch'):
+            df = pd.read_sql_query(sql, self.conn, params=params)
+        
+        if df.empty:
+            raise ValueError("出力するデータがありません")
+        
         # CSV出力
-        df.to_csv(filepath, encoding='utf-8-sig', index=False)
+        with span('export.vegetation_matrix.write'):
+            df.to_csv(filepath, encoding='utf-8-sig', index=False)
         
         return filepath
     
-    def export_combined_data(self, include_diversity: bool = True) -> str:
+    @traced('export.combined_data')
+    def export_combined_data(self, include_diversity: bool = True,
+                             include_estimators: bool = True,
+                             n_bootstrap: int = DEFAULT_BOOTSTRAP,
+                             n_jobs: Optional[int] = -1) -> str:
         """
         調査地ごとの統合データを出力（植生 + 種多様性）
         
         Args:
             include_diversity: 多様度指数を含めるか
+            include_estimators: 種数推定値（Chao1等）と信頼区間を含めるか
+                               （include_diversity が True の場合のみ）
+            n_bootstrap: 信頼区間のブートストラップ反復回数
+            n_jobs: ブートストラップの並列数（-1 は全コア）
             
         Returns:
             str: 出力ファイルパス
@@ -217,27 +502,37 @@ class ExportController:
             GROUP BY ss.id
         """
         
-        df = pd.read_sql_query(veg_sql, self.conn)
+        with span('export.combined_data.fetch'):
+            df = pd.read_sql_query(veg_sql, self.conn)
         
         if include_diversity:
-            # 種多様性を追加
-            diversity_sql = """
+            # 種多様性を追加（推定値を含める場合、種数は推定量と同じく個体数1以上の種の数）
+            richness_expr = 'SUM(total_count > 0)' if include_estimators else 'COUNT(*)'
+            diversity_sql = f"""
                 SELECT 
-                    se.survey_site_id as site_id,
-                    COUNT(DISTINCT ar.species_id) as species_richness,
-                    SUM(ar.count) as total_individuals
-                FROM ant_records ar
-                JOIN survey_events se ON ar.survey_event_id = se.id
-                WHERE ar.deleted_at IS NULL
-                GROUP BY se.survey_site_id
+                    survey_site_id as site_id,
+                    {richness_expr} as species_richness,
+                    SUM(total_count) as total_individuals
+                FROM site_species_summary
+                GROUP BY survey_site_id
             """
             
-            diversity_df = pd.read_sql_query(diversity_sql, self.conn)
+            with span('export.combined_data.fetch'):
+                diversity_df = pd.read_sql_query(diversity_sql, self.conn)
             
             # マージ
-            df = df.merge(diversity_df, on='site_id', how='left')
-            df['species_richness'] = df['species_richness'].fillna(0).astype(int)
-            df['total_individuals'] = df['total_individuals'].fillna(0).astype(int)
+            with span('export.combined_data.reshape'):
+                df = df.merge(diversity_df, on='site_id', how='left')
+                df['species_richness'] = df['species_richness'].fillna(0).astype(int)
+                df['total_individuals'] = df['total_individuals'].fillna(0).astype(int)
+            
+            if include_estimators:
+                from controllers.analysis_controller import AnalysisController
+                
+                estimators_df = AnalysisController(self.conn).calculate_richness_estimators(
+                    n_bootstrap=n_bootstrap, n_jobs=n_jobs)
+                if not estimators_df.empty:
+                    df = df.merge(estimators_df, on='site_id', how='left')
         
         # ファイル名生成
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -245,16 +540,21 @@ class ExportController:
         filepath = os.path.join(self.export_dir, filename)
         
         # CSV出力
-        df.to_csv(filepath, encoding='utf-8-sig', index=False)
+        with span('export.combined_data.write'):
+            df.to_csv(filepath, encoding='utf-8-sig', index=False)
         
         return filepath
     
-    def export_to_excel(self, include_all_sheets: bool = True) -> str:
+    @traced('export.excel')
+    def export_to_excel(self, include_all_sheets: bool = True,
+                        streaming: bool = False) -> str:
         """
         複数シートを含むExcelファイルを出力
         
         Args:
             include_all_sheets: 全シートを含めるか
+            streaming: Trueの場合、openpyxl の書き込み専用モードで
+                      カーソルから1行ずつ書き出す（ブック全体をメモリに持たない）
             
         Returns:
             str: 出力ファイルパス
@@ -263,63 +563,791 @@ class ExportController:
         filename = f"ant_research_data_{timestamp}.xlsx"
         filepath = os.path.join(self.export_dir, filename)
         
+        sheets = self._excel_sheet_queries(include_all_sheets)
+        
+        if streaming:
+            from openpyxl import Workbook
+            
+            workbook = Workbook(write_only=True)
+            for sheet_name, sql in sheets:
+                self._write_excel_sheet_streaming(workbook, sql, sheet_name)
+            
+            with span('export.excel.save'):
+                workbook.save(filepath)
+            
+            return filepath
+        
         with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-            # シート1: 親調査地
-            parent_sql = "SELECT * FROM parent_sites WHERE deleted_at IS NULL"
-            pd.read_sql_query(parent_sql, self.conn).to_excel(
-                writer, sheet_name='親調査地', index=False)
+            for sheet_name, sql in sheets:
+                self._write_excel_sheet(writer, sql, sheet_name)
+        
+        return filepath
+    
+    def _excel_sheet_queries(self, include_all_sheets: bool) -> List[tuple]:
+        """
+        Excel出力のシート名と取得クエリ
+        
+        Args:
+            include_all_sheets: 全シートを含めるか
             
-            # シート2: 調査地
-            site_sql = """
-                SELECT ss.*, ps.name as parent_site_name
+        Returns:
+            List[tuple]: (シート名, 取得クエリ) のリスト
+        """
+        # シート1: 親調査地
+        sheets = [('親調査地', "SELECT * FROM parent_sites WHERE deleted_at IS NULL")]
+        
+        # シート2: 調査地
+        sheets.append(('調査地', """
+            SELECT ss.*, ps.name as parent_site_name
+            FROM survey_sites ss
+            LEFT JOIN parent_sites ps ON ss.parent_site_id = ps.id
+            WHERE ss.deleted_at IS NULL
+        """))
+        
+        # シート3: 調査イベント
+        sheets.append(('調査イベント', """
+            SELECT se.*, ss.name as site_name
+            FROM survey_events se
+            LEFT JOIN survey_sites ss ON se.survey_site_id = ss.id
+            WHERE se.deleted_at IS NULL
+        """))
+        
+        if include_all_sheets:
+            # シート4: 植生データ
+            sheets.append(('植生データ', """
+                SELECT vd.*, se.survey_date, ss.name as site_name
+                FROM vegetation_data vd
+                LEFT JOIN survey_events se ON vd.survey_event_id = se.id
+                LEFT JOIN survey_sites ss ON se.survey_site_id = ss.id
+                WHERE vd.deleted_at IS NULL
+            """))
+            
+            # シート5: アリ類記録
+            sheets.append(('アリ類記録', """
+                SELECT ar.*, se.survey_date, ss.name as site_name, sm.name as species_name
+                FROM ant_records ar
+                LEFT JOIN survey_events se ON ar.survey_event_id = se.id
+                LEFT JOIN survey_sites ss ON se.survey_site_id = ss.id
+                LEFT JOIN species_master sm ON ar.species_id = sm.id
+                WHERE ar.deleted_at IS NULL
+            """))
+            
+            # シート6: 種マスタ
+            sheets.append(('種マスタ', "SELECT * FROM species_master WHERE deleted_at IS NULL"))
+        
+        return sheets
+    
+    def _write_excel_sheet(self, writer, sql: str, sheet_name: str):
+        """
+        クエリ結果をExcelのシートに書き出す
+        
+        Args:
+            writer: pandasのExcelWriter
+            sql: 取得クエリ
+            sheet_name: シート名
+        """
+        with span('export.excel.fetch', sheet=sheet_name) as sp:
+            df = pd.read_sql_query(sql, self.conn)
+            sp.set(rows=len(df))
+        
+        with span('export.excel.write', sheet=sheet_name):
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    
+    def _write_excel_sheet_streaming(self, workbook, sql: str, sheet_name: str):
+        """
+        クエリ結果を書き込み専用ワークシートに1行ずつ書き出す
+        
+        1シートの上限（EXCEL_MAX_ROWS 行）を超える場合は
+        「シート名 (2)」「シート名 (3)」… に分割する。
+        
+        Args:
+            workbook: openpyxl の書き込み専用 Workbook
+            sql: 取得クエリ
+            sheet_name: シート名
+        """
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Border, Font, Side
+        
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(sql)
+        columns = [column[0] for column in cursor.description]
+        
+        # 見出し行（pandas の to_excel と同じ書式）
+        thin = Side(style='thin')
+        header_font = Font(bold=True)
+        header_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        header_alignment = Alignment(horizontal='center', vertical='top')
+        
+        def new_sheet(part):
+            title = sheet_name if part == 1 else f"{sheet_name} ({part})"
+            sheet = workbook.create_sheet(title)
+            header = []
+            for column in columns:
+                cell = WriteOnlyCell(sheet, value=column)
+                cell.font = header_font
+                cell.border = header_border
+                cell.alignment = header_alignment
+                header.append(cell)
+            sheet.append(header)
+            return sheet
+        
+        part = 1
+        sheet = new_sheet(part)
+        sheet_rows = 0
+        total_rows = 0
+        
+        with span('export.excel.write', sheet=sheet_name, streaming=True) as sp:
+            for row in self._iter_cursor(cursor):
+                if sheet_rows == self.EXCEL_MAX_ROWS - 1:
+                    part += 1
+                    sheet = new_sheet(part)
+                    sheet_rows = 0
+                sheet.append(row)
+                sheet_rows += 1
+                total_rows += 1
+            sp.set(rows=total_rows, sheets=part)
+    
+    @traced('export.columnar_table')
+    def export_table_columnar(self, table: str, fmt: str = 'parquet',
+                              filepath: Optional[str] = None) -> str:
+        """
+        テーブルを列指向形式（Parquet / Feather）で出力
+        
+        列の型はテーブル定義（INTEGER / REAL / TEXT）から決め、
+        カーソルから COLUMNAR_ROW_GROUP_SIZE 件ずつ書き出す。
+        
+        Args:
+            table: テーブル名（SNAPSHOT_TABLES のいずれか）
+            fmt: 'parquet' または 'feather'
+            filepath: 出力ファイルパス（Noneの場合は exports/{table}_YYYYMMDD_HHMMSS.{拡張子}）
+            
+        Returns:
+            str: 出力ファイルパス
+        """
+        if table not in self.SNAPSHOT_TABLES:
+            raise ValueError(f"出力できないテーブルです: {table}")
+        pa = self._import_pyarrow()
+        
+        # 宣言型から Arrow の型を決める（TIMESTAMP 等は保存形式のまま文字列）
+        columns = self.conn.execute(f"PRAGMA table_info({table})").fetchall()
+        fields = [pa.field(column[1], self._arrow_type(pa, column[2]))
+                  for column in columns]
+        schema = pa.schema(fields)
+        
+        column_names = ', '.join(f'"{field.name}"' for field in fields)
+        cursor = self.conn.cursor()
+        cursor.row_factory = None  # 列単位に組み替えるため行はタプルで受け取る
+        cursor.execute(f"SELECT {column_names} FROM {table} "
+                       f"WHERE deleted_at IS NULL ORDER BY id")
+        
+        def batches():
+            while True:
+                rows = cursor.fetchmany(self.COLUMNAR_ROW_GROUP_SIZE)
+                if not rows:
+                    break
+                values = list(zip(*rows))
+                yield pa.record_batch(
+                    [pa.array(values[i], type=field.type) for i, field in enumerate(fields)],
+                    schema=schema)
+        
+        if filepath is None:
+            filepath = self._columnar_filepath(table, fmt)
+        
+        with span('export.columnar_table.write', table=table, format=fmt) as sp:
+            rows = self._write_columnar(filepath, fmt, schema, batches())
+            sp.set(rows=rows)
+        
+        return filepath
+    
+    @traced('export.community_long')
+    def export_community_long(self, fmt: str = 'parquet',
+                              filepath: Optional[str] = None) -> str:
+        """
+        アリ類群集行列を縦持ち（調査地×種 1行）の列指向形式で出力
+        
+        調査地×種 集計テーブルを主キー順に読み、調査地名・親調査地名・種名は
+        辞書型（カテゴリ）列として書き出す（名前は辞書に1回だけ保持される）。
+        
+        Args:
+            fmt: 'parquet' または 'feather'
+            filepath: 出力ファイルパス（Noneの場合は exports/community_long_YYYYMMDD_HHMMSS.{拡張子}）
+            
+        Returns:
+            str: 出力ファイルパス
+        """
+        pa = self._import_pyarrow()
+        cursor = self.conn.cursor()
+        cursor.row_factory = None  # 列単位に組み替えるため行はタプルで受け取る
+        
+        # 名前の辞書（ID → 辞書上の位置）
+        with span('export.community_long.fetch', step='dictionaries'):
+            sites = cursor.execute("""
+                SELECT ss.id, ss.name, ps.name
                 FROM survey_sites ss
                 LEFT JOIN parent_sites ps ON ss.parent_site_id = ps.id
-                WHERE ss.deleted_at IS NULL
-            """
-            pd.read_sql_query(site_sql, self.conn).to_excel(
-                writer, sheet_name='調査地', index=False)
+            """).fetchall()
+            species = cursor.execute("SELECT id, name FROM species_master").fetchall()
+        
+        site_names, site_index = self._build_dictionary((row[0], row[1]) for row in sites)
+        parent_names, parent_index = self._build_dictionary((row[0], row[2]) for row in sites)
+        species_names, species_index = self._build_dictionary(species)
+        
+        site_dictionary = pa.array(site_names, type=pa.string())
+        parent_dictionary = pa.array(parent_names, type=pa.string())
+        species_dictionary = pa.array(species_names, type=pa.string())
+        
+        name_type = pa.dictionary(pa.int32(), pa.string())
+        schema = pa.schema([
+            pa.field('survey_site_id', pa.int64()),
+            pa.field('site_name', name_type),
+            pa.field('parent_site_name', name_type),
+            pa.field('species_id', pa.int64()),
+            pa.field('species_name', name_type),
+            pa.field('total_count', pa.int64()),
+            pa.field('n_events', pa.int64()),
+            pa.field('first_date', pa.string()),
+            pa.field('last_date', pa.string()),
+        ])
+        
+        cursor.execute("""
+            SELECT survey_site_id, species_id, total_count, n_events, first_date, last_date
+            FROM site_species_summary
+            ORDER BY survey_site_id, species_id
+        """)
+        
+        def encode(ids, index, dictionary):
+            indices = pa.array([index.get(i) for i in ids], type=pa.int32())
+            return pa.DictionaryArray.from_arrays(indices, dictionary)
+        
+        def batches():
+            while True:
+                rows = cursor.fetchmany(self.COLUMNAR_ROW_GROUP_SIZE)
+                if not rows:
+                    break
+                site_ids, species_ids, totals, n_events, first_dates, last_dates = zip(*rows)
+                yield pa.record_batch([
+                    pa.array(site_ids, type=pa.int64()),
+                    encode(site_ids, site_index, site_dictionary),
+                    encode(site_ids, parent_index, parent_dictionary),
+                    pa.array(species_ids, type=pa.int64()),
+                    encode(species_ids, species_index, species_dictionary),
+                    pa.array(totals, type=pa.int64()),
+                    pa.array(n_events, type=pa.int64()),
+                    pa.array(first_dates, type=pa.string()),
+                    pa.array(last_dates, type=pa.string()),
+                ], schema=schema)
+        
+        if filepath is None:
+            filepath = self._columnar_filepath('community_long', fmt)
+        
+        with span('export.community_long.write', format=fmt) as sp:
+            rows = self._write_columnar(filepath, fmt, schema, batches())
+            sp.set(rows=rows)
+        
+        if rows == 0:
+            os.remove(filepath)
+            raise ValueError("出力するデータがありません")
+        
+        return filepath
+    
+    @traced('export.beta_diversity')
+    def export_beta_diversity(self, metric: str = 'braycurtis', layout: str = 'square',
+                              n_jobs: Optional[int] = 1) -> str:
+        """
+        調査地間の群集非類似度（β多様度）を出力
+        
+        square: 調査地×調査地の正方行列をCSVで出力（BETA_SQUARE_MAX_SITES 地点まで）
+        condensed: 上三角の1次元配列（scipy の pdist と同じ並び）を .npy に直接書き出し、
+                   行の並びを {ファイル名}_sites.csv に出力する。
+                   np.load(path, mmap_mode='r') でメモリに読み込まずに参照できる
+        
+        Args:
+            metric: 'braycurtis' / 'jaccard' / 'sorensen'
+            layout: 'square' または 'condensed'
+            n_jobs: 並列数（-1 は全コア）
             
-            # シート3: 調査イベント
-            event_sql = """
-                SELECT se.*, ss.name as site_name
-                FROM survey_events se
-                LEFT JOIN survey_sites ss ON se.survey_site_id = ss.id
-                WHERE se.deleted_at IS NULL
-            """
-            pd.read_sql_query(event_sql, self.conn).to_excel(
-                writer, sheet_name='調査イベント', index=False)
-            
-            if include_all_sheets:
-                # シート4: 植生データ
-                veg_sql = """
-                    SELECT vd.*, se.survey_date, ss.name as site_name
-                    FROM vegetation_data vd
-                    LEFT JOIN survey_events se ON vd.survey_event_id = se.id
-                    LEFT JOIN survey_sites ss ON se.survey_site_id = ss.id
-                    WHERE vd.deleted_at IS NULL
-                """
-                pd.read_sql_query(veg_sql, self.conn).to_excel(
-                    writer, sheet_name='植生データ', index=False)
+        Returns:
+            str: 出力ファイルパス
+        """
+        if layout not in ('square', 'condensed'):
+            raise ValueError(f"出力形式が不正です: {layout}")
+        
+        with span('export.beta_diversity.fetch'):
+            site_ids, _, matrix = fetch_community_matrix(self.conn)
+            sites = pd.read_sql_query("""
+                SELECT ss.id AS survey_site_id,
+                       ss.name || ' (' || ps.name || ')' AS site_name
+                FROM survey_sites ss
+                JOIN parent_sites ps ON ss.parent_site_id = ps.id
+            """, self.conn)
+        
+        if len(site_ids) < 2:
+            raise ValueError("出力するデータがありません（記録のある調査地が2地点未満）")
+        if layout == 'square' and len(site_ids) > self.BETA_SQUARE_MAX_SITES:
+            raise ValueError(f"調査地が{len(site_ids):,}地点あるため正方行列では出力できません"
+                             f"（上限 {self.BETA_SQUARE_MAX_SITES:,}）。condensed 形式を使用してください")
+        
+        order = pd.DataFrame({'survey_site_id': site_ids}).merge(
+            sites, on='survey_site_id', how='left')
+        
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        stem = os.path.join(self.export_dir, f"beta_{metric}_{timestamp}")
+        
+        if layout == 'condensed':
+            filepath = stem + '.npy'
+            with span('export.beta_diversity.compute', sites=len(site_ids), layout=layout):
+                pairwise_dissimilarity(matrix, metric, out=filepath, n_jobs=n_jobs)
+            order.to_csv(stem + '_sites.csv', index_label='row', encoding='utf-8-sig')
+            return filepath
+        
+        from scipy.spatial.distance import squareform
+        with span('export.beta_diversity.compute', sites=len(site_ids), layout=layout):
+            condensed = pairwise_dissimilarity(matrix, metric, n_jobs=n_jobs)
+        
+        filepath = stem + '.csv'
+        with span('export.beta_diversity.write'):
+            square = pd.DataFrame(squareform(condensed), index=order['site_name'],
+                                  columns=order['site_name'])
+            square.to_csv(filepath, encoding='utf-8-sig', float_format='%.6f')
+        
+        return filepath
+    
+    @traced('export.snapshot')
+    def export_snapshot(self, fmt: str = 'parquet') -> str:
+        """
+        全テーブルと群集データ（縦持ち）を列指向形式のスナップショットとして出力
+        
+        exports/snapshot_{形式}_YYYYMMDD_HHMMSS/ に テーブルごとのファイルと
+        manifest.json（形式・作成日時・行数）を作成する。
+        
+        Args:
+            fmt: 'parquet' または 'feather'
+            
+        Returns:
+            str: 出力ディレクトリのパス
+        """
+        self._import_pyarrow()
+        extension = self._columnar_extension(fmt)
+        
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        snapshot_dir = os.path.join(self.export_dir, f"snapshot_{fmt}_{timestamp}")
+        os.makedirs(snapshot_dir, exist_ok=True)
+        
+        manifest = {
+            'format': fmt,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'tables': {},
+        }
+        
+        for table in self.SNAPSHOT_TABLES:
+            filepath = os.path.join(snapshot_dir, table + extension)
+            self.export_table_columnar(table, fmt, filepath)
+            manifest['tables'][table] = {
+                'file': os.path.basename(filepath),
+                'rows': self._count_columnar_rows(filepath, fmt),
+            }
+        
+        filepath = os.path.join(snapshot_dir, 'community_long' + extension)
+        try:
+            self.export_community_long(fmt, filepath)
+            manifest['tables']['community_long'] = {
+                'file': os.path.basename(filepath),
+                'rows': self._count_columnar_rows(filepath, fmt),
+            }
+        except ValueError:
+            # アリ類記録が無い場合は群集データを含めない
+            pass
+        
+        with open(os.path.join(snapshot_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        
+        return snapshot_dir
+    
+    def create_export_checkpoint(self, name: str = 'default') -> Dict[str, Any]:
+        """
+        現時点をエクスポートチェックポイントとして記録（以降の変更を追跡する）
+        
+        Args:
+            name: チェックポイント名（出力先の共同研究者ごとに分ける）
+        
+        Returns:
+            Dict: 記録したチェックポイント
+        """
+        self._validate_checkpoint_name(name)
+        return self.checkpoints.record(name)
+    
+    @traced('export.changes')
+    def export_changes(self, name: str = 'default',
+                       update_checkpoint: bool = True) -> str:
+        """
+        前回のチェックポイント以降に変更された行を差分として出力
+        
+        exports/changes_{名前}_YYYYMMDD_HHMMSS/ に以下を作成する。
+        - {テーブル名}.csv: 追加・更新された行（論理削除されていない行の現在の値）
+        - tombstones.csv: 論理削除・物理削除された行（table_name, id, deleted_at）
+        - manifest.json: 基準と新しいチェックポイント、ファイルごとの行数、
+          テーブルごとの最大ID・最大updated_at・件数（受け取り側での照合用）
+        
+        チェックポイントが無い場合は全件を出力し、以降の変更の追跡を始める。
+        出力とチェックポイントの記録は1つのトランザクションで行い、
+        出力中の変更が差分から漏れないようにする。
+        
+        Args:
+            name: チェックポイント名
+            update_checkpoint: 出力後にチェックポイントを進めるか
+                               （Falseの場合は同じ差分を何度でも出力できる）
+        
+        Returns:
+            str: 出力ディレクトリのパス
+        """
+        self._validate_checkpoint_name(name)
+        
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        changes_dir = os.path.join(self.export_dir, f"changes_{name}_{timestamp}")
+        os.makedirs(changes_dir, exist_ok=True)
+        
+        # 書き込みロックを取り、出力中に他の変更が入らないようにする
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            since = self.checkpoints.get_latest(name)
+            full = since is None
+            manifest = {
+                'name': name,
+                'full': full,
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'since': since,
+                'tables': {},
+            }
+            
+            for table in self.SNAPSHOT_TABLES:
+                filepath = os.path.join(changes_dir, f"{table}.csv")
+                with span('export.changes.table', table=table) as sp:
+                    rows = self._write_changed_rows(table, filepath,
+                                                    None if full else since['change_seq'])
+                    sp.set(rows=rows)
+                if rows == 0:
+                    os.remove(filepath)
+                    continue
+                manifest['tables'][table] = {'file': os.path.basename(filepath), 'rows': rows}
+            
+            tombstones = 0
+            if not full:
+                filepath = os.path.join(changes_dir, 'tombstones.csv')
+                tombstones = self._write_tombstones(filepath, since['change_seq'])
+            manifest['tombstones'] = tombstones
+            
+            if update_checkpoint:
+                manifest['checkpoint'] = self.checkpoints.record(name, commit=False)
+            
+            with open(os.path.join(changes_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+            
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        
+        return changes_dir
+    
+    def _write_changed_rows(self, table: str, filepath: str,
+                            since_seq: Optional[int]) -> int:
+        """
+        変更された行（since_seq が None の場合は全行）をCSVに書き出す
+        
+        Args:
+            table: テーブル名
+            filepath: 出力ファイルパス
+            since_seq: 基準となる変更ログの番号
+        
+        Returns:
+            int: 書き出した行数
+        """
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        if since_seq is None:
+            cursor.execute(f"SELECT * FROM {table} WHERE deleted_at IS NULL ORDER BY id")
+        else:
+            cursor.execute(f"""
+                SELECT * FROM {table}
+                WHERE id IN (
+                    SELECT row_id FROM change_log
+                    WHERE table_name = ? AND seq > ?
+                )
+                AND deleted_at IS NULL
+                ORDER BY id
+            """, (table, since_seq))
+        
+        header = [column[0] for column in cursor.description]
+        return self._write_csv_rows(filepath, header, self._iter_cursor(cursor))
+    
+    def _write_tombstones(self, filepath: str, since_seq: int) -> int:
+        """
+        基準以降に論理削除・物理削除された行をCSVに書き出す
+        
+        物理削除された行は deleted_at を空欄とする。基準以降に追加されてから
+        削除された行も含まれるが、受け取り側で該当IDが無ければ無視すればよい。
+        
+        Args:
+            filepath: 出力ファイルパス
+            since_seq: 基準となる変更ログの番号
+        
+        Returns:
+            int: 書き出した行数
+        """
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        
+        def rows():
+            for table in self.SNAPSHOT_TABLES:
+                cursor.execute(f"""
+                    SELECT ?, changed.row_id, t.deleted_at
+                    FROM (
+                        SELECT DISTINCT row_id FROM change_log
+                        WHERE table_name = ? AND seq > ?
+                    ) changed
+                    LEFT JOIN {table} t ON t.id = changed.row_id
+                    WHERE t.id IS NULL OR t.deleted_at IS NOT NULL
+                    ORDER BY changed.row_id
+                """, (table, table, since_seq))
+                yield from self._iter_cursor(cursor)
+        
+        return self._write_csv_rows(filepath, ['table_name', 'id', 'deleted_at'], rows())
+    
+    @staticmethod
+    def _validate_checkpoint_name(name: str) -> None:
+        """
+        チェックポイント名を検証（出力ディレクトリ名に使うため区切り文字を禁止）
+        
+        Args:
+            name: チェックポイント名
+        """
+        if not name or os.path.basename(name) != name or name in ('.', '..'):
+            raise ValueError(f"チェックポイント名が不正です: {name!r}")
+    
+    @traced('export.dwca')
+    def export_dwca(self, filepath: Optional[str] = None,
+                    id_prefix: str = 'ant-db',
+                    basis_of_record: str = 'HumanObservation') -> str:
+        """
+        Darwin Core Archive（調査イベント + 出現記録）を出力
+        
+        調査イベントをコア（event.txt）、アリ類記録を拡張（occurrence.txt）とし、
+        meta.xml と合わせて zip にまとめる。行はカーソルから直接 zip に書き込み、
+        テーブル全体をDataFrameとして読み込まない。
+        論理削除された記録・イベント・調査地・親調査地は含めない。
+        
+        Args:
+            filepath: 出力ファイルパス（Noneの場合は exports/dwca_YYYYMMDD_HHMMSS.zip）
+            id_prefix: eventID / occurrenceID / locationID の接頭辞
+                       （公開先で一意になるよう機関名などを指定する）
+            basis_of_record: basisOfRecord の値（標本を保管している場合は 'PreservedSpecimen'）
+        
+        Returns:
+            str: 出力ファイルパス
+        """
+        from utils.dwca import (EVENT_TERMS, OCCURRENCE_TERMS,
+                                build_meta_xml, write_text_file)
+        
+        if filepath is None:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            filepath = os.path.join(self.export_dir, f"dwca_{timestamp}.zip")
+        
+        active = """
+            se.deleted_at IS NULL AND ss.deleted_at IS NULL AND ps.deleted_at IS NULL
+        """
+        # 和名の列は種マスタを開いたときに追加されるため、無い場合は空欄
+        species_columns = {column[1] for column in
+                           self.conn.execute("PRAGMA table_info(species_master)")}
+        vernacular = 'sm.ja_name' if 'ja_name' in species_columns else 'NULL'
+        
+        # 調査地の位置・標高・面積はイベントごとに展開する
+        event_sql = f"""
+            SELECT
+                :prefix || ':event:' || se.id,
+                :prefix || ':site:' || ss.id,
+                ss.name || ' (' || ps.name || ')',
+                ss.latitude,
+                ss.longitude,
+                'WGS84',
+                ss.altitude,
+                ss.altitude,
+                replace(se.survey_date, ' ', 'T'),
+                se.surveyor_name,
+                ss.area,
+                CASE WHEN ss.area IS NULL THEN NULL ELSE 'square metre' END,
+                se.remarks,
+                CASE WHEN se.weather IS NULL AND se.temperature IS NULL THEN NULL
+                     ELSE json_object('weather', se.weather,
+                                      'airTemperatureInCelsius', se.temperature)
+                END
+            FROM survey_events se
+            JOIN survey_sites ss ON se.survey_site_id = ss.id
+            JOIN parent_sites ps ON ss.parent_site_id = ps.id
+            WHERE {active}
+            ORDER BY se.id
+        """
+        # 記録の主キー順に読み、結合は主キー検索のみ（並べ替え用の一時領域を使わない）
+        occurrence_sql = f"""
+            SELECT
+                :prefix || ':event:' || ar.survey_event_id,
+                :prefix || ':occurrence:' || ar.id,
+                :basis,
+                sm.name,
+                {vernacular},
+                'Animalia',
+                'Arthropoda',
+                'Insecta',
+                'Hymenoptera',
+                'Formicidae',
+                sm.subfamily,
+                sm.genus,
+                ar.count,
+                ar.count,
+                'individuals',
+                CASE WHEN ar.count > 0 THEN 'present' ELSE 'absent' END,
+                ar.remarks
+            FROM ant_records ar
+            JOIN survey_events se ON ar.survey_event_id = se.id
+            JOIN survey_sites ss ON se.survey_site_id = ss.id
+            JOIN parent_sites ps ON ss.parent_site_id = ps.id
+            JOIN species_master sm ON ar.species_id = sm.id
+            WHERE ar.deleted_at IS NULL AND {active}
+            ORDER BY ar.id
+        """
+        params = {'prefix': id_prefix, 'basis': basis_of_record}
+        
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        try:
+            with zipfile.ZipFile(filepath, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                with span('export.dwca.events') as sp:
+                    cursor.execute(event_sql, params)
+                    events = write_text_file(archive, 'event.txt', EVENT_TERMS,
+                                             self._iter_cursor(cursor))
+                    sp.set(rows=events)
                 
-                # シート5: アリ類記録
-                ant_sql = """
-                    SELECT ar.*, se.survey_date, ss.name as site_name, sm.name as species_name
-                    FROM ant_records ar
-                    LEFT JOIN survey_events se ON ar.survey_event_id = se.id
-                    LEFT JOIN survey_sites ss ON se.survey_site_id = ss.id
-                    LEFT JOIN species_master sm ON ar.species_id = sm.id
-                    WHERE ar.deleted_at IS NULL
-                """
-                pd.read_sql_query(ant_sql, self.conn).to_excel(
-                    writer, sheet_name='アリ類記録', index=False)
+                with span('export.dwca.occurrences') as sp:
+                    cursor.execute(occurrence_sql, params)
+                    occurrences = write_text_file(archive, 'occurrence.txt', OCCURRENCE_TERMS,
+                                                  self._iter_cursor(cursor))
+                    sp.set(rows=occurrences)
                 
-                # シート6: 種マスタ
-                species_sql = "SELECT * FROM species_master WHERE deleted_at IS NULL"
-                pd.read_sql_query(species_sql, self.conn).to_excel(
-                    writer, sheet_name='種マスタ', index=False)
+                archive.writestr('meta.xml', build_meta_xml('event.txt', 'occurrence.txt'))
+        except Exception:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            raise
+        
+        if events == 0:
+            os.remove(filepath)
+            raise ValueError("出力するデータがありません")
         
         return filepath
     
+    @staticmethod
+    def _import_pyarrow():
+        """
+        pyarrow を読み込む（Parquet / Feather 出力でのみ必要な任意の依存パッケージ）
+        
+        Returns:
+            module: pyarrow
+        """
+        try:
+            import pyarrow
+        except ImportError as e:
+            raise ImportError(
+                "Parquet / Feather 出力には pyarrow が必要です（pip install pyarrow）") from e
+        return pyarrow
+    
+    @staticmethod
+    def _arrow_type(pa, declared_type: str):
+        """SQLiteの宣言型 → Arrowの型（SQLiteの型親和性の規則に合わせる）"""
+        declared_type = (declared_type or '').upper()
+        if 'INT' in declared_type:
+            return pa.int64()
+        if any(name in declared_type for name in ('REAL', 'FLOA', 'DOUB')):
+            return pa.float64()
+        return pa.string()
+    
+    @staticmethod
+    def _build_dictionary(pairs):
+        """
+        (ID, 名前) の組から辞書（重複の無い名前のリスト）と ID → 位置 の対応を作成
+        
+        Args:
+            pairs: (ID, 名前) のイテラブル
+            
+        Returns:
+            (List[str], Dict[int, int]): 名前のリスト, ID → 位置（名前がNULLのIDは含まない）
+        """
+        names = []
+        positions = {}
+        index = {}
+        for key, name in pairs:
+            if name is None:
+                continue
+            if name not in positions:
+                positions[name] = len(names)
+                names.append(name)
+            index[key] = positions[name]
+        return names, index
+    
+    def _columnar_extension(self, fmt: str) -> str:
+        """形式名 → 拡張子"""
+        if fmt not in self.COLUMNAR_FORMATS:
+            raise ValueError(f"対応していない出力形式です: {fmt}（parquet または feather）")
+        return self.COLUMNAR_FORMATS[fmt]
+    
+    def _columnar_filepath(self, name: str, fmt: str) -> str:
+        """列指向形式の出力ファイルパスを生成"""
+        extension = self._columnar_extension(fmt)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return os.path.join(self.export_dir, f"{name}_{timestamp}{extension}")
+    
+    def _write_columnar(self, filepath: str, fmt: str, schema, batches) -> int:
+        """
+        レコードバッチを順に列指向形式のファイルへ書き出す（zstd圧縮）
+        
+        Args:
+            filepath: 出力ファイルパス
+            fmt: 'parquet' または 'feather'
+            schema: Arrowのスキーマ
+            batches: レコードバッチのイテラブル（1バッチ = Parquetの1行グループ）
+            
+        Returns:
+            int: 書き出した行数
+        """
+        pa = self._import_pyarrow()
+        self._columnar_extension(fmt)
+        rows = 0
+        
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+            with pq.ParquetWriter(filepath, schema, compression='zstd') as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+        else:
+            # Feather（V2）は Arrow IPC ファイル形式
+            options = pa.ipc.IpcWriteOptions(compression='zstd')
+            with pa.ipc.new_file(filepath, schema, options=options) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+        
+        return rows
+    
+    def _count_columnar_rows(self, filepath: str, fmt: str) -> int:
+        """列指向形式のファイルの行数（メタデータのみ読む）"""
+        pa = self._import_pyarrow()
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+            return pq.ParquetFile(filepath).metadata.num_rows
+        with pa.memory_map(filepath) as source:
+            reader = pa.ipc.open_file(source)
+            return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    
     def get_export_summary(self) -> Dict[str, int]:
         """
         エクスポート可能なデータのサマリーを取得
@@ -2,32 +2,171 @@
 地図・地理情報コントローラー
 """
 import folium
+from branca.element import MacroElement
 from folium import plugins
+from folium.utilities import JsCode
+from jinja2 import Template
 import pandas as pd
 import numpy as np
 from math import radians, sin, cos, sqrt, atan2
-from sklearn.cluster import KMeans, DBSCAN
 from scipy.cluster.hierarchy import dendrogram, linkage, fcluster
 from scipy.spatial.distance import pdist, squareform
-import matplotlib.pyplot as plt
-from typing import Dict, List, Tuple, Optional, Any
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional, Any
+import hashlib
+import json
 import os
+import re
 import webbrowser
+from models.site_species_summary import SiteSpeciesSummary
+from models.data_version import DataVersion
+from utils.background_query import get_database_path
+from utils.diversity import (DIVERSITY_INDICES, DIVERSITY_INDEX_LABELS,
+                             fetch_site_counts, fetch_site_totals, grouped_diversity)
+from utils.figure_utils import create_figure, finalize_figure
+from utils.beta_diversity import (BETA_METRICS, BETA_METRIC_LABELS, aggregate_community,
+                                  fetch_community_matrix, nearest_rows,
+                                  pairwise_dissimilarity)
+from utils.spatial_surface import (SURFACE_METHODS, compute_surface, surface_contours,
+                                   surface_grid, surface_to_rgba)
+from utils.perf_trace import span, traced
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+    from utils.tile_cache import TileServer
+
+
+# 調査地の色分けとポップアップを作るJavaScript（Python側の色分け・ポップアップと同じ内容）
+_SITE_MARKER_JS = """
+    function diversityColor(count) {
+        if (count === null || count === undefined) { return 'blue'; }
+        if (count == 0) { return 'gray'; }
+        if (count < 5) { return 'lightblue'; }
+        if (count < 10) { return 'blue'; }
+        if (count < 15) { return 'orange'; }
+        return 'darkred';
+    }
+    function escapeHtml(text) {
+        return String(text).replace(/[&<>"']/g, function (c) {
+            return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+        });
+    }
+    function bindSitePopup(layer, name, parentName, lat, lon, count) {
+        layer.bindTooltip(escapeHtml(name));
+        // ポップアップの内容はクリックされた時に作成する
+        layer.bindPopup(function () {
+            var html = '<b>' + escapeHtml(name) + '</b><br>' +
+                '親調査地: ' + escapeHtml(parentName) + '<br>' +
+                '緯度: ' + lat.toFixed(6) + '<br>' +
+                '経度: ' + lon.toFixed(6);
+            if (count !== null && count !== undefined && count > 0) {
+                html += '<br>種数: ' + count;
+            }
+            return html;
+        }, {maxWidth: 200});
+    }
+"""
+
+# 親調査地のGeoJSONレイヤー: 名前のツールチップとポップアップを設定
+_PARENT_FEATURE_JS = """
+function (feature, layer) {
+    var name = String(feature.properties.name).replace(/[&<>"']/g, function (c) {
+        return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+    });
+    layer.bindTooltip(name);
+    layer.bindPopup('<b>' + name + '</b><br>親調査地');
+}
+"""
+
+# GeoJSONレイヤー: 地物の属性（name, parent_name, species_count）から色とポップアップを設定
+# （diversityColor / bindSitePopup は _SiteMarkerScript で地図に1回だけ定義する）
+_GEOJSON_FEATURE_JS = """
+function (feature, layer) {
+    var props = feature.properties;
+    var coords = feature.geometry.coordinates;
+    var color = diversityColor(props.species_count);
+    layer.setStyle({color: color, fillColor: color});
+    bindSitePopup(layer, props.name, props.parent_name, coords[1], coords[0],
+                  props.species_count);
+}
+"""
+
+# マーカークラスタ: 行 [緯度, 経度, 調査地名, 親調査地名, 種数] からマーカーを作成
+# （FastMarkerCluster が "var callback = ...;" として埋め込むため関数式のみ）
+_CLUSTER_CALLBACK_JS = """
+function (row) {
+    var color = diversityColor(row[4]);
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 8, color: color, fillColor: color, fillOpacity: 0.7
+    });
+    bindSitePopup(marker, row[2], row[3], row[0], row[1], row[4]);
+    return marker;
+}
+"""
+
+
+class _SiteMarkerScript(MacroElement):
+    """調査地の色分け・ポップアップのJavaScript関数を地図のスクリプトに1回だけ定義する要素"""
+    
+    _template = Template(
+        "{% macro script(this, kwargs) %}" + _SITE_MARKER_JS + "{% endmacro %}")
+
+
+# キャッシュした地図のファイル名（接頭辞, 条件のハッシュ, データ版数のハッシュ）
+_MAP_CACHE_FILE = re.compile(r'^(.+)_([0-9a-f]{12})_([0-9a-f]{12})\.html$')
 
 
 class MapController:
     """地図・地理情報管理クラス"""
     
-    def __init__(self, db_connection, map_dir='exports'):
+    # 調査地の描画方法と、auto で個別マーカーにする上限件数
+    SITE_MAP_RENDER_MODES = ('auto', 'markers', 'geojson', 'cluster')
+    MARKER_RENDER_LIMIT = 2000
+    
+    # ヒートマップの重み付けと正規化方法
+    HEATMAP_WEIGHTINGS = ('none', 'events', 'log_individuals')
+    HEATMAP_NORMALIZATIONS = ('max', 'minmax', 'rank', 'none')
+    
+    # 階層的クラスタリングの結合方法と、距離を総当たりで求める地点数の上限
+    LINKAGE_METHODS = ('ward', 'single', 'complete', 'average')
+    LINKAGE_MAX_LEAVES = 3000
+    
+    # 群集の非類似度を計算する並列数（-1 は全コア）
+    BETA_N_JOBS = -1
+    
+    # 樹形図の葉がこれを超える場合は、最後に結合する DENDROGRAM_TRUNCATE_LASTP 個だけ表示
+    DENDROGRAM_MAX_LEAVES = 60
+    DENDROGRAM_TRUNCATE_LASTP = 30
+    
+    # 多様度サーフェスの表示方法と、計算結果をメモリに保持する件数
+    SURFACE_RENDERS = ('image', 'contour')
+    SURFACE_CACHE_SIZE = 4
+    
+    # 地図HTMLキャッシュの形式（描画内容を変えた場合は上げる）と保持する最大ファイル数
+    MAP_CACHE_FORMAT = 3
+    MAP_CACHE_MAX_FILES = 50
+    
+    def __init__(self, db_connection, map_dir='exports',
+                 tiles: Optional[str] = None, attribution: Optional[str] = None,
+                 tile_server: Optional['TileServer'] = None):
         """
         初期化
         
         Args:
             db_connection: データベース接続
             map_dir: 地図ファイル保存先
+            tiles: 背景地図タイルのURLテンプレート（Noneの場合はOpenStreetMap）
+            attribution: 背景地図の出典表示（tiles を指定する場合は必須）
+            tile_server: オフライン表示用のローカルタイルサーバー
+                         （指定した場合はタイルと Leaflet 等をこのサーバーから読み込む）
         """
         self.conn = db_connection
         self.map_dir = map_dir
+        self.tiles = tiles
+        self.attribution = attribution
+        self.tile_server = tile_server
+        self.summary = SiteSpeciesSummary(db_connection)
+        self.versions = DataVersion(db_connection)
+        self._surface_cache: Dict[str, Dict[str, Any]] = {}
         
         if not os.path.exists(map_dir):
             os.makedirs(map_dir)
@@ -56,6 +195,7 @@ class MapController:
         
         return R * c
     
+    @traced('map.distance_matrix')
     def get_distance_matrix(self, site_type: str = 'survey') -> pd.DataFrame:
         """
         距離行列を計算
@@ -81,23 +221,16 @@ class MapController:
                 ORDER BY ss.name
             """
         
-        df = pd.read_sql_query(sql, self.conn)
+        with span('map.distance_matrix.fetch'):
+            df = pd.read_sql_query(sql, self.conn)
         
         if df.empty:
             raise ValueError("データがありません")
         
-        # 距離行列を計算
-        n = len(df)
-        dist_matrix = np.zeros((n, n))
-        
-        for i in range(n):
-            for j in range(i+1, n):
-                dist = self.calculate_distance(
-                    df.iloc[i]['latitude'], df.iloc[i]['longitude'],
-                    df.iloc[j]['latitude'], df.iloc[j]['longitude']
-                )
-                dist_matrix[i, j] = dist
-                dist_matrix[j, i] = dist
+        # 距離行列を計算（上三角を一度に求めてから正方行列に展開）
+        with span('map.distance_matrix.compute', sites=len(df)):
+            dist_matrix = squareform(self.condensed_distances(df['latitude'].values,
+                                                              df['longitude'].values))
         
         # DataFrameに変換
         dist_df = pd.DataFrame(
@@ -108,9 +241,39 @@ class MapController:
         
         return dist_df
     
+    @staticmethod
+    def condensed_distances(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        """
+        全地点間の距離（km）を上三角の1次元配列（condensed 形式）で計算
+        
+        地点を単位球面上の3次元座標にし、弦の長さ c から大円距離 2R·asin(c/2) を求める
+        （calculate_distance の Haversine 公式と同じ値）。
+        正方行列を作らないため、メモリは n(n-1)/2 要素で済む。
+        
+        Args:
+            latitudes: 緯度の配列
+            longitudes: 経度の配列
+            
+        Returns:
+            ndarray: scipy.spatial.distance.pdist と同じ並びの距離
+        """
+        xyz = MapController._unit_vectors(latitudes, longitudes)
+        chord = pdist(xyz)
+        return 2 * 6371 * np.arcsin(np.minimum(chord / 2, 1.0))
+    
+    @staticmethod
+    def _unit_vectors(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        """緯度経度を単位球面上の3次元座標に変換"""
+        lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+        lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+        return np.column_stack([np.cos(lat) * np.cos(lon),
+                                np.cos(lat) * np.sin(lon),
+                                np.sin(lat)])
+    
     def create_base_map(self, center_lat: Optional[float] = None,
                        center_lon: Optional[float] = None,
-                       zoom: int = 10) -> folium.Map:
+                       zoom: int = 10,
+                       prefer_canvas: bool = False) -> folium.Map:
         """
         ベース地図を作成
         
@@ -118,6 +281,7 @@ class MapController:
             center_lat: 中心緯度（Noneの場合は調査地の中心）
             center_lon: 中心経度
             zoom: ズームレベル
+            prefer_canvas: 図形をSVGではなくCanvasに描画する（大量の点を表示する場合）
             
         Returns:
             folium.Map: 地図オブジェクト
@@ -143,14 +307,85 @@ class MapController:
         m = folium.Map(
             location=[center_lat, center_lon],
             zoom_start=zoom,
-            tiles='OpenStreetMap'
+            tiles=self._create_tile_layer(),
+            prefer_canvas=prefer_canvas
         )
         
         return m
     
+    def _create_tile_layer(self):
+        """
+        背景地図のタイルレイヤーを作成
+        
+        Returns:
+            TileLayer または 'OpenStreetMap'（folium 標準のタイル）
+        """
+        if self.tile_server is not None:
+            # 保存済みの最大ズームより拡大した場合はそのタイルを拡大表示する
+            return folium.TileLayer(
+                tiles=self.tile_server.tile_url,
+                attr=self.attribution or '© OpenStreetMap contributors',
+                name='地図（オフライン）',
+                max_zoom=19,
+                max_native_zoom=self.tile_server.max_zoom or 19
+            )
+        if self.tiles:
+            if not self.attribution:
+                raise ValueError("背景地図の出典表示（attribution）を指定してください")
+            return folium.TileLayer(tiles=self.tiles, attr=self.attribution, name='地図')
+        return 'OpenStreetMap'
+    
+    def get_site_bounds(self, margin_km: float = 0.0) -> Tuple[float, float, float, float]:
+        """
+        調査地・親調査地を囲む範囲を取得（オフライン用タイルの取得範囲）
+        
+        Args:
+            margin_km: 四方に広げる距離（km）
+            
+        Returns:
+            (南端緯度, 西端経度, 北端緯度, 東端経度)
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT MIN(latitude), MIN(longitude), MAX(latitude), MAX(longitude)
+            FROM (
+                SELECT latitude, longitude FROM parent_sites WHERE deleted_at IS NULL
+                UNION ALL
+                SELECT latitude, longitude FROM survey_sites WHERE deleted_at IS NULL
+            )
+        """)
+        south, west, north, east = cursor.fetchone()
+        
+        if south is None:
+            raise ValueError("調査地がありません")
+        
+        # 緯度1度 ≒ 111km、経度1度は緯度に応じて短くなる
+        lat_margin = margin_km / 111.0
+        lon_margin = margin_km / (111.0 * max(cos(radians((south + north) / 2)), 0.01))
+        return (max(south - lat_margin, -85.0), max(west - lon_margin, -180.0),
+                min(north + lat_margin, 85.0), min(east + lon_margin, 180.0))
+    
+    @staticmethod
+    def map_asset_urls() -> List[str]:
+        """
+        地図HTMLが読み込む JavaScript / CSS のURL（オフライン用に保存する対象）
+        
+        Returns:
+            List[str]: URLのリスト
+        """
+        urls = []
+        for element in (folium.Map, plugins.HeatMap, plugins.FastMarkerCluster):
+            for _, url in element.default_js + element.default_css:
+                if url not in urls:
+                    urls.append(url)
+        return urls
+    
+    @traced('map.site_map')
     def create_site_map(self, show_parent: bool = True,
                        show_survey: bool = True,
-                       show_diversity: bool = False) -> str:
+                       show_diversity: bool = False,
+                       render_mode: str = 'auto',
+                       use_cache: bool = True) -> str:
         """
         調査地の地図を作成
         
@@ -158,30 +393,43 @@ class MapController:
             show_parent: 親調査地を表示
             show_survey: 調査地を表示
             show_diversity: 種多様度を色で表現
+            render_mode: 調査地の描画方法
+                         ('markers': 調査地ごとのマーカー,
+                          'geojson': 1つのGeoJSONレイヤー（Canvas描画）,
+                          'cluster': マーカークラスタ（ブラウザ側で生成）,
+                          'auto': MARKER_RENDER_LIMIT 件以下は markers、超える場合は geojson)
+            use_cache: 条件とデータが同じ地図を生成済みであれば再利用する
             
         Returns:
             str: 生成されたHTMLファイルのパス
         """
-        m = self.create_base_map()
+        if render_mode not in self.SITE_MAP_RENDER_MODES:
+            raise ValueError(f"描画方法が不正です: {render_mode}")
         
-        # 親調査地を表示
+        cache_path = None
+        if use_cache:
+            tables = ['parent_sites', 'survey_sites']
+            if show_diversity:
+                tables += ['survey_events', 'ant_records']
+            cache_path = self._map_cache_path('site_map', {
+                'show_parent': show_parent,
+                'show_survey': show_survey,
+                'show_diversity': show_diversity,
+                'render_mode': render_mode,
+            }, tables)
+            if self._reuse_cached_map(cache_path):
+                return cache_path
+        
+        # 地点を先に取得し、件数から描画方法を決める
         if show_parent:
             parent_sql = """
                 SELECT id, name, latitude, longitude
                 FROM parent_sites
                 WHERE deleted_at IS NULL
             """
-            parent_df = pd.read_sql_query(parent_sql, self.conn)
-            
-            for _, site in parent_df.iterrows():
-                folium.Marker(
-                    location=[site['latitude'], site['longitude']],
-                    popup=f"<b>{site['name']}</b><br>親調査地",
-                    icon=folium.Icon(color='red', icon='home', prefix='fa'),
-                    tooltip=site['name']
-                ).add_to(m)
+            with span('map.site_map.fetch'):
+                parent_df = pd.read_sql_query(parent_sql, self.conn)
         
-        # 調査地を表示
         if show_survey:
             survey_sql = """
                 SELECT 
@@ -194,146 +442,536 @@ class MapController:
                 LEFT JOIN parent_sites ps ON ss.parent_site_id = ps.id
                 WHERE ss.deleted_at IS NULL
             """
-            survey_df = pd.read_sql_query(survey_sql, self.conn)
-            
+            with span('map.site_map.fetch'):
+                survey_df = pd.read_sql_query(survey_sql, self.conn)
+        
+        if render_mode == 'auto':
+            n_sites = ((len(parent_df) if show_parent else 0)
+                       + (len(survey_df) if show_survey else 0))
+            render_mode = 'markers' if n_sites <= self.MARKER_RENDER_LIMIT else 'geojson'
+        
+        m = self.create_base_map(prefer_canvas=render_mode == 'geojson')
+        
+        # 親調査地を表示
+        if show_parent:
+            if render_mode == 'markers':
+                with span('map.site_map.render', markers=len(parent_df)):
+                    for _, site in parent_df.iterrows():
+                        folium.Marker(
+                            location=[site['latitude'], site['longitude']],
+                            popup=f"<b>{site['name']}</b><br>親調査地",
+                            icon=folium.Icon(color='red', icon='home', prefix='fa'),
+                            tooltip=site['name']
+                        ).add_to(m)
+            else:
+                # 親調査地は件数が少ないため、クラスタにせず1つのGeoJSONレイヤーにする
+                with span('map.site_map.render', sites=len(parent_df), mode='geojson'):
+                    self._add_parent_site_layer(m, parent_df)
+        
+        # 調査地を表示
+        if show_survey:
             # 多様度データを取得（show_diversity=Trueの場合）
             diversity_dict = {}
             if show_diversity:
                 diversity_sql = """
                     SELECT 
-                        se.survey_site_id,
-                        COUNT(DISTINCT ar.species_id) as species_count
-                    FROM ant_records ar
-                    JOIN survey_events se ON ar.survey_event_id = se.id
-                    WHERE ar.deleted_at IS NULL
-                    GROUP BY se.survey_site_id
+                        survey_site_id,
+                        COUNT(*) as species_count
+                    FROM site_species_summary
+                    GROUP BY survey_site_id
                 """
-                diversity_df = pd.read_sql_query(diversity_sql, self.conn)
+                with span('map.site_map.fetch'):
+                    diversity_df = pd.read_sql_query(diversity_sql, self.conn)
                 diversity_dict = dict(zip(diversity_df['survey_site_id'], 
                                          diversity_df['species_count']))
             
-            for _, site in survey_df.iterrows():
-                species_count = diversity_dict.get(site['id'], 0)
-                
-                # 種数に応じて色を変更
-                if show_diversity:
-                    if species_count == 0:
-                        color = 'gray'
-                    elif species_count < 5:
-                        color = 'lightblue'
-                    elif species_count < 10:
-                        color = 'blue'
-                    elif species_count < 15:
-                        color = 'orange'
-                    else:
-                        color = 'darkred'
-                else:
-                    color = 'blue'
-                
-                popup_html = f"""
-                <b>{site['name']}</b><br>
-                親調査地: {site['parent_name']}<br>
-                緯度: {site['latitude']:.6f}<br>
-                経度: {site['longitude']:.6f}
-                """
-                
-                if show_diversity and species_count > 0:
-                    popup_html += f"<br>種数: {species_count}"
-                
-                folium.CircleMarker(
-                    location=[site['latitude'], site['longitude']],
-                    radius=8,
-                    popup=folium.Popup(popup_html, max_width=200),
-                    tooltip=site['name'],
-                    color=color,
-                    fill=True,
-                    fillColor=color,
-                    fillOpacity=0.7
-                ).add_to(m)
+            if render_mode == 'markers':
+                with span('map.site_map.render', markers=len(survey_df)):
+                    for _, site in survey_df.iterrows():
+                        species_count = diversity_dict.get(site['id'], 0)
+                        
+                        # 種数に応じて色を変更
+                        if show_diversity:
+                            if species_count == 0:
+                                color = 'gray'
+                            elif species_count < 5:
+                                color = 'lightblue'
+                            elif species_count < 10:
+                                color = 'blue'
+                            elif species_count < 15:
+                                color = 'orange'
+                            else:
+                                color = 'darkred'
+                        else:
+                            color = 'blue'
+                        
+                        popup_html = f"""
+                        <b>{site['name']}</b><br>
+                        親調査地: {site['parent_name']}<br>
+                        緯度: {site['latitude']:.6f}<br>
+                        経度: {site['longitude']:.6f}
+                        """
+                        
+                        if show_diversity and species_count > 0:
+                            popup_html += f"<br>種数: {species_count}"
+                        
+                        folium.CircleMarker(
+                            location=[site['latitude'], site['longitude']],
+                            radius=8,
+                            popup=folium.Popup(popup_html, max_width=200),
+                            tooltip=site['name'],
+                            color=color,
+                            fill=True,
+                            fillColor=color,
+                            fillOpacity=0.7
+                        ).add_to(m)
+            else:
+                with span('map.site_map.render', sites=len(survey_df), mode=render_mode):
+                    self._add_survey_site_layer(m, survey_df, diversity_dict,
+                                                show_diversity, render_mode)
         
         # ファイル保存
-        from datetime import datetime
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"site_map_{timestamp}.html"
-        filepath = os.path.join(self.map_dir, filename)
+        filepath = cache_path or self._timestamped_map_path('site_map')
         
-        m.save(filepath)
+        with span('map.site_map.save'):
+            self._save_map(m, filepath)
         
         return filepath
     
-    def create_heatmap(self, metric: str = 'species_richness') -> str:
+    def _add_parent_site_layer(self, m: folium.Map, parent_df: pd.DataFrame) -> None:
+        """
+        親調査地を1つのGeoJSONレイヤーとして追加
+        
+        Args:
+            m: 地図オブジェクト
+            parent_df: 親調査地（id, name, latitude, longitude）
+        """
+        features = [
+            {
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+                'properties': {'name': name},
+            }
+            for name, lat, lon in zip(parent_df['name'].tolist(),
+                                      parent_df['latitude'].round(6).tolist(),
+                                      parent_df['longitude'].round(6).tolist())
+        ]
+        
+        folium.GeoJson(
+            {'type': 'FeatureCollection', 'features': features},
+            name='親調査地',
+            marker=folium.Marker(icon=folium.Icon(color='red', icon='home', prefix='fa')),
+            on_each_feature=JsCode(_PARENT_FEATURE_JS)
+        ).add_to(m)
+    
+    def _add_survey_site_layer(self, m: folium.Map, survey_df: pd.DataFrame,
+                               diversity_dict: Dict[int, int], show_diversity: bool,
+                               render_mode: str) -> None:
+        """
+        調査地を1つのレイヤー（GeoJSON またはマーカークラスタ）として追加
+        
+        調査地ごとのマーカー・ポップアップのHTMLは作らず、座標と属性だけを
+        データとして埋め込む。色分けとポップアップはブラウザ側で必要になった時に作る。
+        
+        Args:
+            m: 地図オブジェクト
+            survey_df: 調査地（id, name, latitude, longitude, parent_name）
+            diversity_dict: 調査地ID -> 種数
+            show_diversity: 種数で色分けする
+            render_mode: 'geojson' または 'cluster'
+        """
+        names = survey_df['name'].tolist()
+        parent_names = survey_df['parent_name'].fillna('').tolist()
+        latitudes = survey_df['latitude'].round(6).tolist()
+        longitudes = survey_df['longitude'].round(6).tolist()
+        if show_diversity:
+            species_counts = survey_df['id'].map(diversity_dict).fillna(0).astype(int).tolist()
+        else:
+            species_counts = [None] * len(survey_df)
+        
+        # 色分け・ポップアップの関数は地物ごとではなく地図に1回だけ定義する
+        _SiteMarkerScript().add_to(m)
+        
+        if render_mode == 'cluster':
+            data = [list(row) for row in zip(latitudes, longitudes, names,
+                                              parent_names, species_counts)]
+            plugins.FastMarkerCluster(
+                data,
+                callback=_CLUSTER_CALLBACK_JS,
+                name='調査地'
+            ).add_to(m)
+            return
+        
+        features = []
+        for name, parent_name, lat, lon, species_count in zip(
+                names, parent_names, latitudes, longitudes, species_counts):
+            properties = {'name': name, 'parent_name': parent_name}
+            if species_count is not None:
+                properties['species_count'] = species_count
+            features.append({
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+                'properties': properties,
+            })
+        
+        folium.GeoJson(
+            {'type': 'FeatureCollection', 'features': features},
+            name='調査地',
+            marker=folium.CircleMarker(radius=8, fill=True, fill_opacity=0.7),
+            on_each_feature=JsCode(_GEOJSON_FEATURE_JS)
+        ).add_to(m)
+    
+    @traced('map.heatmap')
+    def create_heatmap(self, metric: str = 'species_richness',
+                       weighting: str = 'none',
+                       normalization: str = 'max',
+                       use_cache: bool = True) -> str:
         """
         ヒートマップを作成
         
         Args:
-            metric: 表示する指標 ('species_richness' or 'shannon_index')
+            metric: 表示する指標（DIVERSITY_INDICES のいずれか。
+                    'species_richness', 'shannon_index' など）
+            weighting: 調査地ごとの重み
+                       ('none': なし, 'events': 調査イベント数（調査努力量）,
+                        'log_individuals': log(1 + 総個体数))
+            normalization: 強度の正規化
+                           ('max': 最大値で割る, 'minmax': 最小0・最大1,
+                            'rank': 順位（0〜1）, 'none': そのまま)
+            use_cache: 条件とデータが同じ地図を生成済みであれば再利用する
             
         Returns:
             str: 生成されたHTMLファイルのパス
         """
+        if metric not in DIVERSITY_INDICES:
+            raise ValueError(f"指標が不正です: {metric}")
+        if weighting not in self.HEATMAP_WEIGHTINGS:
+            raise ValueError(f"重み付けが不正です: {weighting}")
+        if normalization not in self.HEATMAP_NORMALIZATIONS:
+            raise ValueError(f"正規化方法が不正です: {normalization}")
+        
+        cache_path = None
+        if use_cache:
+            cache_path = self._map_cache_path(f'heatmap_{metric}', {
+                'weighting': weighting,
+                'normalization': normalization,
+            }, ['survey_sites', 'survey_events', 'ant_records'])
+            if self._reuse_cached_map(cache_path):
+                return cache_path
+        
         m = self.create_base_map()
         
-        # データ取得
-        if metric == 'species_richness':
-            sql = """
-                SELECT 
-                    ss.latitude,
-                    ss.longitude,
-                    COUNT(DISTINCT ar.species_id) as value
-                FROM survey_sites ss
-                LEFT JOIN survey_events se ON ss.id = se.survey_site_id
-                LEFT JOIN ant_records ar ON se.id = ar.survey_event_id
-                WHERE ss.deleted_at IS NULL
-                GROUP BY ss.id
-                HAVING value > 0
-            """
-        else:
-            # Shannon指数を計算して取得（簡易版）
-            sql = """
-                SELECT 
-                    ss.latitude,
-                    ss.longitude,
-                    COUNT(DISTINCT ar.species_id) as value
-                FROM survey_sites ss
-                LEFT JOIN survey_events se ON ss.id = se.survey_site_id
-                LEFT JOIN ant_records ar ON se.id = ar.survey_event_id
-                WHERE ss.deleted_at IS NULL
-                GROUP BY ss.id
-                HAVING value > 0
-            """
+        groups, coordinates, values = self._site_metric_values(metric, weighting, 'map.heatmap')
         
-        df = pd.read_sql_query(sql, self.conn)
+        with span('map.heatmap.normalize'):
+            values = self._normalize_heat_values(values, normalization)
         
-        if df.empty:
+        if len(groups) == 0:
             raise ValueError("ヒートマップ用のデータがありません")
         
-        # ヒートマップデータ準備
-        heat_data = [[row['latitude'], row['longitude'], row['value']] 
-                    for _, row in df.iterrows()]
+        # ヒートマップデータ準備（[緯度, 経度, 強度] の配列）
+        with span('map.heatmap.reshape', points=len(groups)):
+            heat_data = np.column_stack([coordinates, values]).tolist()
         
         # ヒートマップ追加
-        plugins.HeatMap(
-            heat_data,
-            name='種多様度ヒートマップ',
-            radius=25,
-            blur=35,
-            max_zoom=13,
-            gradient={0.4: 'blue', 0.65: 'lime', 0.8: 'yellow', 1.0: 'red'}
-        ).add_to(m)
+        with span('map.heatmap.render'):
+            plugins.HeatMap(
+                heat_data,
+                name=f'{DIVERSITY_INDEX_LABELS[metric]}ヒートマップ',
+                radius=25,
+                blur=35,
+                max_zoom=13,
+                gradient={0.4: 'blue', 0.65: 'lime', 0.8: 'yellow', 1.0: 'red'}
+            ).add_to(m)
         
         # レイヤーコントロール追加
         folium.LayerControl().add_to(m)
         
         # 保存
-        from datetime import datetime
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"heatmap_{metric}_{timestamp}.html"
-        filepath = os.path.join(self.map_dir, filename)
+        filepath = cache_path or self._timestamped_map_path(f'heatmap_{metric}')
+        
+        with span('map.heatmap.save'):
+            self._save_map(m, filepath)
+        
+        return filepath
+    
+    def _site_metric_values(self, metric: str, weighting: str = 'none',
+                            span_prefix: str = 'map.heatmap'
+                            ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        調査地ごとの指標値と座標を配列で取得（論理削除された調査地を除く）
+        
+        Args:
+            metric: 指標（DIVERSITY_INDICES のいずれか）
+            weighting: 調査地ごとの重み（HEATMAP_WEIGHTINGS のいずれか）
+            span_prefix: 処理時間トレースの名前の接頭辞
+            
+        Returns:
+            (調査地ID, [緯度, 経度] の2列配列, 指標値)。調査地ID順
+        """
+        # データ取得（調査地ごとの集計値と座標を配列で）
+        with span(f'{span_prefix}.fetch'):
+            if metric in ('species_richness', 'total_individuals'):
+                # 種数・総個体数はSQLの集計で足りる
+                indices = fetch_site_totals(self.conn, active_sites_only=True)
+            else:
+                # その他の指数は種ごとの個体数から計算
+                site_ids, counts = fetch_site_counts(self.conn, active_sites_only=True)
+                indices = None
+            cursor = self.conn.cursor()
+            cursor.row_factory = None
+            cursor.execute("""
+                SELECT id, latitude, longitude
+                FROM survey_sites
+                WHERE deleted_at IS NULL
+                ORDER BY id
+            """)
+            coordinates = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 3)
+        
+        # 調査地ごとの指数をまとめて計算
+        with span(f'{span_prefix}.compute') as sp:
+            if indices is None:
+                indices = grouped_diversity(site_ids, counts)
+            groups = indices['group_id']
+            values = indices[metric].astype(np.float64)
+            
+            if weighting == 'events':
+                values = values * self._site_event_counts(groups)
+            elif weighting == 'log_individuals':
+                values = values * np.log1p(indices['total_individuals'])
+            sp.set(sites=len(groups))
+        
+        positions = np.searchsorted(coordinates[:, 0], groups)
+        return groups, coordinates[positions, 1:3], values
+    
+    def compute_diversity_surface(self, metric: str = 'species_richness',
+                                  method: str = 'kde',
+                                  bandwidth_km: Optional[float] = None,
+                                  resolution: int = 200) -> Dict[str, Any]:
+        """
+        調査地の指標値から連続面（格子）を計算
+        
+        同じ条件・データ版数の計算結果はメモリに保持して再利用する
+        （表示方法だけを変えて作り直す場合など）。
+        
+        Args:
+            metric: 指標（DIVERSITY_INDICES のいずれか）
+            method: 'kde': カーネル密度推定（値の重み付き密度）,
+                    'idw': 逆距離加重補間（バンド幅の3倍より遠いセルは空白）
+            bandwidth_km: バンド幅（km。Noneの場合は調査地の範囲の1/25）
+            resolution: 格子の長い辺のセル数
+            
+        Returns:
+            Dict: lats, lons（セル中心）, surface（行は南→北）, bounds（格子の外周）,
+                  bandwidth_km, n_sites
+        """
+        if metric not in DIVERSITY_INDICES:
+            raise ValueError(f"指標が不正です: {metric}")
+        if method not in SURFACE_METHODS:
+            raise ValueError(f"計算方法が不正です: {method}")
+        
+        cache_key = self._hash_key({
+            'metric': metric, 'method': method, 'bandwidth_km': bandwidth_km,
+            'resolution': resolution,
+            'versions': self.versions.get_versions(['survey_sites', 'survey_events',
+                                                    'ant_records']),
+        })
+        if cache_key in self._surface_cache:
+            return self._surface_cache[cache_key]
+        
+        _, coordinates, values = self._site_metric_values(metric, span_prefix='map.surface')
+        if len(values) == 0:
+            raise ValueError("サーフェス用のデータがありません")
+        
+        with span('map.surface.grid', sites=len(values)) as sp:
+            lat, lon = coordinates[:, 0], coordinates[:, 1]
+            lat0 = float(np.mean(lat))
+            height_km = (lat.max() - lat.min()) * 110.574
+            width_km = (lon.max() - lon.min()) * 111.320 * cos(radians(lat0))
+            if bandwidth_km is None:
+                bandwidth_km = max(max(height_km, width_km) / 25, 0.1)
+            
+            # カーネルの裾が切れないよう、バンド幅の3倍だけ範囲を広げる
+            lat_margin = bandwidth_km * 3 / 110.574
+            lon_margin = bandwidth_km * 3 / (111.320 * max(cos(radians(lat0)), 0.01))
+            lats, lons = surface_grid((lat.min() - lat_margin, lon.min() - lon_margin,
+                                       lat.max() + lat_margin, lon.max() + lon_margin),
+                                      resolution)
+            surface = compute_surface(lat, lon, values, lats, lons,
+                                      method=method, bandwidth_km=bandwidth_km)
+            sp.set(cells=surface.size)
+        
+        lat_half = (lats[1] - lats[0]) / 2
+        lon_half = (lons[1] - lons[0]) / 2
+        result = {
+            'lats': lats,
+            'lons': lons,
+            'surface': surface,
+            'bounds': (lats[0] - lat_half, lons[0] - lon_half,
+                       lats[-1] + lat_half, lons[-1] + lon_half),
+            'bandwidth_km': bandwidth_km,
+            'n_sites': len(values),
+        }
+        
+        # 古いものから捨てる
+        self._surface_cache[cache_key] = result
+        while len(self._surface_cache) > self.SURFACE_CACHE_SIZE:
+            self._surface_cache.pop(next(iter(self._surface_cache)))
+        return result
+    
+    @traced('map.surface')
+    def create_diversity_surface_map(self, metric: str = 'species_richness',
+                                     method: str = 'kde',
+                                     bandwidth_km: Optional[float] = None,
+                                     resolution: int = 200,
+                                     render: str = 'image',
+                                     use_cache: bool = True) -> str:
+        """
+        多様度の連続面（サーバー側で計算した格子）を地図に重ねて表示
+        
+        ヒートマップ（ブラウザ側で点の密度を描画）と異なり、格子の値を計算済みの
+        画像または等値線として埋め込むため、調査地数に関わらず表示が軽い。
+        
+        Args:
+            metric: 指標（DIVERSITY_INDICES のいずれか）
+            method: 'kde' / 'idw'（compute_diversity_surface を参照）
+            bandwidth_km: バンド幅（km。Noneの場合は自動）
+            resolution: 格子の長い辺のセル数
+            render: 'image': 画像として重ねる, 'contour': 等値線（塗り分け）のGeoJSON
+            use_cache: 条件とデータが同じ地図を生成済みであれば再利用する
+            
+        Returns:
+            str: 生成されたHTMLファイルのパス
+        """
+        if render not in self.SURFACE_RENDERS:
+            raise ValueError(f"表示方法が不正です: {render}")
         
-        m.save(filepath)
+        cache_path = None
+        if use_cache:
+            cache_path = self._map_cache_path(f'surface_{metric}', {
+                'method': method,
+                'bandwidth_km': bandwidth_km,
+                'resolution': resolution,
+                'render': render,
+            }, ['survey_sites', 'survey_events', 'ant_records'])
+            if self._reuse_cached_map(cache_path):
+                return cache_path
+        
+        result = self.compute_diversity_surface(metric, method, bandwidth_km, resolution)
+        surface = result['surface']
+        south, west, north, east = result['bounds']
+        
+        label = DIVERSITY_INDEX_LABELS[metric]
+        layer_name = f"{label}（{'KDE' if method == 'kde' else 'IDW'}, "\
+                     f"バンド幅 {result['bandwidth_km']:.2f}km）"
+        
+        m = self.create_base_map((south + north) / 2, (west + east) / 2)
+        
+        with span('map.surface.render', render=render):
+            if render == 'image':
+                # 格子は緯度方向に等間隔のため、Webメルカトルに合わせて行を引き伸ばす
+                folium.raster_layers.ImageOverlay(
+                    surface_to_rgba(surface),
+                    bounds=[[south, west], [north, east]],
+                    mercator_project=True,
+                    name=layer_name
+                ).add_to(m)
+            else:
+                contours = surface_contours(surface, result['lats'], result['lons'])
+                for feature in contours['features']:
+                    props = feature['properties']
+                    props['label'] = f"{props['lower']:.3g} 〜 {props['upper']:.3g}"
+                folium.GeoJson(
+                    contours,
+                    name=layer_name,
+                    style_function=lambda feature: {
+                        'fillColor': feature['properties']['color'],
+                        'color': feature['properties']['color'],
+                        'weight': 0.5,
+                        'fillOpacity': 0.55,
+                        'fillRule': 'evenodd',
+                    },
+                    tooltip=folium.GeoJsonTooltip(fields=['label'], aliases=[label])
+                ).add_to(m)
+            
+            finite = surface[np.isfinite(surface)]
+            if len(finite):
+                import branca.colormap
+                import matplotlib
+                colors = [matplotlib.colors.to_hex(c)
+                          for c in matplotlib.colormaps['YlOrRd'](np.linspace(0, 1, 9))]
+                caption = label + ('（密度 / km²）' if method == 'kde' else '')
+                branca.colormap.LinearColormap(
+                    colors, vmin=float(finite.min()), vmax=float(finite.max()),
+                    caption=caption
+                ).add_to(m)
+        
+        folium.LayerControl().add_to(m)
+        
+        filepath = cache_path or self._timestamped_map_path(f'surface_{metric}')
+        
+        with span('map.surface.save'):
+            self._save_map(m, filepath)
         
         return filepath
     
+    def _site_event_counts(self, site_ids: np.ndarray) -> np.ndarray:
+        """
+        調査地ごとの調査イベント数（論理削除を除く）を取得
+        
+        Args:
+            site_ids: 調査地ID（昇順）
+            
+        Returns:
+            ndarray: site_ids と同じ順のイベント数
+        """
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute("""
+            SELECT survey_site_id, COUNT(*)
+            FROM survey_events
+            WHERE deleted_at IS NULL
+            GROUP BY survey_site_id
+            ORDER BY survey_site_id
+        """)
+        rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+        
+        events = np.zeros(len(site_ids))
+        positions = np.searchsorted(rows[:, 0], site_ids)
+        found = positions < len(rows)
+        found[found] = rows[positions[found], 0] == site_ids[found]
+        events[found] = rows[positions[found], 1]
+        return events
+    
+    @staticmethod
+    def _normalize_heat_values(values: np.ndarray, normalization: str) -> np.ndarray:
+        """
+        ヒートマップの強度を正規化
+        
+        Leaflet.heat は強度1以上を同じ色で表示するため、
+        指標の大きさに関わらず0〜1に収める（'none' を除く）。
+        
+        Args:
+            values: 調査地ごとの値
+            normalization: 'max' / 'minmax' / 'rank' / 'none'
+            
+        Returns:
+            ndarray: 正規化した値
+        """
+        if normalization == 'none' or len(values) == 0:
+            return values
+        
+        if normalization == 'rank':
+            # 同順位は平均順位
+            return pd.Series(values).rank(method='average', pct=True).to_numpy()
+        
+        high = values.max()
+        low = values.min() if normalization == 'minmax' else 0.0
+        if high <= low:
+            return np.ones_like(values) if high > 0 else np.zeros_like(values)
+        return (values - low) / (high - low)
+    
+    @traced('map.kmeans')
     def perform_kmeans_clustering(self, n_clusters: int = 3,
                                   site_type: str = 'survey') -> Dict[str, Any]:
         """
@@ -359,7 +997,8 @@ class MapController:
                 WHERE ss.deleted_at IS NULL
             """
         
-        df = pd.read_sql_query(sql, self.conn)
+        with span('map.kmeans.fetch'):
+            df = pd.read_sql_query(sql, self.conn)
         
         if len(df) < n_clusters:
             raise ValueError(f"データ数（{len(df)}）がクラスタ数（{n_clusters}）より少ないです")
@@ -368,8 +1007,12 @@ class MapController:
         coords = df[['latitude', 'longitude']].values
         
         # K-Meansクラスタリング
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-        df['cluster'] = kmeans.fit_predict(coords)
+        # scikit-learn は読み込みが重いため使用時に読み込む
+        from sklearn.cluster import KMeans
+        
+        with span('map.kmeans.compute', sites=len(df)):
+            kmeans = KMeans(n_clusters=n_clusters, random_state=42)
+            df['cluster'] = kmeans.fit_predict(coords)
         
         # クラスタ中心
         centers = kmeans.cluster_centers_
@@ -381,25 +1024,257 @@ class MapController:
             'inertia': kmeans.inertia_
         }
     
+    def compute_linkage(self, site_type: str = 'survey', method: str = 'ward',
+                        max_leaves: Optional[int] = None,
+                        aggregate: str = 'auto',
+                        distance: str = 'geographic') -> Dict[str, Any]:
+        """
+        階層的クラスタリングの結合（linkage）を計算
+        
+        地点数が max_leaves を超える場合は、距離行列（n² / 2 要素）が大きくなりすぎるため
+        調査地を親調査地ごとに集約（重心・群集の合計）するか、max_leaves 地点を無作為抽出して
+        結合を求め、残りの地点は最も近い抽出地点と同じ葉に割り当てる。
+        
+        群集の非類似度（distance が 'braycurtis' など）を使う場合、記録の無い地点は除く。
+        ward法はユークリッド距離を前提とするため、群集の非類似度には average法を推奨。
+        
+        Args:
+            site_type: 'survey' or 'parent'
+            method: 'ward', 'single', 'complete', 'average'
+            max_leaves: 結合を求める地点（葉）数の上限（Noneの場合は LINKAGE_MAX_LEAVES）
+            aggregate: 上限を超えた場合の扱い
+                       ('auto': 親調査地に集約し、なお超える場合は抽出,
+                        'parent': 親調査地に集約, 'sample': 抽出, 'none': エラー)
+            distance: 'geographic'（地理的距離, km） または BETA_METRICS の非類似度
+            
+        Returns:
+            Dict: sites（全地点）, leaves（葉。name, latitude, longitude, n_sites）,
+                  leaf_index（各地点の葉の番号）, linkage, aggregation（'none' / 'parent' / 'sample'）
+        """
+        if method not in self.LINKAGE_METHODS:
+            raise ValueError(f"結合方法が不正です: {method}")
+        if aggregate not in ('auto', 'parent', 'sample', 'none'):
+            raise ValueError(f"集約方法が不正です: {aggregate}")
+        if distance != 'geographic' and distance not in BETA_METRICS:
+            raise ValueError(f"距離の種類が不正です: {distance}")
+        max_leaves = max_leaves or self.LINKAGE_MAX_LEAVES
+        
+        if site_type == 'parent':
+            sql = """
+                SELECT id, name, latitude, longitude
+                FROM parent_sites
+                WHERE deleted_at IS NULL
+                ORDER BY name
+            """
+        else:
+            sql = """
+                SELECT ss.id, ss.name, ss.latitude, ss.longitude,
+                       ss.parent_site_id, ps.name AS parent_name
+                FROM survey_sites ss
+                LEFT JOIN parent_sites ps ON ss.parent_site_id = ps.id
+                WHERE ss.deleted_at IS NULL
+                ORDER BY ss.name
+            """
+        
+        with span('map.linkage.fetch'):
+            sites = pd.read_sql_query(sql, self.conn)
+            community = None
+            if distance != 'geographic':
+                sites, community = self._site_communities(sites, site_type)
+        
+        if len(sites) < 2:
+            raise ValueError("階層的クラスタリングには2地点以上が必要です")
+        
+        leaves = sites[['name', 'latitude', 'longitude']].assign(n_sites=1)
+        leaf_index = np.arange(len(sites))
+        aggregation = 'none'
+        
+        if len(sites) > max_leaves:
+            if aggregate == 'none':
+                raise ValueError(f"地点数（{len(sites):,}）が上限（{max_leaves:,}）を超えています")
+            
+            if site_type == 'survey' and aggregate in ('auto', 'parent'):
+                codes, uniques = pd.factorize(sites['parent_site_id'], sort=True)
+                if len(uniques) <= max_leaves or aggregate == 'parent':
+                    leaves = sites.groupby(codes).agg(
+                        name=('parent_name', 'first'),
+                        latitude=('latitude', 'mean'),
+                        longitude=('longitude', 'mean'),
+                        n_sites=('id', 'size')
+                    ).reset_index(drop=True)
+                    leaf_index = codes
+                    aggregation = 'parent'
+                    if community is not None:
+                        community = aggregate_community(community, codes, len(uniques))
+            
+            if aggregation == 'none':
+                # 無作為に抽出した地点で結合を求め、他の地点は最も近い抽出地点に割り当てる
+                rng = np.random.default_rng(42)
+                sample = np.sort(rng.choice(len(sites), size=max_leaves, replace=False))
+                if community is None:
+                    from scipy.spatial import cKDTree
+                    xyz = self._unit_vectors(sites['latitude'].values, sites['longitude'].values)
+                    _, leaf_index = cKDTree(xyz[sample]).query(xyz)
+                else:
+                    with span('map.linkage.assign', sites=len(sites), leaves=len(sample)):
+                        leaf_index = nearest_rows(community, community[sample], distance)
+                    community = community[sample]
+                leaves = sites.iloc[sample][['name', 'latitude', 'longitude']].reset_index(drop=True)
+                leaves['n_sites'] = np.bincount(leaf_index, minlength=len(sample))
+                aggregation = 'sample'
+        
+        if len(leaves) < 2:
+            raise ValueError("階層的クラスタリングには2地点以上が必要です")
+        
+        with span('map.linkage.compute', leaves=len(leaves), method=method, distance=distance):
+            if community is None:
+                condensed = self.condensed_distances(leaves['latitude'].values,
+                                                     leaves['longitude'].values)
+            else:
+                condensed = pairwise_dissimilarity(community, distance,
+                                                   n_jobs=self.BETA_N_JOBS)
+            linkage_matrix = linkage(condensed, method=method)
+        
+        return {
+            'sites': sites,
+            'leaves': leaves,
+            'leaf_index': np.asarray(leaf_index),
+            'linkage': linkage_matrix,
+            'aggregation': aggregation,
+        }
+    
+    def _site_communities(self, sites: pd.DataFrame,
+                          site_type: str) -> Tuple[pd.DataFrame, Any]:
+        """
+        地点の群集行列（疎行列）を地点の並びに合わせて取得
+        
+        親調査地の場合は配下の調査地の群集を合計する。記録の無い地点は除く。
+        
+        Args:
+            sites: 地点（id 列を持つ）
+            site_type: 'survey' or 'parent'
+            
+        Returns:
+            (sites, community): 記録のある地点と、その並びの群集行列
+        """
+        site_ids, _, community = fetch_community_matrix(self.conn)
+        
+        if site_type == 'parent':
+            cursor = self.conn.cursor()
+            cursor.row_factory = None
+            cursor.execute("SELECT id, parent_site_id FROM survey_sites")
+            parent_of = dict(cursor.fetchall())
+            parent_ids = np.array([parent_of.get(i) for i in site_ids.tolist()], dtype=object)
+            
+            # 親調査地の並び（sites の行番号）に合わせて合計
+            position = {parent_id: row for row, parent_id in enumerate(sites['id'].tolist())}
+            groups = np.array([position.get(p, -1) for p in parent_ids], dtype=np.int64)
+            keep = groups >= 0
+            community = aggregate_community(community[keep], groups[keep], len(sites))
+            has_records = np.diff(community.indptr) > 0
+            return sites[has_records].reset_index(drop=True), community[has_records]
+        
+        has_records = np.isin(sites['id'].values, site_ids)
+        sites = sites[has_records].reset_index(drop=True)
+        rows = np.searchsorted(site_ids, sites['id'].values)
+        return sites, community[rows]
+    
+    @traced('map.hierarchical')
+    def perform_hierarchical_clustering(self, n_clusters: Optional[int] = 3,
+                                        site_type: str = 'survey',
+                                        method: str = 'ward',
+                                        distance_threshold: Optional[float] = None,
+                                        max_leaves: Optional[int] = None,
+                                        aggregate: str = 'auto',
+                                        distance: str = 'geographic') -> Dict[str, Any]:
+        """
+        階層的クラスタリングを実行し、樹形図を切ってクラスタに分ける
+        
+        Args:
+            n_clusters: クラスタ数（distance_threshold を指定する場合は None）
+            site_type: 'survey' or 'parent'
+            method: 'ward', 'single', 'complete', 'average'
+            distance_threshold: この結合距離（km、群集の非類似度の場合は 0〜1）で切る
+            max_leaves: 結合を求める地点数の上限（compute_linkage を参照）
+            aggregate: 上限を超えた場合の扱い（compute_linkage を参照）
+            distance: 'geographic' または BETA_METRICS の非類似度（compute_linkage を参照）
+            
+        Returns:
+            Dict: data（全地点と 0 始まりの cluster 列）, n_clusters, linkage,
+                  leaves（葉と cluster 列）, aggregation
+        """
+        if (n_clusters is None) == (distance_threshold is None):
+            raise ValueError("クラスタ数と結合距離のどちらか一方を指定してください")
+        
+        result = self.compute_linkage(site_type, method, max_leaves, aggregate, distance)
+        sites, leaves = result['sites'], result['leaves']
+        
+        if n_clusters is not None and len(sites) < n_clusters:
+            raise ValueError(f"データ数（{len(sites)}）がクラスタ数（{n_clusters}）より少ないです")
+        
+        with span('map.hierarchical.cut'):
+            if n_clusters is not None:
+                leaf_clusters = fcluster(result['linkage'], n_clusters, criterion='maxclust')
+            else:
+                leaf_clusters = fcluster(result['linkage'], distance_threshold,
+                                         criterion='distance')
+            leaf_clusters = leaf_clusters - 1
+            leaves = leaves.assign(cluster=leaf_clusters)
+            sites = sites.assign(cluster=leaf_clusters[result['leaf_index']])
+        
+        return {
+            'data': sites,
+            'n_clusters': int(leaf_clusters.max()) + 1,
+            'linkage': result['linkage'],
+            'leaves': leaves,
+            'aggregation': result['aggregation'],
+        }
+    
+    @traced('map.cluster_map')
     def create_cluster_map(self, n_clusters: int = 3,
                           method: str = 'kmeans',
-                          site_type: str = 'survey') -> str:
+                          site_type: str = 'survey',
+                          use_cache: bool = True,
+                          distance: str = 'geographic') -> str:
         """
         クラスタリング結果を地図に表示
         
         Args:
             n_clusters: クラスタ数
-            method: 'kmeans' or 'dbscan'
+            method: 'kmeans', 'hierarchical'（ward法） or 'dbscan'
             site_type: 'survey' or 'parent'
+            use_cache: 条件とデータが同じ地図を生成済みであれば再利用する
+            distance: 階層的クラスタリングの距離（'geographic' または BETA_METRICS の非類似度）
             
         Returns:
             str: 生成されたHTMLファイルのパス
         """
+        cache_path = None
+        if use_cache:
+            # K-Means・地点の抽出は乱数を固定しているため、同じデータからは同じ地図になる
+            tables = ['parent_sites' if site_type == 'parent' else 'survey_sites']
+            if method == 'hierarchical' and distance != 'geographic':
+                tables += ['survey_sites', 'survey_events', 'ant_records']
+            cache_path = self._map_cache_path(f'cluster_map_{n_clusters}clusters', {
+                'method': method,
+                'site_type': site_type,
+                'distance': distance,
+            }, sorted(set(tables)))
+            if self._reuse_cached_map(cache_path):
+                return cache_path
+        
         # クラスタリング実行
         if method == 'kmeans':
             result = self.perform_kmeans_clustering(n_clusters, site_type)
             df = result['data']
             centers = result['centers']
+        elif method == 'hierarchical':
+            method_name = 'ward' if distance == 'geographic' else 'average'
+            result = self.perform_hierarchical_clustering(n_clusters, site_type, method_name,
+                                                          distance=distance)
+            df = result['data']
+            n_clusters = result['n_clusters']
+            centers = df.groupby('cluster')[['latitude', 'longitude']].mean().values
         else:
             # DBSCAN（今後実装）
             raise NotImplementedError("DBSCANは今後実装予定です")
@@ -412,77 +1287,225 @@ class MapController:
                  'darkred', 'lightred', 'beige', 'darkblue', 'darkgreen']
         
         # 各クラスタの地点をプロット
-        for cluster_id in range(n_clusters):
-            cluster_data = df[df['cluster'] == cluster_id]
-            color = colors[cluster_id % len(colors)]
-            
-            for _, site in cluster_data.iterrows():
-                folium.CircleMarker(
-                    location=[site['latitude'], site['longitude']],
-                    radius=8,
-                    popup=f"<b>{site['name']}</b><br>クラスタ {cluster_id + 1}",
-                    tooltip=f"{site['name']} (クラスタ {cluster_id + 1})",
-                    color=color,
-                    fill=True,
-                    fillColor=color,
-                    fillOpacity=0.7
+        with span('map.cluster_map.render', markers=len(df)):
+            for cluster_id in range(n_clusters):
+                cluster_data = df[df['cluster'] == cluster_id]
+                color = colors[cluster_id % len(colors)]
+                
+                for _, site in cluster_data.iterrows():
+                    folium.CircleMarker(
+                        location=[site['latitude'], site['longitude']],
+                        radius=8,
+                        popup=f"<b>{site['name']}</b><br>クラスタ {cluster_id + 1}",
+                        tooltip=f"{site['name']} (クラスタ {cluster_id + 1})",
+                        color=color,
+                        fill=True,
+                        fillColor=color,
+                        fillOpacity=0.7
+                    ).add_to(m)
+                
+                # クラスタ中心を表示
+                folium.Marker(
+                    location=[centers[cluster_id][0], centers[cluster_id][1]],
+                    popup=f"クラスタ {cluster_id + 1} 中心",
+                    icon=folium.Icon(color=color, icon='star', prefix='fa')
                 ).add_to(m)
-            
-            # クラスタ中心を表示
-            folium.Marker(
-                location=[centers[cluster_id][0], centers[cluster_id][1]],
-                popup=f"クラスタ {cluster_id + 1} 中心",
-                icon=folium.Icon(color=color, icon='star', prefix='fa')
-            ).add_to(m)
         
         # 保存
+        filepath = cache_path or self._timestamped_map_path(f'cluster_map_{n_clusters}clusters')
+        
+        with span('map.cluster_map.save'):
+            self._save_map(m, filepath)
+        
+        return filepath
+    
+    def _map_cache_path(self, prefix: str, options: Dict[str, Any],
+                        tables: List[str]) -> str:
+        """
+        地図の条件と元データの版数からキャッシュファイルのパスを決める
+        
+        ファイル名は「{prefix}_{条件のハッシュ}_{データ版数のハッシュ}.html」。
+        データベースのファイルと背景地図も条件に含め、別のDBやオンライン用の地図と
+        取り違えないようにする。
+        
+        Args:
+            prefix: ファイル名の接頭辞（地図の種類）
+            options: 地図の条件
+            tables: 地図の元データのテーブル
+            
+        Returns:
+            str: キャッシュファイルのパス
+        """
+        db_file = get_database_path(self.conn)
+        
+        # オフライン表示では保存済みのズーム範囲・静的ファイルでHTMLが変わる
+        tiles = self.tiles
+        if self.tile_server is not None:
+            info = self.tile_server.cache.get_info()
+            tiles = [self.tile_server.base_url, info['metadata'].get('maxzoom'), info['assets']]
+        
+        options_key = self._hash_key({
+            **options,
+            'database': os.path.abspath(db_file) if db_file else '',
+            'tiles': tiles,
+            'format': self.MAP_CACHE_FORMAT,
+            'folium': folium.__version__,
+        })
+        version_key = self._hash_key(self.versions.get_versions(tables))
+        return os.path.join(self.map_dir, f"{prefix}_{options_key}_{version_key}.html")
+    
+    @staticmethod
+    def _hash_key(value: Dict[str, Any]) -> str:
+        """辞書の内容から12桁のハッシュ文字列を作成"""
+        text = json.dumps(value, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+    
+    def _reuse_cached_map(self, cache_path: str) -> bool:
+        """
+        生成済みの地図があれば再利用する
+        
+        Args:
+            cache_path: キャッシュファイルのパス
+            
+        Returns:
+            bool: 再利用できたか
+        """
+        if not os.path.exists(cache_path):
+            return False
+        
+        # 最近使った地図を残すため、更新日時を使用時刻にする
+        os.utime(cache_path)
+        return True
+    
+    def _timestamped_map_path(self, prefix: str) -> str:
+        """キャッシュを使わない場合の日時付きファイルパス"""
         from datetime import datetime
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"cluster_map_{n_clusters}clusters_{timestamp}.html"
-        filepath = os.path.join(self.map_dir, filename)
+        return os.path.join(self.map_dir, f"{prefix}_{timestamp}.html")
+    
+    def _save_map(self, m: folium.Map, filepath: str) -> None:
+        """
+        地図を保存し、キャッシュファイルの場合は古い地図を削除
         
-        m.save(filepath)
+        書き込み途中のファイルを開かないよう、一時ファイルに書いてから置き換える。
+        オフライン表示では、外部の JavaScript / CSS の参照をローカルサーバーに向ける。
         
-        return filepath
+        Args:
+            m: 地図オブジェクト
+            filepath: 保存先
+        """
+        temp_path = filepath + '.tmp'
+        if self.tile_server is not None:
+            html = self.tile_server.localize_html(m.get_root().render())
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(html)
+        else:
+            m.save(temp_path)
+        os.replace(temp_path, filepath)
+        
+        match = _MAP_CACHE_FILE.match(os.path.basename(filepath))
+        if match:
+            self._evict_cached_maps(match.group(1), match.group(2), filepath)
     
+    def _evict_cached_maps(self, prefix: str, options_key: str, keep: str) -> int:
+        """
+        古いキャッシュファイルを削除
+        
+        同じ条件で古いデータ版数の地図を削除し、さらにキャッシュ全体が
+        MAP_CACHE_MAX_FILES を超える分を使用日時の古い順に削除する。
+        日時付きのファイル名（キャッシュを使わずに生成した地図）は削除しない。
+        
+        Args:
+            prefix: ファイル名の接頭辞
+            options_key: 条件のハッシュ
+            keep: 残すファイル（今回生成した地図）のパス
+            
+        Returns:
+            int: 削除したファイル数
+        """
+        cached = []
+        for filename in os.listdir(self.map_dir):
+            match = _MAP_CACHE_FILE.match(filename)
+            path = os.path.join(self.map_dir, filename)
+            if not match or os.path.abspath(path) == os.path.abspath(keep):
+                continue
+            if match.group(1) == prefix and match.group(2) == options_key:
+                cached.append((0.0, path))  # 同じ条件の古い版数は必ず削除
+            else:
+                cached.append((os.path.getmtime(path), path))
+        
+        cached.sort()
+        n_remove = sum(1 for mtime, _ in cached if mtime == 0.0)
+        n_remove = max(n_remove, len(cached) + 1 - self.MAP_CACHE_MAX_FILES)
+        
+        removed = 0
+        for _, path in cached[:n_remove]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass  # 開いている等で削除できない場合は次回に回す
+        return removed
+    
+    @traced('map.dendrogram')
     def create_dendrogram(self, site_type: str = 'survey',
-                         method: str = 'ward') -> plt.Figure:
+                         method: str = 'ward',
+                         truncate_lastp: Optional[int] = None,
+                         max_leaves: Optional[int] = None,
+                         distance: str = 'geographic') -> 'Figure':
         """
         階層的クラスタリングの樹形図を作成
         
         Args:
             site_type: 'survey' or 'parent'
             method: 'ward', 'single', 'complete', 'average'
+            truncate_lastp: 最後に結合する p 個のまとまりだけを表示
+                            （Noneの場合、葉が DENDROGRAM_MAX_LEAVES を超えると自動で省略）
+            max_leaves: 結合を求める地点数の上限（compute_linkage を参照）
+            distance: 'geographic' または BETA_METRICS の非類似度
             
         Returns:
             Figure: matplotlibのFigureオブジェクト
         """
-        # 距離行列を取得
-        dist_df = self.get_distance_matrix(site_type)
-        
-        if dist_df.empty:
-            raise ValueError("データがありません")
+        # 階層的クラスタリング（距離は上三角の配列で直接計算）
+        result = self.compute_linkage(site_type, method, max_leaves, distance=distance)
+        leaves = result['leaves']
         
-        # 階層的クラスタリング
-        condensed_dist = squareform(dist_df.values)
-        linkage_matrix = linkage(condensed_dist, method=method)
+        if truncate_lastp is None and len(leaves) > self.DENDROGRAM_MAX_LEAVES:
+            truncate_lastp = self.DENDROGRAM_TRUNCATE_LASTP
         
         # 樹形図作成
-        fig, ax = plt.subplots(figsize=(12, 8))
-        
-        dendrogram(
-            linkage_matrix,
-            labels=dist_df.index.tolist(),
-            ax=ax,
-            orientation='right',
-            leaf_font_size=10
-        )
-        
-        ax.set_xlabel('距離 (km)', fontsize=12)
-        ax.set_title(f'階層的クラスタリング樹形図 ({method}法)', 
-                    fontsize=14, fontweight='bold')
-        
-        plt.tight_layout()
+        with span('map.dendrogram.render'):
+            fig, ax = create_figure(figsize=(12, 8))
+            
+            options = {}
+            if truncate_lastp is not None and truncate_lastp < len(leaves):
+                # 省略したまとまりは葉の数を (n) で表示する
+                options = {'truncate_mode': 'lastp', 'p': truncate_lastp,
+                           'show_contracted': True}
+            
+            dendrogram(
+                result['linkage'],
+                labels=leaves['name'].tolist(),
+                ax=ax,
+                orientation='right',
+                leaf_font_size=10,
+                **options
+            )
+            
+            title = f'階層的クラスタリング樹形図 ({method}法)'
+            if result['aggregation'] == 'parent':
+                title += f'\n調査地{len(result["sites"]):,}地点を親調査地{len(leaves):,}件に集約'
+            elif result['aggregation'] == 'sample':
+                title += f'\n{len(result["sites"]):,}地点から{len(leaves):,}地点を抽出'
+            
+            if distance == 'geographic':
+                ax.set_xlabel('距離 (km)', fontsize=12)
+            else:
+                ax.set_xlabel(f'{BETA_METRIC_LABELS[distance]} 非類似度', fontsize=12)
+            ax.set_title(title, fontsize=14, fontweight='bold')
+            
+            finalize_figure(fig)
         
         return fig
     
@@ -0,0 +1,547 @@
+"""
+群集の序列化（PCoA / NMDS）・Mantel検定コントローラー
+"""
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Any
+from models.data_version import DataVersion
+from utils.background_query import get_database_path
+from utils.beta_diversity import (BETA_METRICS, BETA_METRIC_LABELS, aggregate_community,
+                                  fetch_community_matrix, pairwise_dissimilarity)
+from utils.figure_utils import create_figure, finalize_figure
+from utils.mantel import mantel
+from utils.ordination import PCOA_EXACT_MAX_SITES, fit_vectors, nmds, pcoa
+from utils.perf_trace import span, traced
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+
+class OrdinationController:
+    """群集解析（序列化・Mantel検定）管理クラス"""
+    
+    # 序列化の方法
+    ORDINATION_METHODS = ('pcoa', 'nmds')
+    
+    # NMDS を計算する地点数の上限（1回の反復が地点数の2乗に比例するため）
+    NMDS_MAX_SITES = 1000
+    
+    # PCoA を計算する地点数の上限（condensed 配列が float32 で約0.8GB）
+    PCOA_MAX_SITES = 20000
+    
+    # Mantel 検定の地点数の上限（並べ替え1回ごとに地点数の2乗の要素を読むため）
+    MANTEL_MAX_SITES = 3000
+    
+    # Mantel 検定に使う距離と表示ラベル（群集の非類似度・地理的距離・植生の距離）
+    MANTEL_DISTANCE_LABELS = {
+        **BETA_METRIC_LABELS,
+        'geographic': '地理的距離',
+        'vegetation': '植生の距離',
+    }
+    
+    # 得点のキャッシュの形式の版数（保存内容を変えたら上げる）
+    CACHE_FORMAT = 1
+    
+    # キャッシュとして残すファイル数の上限（使用日時の古い順に削除）
+    CACHE_MAX_FILES = 20
+    
+    # 得点が依存するテーブル（調査地×種 集計テーブルは調査イベント・記録から作られる）
+    CACHE_TABLES = ['survey_sites', 'survey_events', 'ant_records']
+    
+    # 当てはめる植生の変数と表示ラベル
+    VEGETATION_VARIABLES = {
+        'basal_area': '胸高断面積',
+        'avg_tree_height': '平均樹高',
+        'avg_herb_height': '平均草丈',
+        'soil_temperature': '地温',
+        'canopy_coverage': '樹冠被度',
+        'sasa_coverage': 'ササ被度',
+        'herb_coverage': '草本被度',
+        'litter_coverage': 'リター被度',
+        'light_condition': '光条件',
+        'soil_moisture': '土湿条件',
+        'vegetation_complexity': '植生複雑度',
+    }
+    
+    def __init__(self, db_connection, cache_dir: Optional[str] = None):
+        """
+        初期化
+        
+        Args:
+            db_connection: データベース接続
+            cache_dir: 得点のキャッシュの保存先
+                       （Noneの場合はデータベースと同じ場所の ordination_cache。
+                        既定の data/ordination_cache は .gitignore で除外している。
+                        メモリ上のデータベースではキャッシュしない）
+        """
+        self.conn = db_connection
+        self.versions = DataVersion(db_connection)
+        
+        db_file = get_database_path(db_connection)
+        if cache_dir is None and db_file:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(db_file)), 'ordination_cache')
+        self.cache_dir = cache_dir
+        self._db_file = db_file
+    
+    @traced('ordination.compute')
+    def compute_ordination(self, method: str = 'pcoa', metric: str = 'braycurtis',
+                           site_type: str = 'survey', n_components: int = 2,
+                           n_init: int = 10, n_jobs: Optional[int] = -1,
+                           use_cache: bool = True) -> Dict[str, Any]:
+        """
+        調査地の群集を序列化
+        
+        pcoa: 非類似度行列の固有分解（PCOA_EXACT_MAX_SITES 地点を超える場合はランダム化固有分解）
+        nmds: PCoA の得点と無作為な配置を初期値に非計量 SMACOF を並列に実行し、
+              stress が最小の配置を採用する
+        
+        得点はデータ版数と条件ごとにファイルへ保存し、データが変わるまで再利用する。
+        
+        Args:
+            method: 'pcoa' / 'nmds'
+            metric: 'braycurtis' / 'jaccard' / 'sorensen'
+            site_type: 'survey'（調査地） or 'parent'（親調査地。配下の群集を合計）
+            n_components: 軸の数
+            n_init: NMDS の初期配置の数
+            n_jobs: 並列数（-1 は全コア）
+            use_cache: 条件とデータが同じ得点を計算済みであれば再利用する
+        
+        Returns:
+            Dict: method, metric, site_type, sites（id, name, 軸1… のデータフレーム）, scores,
+                  pcoa は eigenvalues と explained（寄与率）, nmds は stress と stresses, cached
+        """
+        if method not in self.ORDINATION_METHODS:
+            raise ValueError(f"序列化の方法が不正です: {method}")
+        if metric not in BETA_METRICS:
+            raise ValueError(f"非類似度の指標が不正です: {metric}")
+        if site_type not in ('survey', 'parent'):
+            raise ValueError(f"地点の種類が不正です: {site_type}")
+        
+        options = {
+            'method': method, 'metric': metric, 'site_type': site_type,
+            'n_components': n_components,
+            'n_init': n_init if method == 'nmds' else None,
+        }
+        cache_path = self._cache_path(options) if use_cache else None
+        
+        with span('ordination.fetch', site_type=site_type):
+            sites, community = self._site_communities(site_type)
+        
+        if len(sites) < n_components + 2:
+            raise ValueError(f"序列化には記録のある地点が{n_components + 2}地点以上必要です")
+        limit = self.NMDS_MAX_SITES if method == 'nmds' else self.PCOA_MAX_SITES
+        if len(sites) > limit:
+            hint = "親調査地単位にするか、PCoA を使用してください" if method == 'nmds' \
+                else "親調査地単位にしてください"
+            raise ValueError(f"地点数（{len(sites):,}）が{method.upper()}の上限（{limit:,}）を"
+                             f"超えています。{hint}")
+        
+        result = self._load_cache(cache_path, sites['id'].values)
+        cached = result is not None
+        if not cached:
+            result = self._compute(community, method, metric, n_components, n_init, n_jobs)
+            self._save_cache(cache_path, sites['id'].values, result)
+        
+        axis_names = [f'軸{axis + 1}' for axis in range(result['scores'].shape[1])]
+        sites = pd.concat([sites, pd.DataFrame(result['scores'], columns=axis_names)], axis=1)
+        return {'method': method, 'metric': metric, 'site_type': site_type,
+                'sites': sites, **result, 'cached': cached}
+    
+    def _compute(self, community, method: str, metric: str, n_components: int,
+                 n_init: int, n_jobs: Optional[int]) -> Dict[str, np.ndarray]:
+        """非類似度を求めて序列化を計算（キャッシュを使わない）"""
+        n = community.shape[0]
+        # ランダム化固有分解では condensed 配列しか保持しないため、単精度でメモリを半分にする
+        dtype = np.float32 if n > PCOA_EXACT_MAX_SITES else np.float64
+        with span('ordination.dissimilarity', sites=n, metric=metric):
+            condensed = pairwise_dissimilarity(community, metric, dtype=dtype, n_jobs=n_jobs)
+        
+        with span('ordination.pcoa', sites=n):
+            result = pcoa(condensed, n_components=n_components)
+        if method == 'pcoa':
+            return result
+        
+        with span('ordination.nmds', sites=n, starts=n_init):
+            return nmds(condensed, n_components=n_components, n_init=n_init,
+                        n_jobs=n_jobs, init=result['scores'])
+    
+    def _site_communities(self, site_type: str):
+        """
+        記録のある地点と、その並びの群集行列（疎行列）を取得
+        
+        Args:
+            site_type: 'survey' or 'parent'
+        
+        Returns:
+            (sites, community): id, name 列を持つ地点と群集行列
+        """
+        site_ids, _, community = fetch_community_matrix(self.conn)
+        
+        if site_type == 'survey':
+            names = pd.read_sql_query("""
+                SELECT ss.id, ss.name || ' (' || ps.name || ')' AS name
+                FROM survey_sites ss
+                JOIN parent_sites ps ON ss.parent_site_id = ps.id
+            """, self.conn)
+            sites = pd.DataFrame({'id': site_ids}).merge(names, on='id', how='left')
+            return sites, community
+        
+        parents = pd.read_sql_query("""
+            SELECT ss.id AS survey_site_id, ps.id, ps.name
+            FROM survey_sites ss
+            JOIN parent_sites ps ON ss.parent_site_id = ps.id
+            WHERE ps.deleted_at IS NULL
+        """, self.conn)
+        rows = pd.DataFrame({'survey_site_id': site_ids}).merge(
+            parents, on='survey_site_id', how='left')
+        keep = rows['id'].notna().values
+        codes, uniques = pd.factorize(rows.loc[keep, 'id'].astype(np.int64), sort=True)
+        community = aggregate_community(community[keep], codes, len(uniques))
+        sites = pd.DataFrame({'id': np.asarray(uniques)}).merge(
+            parents.drop_duplicates('id')[['id', 'name']], on='id', how='left')
+        return sites, community
+    
+    def _cache_path(self, options: Dict[str, Any]) -> Optional[str]:
+        """
+        条件とデータ版数からキャッシュファイルのパスを作成
+        
+        ファイル名は ordination_{条件のハッシュ}_{データ版数のハッシュ}.npz。
+        
+        Returns:
+            str: キャッシュファイルのパス（キャッシュしない場合は None）
+        """
+        if not self.cache_dir:
+            return None
+        options_key = self._hash_key({**options, 'database': os.path.abspath(self._db_file)
+                                      if self._db_file else '', 'format': self.CACHE_FORMAT})
+        version_key = self._hash_key(self.versions.get_versions(self.CACHE_TABLES))
+        return os.path.join(self.cache_dir, f"ordination_{options_key}_{version_key}.npz")
+    
+    @staticmethod
+    def _hash_key(value: Dict[str, Any]) -> str:
+        """辞書の内容から12桁のハッシュ文字列を作成"""
+        text = json.dumps(value, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+    
+    @staticmethod
+    def _load_cache(cache_path: Optional[str],
+                    site_ids: np.ndarray) -> Optional[Dict[str, np.ndarray]]:
+        """
+        キャッシュから得点を読み込む
+        
+        地点の並びが一致しない場合（版数の管理外で変わった場合）は使わない。
+        
+        Returns:
+            Dict: 保存した計算結果（無い場合は None）
+        """
+        if cache_path is None or not os.path.exists(cache_path):
+            return None
+        try:
+            with np.load(cache_path) as data:
+                if not np.array_equal(data['site_ids'], site_ids):
+                    return None
+                result = {key: data[key] if data[key].ndim else data[key].item()
+                          for key in data.files if key != 'site_ids'}
+        except (OSError, ValueError, KeyError):
+            return None  # 壊れたファイルは計算し直して上書きする
+        
+        # 最近使った結果を残すため、更新日時を使用時刻にする
+        os.utime(cache_path)
+        return result
+    
+    def _save_cache(self, cache_path: Optional[str], site_ids: np.ndarray,
+                    result: Dict[str, np.ndarray]) -> None:
+        """
+        得点をキャッシュに保存し、古いキャッシュを削除
+        
+        書き込み途中のファイルを読まないよう、一時ファイルに書いてから置き換える。
+        """
+        if cache_path is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = cache_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(f, site_ids=site_ids, **result)
+        os.replace(temp_path, cache_path)
+        self._evict_cache(cache_path)
+    
+    def _evict_cache(self, keep: str) -> int:
+        """
+        古いキャッシュファイルを削除
+        
+        同じ条件で古いデータ版数の結果を削除し、さらに CACHE_MAX_FILES を超える分を
+        使用日時の古い順に削除する。
+        
+        Args:
+            keep: 残すファイル（今回保存した結果）のパス
+        
+        Returns:
+            int: 削除したファイル数
+        """
+        options_key = os.path.basename(keep).split('_')[1]
+        cached = []
+        for filename in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, filename)
+            if not (filename.startswith('ordination_') and filename.endswith('.npz')) \
+                    or os.path.abspath(path) == os.path.abspath(keep):
+                continue
+            if filename.split('_')[1] == options_key:
+                cached.append((0.0, path))  # 同じ条件の古い版数は必ず削除
+            else:
+                cached.append((os.path.getmtime(path), path))
+        
+        cached.sort()
+        n_remove = sum(1 for mtime, _ in cached if mtime == 0.0)
+        n_remove = max(n_remove, len(cached) + 1 - self.CACHE_MAX_FILES)
+        
+        removed = 0
+        for _, path in cached[:n_remove]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass  # 開いている等で削除できない場合は次回に回す
+        return removed
+    
+    @traced('ordination.vegetation')
+    def get_site_vegetation(self, site_type: str = 'survey') -> pd.DataFrame:
+        """
+        地点ごとの植生の平均値を取得
+        
+        Args:
+            site_type: 'survey'（調査イベントの平均） or 'parent'（配下の調査イベントの平均）
+        
+        Returns:
+            DataFrame: id 列と VEGETATION_VARIABLES の列
+        """
+        group_column = 'se.survey_site_id' if site_type == 'survey' else 'ss.parent_site_id'
+        averages = ',\n'.join(f'AVG(vd.{column}) AS {column}'
+                              for column in self.VEGETATION_VARIABLES)
+        sql = f"""
+            SELECT {group_column} AS id,
+                   {averages}
+            FROM vegetation_data vd
+            JOIN survey_events se ON vd.survey_event_id = se.id
+            JOIN survey_sites ss ON se.survey_site_id = ss.id
+            WHERE vd.deleted_at IS NULL
+            AND se.deleted_at IS NULL
+            GROUP BY {group_column}
+        """
+        return pd.read_sql_query(sql, self.conn)
+    
+    @traced('ordination.fit_vectors')
+    def fit_vegetation_vectors(self, ordination: Dict[str, Any],
+                               permutations: int = 999) -> pd.DataFrame:
+        """
+        植生の変数を序列化の得点に当てはめる
+        
+        Args:
+            ordination: compute_ordination の戻り値
+            permutations: p 値を求める並べ替えの回数
+        
+        Returns:
+            DataFrame: variable, label, 軸ごとの向き, r2, p_value, n
+                       （当てはめられない変数は r2 が NaN）
+        """
+        sites = ordination['sites']
+        vegetation = sites[['id']].merge(self.get_site_vegetation(ordination['site_type']),
+                                         on='id', how='left')
+        columns = list(self.VEGETATION_VARIABLES)
+        
+        with span('ordination.fit_vectors.compute', sites=len(sites), permutations=permutations):
+            fitted = fit_vectors(ordination['scores'], vegetation[columns].to_numpy(dtype=np.float64),
+                                 permutations=permutations)
+        
+        axis_names = [f'軸{axis + 1}' for axis in range(ordination['scores'].shape[1])]
+        vectors = pd.DataFrame(fitted['directions'], columns=axis_names)
+        vectors.insert(0, 'variable', columns)
+        vectors.insert(1, 'label', [self.VEGETATION_VARIABLES[c] for c in columns])
+        vectors['r2'] = fitted['r2']
+        vectors['p_value'] = fitted['p_values']
+        vectors['n'] = fitted['n']
+        return vectors
+    
+    @traced('ordination.plot')
+    def create_ordination_plot(self, ordination: Dict[str, Any],
+                               vectors: Optional[pd.DataFrame] = None,
+                               alpha: float = 0.05) -> 'Figure':
+        """
+        序列化の得点の散布図を作成（植生のベクトルを重ねる）
+        
+        ベクトルは p 値が alpha 未満の変数のみ描き、長さを √r² に比例させる。
+        
+        Args:
+            ordination: compute_ordination の戻り値
+            vectors: fit_vegetation_vectors の戻り値（Noneの場合はベクトルを描かない）
+            alpha: ベクトルを描く有意水準
+        
+        Returns:
+            Figure: matplotlibのFigureオブジェクト
+        """
+        method = ordination['method']
+        metric_label = BETA_METRIC_LABELS[ordination['metric']]
+        scores = ordination['scores']
+        
+        with span('ordination.plot.render', sites=len(scores)):
+            fig, ax = create_figure(figsize=(9, 7))
+            
+            size = 40 if len(scores) <= 300 else max(4, 12000 / len(scores))
+            ax.scatter(scores[:, 0], scores[:, 1], s=size, alpha=0.6,
+                       color='steelblue', edgecolors='none')
+            
+            if method == 'pcoa':
+                explained = ordination['explained']
+                ax.set_xlabel(f'PCoA 軸1（{explained[0]:.1%}）', fontsize=12)
+                ax.set_ylabel(f'PCoA 軸2（{explained[1]:.1%}）', fontsize=12)
+                subtitle = f'{len(scores):,}地点'
+            else:
+                ax.set_xlabel('NMDS 軸1', fontsize=12)
+                ax.set_ylabel('NMDS 軸2', fontsize=12)
+                subtitle = f'{len(scores):,}地点  stress = {ordination["stress"]:.3f}'
+            
+            if vectors is not None:
+                significant = vectors[vectors['p_value'] < alpha]
+                # 最も長いベクトルが得点の広がりの8割に届くよう拡大する
+                spread = np.abs(scores[:, :2]).max(axis=0).min()
+                scale = 0.8 * spread / max(np.sqrt(significant['r2']).max(), 1e-12) \
+                    if len(significant) else 0
+                for _, row in significant.iterrows():
+                    length = np.sqrt(row['r2']) * scale
+                    dx, dy = row['軸1'] * length, row['軸2'] * length
+                    ax.annotate('', xy=(dx, dy), xytext=(0, 0),
+                                arrowprops=dict(arrowstyle='->', color='firebrick', lw=1.5))
+                    ax.text(dx * 1.08, dy * 1.08, row['label'], color='firebrick',
+                            fontsize=10, ha='center', va='center')
+                if len(significant):
+                    subtitle += f'  植生ベクトル p < {alpha:g}'
+            
+            ax.axhline(0, color='gray', linewidth=0.5, alpha=0.5)
+            ax.axvline(0, color='gray', linewidth=0.5, alpha=0.5)
+            ax.set_title(f'{method.upper()}（{metric_label}）\n{subtitle}', fontsize=14)
+            ax.grid(True, alpha=0.3)
+            finalize_figure(fig)
+        
+        return fig
+    
+    @traced('ordination.mantel')
+    def mantel_test(self, x: str = 'braycurtis', y: str = 'geographic',
+                    z: Optional[str] = None, site_type: str = 'survey',
+                    method: str = 'pearson', permutations: int = 999,
+                    alternative: str = 'greater', n_jobs: Optional[int] = -1,
+                    progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        2つの距離の相関を Mantel 検定（z を指定した場合は部分 Mantel 検定）で調べる
+        
+        距離は MANTEL_DISTANCE_LABELS のいずれか。
+        geographic: 調査地（親調査地）の大円距離（km）
+        vegetation: 地点ごとの植生の平均値を標準化したユークリッド距離
+                    （全地点で値の無い変数は除き、欠損のある地点は検定から除く）
+        
+        Args:
+            x: 並べ替える距離（通常は群集の非類似度）
+            y: 比較する距離
+            z: 影響を除く距離（Noneの場合は通常の Mantel 検定）
+            site_type: 'survey' or 'parent'
+            method: 'pearson' / 'spearman'
+            permutations: 並べ替えの回数
+            alternative: 'greater' / 'less' / 'two-sided'
+            n_jobs: 並列数（-1 は全コア）
+            progress: 進捗コールバック (計算済みの並べ替え回数, 全回数)
+            
+        Returns:
+            Dict: r, p_value, distribution, n, method, x, y, z, permutations
+        """
+        names = [name for name in (x, y, z) if name is not None]
+        for name in names:
+            if name not in self.MANTEL_DISTANCE_LABELS:
+                raise ValueError(f"距離の種類が不正です: {name}")
+        if len(set(names)) < len(names):
+            raise ValueError("異なる距離を指定してください")
+        if site_type not in ('survey', 'parent'):
+            raise ValueError(f"地点の種類が不正です: {site_type}")
+        
+        with span('ordination.mantel.fetch', site_type=site_type):
+            sites, community = self._site_communities(site_type)
+            keep = np.ones(len(sites), dtype=bool)
+            
+            if 'geographic' in names:
+                table = 'survey_sites' if site_type == 'survey' else 'parent_sites'
+                coordinates = sites[['id']].merge(pd.read_sql_query(
+                    f"SELECT id, latitude, longitude FROM {table}", self.conn),
+                    on='id', how='left')
+                keep &= coordinates[['latitude', 'longitude']].notna().all(axis=1).values
+            
+            if 'vegetation' in names:
+                vegetation = sites[['id']].merge(self.get_site_vegetation(site_type),
+                                                 on='id', how='left')
+                vegetation = vegetation[list(self.VEGETATION_VARIABLES)].dropna(axis=1, how='all')
+                if vegetation.shape[1] == 0:
+                    raise ValueError("植生データがありません")
+                keep &= vegetation.notna().all(axis=1).values
+        
+        if keep.sum() < 3:
+            raise ValueError("Mantel検定には距離を計算できる地点が3地点以上必要です")
+        if keep.sum() > self.MANTEL_MAX_SITES:
+            raise ValueError(f"地点数（{keep.sum():,}）がMantel検定の上限"
+                             f"（{self.MANTEL_MAX_SITES:,}）を超えています。親調査地単位にしてください")
+        
+        distances = {}
+        with span('ordination.mantel.distances', sites=int(keep.sum())):
+            for name in names:
+                if name == 'geographic':
+                    from controllers.map_controller import MapController
+                    distances[name] = MapController.condensed_distances(
+                        coordinates['latitude'].values[keep], coordinates['longitude'].values[keep])
+                elif name == 'vegetation':
+                    from scipy.spatial.distance import pdist
+                    values = vegetation.values[keep]
+                    std = values.std(axis=0)
+                    values = (values - values.mean(axis=0)) / np.where(std > 0, std, 1)
+                    distances[name] = pdist(values)
+                else:
+                    distances[name] = pairwise_dissimilarity(community[keep], name, n_jobs=n_jobs)
+        
+        with span('ordination.mantel.permutations', sites=int(keep.sum()),
+                  permutations=permutations):
+            result = mantel(distances[x], distances[y], distances.get(z), method=method,
+                            permutations=permutations, alternative=alternative,
+                            n_jobs=n_jobs, progress=progress)
+        
+        return {**result, 'x': x, 'y': y, 'z': z, 'permutations': permutations}
+    
+    @traced('ordination.mantel_plot')
+    def create_mantel_plot(self, result: Dict[str, Any]) -> 'Figure':
+        """
+        Mantel 検定の並べ替え分布のヒストグラムを作成
+        
+        Args:
+            result: mantel_test の戻り値
+            
+        Returns:
+            Figure: matplotlibのFigureオブジェクト
+        """
+        labels = self.MANTEL_DISTANCE_LABELS
+        title = f"{labels[result['x']]} と {labels[result['y']]}"
+        if result['z'] is not None:
+            title += f"（{labels[result['z']]}の影響を除く）"
+        
+        with span('ordination.mantel_plot.render'):
+            fig, ax = create_figure(figsize=(9, 6))
+            
+            ax.hist(result['distribution'], bins=50, color='steelblue', alpha=0.7,
+                    label=f"並べ替え（{result['permutations']:,}回）")
+            ax.axvline(result['r'], color='firebrick', linewidth=2,
+                       label=f"観測値 r = {result['r']:.3f}")
+            
+            ax.set_xlabel('Mantel 統計量 r', fontsize=12)
+            ax.set_ylabel('頻度', fontsize=12)
+            ax.set_title(f"{title}\n{result['n']:,}地点  p = {result['p_value']:.4f}",
+                         fontsize=14)
+            ax.grid(True, alpha=0.3)
+            ax.legend()
+            finalize_figure(fig)
+        
+        return fig
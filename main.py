@@ -15,6 +15,8 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from models.database import Database
 from views.main_window import MainWindow
 from utils.sample_data import generate_sample_data
+from utils.query_profiler import create_query_profiler
+from utils import perf_trace
 
 
 def load_config():
@@ -44,7 +46,10 @@ def initialize_database(config):
     backup_dir = config.get('Database', 'backup_dir', fallback='backups')
     auto_backup = config.getboolean('Database', 'auto_backup', fallback=True)
     
-    db = Database(db_path)
+    # SQLの実行時間計測・スロークエリログ（[Logging] query_profiling）
+    query_profiler = create_query_profiler(config)
+    
+    db = Database(db_path, query_profiler=query_profiler)
     
     # データベースファイルが存在するかチェック
     db_exists = Path(db_path).exists()
@@ -93,6 +98,10 @@ def main():
         # 設定読み込み
         config = load_config()
         
+        # 処理時間のトレース（[Logging] perf_tracing）
+        if perf_trace.configure(config):
+            print("✓ 処理時間のトレースを有効化しました")
+        
         # データベース初期化
         db = initialize_database(config)
         
@@ -310,11 +310,10 @@ class AntRecord:
         cursor = self.conn.cursor()
         cursor.execute("""
             SELECT 
-                COUNT(DISTINCT ar.species_id) as species_count,
-                SUM(ar.count) as total_individuals
-            FROM ant_records ar
-            JOIN survey_events se ON ar.survey_event_id = se.id
-            WHERE se.survey_site_id = ? AND ar.deleted_at IS NULL
+                COUNT(*) as species_count,
+                SUM(total_count) as total_individuals
+            FROM site_species_summary
+            WHERE survey_site_id = ?
         """, (survey_site_id,))
         
         row = cursor.fetchone()
@@ -0,0 +1,126 @@
+"""
+データ版数（テーブルごとの変更カウンタ）モデル
+
+各テーブルの行の追加・更新・削除をトリガーで数え、テーブルごとの版数として保持する。
+地図HTMLなど、データから生成した成果物のキャッシュの有効性判定に使う。
+版数は比較のための値で、変更件数そのものを表すとは限らない
+（トリガーを外して一括投入した後は bump() で1つ進める）。
+"""
+import sqlite3
+from typing import Dict, Iterable, Optional
+
+from models.export_checkpoint import TRACKED_TABLES
+
+
+def _trigger_sql(table: str, event: str) -> str:
+    """
+    テーブルの版数を1つ進めるトリガーのSQLを生成
+
+    Args:
+        table: 対象テーブル名
+        event: 'INSERT' / 'UPDATE' / 'DELETE'
+
+    Returns:
+        str: CREATE TRIGGER 文
+    """
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_version_{table}_{event.lower()}
+        AFTER {event} ON {table}
+        BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';
+        END
+    """
+
+
+class DataVersion:
+    """データ版数モデルクラス"""
+
+    def __init__(self, db_connection):
+        """
+        初期化
+
+        Args:
+            db_connection: データベース接続オブジェクト
+        """
+        self.conn = db_connection
+        self._ensure_schema_exists()
+
+    @staticmethod
+    def create_schema(cursor) -> None:
+        """
+        版数テーブルとトリガーを作成
+
+        Args:
+            cursor: データベースカーソル
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS data_versions (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
+        cursor.executemany("""
+            INSERT OR IGNORE INTO data_versions (table_name, version) VALUES (?, 0)
+        """, [(table,) for table in TRACKED_TABLES])
+
+        for table in TRACKED_TABLES:
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(_trigger_sql(table, event))
+
+    def _ensure_schema_exists(self) -> None:
+        """
+        既存DBにテーブルとトリガーが無ければ作成する
+        """
+        cursor = self.conn.cursor()
+        try:
+            self.create_schema(cursor)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+    def get_versions(self, tables: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        テーブルごとの版数を取得
+
+        Args:
+            tables: 対象テーブル名（Noneの場合は全て）
+
+        Returns:
+            Dict: テーブル名 -> 版数
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT table_name, version FROM data_versions")
+        versions = {row[0]: row[1] for row in cursor.fetchall()}
+
+        if tables is None:
+            return versions
+
+        unknown = [table for table in tables if table not in versions]
+        if unknown:
+            raise ValueError(f"版数を管理していないテーブルです: {', '.join(unknown)}")
+        return {table: versions[table] for table in tables}
+
+    def bump(self, tables: Optional[Iterable[str]] = None) -> None:
+        """
+        トリガーを通さずに変更したテーブルの版数を進める
+
+        Args:
+            tables: 対象テーブル名（Noneの場合は全て）
+        """
+        cursor = self.conn.cursor()
+        try:
+            if tables is None:
+                cursor.execute("UPDATE data_versions SET version = version + 1")
+            else:
+                cursor.executemany("""
+                    UPDATE data_versions SET version = version + 1 WHERE table_name = ?
+                """, [(table,) for table in tables])
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+
+# エクスポート補助: モジュールから DataVersion を明示的にエクスポート
+__all__ = ["DataVersion"]
@@ -7,18 +7,25 @@ from datetime import datetime
 from pathlib import Path
 import shutil
 
+from models.site_species_summary import SiteSpeciesSummary
+from models.export_checkpoint import ExportCheckpoint
+from models.data_version import DataVersion
+from utils.query_profiler import connect as connect_database
+
 
 class Database:
     """データベース管理クラス"""
     
-    def __init__(self, db_path='data/ant_database.db'):
+    def __init__(self, db_path='data/ant_database.db', query_profiler=None):
         """
         初期化
         
         Args:
             db_path: データベースファイルのパス
+            query_profiler: クエリプロファイラ（指定時はSQLの実行時間を計測）
         """
         self.db_path = db_path
+        self.query_profiler = query_profiler
         self._ensure_directory()
         self.conn = None
         
@@ -30,7 +37,7 @@ class Database:
     
     def connect(self):
         """データベース接続"""
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = connect_database(self.db_path, self.query_profiler)
         self.conn.row_factory = sqlite3.Row  # 列名でアクセス可能に
         # 外部キー制約を有効化
         self.conn.execute("PRAGMA foreign_keys = ON")
@@ -191,6 +198,15 @@ class Database:
             # インデックス作成
             self._create_indexes(cursor)
             
+            # 調査地×種 集計テーブル（トリガーで自動更新）
+            SiteSpeciesSummary.create_schema(cursor)
+            
+            # 差分出力用の変更ログ・チェックポイント
+            ExportCheckpoint.create_schema(cursor)
+            
+            # 地図キャッシュ等の有効性判定用のデータ版数
+            DataVersion.create_schema(cursor)
+            
             # 初期データ投入
             self._insert_initial_data(cursor)
             
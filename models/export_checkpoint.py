@@ -0,0 +1,284 @@
+"""
+エクスポートチェックポイント（差分出力の基準点）モデル
+
+共同研究者向けの差分出力のため、各テーブルの行の追加・更新・削除を
+トリガーで変更ログ（change_log）に記録し、出力時点の変更ログの番号を
+チェックポイントとして保存する。
+
+updated_at は既定値（UTC, CURRENT_TIMESTAMP）と更新時の値（ローカル時刻）が混在し、
+論理削除では更新されないため、差分の判定には使わず変更ログの番号を使う。
+テーブルごとの最大ID・最大updated_at・件数は照合用として併せて保存する。
+"""
+import sqlite3
+from typing import List, Optional, Dict, Any
+
+
+# 変更を追跡するテーブル（いずれも id / updated_at / deleted_at 列を持つ）
+TRACKED_TABLES = ['parent_sites', 'survey_sites', 'survey_events',
+                  'vegetation_data', 'species_master', 'ant_records']
+
+# チェックポイントが1件も無い間は変更ログを記録しない
+_TRACKING_ENABLED = "EXISTS (SELECT 1 FROM export_checkpoints)"
+
+
+def _trigger_sql(table: str, event: str, row_expr: str) -> str:
+    """
+    変更ログに行IDを記録するトリガーのSQLを生成
+
+    Args:
+        table: 対象テーブル名
+        event: 'INSERT' / 'UPDATE' / 'DELETE'
+        row_expr: 記録する行IDのSQL式（NEW.id / OLD.id）
+
+    Returns:
+        str: CREATE TRIGGER 文
+    """
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_changes_{table}_{event.lower()}
+        AFTER {event} ON {table}
+        WHEN {_TRACKING_ENABLED}
+        BEGIN
+            INSERT INTO change_log (table_name, row_id) VALUES ('{table}', {row_expr});
+        END
+    """
+
+
+class ExportCheckpoint:
+    """エクスポートチェックポイントモデルクラス"""
+
+    def __init__(self, db_connection):
+        """
+        初期化
+
+        Args:
+            db_connection: データベース接続オブジェクト
+        """
+        self.conn = db_connection
+        self._ensure_schema_exists()
+
+    @staticmethod
+    def create_schema(cursor) -> None:
+        """
+        変更ログ・チェックポイントのテーブルとトリガーを作成
+
+        Args:
+            cursor: データベースカーソル
+        """
+        # AUTOINCREMENT: 古いログを削除しても番号を再利用しない
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_change_log_table_seq
+            ON change_log(table_name, seq, row_id)
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS export_checkpoints (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                change_seq INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_export_checkpoints_name
+            ON export_checkpoints(name, id)
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS export_checkpoint_tables (
+                checkpoint_id INTEGER NOT NULL,
+                table_name TEXT NOT NULL,
+                max_id INTEGER,
+                max_updated_at TIMESTAMP,
+                row_count INTEGER NOT NULL,
+                PRIMARY KEY (checkpoint_id, table_name),
+                FOREIGN KEY (checkpoint_id) REFERENCES export_checkpoints(id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        """)
+
+        for table in TRACKED_TABLES:
+            cursor.execute(_trigger_sql(table, 'INSERT', 'NEW.id'))
+            cursor.execute(_trigger_sql(table, 'UPDATE', 'NEW.id'))
+            cursor.execute(_trigger_sql(table, 'DELETE', 'OLD.id'))
+
+    def _ensure_schema_exists(self) -> None:
+        """
+        既存DBにテーブルとトリガーが無ければ作成する
+        """
+        cursor = self.conn.cursor()
+        try:
+            self.create_schema(cursor)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+    def current_seq(self) -> int:
+        """
+        変更ログの最新番号を取得
+
+        Returns:
+            int: 最後に記録された変更の番号（記録が無い場合は0）
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def get_latest(self, name: str = 'default') -> Optional[Dict[str, Any]]:
+        """
+        名前ごとの最新のチェックポイントを取得
+
+        Args:
+            name: チェックポイント名（出力先の共同研究者ごとに分ける）
+
+        Returns:
+            Dict: id, name, change_seq, created_at, tables（テーブルごとの照合値）。
+                  無い場合はNone
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT * FROM export_checkpoints
+            WHERE name = ?
+            ORDER BY id DESC
+            LIMIT 1
+        """, (name,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+
+        checkpoint = dict(row)
+        checkpoint['tables'] = self._get_table_marks(checkpoint['id'])
+        return checkpoint
+
+    def get_all(self) -> List[Dict[str, Any]]:
+        """
+        名前ごとの最新のチェックポイント一覧を取得
+
+        Returns:
+            List[Dict]: id, name, change_seq, created_at
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT * FROM export_checkpoints
+            WHERE id IN (SELECT MAX(id) FROM export_checkpoints GROUP BY name)
+            ORDER BY name
+        """)
+        return [dict(row) for row in cursor.fetchall()]
+
+    def _get_table_marks(self, checkpoint_id: int) -> Dict[str, Dict[str, Any]]:
+        """
+        チェックポイントのテーブルごとの照合値を取得
+
+        Args:
+            checkpoint_id: チェックポイントID
+
+        Returns:
+            Dict: テーブル名 -> {max_id, max_updated_at, row_count}
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT table_name, max_id, max_updated_at, row_count
+            FROM export_checkpoint_tables
+            WHERE checkpoint_id = ?
+        """, (checkpoint_id,))
+        return {
+            row['table_name']: {
+                'max_id': row['max_id'],
+                'max_updated_at': row['max_updated_at'],
+                'row_count': row['row_count'],
+            }
+            for row in cursor.fetchall()
+        }
+
+    def record(self, name: str = 'default', commit: bool = True) -> Dict[str, Any]:
+        """
+        現時点のチェックポイントを記録し、全ての名前で出力済みの変更ログを削除
+
+        差分出力と同じトランザクション内で呼ぶ場合は commit=False とし、
+        出力が完了してから呼び出し側でコミットする。
+
+        Args:
+            name: チェックポイント名
+            commit: 記録後にコミットするか
+
+        Returns:
+            Dict: 記録したチェックポイント（get_latest と同じ形式）
+        """
+        if not name:
+            raise ValueError("チェックポイント名を指定してください")
+
+        cursor = self.conn.cursor()
+        try:
+            change_seq = self.current_seq()
+            cursor.execute("""
+                INSERT INTO export_checkpoints (name, change_seq) VALUES (?, ?)
+            """, (name, change_seq))
+            checkpoint_id = cursor.lastrowid
+
+            for table in TRACKED_TABLES:
+                cursor.execute(f"""
+                    INSERT INTO export_checkpoint_tables
+                        (checkpoint_id, table_name, max_id, max_updated_at, row_count)
+                    SELECT ?, ?, MAX(id), MAX(updated_at),
+                           COUNT(*) FILTER (WHERE deleted_at IS NULL)
+                    FROM {table}
+                """, (checkpoint_id, table))
+
+            # どの名前の次回差分にも不要になった変更ログを削除
+            cursor.execute("""
+                DELETE FROM change_log
+                WHERE seq <= (
+                    SELECT MIN(change_seq) FROM export_checkpoints
+                    WHERE id IN (SELECT MAX(id) FROM export_checkpoints GROUP BY name)
+                )
+            """)
+
+            if commit:
+                self.conn.commit()
+        except sqlite3.Error:
+            if commit:
+                self.conn.rollback()
+            raise
+
+        return self.get_latest(name)
+
+    def delete(self, name: str) -> int:
+        """
+        チェックポイントを名前ごと削除（次回の差分出力は全件出力になる）
+
+        Args:
+            name: チェックポイント名
+
+        Returns:
+            int: 削除したチェックポイント数
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("""
+                DELETE FROM export_checkpoint_tables
+                WHERE checkpoint_id IN (SELECT id FROM export_checkpoints WHERE name = ?)
+            """, (name,))
+            cursor.execute("DELETE FROM export_checkpoints WHERE name = ?", (name,))
+            deleted = cursor.rowcount
+
+            # チェックポイントが無くなった場合は変更ログも不要
+            cursor.execute("""
+                DELETE FROM change_log
+                WHERE NOT EXISTS (SELECT 1 FROM export_checkpoints)
+            """)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+        return deleted
+
+
+# エクスポート補助: モジュールから ExportCheckpoint を明示的にエクスポート
+__all__ = ["ExportCheckpoint", "TRACKED_TABLES"]
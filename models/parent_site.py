@@ -4,6 +4,7 @@
 import sqlite3
 from datetime import datetime
 from typing import List, Optional, Dict, Any
+from models.search_index import SearchIndex
 
 
 class ParentSite:
@@ -17,6 +18,7 @@ class ParentSite:
             db_connection: データベース接続オブジェクト
         """
         self.conn = db_connection
+        self.search_index = SearchIndex(db_connection)
     
     def create(self, name: str, latitude: float, longitude: float, 
                altitude: Optional[float] = None, remarks: Optional[str] = None,
@@ -267,12 +269,17 @@ class ParentSite:
             List[Dict]: マッチした親調査地のリスト
         """
         cursor = self.conn.cursor()
-        cursor.execute("""
+        
+        # 全文検索インデックス（短いキーワードはLIKE検索）
+        condition, params = self.search_index.build_condition(
+            'parent_site', keyword)
+        
+        cursor.execute(f"""
             SELECT * FROM parent_sites 
             WHERE deleted_at IS NULL 
-            AND (name LIKE ? OR remarks LIKE ?)
+            AND {condition}
             ORDER BY name
-        """, (f'%{keyword}%', f'%{keyword}%'))
+        """, params)
         
         return [dict(row) for row in cursor.fetchall()]
     
@@ -297,3 +304,33 @@ class ParentSite:
         """)
         
         return [dict(row) for row in cursor.fetchall()]
+    
+    def search_with_site_count(self, keyword: str) -> List[Dict[str, Any]]:
+        """
+        キーワードで親調査地を検索（調査地数を含む）
+        
+        Args:
+            keyword: 検索キーワード（名称、備考を対象）
+            
+        Returns:
+            List[Dict]: マッチした親調査地データ + 調査地数
+        """
+        cursor = self.conn.cursor()
+        
+        condition, params = self.search_index.build_condition(
+            'parent_site', keyword, 'ps.id')
+        
+        cursor.execute(f"""
+            SELECT 
+                ps.*,
+                COUNT(ss.id) as site_count
+            FROM parent_sites ps
+            LEFT JOIN survey_sites ss ON ps.id = ss.parent_site_id 
+                AND ss.deleted_at IS NULL
+            WHERE ps.deleted_at IS NULL
+            AND {condition}
+            GROUP BY ps.id
+            ORDER BY ps.name
+        """, params)
+        
+        return [dict(row) for row in cursor.fetchall()]
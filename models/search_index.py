@@ -0,0 +1,262 @@
+"""
+全文検索インデックス（FTS5）モデル
+
+親調査地・調査地・種名マスタの名称／備考を trigram トークナイザの
+FTS5 仮想テーブルで索引化し、トリガーで元テーブルと同期する。
+"""
+import sqlite3
+from typing import List, Optional, Dict, Any, Tuple
+
+
+# エンティティ種別 → (FTSテーブル, 元テーブル, 索引対象カラム, 表示名)
+ENTITY_DEFINITIONS = {
+    'parent_site': ('parent_sites_fts', 'parent_sites',
+                    ('name', 'remarks'), '親調査地'),
+    'survey_site': ('survey_sites_fts', 'survey_sites',
+                    ('name', 'remarks'), '調査地'),
+    'species': ('species_fts', 'species_master',
+                ('name', 'ja_name', 'genus', 'subfamily', 'remarks'), '種'),
+}
+
+# trigram トークナイザで索引検索できる最小文字数
+MIN_TRIGRAM_LENGTH = 3
+
+
+class SearchIndex:
+    """全文検索インデックスモデルクラス"""
+
+    def __init__(self, db_connection):
+        """
+        初期化
+
+        Args:
+            db_connection: データベース接続オブジェクト
+        """
+        self.conn = db_connection
+        self.available = self._ensure_schema_exists()
+
+    def _ensure_schema_exists(self) -> bool:
+        """
+        FTS5テーブル・同期トリガーを作成（新規作成時は索引を構築）
+
+        Returns:
+            bool: FTS5が利用可能な場合True
+        """
+        # ja_name は索引対象のため先に追加しておく（species は本モジュールを読み込むため遅延import）
+        from models.species import Species
+        Species.ensure_ja_name_column(self.conn)
+
+        cursor = self.conn.cursor()
+        try:
+
+            for entity_type in ENTITY_DEFINITIONS:
+                fts_table = ENTITY_DEFINITIONS[entity_type][0]
+                cursor.execute("""
+                    SELECT COUNT(*) FROM sqlite_master
+                    WHERE type = 'table' AND name = ?
+                """, (fts_table,))
+                table_exists = cursor.fetchone()[0] > 0
+
+                self._create_entity_schema(cursor, entity_type)
+
+                if not table_exists:
+                    cursor.execute(
+                        f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+            self.conn.commit()
+            return True
+
+        except sqlite3.OperationalError as e:
+            # FTS5（trigram）に対応していないSQLiteではLIKE検索にフォールバック
+            self.conn.rollback()
+            if "fts5" in str(e) or "tokenize" in str(e) or "trigram" in str(e):
+                return False
+            raise
+
+    def _create_entity_schema(self, cursor, entity_type: str) -> None:
+        """
+        エンティティ1種類分のFTSテーブルと同期トリガーを作成
+
+        Args:
+            cursor: データベースカーソル
+            entity_type: エンティティ種別
+        """
+        fts_table, base_table, columns, _ = ENTITY_DEFINITIONS[entity_type]
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'new.{col}' for col in columns)
+        old_values = ', '.join(f'old.{col}' for col in columns)
+
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+                {column_list},
+                content='{base_table}',
+                content_rowid='id',
+                tokenize='trigram'
+            )
+        """)
+
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_insert
+            AFTER INSERT ON {base_table}
+            BEGIN
+                INSERT INTO {fts_table}(rowid, {column_list})
+                VALUES (new.id, {new_values});
+            END
+        """)
+
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_delete
+            AFTER DELETE ON {base_table}
+            BEGIN
+                INSERT INTO {fts_table}({fts_table}, rowid, {column_list})
+                VALUES ('delete', old.id, {old_values});
+            END
+        """)
+
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_update
+            AFTER UPDATE OF {column_list} ON {base_table}
+            BEGIN
+                INSERT INTO {fts_table}({fts_table}, rowid, {column_list})
+                VALUES ('delete', old.id, {old_values});
+                INSERT INTO {fts_table}(rowid, {column_list})
+                VALUES (new.id, {new_values});
+            END
+        """)
+
+    def rebuild(self) -> None:
+        """全てのFTS索引を元テーブルから再構築"""
+        if not self.available:
+            return
+
+        cursor = self.conn.cursor()
+        try:
+            for fts_table, _, _, _ in ENTITY_DEFINITIONS.values():
+                cursor.execute(
+                    f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    @staticmethod
+    def build_match_query(keyword: str) -> Optional[str]:
+        """
+        キーワードをFTS5のMATCH式に変換
+
+        空白区切りの各語をフレーズとしてAND結合する。
+        trigramで索引検索できない短い語（3文字未満）を含む場合はNone。
+
+        Args:
+            keyword: 検索キーワード
+
+        Returns:
+            str: MATCH式（索引検索できない場合はNone）
+        """
+        terms = keyword.split()
+        if not terms or any(len(term) < MIN_TRIGRAM_LENGTH for term in terms):
+            return None
+
+        return ' AND '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+    def build_condition(self, entity_type: str, keyword: str,
+                        id_column: str = 'id') -> Tuple[str, List[Any]]:
+        """
+        キーワード検索用のWHERE条件を生成
+
+        FTS5で索引検索できる場合は rowid のサブクエリ、
+        できない場合は索引対象カラムへのLIKE条件を返す。
+        どちらも空白区切りの各語をAND結合し、各語はいずれかのカラムに含まれればよい
+        （語の順序は問わない）ため、語の長さによらず同じ行が該当する。
+
+        Args:
+            entity_type: エンティティ種別
+            keyword: 検索キーワード
+            id_column: 元テーブルのIDカラム（別名付き可）
+
+        Returns:
+            (SQL条件式, パラメータ)
+        """
+        fts_table, _, columns, _ = ENTITY_DEFINITIONS[entity_type]
+        match_query = self.build_match_query(keyword) if self.available else None
+
+        if match_query is not None:
+            condition = (f"{id_column} IN (SELECT rowid FROM {fts_table} "
+                         f"WHERE {fts_table} MATCH ?)")
+            return condition, [match_query]
+
+        # LIKE検索（短いキーワード・FTS5非対応環境）
+        # MATCH式と同じく語ごとに (col1 LIKE ? OR col2 LIKE ? ...) を作りAND結合する
+        # （% と _ はFTSと同じく文字そのものとして扱う）
+        prefix = id_column.rsplit('.', 1)[0] + '.' if '.' in id_column else ''
+        like_group = '(' + ' OR '.join(
+            f"{prefix}{col} LIKE ? ESCAPE '\\'" for col in columns) + ')'
+        conditions = []
+        params = []
+        for term in keyword.split() or ['']:
+            escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append(like_group)
+            params.extend([f'%{escaped}%'] * len(columns))
+        return '(' + ' AND '.join(conditions) + ')', params
+
+    def search(self, keyword: str,
+               entity_types: Optional[List[str]] = None,
+               limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        親調査地・調査地・種を横断してキーワード検索（関連度順）
+
+        Args:
+            keyword: 検索キーワード
+            entity_types: 対象エンティティ種別（Noneの場合は全て）
+            limit: 最大取得件数
+
+        Returns:
+            List[Dict]: entity_type, entity_label, id, name, snippet, score
+                （scoreはbm25で、小さいほど関連度が高い）
+        """
+        keyword = keyword.strip()
+        if not keyword:
+            return []
+
+        match_query = self.build_match_query(keyword) if self.available else None
+        hits = []
+
+        for entity_type in entity_types or list(ENTITY_DEFINITIONS):
+            fts_table, base_table, _, label = ENTITY_DEFINITIONS[entity_type]
+            cursor = self.conn.cursor()
+
+            if match_query is not None:
+                cursor.execute(f"""
+                    SELECT
+                        b.id,
+                        b.name,
+                        snippet({fts_table}, -1, '[', ']', '…', 8) as snippet,
+                        bm25({fts_table}) as score
+                    FROM {fts_table}
+                    JOIN {base_table} b ON b.id = {fts_table}.rowid
+                    WHERE {fts_table} MATCH ? AND b.deleted_at IS NULL
+                    ORDER BY score
+                    LIMIT ?
+                """, (match_query, limit))
+            else:
+                condition, params = self.build_condition(entity_type, keyword, 'b.id')
+                cursor.execute(f"""
+                    SELECT b.id, b.name, b.name as snippet, 0.0 as score
+                    FROM {base_table} b
+                    WHERE b.deleted_at IS NULL AND {condition}
+                    ORDER BY b.name
+                    LIMIT ?
+                """, params + [limit])
+
+            for row in cursor.fetchall():
+                hit = dict(row)
+                hit['entity_type'] = entity_type
+                hit['entity_label'] = label
+                hits.append(hit)
+
+        hits.sort(key=lambda hit: hit['score'])
+        return hits[:limit]
+
+
+# エクスポート補助: モジュールから SearchIndex を明示的にエクスポート
+__all__ = ["SearchIndex", "ENTITY_DEFINITIONS"]
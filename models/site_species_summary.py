@@ -0,0 +1,268 @@
+"""
+調査地×種 集計テーブル（マテリアライズド集計）モデル
+
+ant_records / survey_events の変更をトリガーで追従し、
+調査地ごとの種別個体数・出現イベント数・初出/最終調査日を保持する。
+"""
+import sqlite3
+from typing import List, Optional, Dict, Any
+
+
+# 集計対象（論理削除されていない記録・イベントのみ）を再計算するSELECT句
+_AGGREGATE_SELECT = """
+    SELECT
+        se.survey_site_id,
+        ar.species_id,
+        SUM(ar.count),
+        COUNT(DISTINCT ar.survey_event_id),
+        MIN(se.survey_date),
+        MAX(se.survey_date)
+    FROM ant_records ar
+    JOIN survey_events se ON ar.survey_event_id = se.id
+    WHERE ar.deleted_at IS NULL AND se.deleted_at IS NULL
+"""
+
+_INSERT_PREFIX = """
+    INSERT INTO site_species_summary
+        (survey_site_id, species_id, total_count, n_events, first_date, last_date)
+"""
+
+
+def _refresh_pair_sql(site_expr: str, species_expr: str) -> str:
+    """
+    1つの（調査地, 種）組の集計行を再計算するSQLを生成
+
+    Args:
+        site_expr: 調査地IDを表すSQL式
+        species_expr: 種IDを表すSQL式
+
+    Returns:
+        str: トリガー本体に埋め込むSQL文
+    """
+    return f"""
+        DELETE FROM site_species_summary
+        WHERE survey_site_id = {site_expr} AND species_id = {species_expr};
+        {_INSERT_PREFIX}
+        {_AGGREGATE_SELECT}
+            AND se.survey_site_id = {site_expr} AND ar.species_id = {species_expr}
+        GROUP BY se.survey_site_id, ar.species_id;
+    """
+
+
+def _event_site(event_expr: str) -> str:
+    """調査イベントIDから調査地IDを引くサブクエリ"""
+    return f"(SELECT survey_site_id FROM survey_events WHERE id = {event_expr})"
+
+
+_TRIGGERS = {
+    'trg_summary_ant_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_ant_insert
+        AFTER INSERT ON ant_records
+        BEGIN
+            {_refresh_pair_sql(_event_site('NEW.survey_event_id'), 'NEW.species_id')}
+        END
+    """,
+    'trg_summary_ant_update': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_ant_update
+        AFTER UPDATE OF survey_event_id, species_id, count, deleted_at ON ant_records
+        BEGIN
+            {_refresh_pair_sql(_event_site('OLD.survey_event_id'), 'OLD.species_id')}
+            {_refresh_pair_sql(_event_site('NEW.survey_event_id'), 'NEW.species_id')}
+        END
+    """,
+    'trg_summary_ant_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_ant_delete
+        AFTER DELETE ON ant_records
+        BEGIN
+            {_refresh_pair_sql(_event_site('OLD.survey_event_id'), 'OLD.species_id')}
+        END
+    """,
+    # 調査イベントの移動・日付変更・論理削除ではイベント内の全種を再計算
+    'trg_summary_event_update': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_event_update
+        AFTER UPDATE OF survey_site_id, survey_date, deleted_at ON survey_events
+        BEGIN
+            DELETE FROM site_species_summary
+            WHERE survey_site_id IN (OLD.survey_site_id, NEW.survey_site_id)
+            AND species_id IN (
+                SELECT species_id FROM ant_records WHERE survey_event_id = NEW.id
+            );
+            {_INSERT_PREFIX}
+            {_AGGREGATE_SELECT}
+                AND se.survey_site_id IN (OLD.survey_site_id, NEW.survey_site_id)
+                AND ar.species_id IN (
+                    SELECT species_id FROM ant_records WHERE survey_event_id = NEW.id
+                )
+            GROUP BY se.survey_site_id, ar.species_id;
+        END
+    """,
+    # 物理削除ではカスケードで記録が消えるため調査地単位で再計算
+    'trg_summary_event_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_event_delete
+        AFTER DELETE ON survey_events
+        BEGIN
+            DELETE FROM site_species_summary WHERE survey_site_id = OLD.survey_site_id;
+            {_INSERT_PREFIX}
+            {_AGGREGATE_SELECT}
+                AND se.survey_site_id = OLD.survey_site_id
+            GROUP BY se.survey_site_id, ar.species_id;
+        END
+    """,
+}
+
+
+class SiteSpeciesSummary:
+    """調査地×種 集計テーブルモデルクラス"""
+
+    def __init__(self, db_connection):
+        """
+        初期化
+
+        Args:
+            db_connection: データベース接続オブジェクト
+        """
+        self.conn = db_connection
+        self._ensure_schema_exists()
+
+    @staticmethod
+    def create_schema(cursor) -> None:
+        """
+        集計テーブル・インデックス・トリガーを作成
+
+        Args:
+            cursor: データベースカーソル
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS site_species_summary (
+                survey_site_id INTEGER NOT NULL,
+                species_id INTEGER NOT NULL,
+                total_count INTEGER NOT NULL,
+                n_events INTEGER NOT NULL,
+                first_date TIMESTAMP,
+                last_date TIMESTAMP,
+                PRIMARY KEY (survey_site_id, species_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_site_species_summary_species
+            ON site_species_summary(species_id)
+        """)
+
+        for trigger_sql in _TRIGGERS.values():
+            cursor.execute(trigger_sql)
+
+    def _ensure_schema_exists(self) -> None:
+        """
+        集計テーブルが存在しない既存DBではテーブルを作成し、全件再集計する
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT COUNT(*) FROM sqlite_master
+                WHERE type = 'table' AND name = 'site_species_summary'
+            """)
+            table_exists = cursor.fetchone()[0] > 0
+
+            self.create_schema(cursor)
+            self.conn.commit()
+
+            if not table_exists:
+                self.rebuild()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+    def rebuild(self) -> int:
+        """
+        集計テーブルを元データから全件再構築
+
+        Returns:
+            int: 再構築後の集計行数
+        """
+        cursor = self.conn.cursor()
+
+        try:
+            cursor.execute("DELETE FROM site_species_summary")
+            cursor.execute(f"""
+                {_INSERT_PREFIX}
+                {_AGGREGATE_SELECT}
+                GROUP BY se.survey_site_id, ar.species_id
+            """)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        cursor.execute("SELECT COUNT(*) FROM site_species_summary")
+        return cursor.fetchone()[0]
+
+    def get_by_site(self, survey_site_id: int) -> List[Dict[str, Any]]:
+        """
+        調査地の種別集計を取得
+
+        Args:
+            survey_site_id: 調査地ID
+
+        Returns:
+            List[Dict]: 種名・総個体数・出現イベント数・初出/最終調査日
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT
+                sss.*,
+                sm.name as species_name
+            FROM site_species_summary sss
+            JOIN species_master sm ON sss.species_id = sm.id
+            WHERE sss.survey_site_id = ?
+            ORDER BY sss.total_count DESC, sm.name
+        """, (survey_site_id,))
+
+        return [dict(row) for row in cursor.fetchall()]
+
+    def get_site_totals(self, survey_site_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        調査地ごとの種数・総個体数を取得
+
+        Args:
+            survey_site_id: 調査地IDで絞り込み（Noneの場合は全て）
+
+        Returns:
+            List[Dict]: survey_site_id, species_richness, total_individuals
+        """
+        cursor = self.conn.cursor()
+
+        sql = """
+            SELECT
+                survey_site_id,
+                COUNT(*) as species_richness,
+                SUM(total_count) as total_individuals
+            FROM site_species_summary
+        """
+
+        params = []
+
+        if survey_site_id is not None:
+            sql += " WHERE survey_site_id = ?"
+            params.append(survey_site_id)
+
+        sql += " GROUP BY survey_site_id"
+
+        cursor.execute(sql, params)
+        return [dict(row) for row in cursor.fetchall()]
+
+
+# エクスポート補助: モジュールから SiteSpeciesSummary を明示的にエクスポート
+__all__ = ["SiteSpeciesSummary"]
+
+
+if __name__ == "__main__":
+    # 集計テーブルの再構築コマンド
+    import sys
+    sys.path.append('..')
+    from models.database import Database
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'data/ant_database.db'
+    db = Database(db_path)
+    summary = SiteSpeciesSummary(db.connect())
+    print(f"✓ 集計テーブルを再構築しました: {summary.rebuild()} 行")
+    db.close()
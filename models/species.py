@@ -4,6 +4,7 @@
 import sqlite3
 from datetime import datetime
 from typing import List, Optional, Dict, Any
+from models.search_index import SearchIndex
 
 
 class Species:
@@ -17,21 +18,26 @@ class Species:
             db_connection: データベース接続オブジェクト
         """
         self.conn = db_connection
-        self._ensure_ja_name_column_exists()
+        self.ensure_ja_name_column(db_connection)
+        self.search_index = SearchIndex(db_connection)
 
-    def _ensure_ja_name_column_exists(self) -> None:
+    @staticmethod
+    def ensure_ja_name_column(db_connection) -> None:
         """
         species_master テーブルに ja_name カラムが存在するかをチェックし、未存在の場合は追加する
+        
+        Args:
+            db_connection: データベース接続オブジェクト
         """
-        cursor = self.conn.cursor()
+        cursor = db_connection.cursor()
         try:
             cursor.execute("PRAGMA table_info(species_master)")
             columns = [row[1] for row in cursor.fetchall()]
             if 'ja_name' not in columns:
                 cursor.execute("ALTER TABLE species_master ADD COLUMN ja_name TEXT")
-                self.conn.commit()
+                db_connection.commit()
         except Exception:
-            self.conn.rollback()
+            db_connection.rollback()
     
     def create(self, name: str, 
                genus: Optional[str] = None,
@@ -243,18 +249,22 @@ class Species:
         キーワードで種を検索
         
         Args:
-            keyword: 検索キーワード（種名、属名、亜科名を対象）
+            keyword: 検索キーワード（種名、和名、属名、亜科名、備考を対象）
             
         Returns:
             List[Dict]: マッチした種のリスト
         """
         cursor = self.conn.cursor()
-        cursor.execute("""
+        
+        # 全文検索インデックス（短いキーワードはLIKE検索）
+        condition, params = self.search_index.build_condition('species', keyword)
+        
+        cursor.execute(f"""
             SELECT * FROM species_master 
             WHERE deleted_at IS NULL 
-            AND (name LIKE ? OR genus LIKE ? OR subfamily LIKE ?)
+            AND {condition}
             ORDER BY name
-        """, (f'%{keyword}%', f'%{keyword}%', f'%{keyword}%'))
+        """, params)
         
         return [dict(row) for row in cursor.fetchall()]
     
@@ -4,6 +4,7 @@
 import sqlite3
 from datetime import datetime
 from typing import List, Optional, Dict, Any
+from models.search_index import SearchIndex
 
 
 class SurveySite:
@@ -17,6 +18,7 @@ class SurveySite:
             db_connection: データベース接続オブジェクト
         """
         self.conn = db_connection
+        self.search_index = SearchIndex(db_connection)
     
     def create(self, parent_site_id: int, name: str, 
                latitude: float, longitude: float,
@@ -259,16 +261,18 @@ class SurveySite:
         """
         cursor = self.conn.cursor()
         
-        sql = """
+        # 全文検索インデックス（短いキーワードはLIKE検索）
+        condition, params = self.search_index.build_condition(
+            'survey_site', keyword, 'ss.id')
+        
+        sql = f"""
             SELECT ss.*, ps.name as parent_site_name
             FROM survey_sites ss
             LEFT JOIN parent_sites ps ON ss.parent_site_id = ps.id
             WHERE ss.deleted_at IS NULL 
-            AND (ss.name LIKE ? OR ss.remarks LIKE ?)
+            AND {condition}
         """
         
-        params = [f'%{keyword}%', f'%{keyword}%']
-        
         if parent_site_id is not None:
             sql += " AND ss.parent_site_id = ?"
             params.append(parent_site_id)
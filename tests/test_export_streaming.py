@@ -0,0 +1,73 @@
+"""
+アリ類群集行列のストリーミング出力とpandas出力の一致テスト
+
+論理削除された記録・調査イベント・調査地を含むデータベースで、
+pandasのピボット・集計テーブル経由・期間指定ありの3経路の出力CSVが
+バイト単位で一致することを確認する。
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from controllers.export_controller import ExportController
+from models.database import Database
+from utils.load_test_data import generate_load_test_data
+
+
+class TestAntMatrixStreaming(unittest.TestCase):
+    """export_ant_matrix の出力経路間の一致テスト"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp(prefix='ant_export_test_')
+        db_path = os.path.join(cls.tmp_dir, 'test.db')
+        generate_load_test_data(db_path, num_parent_sites=5, num_survey_sites=40,
+                                num_events=200, num_species=30, seed=7,
+                                overwrite=True)
+
+        cls.database = Database(db_path)
+        cls.conn = cls.database.connect()
+        cursor = cls.conn.cursor()
+
+        # 論理削除: 調査イベント・記録・調査地をそれぞれ1件ずつ
+        cursor.execute("""
+            UPDATE survey_events SET deleted_at = CURRENT_TIMESTAMP
+            WHERE id = (SELECT MIN(survey_event_id) FROM ant_records)
+        """)
+        cursor.execute("""
+            UPDATE ant_records SET deleted_at = CURRENT_TIMESTAMP
+            WHERE id = (SELECT MAX(id) FROM ant_records)
+        """)
+        cursor.execute("""
+            UPDATE survey_sites SET deleted_at = CURRENT_TIMESTAMP
+            WHERE id = (SELECT MAX(survey_site_id) FROM survey_events)
+        """)
+        cls.conn.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def _export(self, name, value_type, **kwargs):
+        """出力先を分けて群集行列を書き出し、ファイル内容を返す"""
+        export_dir = os.path.join(self.tmp_dir, f'{name}_{value_type}')
+        controller = ExportController(self.conn, export_dir=export_dir)
+        filepath = controller.export_ant_matrix(value_type=value_type, **kwargs)
+        with open(filepath, 'rb') as f:
+            return f.read()
+
+    def test_streaming_matches_pandas(self):
+        for value_type in ('presence', 'count'):
+            with self.subTest(value_type=value_type):
+                expected = self._export('pandas', value_type)
+                summary = self._export('summary', value_type, streaming=True)
+                dated = self._export('dated', value_type, streaming=True,
+                                     start_date='1900-01-01', end_date='2999-12-31')
+                self.assertEqual(summary, expected)
+                self.assertEqual(dated, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+"""
+バックグラウンドクエリ実行ユーティリティ
+
+Tkinterのメインスレッドを止めずにDB検索を実行し、
+古くなった（後続の入力で置き換えられた）クエリは中断・破棄する。
+"""
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from utils.query_profiler import connect as connect_database
+
+
+def get_database_path(db_connection) -> str:
+    """
+    接続オブジェクトからデータベースファイルのパスを取得
+
+    Args:
+        db_connection: データベース接続
+
+    Returns:
+        str: データベースファイルのパス
+    """
+    for row in db_connection.execute("PRAGMA database_list").fetchall():
+        if row[1] == 'main':
+            return row[2]
+    raise ValueError("データベースファイルのパスを取得できません")
+
+
+class BackgroundQueryRunner:
+    """バックグラウンドクエリ実行クラス"""
+
+    def __init__(self, widget, db_path: str, poll_interval_ms: int = 20,
+                 query_profiler=None):
+        """
+        初期化
+
+        Args:
+            widget: after() を呼び出すTkウィジェット
+            db_path: データベースファイルのパス（ワーカー専用接続を開く）
+            poll_interval_ms: 結果キューを確認する間隔（ミリ秒）
+            query_profiler: クエリプロファイラ（ワーカー接続のSQLも計測する）
+        """
+        self.widget = widget
+        self.db_path = db_path
+        self.poll_interval_ms = poll_interval_ms
+        self.query_profiler = query_profiler
+
+        self._executor = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix='background-query')
+        self._results = queue.Queue()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._running_channel: Optional[str] = None
+        self._pending = 0
+        self._worker_conn: Optional[sqlite3.Connection] = None
+        self._polling = False
+
+    def submit(self, channel: str,
+               query_fn: Callable[[sqlite3.Connection], Any],
+               on_result: Callable[[Any], None],
+               on_error: Optional[Callable[[Exception], None]] = None,
+               on_progress: Optional[Callable[[Any], None]] = None) -> None:
+        """
+        クエリを投入（同じチャンネルの古いクエリは中断・破棄される）
+
+        Args:
+            channel: クエリの系統名（例: 'parent_site_search'）
+            query_fn: ワーカー用接続を受け取り結果を返す関数
+                      （on_progress を指定した場合は、接続と進捗を通知する関数を受け取る）
+            on_result: メインスレッドで結果を受け取るコールバック
+            on_error: メインスレッドで例外を受け取るコールバック
+            on_progress: メインスレッドで進捗（通知関数に渡した値）を受け取るコールバック
+        """
+        with self._lock:
+            generation = self._generations.get(channel, 0) + 1
+            self._generations[channel] = generation
+
+            # 実行中の同系統クエリは中断する
+            if self._running_channel == channel and self._worker_conn is not None:
+                self._worker_conn.interrupt()
+
+            self._pending += 1
+
+        self._executor.submit(self._run, channel, generation,
+                              query_fn, on_result, on_error, on_progress)
+        self._start_polling()
+
+    def cancel(self, channel: str) -> None:
+        """
+        チャンネルの投入済みクエリを破棄
+
+        Args:
+            channel: クエリの系統名
+        """
+        with self._lock:
+            self._generations[channel] = self._generations.get(channel, 0) + 1
+            if self._running_channel == channel and self._worker_conn is not None:
+                self._worker_conn.interrupt()
+
+    def _is_current(self, channel: str, generation: int) -> bool:
+        """最新世代のクエリかどうか"""
+        with self._lock:
+            return self._generations.get(channel) == generation
+
+    def _get_worker_connection(self) -> sqlite3.Connection:
+        """ワーカースレッド専用の接続を取得"""
+        if self._worker_conn is None:
+            # interrupt()/close() をメインスレッドから呼ぶためスレッドチェックを外す
+            conn = connect_database(self.db_path, self.query_profiler,
+                                    check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA foreign_keys = ON")
+            self._worker_conn = conn
+        return self._worker_conn
+
+    def _run(self, channel, generation, query_fn, on_result, on_error, on_progress):
+        """ワーカースレッドでクエリを実行"""
+        try:
+            # 待機中に後続のクエリが来ていれば実行しない
+            if not self._is_current(channel, generation):
+                return
+
+            conn = self._get_worker_connection()
+            with self._lock:
+                self._running_channel = channel
+
+            if on_progress is None:
+                result = query_fn(conn)
+            else:
+                # 進捗も結果と同じキューで渡し、古い世代の進捗は _poll で捨てる
+                def report(payload):
+                    self._results.put((channel, generation, on_progress, payload))
+                result = query_fn(conn, report)
+            self._results.put((channel, generation, on_result, result))
+        except sqlite3.OperationalError as e:
+            # interrupt() による中断は破棄
+            if "interrupted" not in str(e) and on_error is not None:
+                self._results.put((channel, generation, on_error, e))
+        except Exception as e:
+            if on_error is not None:
+                self._results.put((channel, generation, on_error, e))
+        finally:
+            with self._lock:
+                self._running_channel = None
+                self._pending -= 1
+
+    def _start_polling(self):
+        """結果キューのポーリングを開始"""
+        if not self._polling:
+            self._polling = True
+            self.widget.after(self.poll_interval_ms, self._poll)
+
+    def _poll(self):
+        """メインスレッドで結果を受け取りコールバックを呼ぶ"""
+        while True:
+            try:
+                channel, generation, callback, payload = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            # 古い世代の結果は捨てる
+            if self._is_current(channel, generation):
+                callback(payload)
+
+        with self._lock:
+            pending = self._pending > 0
+        if pending or not self._results.empty():
+            self.widget.after(self.poll_interval_ms, self._poll)
+        else:
+            self._polling = False
+
+    def shutdown(self):
+        """ワーカーを停止し接続を閉じる"""
+        with self._lock:
+            for channel in self._generations:
+                self._generations[channel] += 1
+            if self._worker_conn is not None:
+                self._worker_conn.interrupt()
+        self._executor.shutdown(wait=True)
+        if self._worker_conn is not None:
+            self._worker_conn.close()
+            self._worker_conn = None
@@ -0,0 +1,326 @@
+"""
+調査地間の群集非類似度（β多様度）の計算ユーティリティ
+
+調査地×種 集計テーブルから疎行列（CSR）の群集行列を作り、
+Bray-Curtis / Jaccard / Sørensen の非類似度を行のブロックごとにまとめて計算する。
+
+- Jaccard / Sørensen は在・不在の行列積で共有種数を求める
+- Bray-Curtis は種ごとに、その種が出現する調査地の組だけ min(個体数) を足し込む
+  （計算量は調査地数² ではなく、種ごとの出現調査地数² の合計に比例する）。
+  行列の非ゼロ要素の割合が DENSE_DENSITY を超える場合は、ブロックを密行列にして
+  scipy の cdist（C実装の総当たり）で計算する方が速い
+
+結果は scipy.spatial.distance.pdist と同じ並びの上三角の1次元配列（condensed 形式）で返す。
+ブロックは condensed 配列の連続した区間に対応するため、出力先に np.memmap を使えば
+メモリに載らない大きさの行列もファイルに直接書き出せる。
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+
+# 計算できる非類似度
+BETA_METRICS = ('braycurtis', 'jaccard', 'sorensen')
+
+# 非類似度の表示名
+BETA_METRIC_LABELS = {
+    'braycurtis': 'Bray-Curtis',
+    'jaccard': 'Jaccard',
+    'sorensen': 'Sørensen',
+}
+
+# 1ブロックで計算する（行数 × 列数）の上限（float64 で約32MB）
+BLOCK_ELEMENTS = 4_000_000
+
+# Bray-Curtis を密行列で計算する非ゼロ要素の割合
+# （5,000調査地での計測では、10%で疎行列が約3倍速く、33%で密行列が約3倍速い）
+DENSE_DENSITY = 0.2
+
+
+def fetch_community_matrix(conn, active_sites_only: bool = True
+                           ) -> Tuple[np.ndarray, np.ndarray, sparse.csr_matrix]:
+    """
+    調査地×種 集計テーブルから群集行列（疎行列）を作成
+
+    記録の無い調査地は行に含まれない。
+
+    Args:
+        conn: データベース接続
+        active_sites_only: 論理削除された調査地を除くか
+
+    Returns:
+        (site_ids, species_ids, matrix): 行・列に対応する調査地ID・種ID（昇順）と
+                                         個体数の CSR 行列
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None  # 配列に詰めるため行はタプルで受け取る
+    cursor.execute("""
+        SELECT survey_site_id, species_id, total_count
+        FROM site_species_summary
+        ORDER BY survey_site_id, species_id
+    """)
+    data = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 3)
+
+    if active_sites_only:
+        cursor.execute("SELECT id FROM survey_sites WHERE deleted_at IS NOT NULL")
+        deleted = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+        if len(deleted):
+            data = data[~np.isin(data[:, 0], deleted)]
+
+    site_ids, rows = np.unique(data[:, 0], return_inverse=True)
+    species_ids, cols = np.unique(data[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix((data[:, 2].astype(np.float64), (rows, cols)),
+                               shape=(len(site_ids), len(species_ids)))
+    return site_ids, species_ids, matrix
+
+
+def aggregate_community(matrix: sparse.spmatrix, groups: np.ndarray,
+                        n_groups: Optional[int] = None) -> sparse.csr_matrix:
+    """
+    群集行列の行をグループ（親調査地など）ごとに合計
+
+    Args:
+        matrix: 群集行列
+        groups: 各行のグループ番号（0 始まり）
+        n_groups: グループ数（Noneの場合は groups の最大値 + 1）
+
+    Returns:
+        csr_matrix: (グループ数, 種数) の行列
+    """
+    groups = np.asarray(groups)
+    if n_groups is None:
+        n_groups = int(groups.max()) + 1
+    indicator = sparse.csr_matrix((np.ones(len(groups)), (groups, np.arange(len(groups)))),
+                                  shape=(n_groups, len(groups)))
+    return (indicator @ matrix).tocsr()
+
+
+def condensed_size(n: int) -> int:
+    """n 地点の condensed 形式の長さ n(n-1)/2"""
+    return n * (n - 1) // 2
+
+
+def _condensed_start(i: int, n: int) -> int:
+    """condensed 形式で行 i（i < j の組）が始まる位置"""
+    return i * n - i * (i + 1) // 2
+
+
+class _Community:
+    """ブロック計算で共有する群集行列の前処理結果"""
+
+    def __init__(self, matrix: sparse.spmatrix, metric: str):
+        if metric not in BETA_METRICS:
+            raise ValueError(f"非類似度が不正です: {metric}")
+        self.metric = metric
+        self.csr = sparse.csr_matrix(matrix, dtype=np.float64)
+        self.csr.sum_duplicates()
+        self.csr.eliminate_zeros()
+
+        if metric == 'braycurtis':
+            self.totals = np.asarray(self.csr.sum(axis=1)).ravel()
+            self.csc = self.csr.tocsc()
+            self.csc.sort_indices()
+            cells = self.csr.shape[0] * self.csr.shape[1]
+            self.dense = cells > 0 and self.csr.nnz / cells > DENSE_DENSITY
+        else:
+            self.binary = self.csr.copy()
+            self.binary.data[:] = 1.0
+            self.totals = np.diff(self.binary.indptr).astype(np.float64)
+
+    @property
+    def n_rows(self) -> int:
+        return self.csr.shape[0]
+
+    def _column_rows(self, k: int, start: int, stop: int) -> Tuple[np.ndarray, np.ndarray]:
+        """種 k が出現する行のうち [start, stop) の行番号と個体数"""
+        lo, hi = self.csc.indptr[k], self.csc.indptr[k + 1]
+        rows = self.csc.indices[lo:hi]
+        first, last = np.searchsorted(rows, [start, stop])
+        return rows[first:last], self.csc.data[lo + first:lo + last]
+
+    def block(self, rows: Tuple[int, int], other: '_Community',
+              cols: Tuple[int, int]) -> np.ndarray:
+        """
+        self の行 [rows) と other の行 [cols) の非類似度（密行列）を計算
+
+        Args:
+            rows: (開始, 終了) self の行の範囲
+            other: 比較する群集行列（self と同じ種の列順であること）
+            cols: (開始, 終了) other の行の範囲
+
+        Returns:
+            ndarray: (行数, 列数) の非類似度
+        """
+        r0, r1 = rows
+        c0, c1 = cols
+        sums = self.totals[r0:r1, None] + other.totals[None, c0:c1]
+
+        if self.metric == 'braycurtis' and (self.dense or other.dense):
+            # 共有する個体数 Σ min(x, y) = (Σx + Σy - Σ|x - y|) / 2
+            from scipy.spatial.distance import cdist
+            manhattan = cdist(self.csr[r0:r1].toarray(), other.csr[c0:c1].toarray(), 'cityblock')
+            numerator = sums - manhattan
+        elif self.metric == 'braycurtis':
+            # 共有する個体数 Σ min(x, y) を種ごとに足し込む
+            shared = np.zeros((r1 - r0, c1 - c0))
+            for k in range(self.csc.shape[1]):
+                a_rows, a_values = self._column_rows(k, r0, r1)
+                if len(a_rows) == 0:
+                    continue
+                b_rows, b_values = other._column_rows(k, c0, c1)
+                if len(b_rows) == 0:
+                    continue
+                shared[np.ix_(a_rows - r0, b_rows - c0)] += np.minimum.outer(a_values, b_values)
+            numerator = 2 * shared
+        else:
+            # 共有種数は在・不在の行列積
+            shared = (self.binary[r0:r1] @ other.binary[c0:c1].T).toarray()
+            numerator = shared if self.metric == 'jaccard' else 2 * shared
+
+        if self.metric == 'jaccard':
+            sums = sums - shared
+
+        # 両方とも空（個体数0）の組は同一とみなす
+        similarity = np.divide(numerator, sums, out=np.ones_like(sums), where=sums > 0)
+        return np.maximum(1.0 - similarity, 0.0)
+
+
+def resolve_n_jobs(n_jobs: Optional[int]) -> int:
+    """並列数（None / 1 は逐次、-1 は全コア）"""
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return os.cpu_count() or 1
+    return max(1, n_jobs)
+
+
+def _block_size(n_cols: int, block_rows: Optional[int]) -> int:
+    """1ブロックの行数（BLOCK_ELEMENTS に収まる行数）"""
+    if block_rows is not None:
+        return max(1, block_rows)
+    return max(1, BLOCK_ELEMENTS // max(n_cols, 1))
+
+
+def pairwise_dissimilarity(matrix: sparse.spmatrix, metric: str = 'braycurtis',
+                           out: Union[None, str, np.ndarray] = None,
+                           dtype=np.float64, n_jobs: Optional[int] = 1,
+                           block_rows: Optional[int] = None,
+                           progress: Optional[Callable[[int, int], None]] = None
+                           ) -> np.ndarray:
+    """
+    全調査地間の非類似度を condensed 形式で計算
+
+    行をブロックに分け、各ブロックの行 i と行 j（j > i）の組を計算して
+    condensed 配列の連続した区間に書き込む。ブロックは互いに独立なため、
+    n_jobs > 1 ではスレッドで並列に計算する（行列積と NumPy の演算は GIL を解放する）。
+
+    Args:
+        matrix: 群集行列（調査地 × 種）
+        metric: 'braycurtis' / 'jaccard' / 'sorensen'
+        out: 出力先（Noneの場合は新しい配列、文字列の場合はその .npy ファイルに
+             np.memmap で書き出す、配列の場合はその配列に書き込む）
+        dtype: 出力の型（out が配列の場合はその型）
+        n_jobs: 並列数（-1 は全コア）
+        block_rows: 1ブロックの行数（Noneの場合は BLOCK_ELEMENTS から決める）
+        progress: 進捗コールバック (計算済みの行数, 全行数)
+
+    Returns:
+        ndarray: 長さ n(n-1)/2 の非類似度（out がファイルの場合は np.memmap）
+    """
+    community = _Community(matrix, metric)
+    n = community.n_rows
+    size = condensed_size(n)
+
+    if out is None:
+        result = np.empty(size, dtype=dtype)
+    elif isinstance(out, str):
+        result = np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=(size,))
+    else:
+        if out.shape != (size,):
+            raise ValueError(f"出力先の長さが不正です（{out.shape} / 必要な長さ {size}）")
+        result = out
+
+    step = _block_size(n, block_rows)
+    blocks = [(start, min(start + step, n)) for start in range(0, n - 1, step)]
+
+    def compute(block):
+        r0, r1 = block
+        values = community.block((r0, r1), community, (r0, n))
+        # 行 i の j > i の部分だけを取り出すと、行優先の順序が condensed の並びと一致する
+        upper = np.arange(r0, n)[None, :] > np.arange(r0, r1)[:, None]
+        result[_condensed_start(r0, n):_condensed_start(r1, n)] = values[upper]
+        return r1 - r0
+
+    done = 0
+    jobs = resolve_n_jobs(n_jobs)
+    if jobs == 1:
+        for block in blocks:
+            done += compute(block)
+            if progress:
+                progress(done, n)
+    else:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for rows in executor.map(compute, blocks):
+                done += rows
+                if progress:
+                    progress(done, n)
+
+    if isinstance(result, np.memmap):
+        result.flush()
+    return result
+
+
+def cross_dissimilarity(matrix: sparse.spmatrix, targets: sparse.spmatrix,
+                        metric: str = 'braycurtis') -> np.ndarray:
+    """
+    2つの群集行列の行の組の非類似度を計算
+
+    Args:
+        matrix: 群集行列（m 調査地 × 種）
+        targets: 比較する群集行列（k 調査地 × 種、列は matrix と同じ種の順）
+        metric: 'braycurtis' / 'jaccard' / 'sorensen'
+
+    Returns:
+        ndarray: (m, k) の非類似度
+    """
+    source = _Community(matrix, metric)
+    target = _Community(targets, metric)
+    result = np.empty((source.n_rows, target.n_rows))
+    step = _block_size(target.n_rows, None)
+    for start in range(0, source.n_rows, step):
+        stop = min(start + step, source.n_rows)
+        result[start:stop] = source.block((start, stop), target, (0, target.n_rows))
+    return result
+
+
+def nearest_rows(matrix: sparse.spmatrix, targets: sparse.spmatrix,
+                 metric: str = 'braycurtis') -> np.ndarray:
+    """
+    各行について最も非類似度の小さい targets の行番号を求める
+
+    (m, k) の行列全体は作らず、ブロックごとに最小値の位置だけを残す。
+
+    Args:
+        matrix: 群集行列（m 調査地 × 種）
+        targets: 比較する群集行列（k 調査地 × 種）
+        metric: 'braycurtis' / 'jaccard' / 'sorensen'
+
+    Returns:
+        ndarray: 長さ m の targets の行番号
+    """
+    source = _Community(matrix, metric)
+    target = _Community(targets, metric)
+    nearest = np.empty(source.n_rows, dtype=np.int64)
+    step = _block_size(target.n_rows, None)
+    for start in range(0, source.n_rows, step):
+        stop = min(start + step, source.n_rows)
+        values = source.block((start, stop), target, (0, target.n_rows))
+        nearest[start:stop] = values.argmin(axis=1)
+    return nearest
+
+
+__all__ = ["BETA_METRICS", "BETA_METRIC_LABELS", "fetch_community_matrix",
+           "aggregate_community", "condensed_size", "resolve_n_jobs",
+           "pairwise_dissimilarity", "cross_dissimilarity", "nearest_rows"]
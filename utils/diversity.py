@@ -0,0 +1,175 @@
+"""
+種多様度指数のベクトル化計算ユーティリティ
+
+調査地×種 集計テーブルの（調査地ID, 個体数）の組を NumPy 配列で受け取り、
+調査地ごとの多様度指数を bincount でまとめて計算する。
+調査地ごとの DataFrame の絞り込みやループを行わないため、
+10万調査地でも計算は配列演算数回で済む。
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# 計算する指標（ヒートマップ・地図の指標名としても使用）
+DIVERSITY_INDICES = ('species_richness', 'total_individuals', 'shannon_index',
+                     'simpson_index', 'pielou_evenness', 'berger_parker_dominance')
+
+# 指標の表示名
+DIVERSITY_INDEX_LABELS = {
+    'species_richness': '種数',
+    'total_individuals': '総個体数',
+    'shannon_index': 'Shannon多様度指数',
+    'simpson_index': 'Simpson多様度指数',
+    'pielou_evenness': 'Pielou均等度',
+    'berger_parker_dominance': 'Berger-Parker優占度',
+}
+
+# 集計テーブルから一度に読み込む行数
+FETCH_CHUNK_SIZE = 100_000
+
+
+def fetch_site_counts(conn, survey_site_id: Optional[int] = None,
+                      active_sites_only: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    調査地×種 集計テーブルから調査地IDと個体数を配列で取得
+
+    Args:
+        conn: データベース接続
+        survey_site_id: 調査地IDで絞り込み（Noneの場合は全て）
+        active_sites_only: 論理削除された調査地を除くか
+
+    Returns:
+        (site_ids, counts): 調査地ID順に並んだ int64 配列
+    """
+    sql = "SELECT survey_site_id, total_count FROM site_species_summary"
+    params = []
+
+    if survey_site_id is not None:
+        sql += " WHERE survey_site_id = ?"
+        params.append(survey_site_id)
+
+    sql += " ORDER BY survey_site_id"
+
+    cursor = conn.cursor()
+    cursor.row_factory = None  # 配列に詰めるため行はタプルで受け取る
+    cursor.execute(sql, params)
+
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(FETCH_CHUNK_SIZE)
+        if not rows:
+            break
+        chunks.append(np.array(rows, dtype=np.int64))
+
+    if not chunks:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    data = np.concatenate(chunks)
+
+    if active_sites_only:
+        # 論理削除された調査地は少数のため、結合せずに配列側で除く
+        cursor.execute("SELECT id FROM survey_sites WHERE deleted_at IS NOT NULL")
+        deleted = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+        if len(deleted):
+            data = data[~np.isin(data[:, 0], deleted)]
+
+    return data[:, 0], data[:, 1]
+
+
+def fetch_site_totals(conn, active_sites_only: bool = False) -> Dict[str, np.ndarray]:
+    """
+    調査地ごとの種数・総個体数を集計テーブルから取得
+
+    種数と総個体数は SQLite 側の集計で求まるため、種ごとの行を読み込まない。
+
+    Args:
+        conn: データベース接続
+        active_sites_only: 論理削除された調査地を除くか
+
+    Returns:
+        Dict: 'group_id'（昇順）, 'species_richness', 'total_individuals' の配列
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute("""
+        SELECT survey_site_id, COUNT(*), SUM(total_count)
+        FROM site_species_summary
+        GROUP BY survey_site_id
+        ORDER BY survey_site_id
+    """)
+    data = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 3)
+
+    if active_sites_only:
+        cursor.execute("SELECT id FROM survey_sites WHERE deleted_at IS NOT NULL")
+        deleted = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+        if len(deleted):
+            data = data[~np.isin(data[:, 0], deleted)]
+
+    return {
+        'group_id': data[:, 0],
+        'species_richness': data[:, 1],
+        'total_individuals': data[:, 2],
+    }
+
+
+def grouped_diversity(group_ids: np.ndarray, counts: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    グループ（調査地など）ごとの多様度指数を計算
+
+    個体数0の種は種数には含めるが、Shannon / Simpson では 0·log0 = 0 として扱う。
+    総個体数が0のグループの指数は0とする。
+
+    Args:
+        group_ids: 各行のグループID
+        counts: 各行（グループ×種）の個体数
+
+    Returns:
+        Dict: 'group_id'（昇順）と DIVERSITY_INDICES の各指標の配列
+    """
+    group_ids = np.asarray(group_ids)
+    counts = np.asarray(counts, dtype=np.float64)
+
+    groups, inverse = np.unique(group_ids, return_inverse=True)
+    n_groups = len(groups)
+
+    richness = np.bincount(inverse, minlength=n_groups)
+    totals = np.bincount(inverse, weights=counts, minlength=n_groups)
+
+    # 各行の相対優占度（総個体数0のグループは0）
+    row_totals = totals[inverse]
+    proportions = np.divide(counts, row_totals,
+                            out=np.zeros_like(counts), where=row_totals > 0)
+    plogp = proportions * np.log(proportions, out=np.zeros_like(proportions),
+                                 where=proportions > 0)
+
+    shannon = -np.bincount(inverse, weights=plogp, minlength=n_groups)
+    simpson = 1 - np.bincount(inverse, weights=proportions ** 2, minlength=n_groups)
+    simpson[totals == 0] = 0
+
+    log_richness = np.log(richness, out=np.zeros(n_groups), where=richness > 1)
+    pielou = np.divide(shannon, log_richness,
+                       out=np.zeros(n_groups), where=richness > 1)
+
+    max_counts = np.zeros(n_groups)
+    np.maximum.at(max_counts, inverse, counts)
+    berger_parker = np.divide(max_counts, totals,
+                              out=np.zeros(n_groups), where=totals > 0)
+
+    # 浮動小数点誤差で僅かに負になる値を0に丸める
+    shannon = np.maximum(shannon, 0)
+    simpson = np.maximum(simpson, 0)
+
+    return {
+        'group_id': groups,
+        'species_richness': richness,
+        'total_individuals': totals.astype(np.int64),
+        'shannon_index': shannon,
+        'simpson_index': simpson,
+        'pielou_evenness': pielou,
+        'berger_parker_dominance': berger_parker,
+    }
+
+
+__all__ = ["DIVERSITY_INDICES", "DIVERSITY_INDEX_LABELS", "fetch_site_counts",
+           "fetch_site_totals", "grouped_diversity"]
@@ -0,0 +1,158 @@
+"""
+Darwin Core Archive（DwC-A）書き出しユーティリティ
+
+調査イベントをコア（event.txt）、アリ類の出現記録を拡張（occurrence.txt）とする
+サンプリングイベント形式のアーカイブを作成する。
+各ファイルはタブ区切り・UTF-8で、行を受け取りながら zip に直接書き込むため、
+記録数に関わらずメモリ使用量は一定。
+
+参考: https://dwc.tdwg.org/text/ （Darwin Core Text Guide）
+"""
+import xml.etree.ElementTree as ET
+import zipfile
+from typing import Iterable, List, Tuple
+
+DWC_TERMS = 'http://rs.tdwg.org/dwc/terms/'
+DWC_TEXT_NS = 'http://rs.tdwg.org/dwc/text/'
+
+EVENT_ROW_TYPE = DWC_TERMS + 'Event'
+OCCURRENCE_ROW_TYPE = DWC_TERMS + 'Occurrence'
+
+# event.txt の列（先頭がコアのID）
+EVENT_TERMS = [
+    'eventID',
+    'locationID',
+    'locality',
+    'decimalLatitude',
+    'decimalLongitude',
+    'geodeticDatum',
+    'minimumElevationInMeters',
+    'maximumElevationInMeters',
+    'eventDate',
+    'recordedBy',
+    'sampleSizeValue',
+    'sampleSizeUnit',
+    'eventRemarks',
+    'dynamicProperties',
+]
+
+# occurrence.txt の列（先頭がコアのID = eventID）
+OCCURRENCE_TERMS = [
+    'eventID',
+    'occurrenceID',
+    'basisOfRecord',
+    'scientificName',
+    'vernacularName',
+    'kingdom',
+    'phylum',
+    'class',
+    'order',
+    'family',
+    'subfamily',
+    'genus',
+    'individualCount',
+    'organismQuantity',
+    'organismQuantityType',
+    'occurrenceStatus',
+    'occurrenceRemarks',
+]
+
+# zip へまとめて書き込む行数
+_WRITE_BATCH_LINES = 5000
+
+# 区切り文字と改行は値の中では使えないため空白に置き換える
+_FIELD_ESCAPES = str.maketrans({'\t': ' ', '\r': ' ', '\n': ' '})
+
+
+def format_value(value) -> str:
+    """
+    1つの値をタブ区切りテキスト用の文字列に変換
+
+    Args:
+        value: 値（Noneは空欄）
+
+    Returns:
+        str: 変換後の文字列
+    """
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value.translate(_FIELD_ESCAPES)
+    return str(value)
+
+
+def write_text_file(archive: zipfile.ZipFile, name: str, terms: List[str],
+                    rows: Iterable[Tuple]) -> int:
+    """
+    見出し行と行を zip 内のタブ区切りファイルへ順に書き込む
+
+    Args:
+        archive: 書き込み用に開いた ZipFile
+        name: zip 内のファイル名
+        terms: 列の Darwin Core 用語（見出し行）
+        rows: 行のイテラブル（terms と同じ順の値）
+
+    Returns:
+        int: 書き込んだ行数（見出し行を除く）
+    """
+    count = 0
+    lines = ['\t'.join(terms)]
+    separators = len(terms) - 1
+    # 大きさが事前に分からないため、4GBを超えても書けるよう ZIP64 で開く
+    with archive.open(name, 'w', force_zip64=True) as f:
+        for row in rows:
+            line = '\t'.join(['' if value is None else str(value) for value in row])
+            # 値にタブ・改行が含まれる行だけ1値ずつ置き換える
+            if line.count('\t') != separators or '\n' in line or '\r' in line:
+                line = '\t'.join(map(format_value, row))
+            lines.append(line)
+            count += 1
+            # 圧縮処理の呼び出し回数を減らすため、まとめて書き込む
+            if len(lines) >= _WRITE_BATCH_LINES:
+                f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+                lines = []
+        if lines:
+            f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+    return count
+
+
+def build_meta_xml(core_file: str, extension_file: str) -> str:
+    """
+    アーカイブの構成を記述する meta.xml を作成
+
+    Args:
+        core_file: コア（調査イベント）のファイル名
+        extension_file: 拡張（出現記録）のファイル名
+
+    Returns:
+        str: meta.xml の内容
+    """
+    ET.register_namespace('', DWC_TEXT_NS)
+    archive = ET.Element(f'{{{DWC_TEXT_NS}}}archive')
+
+    def add_table(tag, row_type, filename, terms, id_tag):
+        table = ET.SubElement(archive, f'{{{DWC_TEXT_NS}}}{tag}', {
+            'encoding': 'UTF-8',
+            'fieldsTerminatedBy': '\\t',
+            'linesTerminatedBy': '\\n',
+            'fieldsEnclosedBy': '',
+            'ignoreHeaderLines': '1',
+            'rowType': row_type,
+        })
+        files = ET.SubElement(table, f'{{{DWC_TEXT_NS}}}files')
+        ET.SubElement(files, f'{{{DWC_TEXT_NS}}}location').text = filename
+        ET.SubElement(table, f'{{{DWC_TEXT_NS}}}{id_tag}', {'index': '0'})
+        for index, term in enumerate(terms):
+            ET.SubElement(table, f'{{{DWC_TEXT_NS}}}field',
+                          {'index': str(index), 'term': DWC_TERMS + term})
+
+    add_table('core', EVENT_ROW_TYPE, core_file, EVENT_TERMS, 'id')
+    add_table('extension', OCCURRENCE_ROW_TYPE, extension_file, OCCURRENCE_TERMS, 'coreid')
+
+    ET.indent(archive)
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            + ET.tostring(archive, encoding='unicode') + '\n')
+
+
+__all__ = ["EVENT_TERMS", "OCCURRENCE_TERMS", "format_value", "write_text_file",
+           "build_meta_xml"]
@@ -0,0 +1,137 @@
+"""
+グラフ作成ユーティリティ
+
+pyplot（グローバルな状態を持ち、スレッドセーフでない）を使わずに
+matplotlib の Figure を直接作成する。作成した Figure はどのスレッドでも
+描画・保存でき、GUIでは FigureCanvasTkAgg で埋め込むだけにする。
+日本語フォントは rcParams を変更せず、Figure 内の文字ごとに指定する。
+負号は、create_figure が作る Figure の描画中だけ rc_context で
+axes.unicode_minus = False にし、ASCII のハイフンで描く。
+"""
+import functools
+import os
+from typing import List, Tuple
+
+# 日本語フォント（左から順に使用し、無い文字は後ろのフォントで補う）
+JAPANESE_FONTS = ['Yu Gothic', 'MS Gothic', 'Hiragino Sans', 'Noto Sans CJK JP',
+                  'IPAexGothic', 'DejaVu Sans']
+
+# save_figure で対応する形式
+FIGURE_FORMATS = ('png', 'svg', 'pdf')
+
+# Figure の描画中に適用する rcParams（日本語フォントには U+2212 の負号が無い場合があるため）
+FIGURE_RC_PARAMS = {'axes.unicode_minus': False}
+
+
+@functools.lru_cache(maxsize=1)
+def _figure_class():
+    """
+    描画中だけ FIGURE_RC_PARAMS を適用する Figure のサブクラスを取得
+
+    画面への埋め込み（再描画を含む）・画像の保存はいずれも Figure.draw を通るため、
+    draw を rc_context で囲む。複数のスレッドが同時に描画しても、設定する値は同じ。
+    """
+    import matplotlib
+    from matplotlib.figure import Figure
+
+    class RcFigure(Figure):
+        """描画中だけ FIGURE_RC_PARAMS を適用する Figure"""
+
+        def draw(self, renderer):
+            with matplotlib.rc_context(FIGURE_RC_PARAMS):
+                super().draw(renderer)
+
+    return RcFigure
+
+
+def create_figure(figsize: Tuple[float, float], nrows: int = 1, ncols: int = 1):
+    """
+    Figure と Axes を作成（pyplot を使わない）
+
+    Args:
+        figsize: 図の大きさ（インチ）
+        nrows: 行数
+        ncols: 列数
+
+    Returns:
+        (Figure, Axes): Axes は nrows=ncols=1 の場合は1つ、それ以外は配列
+    """
+    # matplotlib.figure は読み込みが重いため使用時に読み込む
+    fig = _figure_class()(figsize=figsize)
+    axes = fig.subplots(nrows, ncols)
+    return fig, axes
+
+
+@functools.lru_cache(maxsize=1)
+def get_font_families() -> List[str]:
+    """
+    JAPANESE_FONTS のうちインストール済みのフォント名を取得
+
+    未インストールのフォントを指定すると描画のたびに検索と警告が発生するため、
+    初回に一度だけ確認する。
+
+    Returns:
+        List[str]: フォント名（最低でも matplotlib 同梱の DejaVu Sans）
+    """
+    from matplotlib import font_manager
+
+    installed = {font.name for font in font_manager.fontManager.ttflist}
+    families = [family for family in JAPANESE_FONTS if family in installed]
+    return families or ['DejaVu Sans']
+
+
+def finalize_figure(fig):
+    """
+    日本語フォントを適用してレイアウトを調整
+
+    Args:
+        fig: Figure
+
+    Returns:
+        Figure: 同じ Figure
+    """
+    from matplotlib.text import Text
+
+    families = get_font_families()
+
+    # 目盛りラベルは後から追加される目盛りにも書式が引き継がれる
+    for ax in fig.axes:
+        for label in ax.get_xticklabels(which='both') + ax.get_yticklabels(which='both'):
+            label.set_fontfamily(families)
+
+    for text in fig.findobj(Text):
+        text.set_fontfamily(families)
+
+    # 配置の計算でも目盛りラベルを描画時と同じ文字で測る
+    import matplotlib
+    with matplotlib.rc_context(FIGURE_RC_PARAMS):
+        fig.tight_layout()
+    return fig
+
+
+def save_figure(fig, filepath: str, dpi: int = 150) -> str:
+    """
+    Figure を画像ファイルに保存（画面表示なし）
+
+    Args:
+        fig: Figure
+        filepath: 保存先（拡張子 .png / .svg / .pdf で形式を判定）
+        dpi: 解像度（PNGのみ）
+
+    Returns:
+        str: 保存したファイルのパス
+    """
+    fmt = os.path.splitext(filepath)[1].lstrip('.').lower()
+    if fmt not in FIGURE_FORMATS:
+        raise ValueError(f"対応していない画像形式です: {fmt}（{', '.join(FIGURE_FORMATS)}）")
+
+    output_dir = os.path.dirname(filepath)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    fig.savefig(filepath, format=fmt, dpi=dpi)
+    return filepath
+
+
+__all__ = ["create_figure", "finalize_figure", "save_figure", "get_font_families",
+           "JAPANESE_FONTS", "FIGURE_FORMATS", "FIGURE_RC_PARAMS"]
@@ -0,0 +1,204 @@
+"""
+Hill数（有効種数）による多様度プロファイルのベクトル化計算ユーティリティ
+
+群集行列（CSR）の非ゼロ要素を1次元配列のまま扱い、全調査地 × 全次数 q の
+Σ p^q を exp(q ⊗ log p) の1回の配列演算と np.add.reduceat（行ごとの和）で求める。
+調査地・次数についての Python ループは無い（メモリを抑えるため、次数は
+BLOCK_ELEMENTS 程度ずつまとめて計算する）。
+
+q = 0 は種数、q = 1 は exp(Shannon)、q = 2 は Simpson の逆数に一致する。
+
+被覆率による標準化（Chao & Jost 2012）は、全調査地の標本被覆率を同じ値に
+揃えてから比べる方法。各調査地の標本を個体ごとに確率 π で残す間引き
+（二項分布）で縮小し、π は被覆率が目標値になるよう全調査地まとめて二分法で求める。
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+from scipy import sparse
+
+from utils.beta_diversity import BLOCK_ELEMENTS, resolve_n_jobs
+
+# 既定の次数 q（0〜3 を 0.1 刻み）
+DEFAULT_ORDERS = np.round(np.linspace(0, 3, 31), 2)
+
+# 被覆率で標準化する際の間引きの回数（結果は平均）
+DEFAULT_DRAWS = 10
+
+# 間引きの確率を求める二分法の反復回数
+BISECTION_STEPS = 40
+
+
+def _row_index(matrix: sparse.csr_matrix) -> np.ndarray:
+    """非ゼロ要素ごとの行番号"""
+    return np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+
+
+def hill_numbers(matrix, orders=DEFAULT_ORDERS) -> np.ndarray:
+    """
+    全調査地・全次数の Hill 数を計算
+
+    Args:
+        matrix: (調査地 × 種) の個体数（疎行列または配列）
+        orders: 次数 q の配列
+
+    Returns:
+        ndarray: (調査地 × 次数) の Hill 数（個体の無い調査地は0）
+    """
+    matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+    orders = np.asarray(orders, dtype=np.float64)
+    n_rows = matrix.shape[0]
+    result = np.zeros((n_rows, len(orders)))
+
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    counts = matrix.data
+    present = counts > 0
+    rows = _row_index(matrix)
+    proportions = np.divide(counts, totals[rows], out=np.zeros(len(counts)), where=present)
+    log_p = np.log(proportions, out=np.zeros(len(counts)), where=present)
+
+    # 非ゼロ要素のある行の先頭位置（reduceat は空の行の区間を正しく扱えないため除く）
+    nonempty = np.diff(matrix.indptr) > 0
+    if not nonempty.any():
+        return result
+    starts = matrix.indptr[:-1][nonempty]
+
+    step = max(1, BLOCK_ELEMENTS // max(len(counts), 1))
+    with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+        for start in range(0, len(orders), step):
+            q = orders[start:start + step]
+            # p^q（記録の無い要素は0）を全次数まとめて求め、行ごとに足す
+            powers = np.exp(q[:, None] * log_p[None, :])
+            powers *= present
+            sums = np.add.reduceat(powers, starts, axis=1)
+            exponent = np.divide(1, 1 - q, out=np.zeros(len(q)), where=q != 1)
+            result[nonempty, start:start + len(q)] = (sums ** exponent[:, None]).T
+
+        # q = 1 は極限の exp(Shannon)
+        shannon = -np.add.reduceat(proportions * log_p, starts)
+        result[np.ix_(nonempty, orders == 1)] = np.exp(shannon)[:, None]
+
+    # 個体の無い行（間引きですべて0になった行を含む）は0
+    result[totals <= 0] = 0
+    return result
+
+
+def sample_coverage(matrix, thinning: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    標本被覆率（次に得られる個体が既に記録された種である確率）の推定
+
+    間引きの確率 π を指定した場合は、各個体を確率 π で残した標本の期待被覆率
+    1 - Σ (X_i / n)(1 - π)^(X_i - 1) を返す（π = 1 で Turing の推定 1 - f1 / n）。
+
+    Args:
+        matrix: (調査地 × 種) の個体数
+        thinning: 調査地ごとの間引きの確率（Noneの場合は 1）
+
+    Returns:
+        ndarray: 調査地ごとの被覆率（個体の無い調査地は0）
+    """
+    matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    counts = matrix.data
+    rows = _row_index(matrix)
+    keep = np.ones(matrix.shape[0]) if thinning is None else np.asarray(thinning)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        missed = np.where(counts > 0, (1 - keep[rows]) ** np.maximum(counts - 1, 0), 0)
+        weights = np.divide(counts, totals[rows], out=np.zeros(len(counts)),
+                            where=totals[rows] > 0)
+    coverage = 1 - np.bincount(rows, weights=weights * missed, minlength=matrix.shape[0])
+    return np.where(totals > 0, coverage, 0.0)
+
+
+def thinning_for_coverage(matrix, coverage: float) -> np.ndarray:
+    """
+    被覆率が coverage になる間引きの確率 π を全調査地まとめて二分法で求める
+
+    Args:
+        matrix: (調査地 × 種) の個体数
+        coverage: 目標の被覆率
+
+    Returns:
+        ndarray: 調査地ごとの π（被覆率が目標に届かない調査地は NaN）
+    """
+    n_rows = matrix.shape[0]
+    lower = np.zeros(n_rows)
+    upper = np.ones(n_rows)
+    for _ in range(BISECTION_STEPS):
+        middle = (lower + upper) / 2
+        reached = sample_coverage(matrix, middle) >= coverage
+        upper = np.where(reached, middle, upper)
+        lower = np.where(reached, lower, middle)
+
+    return np.where(sample_coverage(matrix) >= coverage, upper, np.nan)
+
+
+def standardized_hill_numbers(matrix, orders=DEFAULT_ORDERS, coverage: Optional[float] = None,
+                              n_draws: int = DEFAULT_DRAWS, n_jobs: Optional[int] = 1,
+                              random_state: Optional[int] = 42) -> Dict[str, np.ndarray]:
+    """
+    被覆率で標準化した Hill 数（全調査地の標本被覆率を揃えた多様度プロファイル）
+
+    各調査地の標本を、被覆率が coverage になる確率 π で間引き（各種の個体数を
+    二項分布 B(X_i, π) で縮小）し、n_draws 回の Hill 数の平均をとる。
+    間引きは全調査地の非ゼロ要素をまとめて1回の乱数生成で行い、各回を
+    スレッドで並列に計算する（回ごとに乱数の系列を分けるため、結果は並列数によらない）。
+
+    Args:
+        matrix: (調査地 × 種) の個体数
+        orders: 次数 q の配列
+        coverage: 目標の被覆率（Noneの場合は被覆率が0より大きい調査地の最小値）
+        n_draws: 間引きの回数
+        n_jobs: 並列数（-1 は全コア）
+        random_state: 乱数シード
+
+    Returns:
+        Dict: 'profiles'（調査地 × 次数。被覆率が目標に届かない調査地は NaN）,
+              'coverage'（目標の被覆率）, 'site_coverage'（調査地ごとの被覆率）,
+              'sample_size'（間引き後の期待個体数）
+    """
+    matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+    site_coverage = sample_coverage(matrix)
+    if coverage is None:
+        positive = site_coverage[site_coverage > 0]
+        if len(positive) == 0:
+            raise ValueError("被覆率が0より大きい調査地がありません（記録がすべて1個体の種です）")
+        coverage = float(positive.min())
+    if not 0 < coverage <= 1:
+        raise ValueError(f"被覆率は0より大きく1以下で指定してください: {coverage}")
+
+    thinning = thinning_for_coverage(matrix, coverage)
+    reachable = ~np.isnan(thinning)
+    rows = _row_index(matrix)
+    probabilities = np.nan_to_num(thinning)[rows]
+    counts = matrix.data.astype(np.int64)
+    seeds = np.random.SeedSequence(random_state).spawn(n_draws)
+
+    def compute(seed):
+        rng = np.random.default_rng(seed)
+        thinned = sparse.csr_matrix((rng.binomial(counts, probabilities).astype(np.float64),
+                                     matrix.indices, matrix.indptr), shape=matrix.shape)
+        return hill_numbers(thinned, orders)
+
+    jobs = min(resolve_n_jobs(n_jobs), max(n_draws, 1))
+    if jobs == 1:
+        draws = [compute(seed) for seed in seeds]
+    else:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            draws = list(executor.map(compute, seeds))
+
+    profiles = np.mean(draws, axis=0) if draws else hill_numbers(matrix, orders)
+    profiles[~reachable] = np.nan
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    return {
+        'profiles': profiles,
+        'coverage': coverage,
+        'site_coverage': site_coverage,
+        'sample_size': np.where(reachable, np.nan_to_num(thinning) * totals, np.nan),
+    }
+
+
+__all__ = ["DEFAULT_ORDERS", "DEFAULT_DRAWS", "hill_numbers", "sample_coverage",
+           "thinning_for_coverage", "standardized_hill_numbers"]
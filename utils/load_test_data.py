@@ -0,0 +1,437 @@
+"""
+負荷試験用の大規模サンプルデータ生成ユーティリティ
+
+親調査地 1,000 / 調査地 10万 / 調査イベント 100万 / アリ類記録 2,000万
+といった規模のデータを、固定シードで再現可能に一括投入する。
+
+- 種の個体数分布: 対数正規分布（Prestonの種-個体数分布）
+- 空間構造: 地域 → 親調査地 → 調査地 の入れ子クラスタ
+- 群集構造: 標高由来の環境勾配に対する種ごとのニッチ（ガウス応答）
+"""
+import os
+import time
+from typing import Dict
+
+import numpy as np
+
+from models.site_species_summary import SiteSpeciesSummary
+from models.export_checkpoint import ExportCheckpoint
+from models.data_version import DataVersion
+from models.search_index import SearchIndex
+
+
+# 規模プリセット（親調査地, 調査地, 調査イベント, 種数）
+LOAD_TEST_SCALES = {
+    'small': dict(num_parent_sites=50, num_survey_sites=1_000,
+                  num_events=10_000, num_species=100),
+    'medium': dict(num_parent_sites=200, num_survey_sites=10_000,
+                   num_events=100_000, num_species=200),
+    'large': dict(num_parent_sites=1_000, num_survey_sites=100_000,
+                  num_events=1_000_000, num_species=300),
+}
+
+# 日本の代表的な地域（名称プレフィックス, 緯度中心, 経度中心, 標高範囲）
+REGIONS = [
+    ('北海道', 43.0, 141.3, (50, 500)),
+    ('東北', 38.5, 140.5, (100, 800)),
+    ('関東', 36.0, 139.5, (50, 1500)),
+    ('中部', 35.5, 138.0, (200, 2000)),
+    ('近畿', 35.0, 135.5, (50, 1000)),
+    ('中国', 34.5, 133.5, (100, 1200)),
+    ('四国', 33.5, 133.5, (50, 1500)),
+    ('九州', 32.5, 130.5, (50, 1300)),
+]
+
+ENVIRONMENT_TYPES = ['森林', '草地', '山地', '平地', '丘陵', '河川敷', '湿地', '海岸']
+
+# 属名と亜科の対応
+GENERA = [
+    ('Formica', 'Formicinae'), ('Camponotus', 'Formicinae'),
+    ('Lasius', 'Formicinae'), ('Nylanderia', 'Formicinae'),
+    ('Polyrhachis', 'Formicinae'), ('Tetramorium', 'Myrmicinae'),
+    ('Pheidole', 'Myrmicinae'), ('Crematogaster', 'Myrmicinae'),
+    ('Myrmica', 'Myrmicinae'), ('Aphaenogaster', 'Myrmicinae'),
+    ('Temnothorax', 'Myrmicinae'), ('Strumigenys', 'Myrmicinae'),
+    ('Ponera', 'Ponerinae'), ('Brachyponera', 'Ponerinae'),
+    ('Proceratium', 'Proceratiinae'), ('Technomyrmex', 'Dolichoderinae'),
+]
+
+TREE_SPECIES = ['ブナ', 'ミズナラ', 'コナラ', 'スギ', 'ヒノキ',
+                'カラマツ', 'アカマツ', 'クロマツ', 'シイ', 'カシ']
+SASA_SPECIES = ['スズタケ', 'チシマザサ', 'ミヤコザサ', None]
+HERB_SPECIES = ['イタドリ', 'ススキ', 'オオバコ', None]
+LITTER_TYPES = ['広葉樹', '針葉樹', '混合', None]
+WEATHER_OPTIONS = ['晴れ', '曇り', '雨', '雪']
+SURVEYORS = ['研究者A', '研究者B', '研究者C', None]
+
+# 一括投入中に外すトリガー・インデックス（投入後に再作成・再構築）
+_BULK_LOAD_INDEXES = ['idx_ant_records_event', 'idx_ant_records_species']
+
+
+def _insert_rows(cursor, sql: str, columns) -> int:
+    """
+    列配列をまとめて executemany で投入
+
+    Args:
+        cursor: データベースカーソル
+        sql: INSERT文
+        columns: 各列の配列（numpy配列またはリスト）
+
+    Returns:
+        int: 投入行数
+    """
+    column_lists = [col.tolist() if isinstance(col, np.ndarray) else list(col)
+                    for col in columns]
+    cursor.executemany(sql, zip(*column_lists))
+    return len(column_lists[0]) if column_lists else 0
+
+
+def _pick(rng, options, size):
+    """選択肢（Noneを含む）から一様に選ぶ"""
+    index = rng.integers(0, len(options), size)
+    return [options[i] for i in index.tolist()]
+
+
+def _drop_bulk_load_objects(cursor) -> None:
+    """集計・全文検索・変更ログ・データ版数のトリガーと記録テーブルの副インデックスを外す"""
+    cursor.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type = 'trigger'
+        AND (name LIKE 'trg_summary_%' OR name LIKE 'trg_%_fts_%'
+             OR name LIKE 'trg_changes_%' OR name LIKE 'trg_version_%')
+    """)
+    for (trigger_name,) in cursor.fetchall():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+
+    for index_name in _BULK_LOAD_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+
+def _generate_species(cursor, rng, num_species: int):
+    """
+    種マスタを生成
+
+    Returns:
+        (個体数重み, 環境最適値, ニッチ幅) の配列
+    """
+    names, genera, subfamilies = [], [], []
+    for i in range(num_species):
+        genus, subfamily = GENERA[i % len(GENERA)]
+        names.append(f"{genus} sp.{i + 1:04d}")
+        genera.append(genus)
+        subfamilies.append(subfamily)
+
+    ids = np.arange(1, num_species + 1)
+    _insert_rows(cursor, """
+        INSERT INTO species_master (id, name, genus, subfamily)
+        VALUES (?, ?, ?, ?)
+    """, [ids, names, genera, subfamilies])
+
+    # 対数正規の種-個体数分布（少数の優占種と多数の稀少種）
+    abundance = rng.lognormal(mean=0.0, sigma=1.5, size=num_species)
+    abundance /= abundance.sum()
+
+    optimum = rng.uniform(0.0, 1.0, num_species)
+    breadth = rng.uniform(0.08, 0.35, num_species)
+
+    return abundance, optimum, breadth
+
+
+def _generate_parent_sites(cursor, rng, num_parent_sites: int):
+    """
+    親調査地を生成（地域中心のまわりにクラスタ状に配置）
+
+    Returns:
+        (緯度, 経度, 標高, 環境値) の配列
+    """
+    region_index = rng.integers(0, len(REGIONS), num_parent_sites)
+    centers = np.array([(lat, lon) for _, lat, lon, _ in REGIONS])
+    alt_ranges = np.array([alt for _, _, _, alt in REGIONS], dtype=float)
+
+    latitude = centers[region_index, 0] + rng.normal(0, 0.3, num_parent_sites)
+    longitude = centers[region_index, 1] + rng.normal(0, 0.3, num_parent_sites)
+    alt_low = alt_ranges[region_index, 0]
+    alt_high = alt_ranges[region_index, 1]
+    altitude = alt_low + rng.uniform(0, 1, num_parent_sites) * (alt_high - alt_low)
+
+    # 環境値: 標高の相対位置 + ノイズ（0-1）
+    habitat = np.clip(altitude / 2000 + rng.normal(0, 0.1, num_parent_sites), 0, 1)
+
+    env_types = _pick(rng, ENVIRONMENT_TYPES, num_parent_sites)
+    names = [f"{REGIONS[r][0]}_{env}地点{i + 1:05d}"
+             for i, (r, env) in enumerate(zip(region_index.tolist(), env_types))]
+    remarks = [f"{REGIONS[r][0]}地域の{env}に位置する調査地点"
+               for r, env in zip(region_index.tolist(), env_types)]
+
+    ids = np.arange(1, num_parent_sites + 1)
+    _insert_rows(cursor, """
+        INSERT INTO parent_sites (id, name, latitude, longitude, altitude, remarks)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [ids, names, np.round(latitude, 6), np.round(longitude, 6),
+          np.round(altitude, 1), remarks])
+
+    return latitude, longitude, altitude, habitat
+
+
+def _generate_survey_sites(cursor, rng, num_survey_sites: int, parents):
+    """
+    調査地を生成（親調査地の周辺に配置）
+
+    Returns:
+        np.ndarray: 各調査地の環境値
+    """
+    parent_lat, parent_lon, parent_alt, parent_habitat = parents
+    parent_index = rng.integers(0, len(parent_lat), num_survey_sites)
+
+    latitude = parent_lat[parent_index] + rng.normal(0, 0.01, num_survey_sites)
+    longitude = parent_lon[parent_index] + rng.normal(0, 0.01, num_survey_sites)
+    altitude = np.maximum(parent_alt[parent_index] + rng.normal(0, 30, num_survey_sites), 0)
+    area = np.round(rng.uniform(10, 1000, num_survey_sites), 1)
+    habitat = np.clip(parent_habitat[parent_index] + rng.normal(0, 0.05, num_survey_sites), 0, 1)
+
+    plot_types = _pick(rng, ['A', 'B', 'C', 'D'], num_survey_sites)
+    names = [f"プロット{plot}{i + 1:06d}" for i, plot in enumerate(plot_types)]
+    remarks = [f"優占種: {tree}林" for tree in _pick(rng, TREE_SPECIES, num_survey_sites)]
+
+    ids = np.arange(1, num_survey_sites + 1)
+    _insert_rows(cursor, """
+        INSERT INTO survey_sites
+        (id, parent_site_id, name, latitude, longitude, altitude, area, remarks)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [ids, parent_index + 1, names, np.round(latitude, 6),
+          np.round(longitude, 6), np.round(altitude, 1), area, remarks])
+
+    return habitat
+
+
+def _generate_events(cursor, rng, event_ids, site_index, site_habitat):
+    """調査イベントと植生データ（1イベント1件）を生成"""
+    n = len(event_ids)
+
+    # 過去3年間のランダムな日付・時刻
+    days = rng.integers(0, 3 * 365, n)
+    dates = (np.datetime64('2023-01-01') + days).astype(str)
+    hours = rng.integers(8, 17, n)
+    survey_dates = [f"{d} {h:02d}:00" for d, h in zip(dates.tolist(), hours.tolist())]
+
+    _insert_rows(cursor, """
+        INSERT INTO survey_events
+        (id, survey_site_id, survey_date, surveyor_name, weather, temperature, remarks)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [event_ids, site_index + 1, survey_dates,
+          _pick(rng, SURVEYORS, n), _pick(rng, WEATHER_OPTIONS, n),
+          np.round(rng.uniform(5, 30, n), 1), [None] * n])
+
+    # 植生は環境値と相関させる（環境値が高いほど閉鎖林）
+    habitat = site_habitat[site_index]
+    canopy = np.clip(20 + 75 * habitat + rng.normal(0, 8, n), 0, 100)
+
+    _insert_rows(cursor, """
+        INSERT INTO vegetation_data
+        (survey_event_id, dominant_tree, dominant_sasa, dominant_herb, litter_type,
+         basal_area, avg_tree_height, avg_herb_height, soil_temperature,
+         canopy_coverage, sasa_coverage, herb_coverage, litter_coverage,
+         light_condition, soil_moisture, vegetation_complexity)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [event_ids,
+          _pick(rng, TREE_SPECIES, n), _pick(rng, SASA_SPECIES, n),
+          _pick(rng, HERB_SPECIES, n), _pick(rng, LITTER_TYPES, n),
+          np.round(10 + 40 * habitat + rng.normal(0, 3, n).clip(-9, 9), 1),
+          np.round(5 + 20 * habitat + rng.normal(0, 2, n).clip(-4, 4), 1),
+          np.round(rng.uniform(10, 100, n), 1),
+          np.round(rng.uniform(5, 25, n), 1),
+          np.round(canopy, 1),
+          np.round(rng.uniform(0, 80, n), 1),
+          np.round(rng.uniform(5, 60, n), 1),
+          np.round(rng.uniform(30, 90, n), 1),
+          np.clip(5 - np.round(canopy / 25), 1, 5).astype(int),
+          rng.integers(1, 6, n),
+          rng.integers(1, 6, n)])
+
+
+def _generate_ant_records(cursor, rng, event_ids, event_habitat, species,
+                          mean_species_per_event: float) -> int:
+    """
+    アリ類出現記録を生成
+
+    各イベントの出現種は「個体数重み × 環境適合度」に比例した
+    非復元抽出（Gumbel-top-k法）でまとめて選ぶ。
+
+    Returns:
+        int: 生成した記録数
+    """
+    abundance, optimum, breadth = species
+    num_species = len(abundance)
+    n = len(event_ids)
+
+    # イベント×種の出現重み（対数）
+    suitability = -((event_habitat[:, None] - optimum[None, :]) ** 2) / (2 * breadth ** 2)
+    log_weight = np.log(abundance)[None, :] + suitability
+
+    # 出現種数（ポアソン、1以上）
+    k_max = min(num_species, int(mean_species_per_event * 2.5) + 1)
+    k = np.clip(rng.poisson(mean_species_per_event, n), 1, k_max)
+
+    # Gumbel-top-k: 重み付き非復元抽出を行列演算で
+    keys = log_weight + rng.gumbel(size=(n, num_species))
+    top = np.argpartition(-keys, k_max - 1, axis=1)[:, :k_max]
+    order = np.argsort(-np.take_along_axis(keys, top, axis=1), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+
+    mask = np.arange(k_max)[None, :] < k[:, None]
+    record_event = np.broadcast_to(event_ids[:, None], top.shape)[mask]
+    record_species = top[mask]
+
+    # 個体数: 重みに比例した平均の負の二項分布（集中分布）
+    weight = np.exp(np.take_along_axis(log_weight, top, axis=1)[mask])
+    mean_count = 2 + 400 * weight
+    dispersion = 0.8
+    counts = 1 + rng.negative_binomial(dispersion, dispersion / (dispersion + mean_count))
+
+    return _insert_rows(cursor, """
+        INSERT INTO ant_records (survey_event_id, species_id, count)
+        VALUES (?, ?, ?)
+    """, [record_event, record_species + 1, counts])
+
+
+def generate_load_test_data(db_path: str,
+                            num_parent_sites: int = 1_000,
+                            num_survey_sites: int = 100_000,
+                            num_events: int = 1_000_000,
+                            num_species: int = 300,
+                            mean_species_per_event: float = 20.0,
+                            seed: int = 42,
+                            chunk_size: int = 10_000,
+                            overwrite: bool = False) -> Dict[str, float]:
+    """
+    負荷試験用の大規模データベースを生成
+
+    Args:
+        db_path: 生成するデータベースファイルのパス
+        num_parent_sites: 親調査地の数
+        num_survey_sites: 調査地の数
+        num_events: 調査イベントの数
+        num_species: アリ種の数
+        mean_species_per_event: 1イベントあたりの平均出現種数
+        seed: 乱数シード
+        chunk_size: イベントを一括生成する単位
+        overwrite: 既存ファイルを上書きするか
+
+    Returns:
+        Dict: 各テーブルの生成件数と所要時間（秒）
+    """
+    from models.database import Database
+
+    if os.path.exists(db_path):
+        if not overwrite:
+            raise ValueError(f"データベースが既に存在します: {db_path}")
+        os.remove(db_path)
+
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+
+    database = Database(db_path)
+    database.initialize_schema()
+    conn = database.connect()
+    cursor = conn.cursor()
+
+    # 一括投入用の設定（ジャーナル・同期・外部キー検査を省略）
+    cursor.execute("PRAGMA foreign_keys = OFF")
+    cursor.execute("PRAGMA journal_mode = OFF")
+    cursor.execute("PRAGMA synchronous = OFF")
+    cursor.execute("PRAGMA cache_size = -262144")
+    _drop_bulk_load_objects(cursor)
+
+    try:
+        print(f"  種マスタを {num_species} 種生成中...")
+        species = _generate_species(cursor, rng, num_species)
+
+        print(f"  親調査地を {num_parent_sites:,} 件生成中...")
+        parents = _generate_parent_sites(cursor, rng, num_parent_sites)
+
+        print(f"  調査地を {num_survey_sites:,} 件生成中...")
+        site_habitat = _generate_survey_sites(cursor, rng, num_survey_sites, parents)
+        conn.commit()
+
+        # 調査頻度の偏り（よく調べられる調査地がある）
+        site_weight = rng.gamma(0.7, 1.0, num_survey_sites)
+        site_weight /= site_weight.sum()
+
+        print(f"  調査イベント・植生・アリ類記録を {num_events:,} イベント分生成中...")
+        record_count = 0
+        for start in range(0, num_events, chunk_size):
+            stop = min(start + chunk_size, num_events)
+            event_ids = np.arange(start + 1, stop + 1)
+            site_index = rng.choice(num_survey_sites, size=len(event_ids), p=site_weight)
+
+            _generate_events(cursor, rng, event_ids, site_index, site_habitat)
+            event_habitat = np.clip(
+                site_habitat[site_index] + rng.normal(0, 0.03, len(event_ids)), 0, 1)
+            record_count += _generate_ant_records(
+                cursor, rng, event_ids, event_habitat, species, mean_species_per_event)
+            conn.commit()
+
+            print(f"    {stop:,} / {num_events:,} イベント"
+                  f"（記録 {record_count:,} 件, {time.perf_counter() - started:.0f}秒）")
+
+        # インデックス・トリガーを戻し、集計テーブルと全文検索索引を再構築
+        print("  インデックスと集計テーブルを再構築中...")
+        database._create_indexes(cursor)
+        conn.commit()
+        summary_rows = SiteSpeciesSummary(conn).rebuild()
+        SearchIndex(conn)  # 新規作成時に索引を構築
+        ExportCheckpoint(conn)  # 変更ログのトリガーを戻す
+        DataVersion(conn).bump()  # トリガーを戻し、生成前の地図キャッシュを無効にする
+        cursor.execute("ANALYZE")
+        conn.commit()
+
+    finally:
+        cursor.execute("PRAGMA journal_mode = DELETE")
+        cursor.execute("PRAGMA synchronous = FULL")
+        database.close()
+
+    elapsed = time.perf_counter() - started
+    result = {
+        'parent_sites': num_parent_sites,
+        'survey_sites': num_survey_sites,
+        'survey_events': num_events,
+        'vegetation_data': num_events,
+        'species': num_species,
+        'ant_records': record_count,
+        'site_species_summary': summary_rows,
+        'elapsed_seconds': round(elapsed, 1),
+    }
+
+    print(f"\n  ✓ 負荷試験データ生成完了（{elapsed:.1f}秒）: {db_path}")
+    for key, value in result.items():
+        print(f"     - {key}: {value:,}")
+
+    return result
+
+
+if __name__ == "__main__":
+    # 実行例: python -m utils.load_test_data data/load_test.db --scale large
+    import argparse
+
+    parser = argparse.ArgumentParser(description='負荷試験用の大規模データを生成します')
+    parser.add_argument('db_path', help='生成するデータベースファイル')
+    parser.add_argument('--scale', choices=list(LOAD_TEST_SCALES), default='large',
+                        help='規模プリセット（個別指定で上書き可）')
+    parser.add_argument('--parent-sites', type=int, dest='num_parent_sites')
+    parser.add_argument('--survey-sites', type=int, dest='num_survey_sites')
+    parser.add_argument('--events', type=int, dest='num_events')
+    parser.add_argument('--species', type=int, dest='num_species')
+    parser.add_argument('--species-per-event', type=float, default=20.0,
+                        dest='mean_species_per_event')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--overwrite', action='store_true')
+    args = parser.parse_args()
+
+    options = dict(LOAD_TEST_SCALES[args.scale])
+    for key in ('num_parent_sites', 'num_survey_sites', 'num_events', 'num_species'):
+        if getattr(args, key) is not None:
+            options[key] = getattr(args, key)
+
+    generate_load_test_data(args.db_path,
+                            mean_species_per_event=args.mean_species_per_event,
+                            seed=args.seed, overwrite=args.overwrite, **options)
@@ -0,0 +1,154 @@
+"""
+Mantel 検定・部分 Mantel 検定ユーティリティ
+
+距離行列は condensed 形式（上三角の1次元配列。utils.beta_diversity や scipy の pdist と
+同じ並び）で受け取る。相関は標準化した距離の内積として求め、並べ替えごとの統計量は
+並べ替えた行列と標準化済みの行列の内積（BLAS）1回で計算する。
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from utils.beta_diversity import resolve_n_jobs
+from utils.ordination import condensed_to_n
+
+# 相関係数の種類
+MANTEL_METHODS = ('pearson', 'spearman')
+
+# 対立仮説（greater: 正の相関）
+MANTEL_ALTERNATIVES = ('greater', 'less', 'two-sided')
+
+# 1回の進捗通知・並列処理の単位とする並べ替えの回数
+PERMUTATION_CHUNK = 50
+
+
+def _standardize(values: np.ndarray, method: str) -> np.ndarray:
+    """距離を平均0・標準偏差1に変換（spearman は順位に変換してから）"""
+    values = np.asarray(values, dtype=np.float64)
+    if not np.all(np.isfinite(values)):
+        raise ValueError("距離に欠損値または無限大が含まれています")
+    if method == 'spearman':
+        from scipy.stats import rankdata
+        values = rankdata(values)
+
+    std = values.std()
+    if std == 0:
+        raise ValueError("距離がすべて同じ値のため相関を計算できません")
+    return (values - values.mean()) / std
+
+
+def _partial(r_xy, r_xz, r_yz):
+    """z の影響を除いた x と y の偏相関係数"""
+    return (r_xy - r_xz * r_yz) / np.sqrt((1 - r_xz ** 2) * (1 - r_yz ** 2))
+
+
+def mantel(x: np.ndarray, y: np.ndarray, z: Optional[np.ndarray] = None,
+           method: str = 'pearson', permutations: int = 999,
+           alternative: str = 'greater', n_jobs: Optional[int] = 1,
+           random_state: Optional[int] = 42,
+           progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, object]:
+    """
+    Mantel 検定（z を指定した場合は部分 Mantel 検定）
+
+    x の地点の並びを並べ替えて統計量の分布を求める（R vegan の mantel / mantel.partial と同じ）。
+    並べ替えは PERMUTATION_CHUNK 回ずつに分け、n_jobs > 1 ではスレッドで並列に計算する
+    （取り出し・内積は GIL を解放する。まとまりごとに乱数の系列を分けるため、
+    結果は並列数によらない）。正方行列を並列数 × 2 個分使うため、メモリは地点数の2乗に比例する。
+
+    Args:
+        x, y: 距離（condensed 形式）
+        z: 影響を除く距離（condensed 形式）
+        method: 'pearson' / 'spearman'
+        permutations: 並べ替えの回数（0 の場合は p 値を計算しない）
+        alternative: 'greater' / 'less' / 'two-sided'
+        n_jobs: 並列数（-1 は全コア）
+        random_state: 乱数シード
+        progress: 進捗コールバック (計算済みの並べ替え回数, 全回数)
+
+    Returns:
+        Dict: r（統計量）, p_value, distribution（並べ替えた統計量）, n（地点数）, method
+    """
+    if method not in MANTEL_METHODS:
+        raise ValueError(f"相関係数の種類が不正です: {method}")
+    if alternative not in MANTEL_ALTERNATIVES:
+        raise ValueError(f"対立仮説が不正です: {alternative}")
+    if len(x) != len(y) or (z is not None and len(z) != len(x)):
+        raise ValueError("距離の長さ（地点数）が一致しません")
+
+    n = condensed_to_n(len(x))
+    if n < 3:
+        raise ValueError("Mantel検定には3地点以上が必要です")
+
+    xs = _standardize(x, method)
+    ys = _standardize(y, method)
+    size = len(xs)
+    r_xy = float(xs @ ys) / size
+    if z is None:
+        statistic = r_xy
+    else:
+        zs = _standardize(z, method)
+        r_xz = float(xs @ zs) / size
+        r_yz = float(ys @ zs) / size
+        statistic = float(_partial(r_xy, r_xz, r_yz))
+
+    distribution = np.empty(max(permutations, 0))
+    p_value = float('nan')
+    if permutations > 0:
+        from scipy.spatial.distance import squareform
+
+        # 並べ替えは正方行列の行・列の取り出しで行う（condensed 配列の位置を計算して
+        # 取り出すより、行ごとに連続したメモリを読むため約2倍速い）。対角は0のため、
+        # 全要素の積和は上三角の積和の2倍になる
+        square_x = squareform(xs)
+        square_y = squareform(ys)
+        square_z = squareform(zs) if z is not None else None
+        chunks = [(start, min(start + PERMUTATION_CHUNK, permutations))
+                  for start in range(0, permutations, PERMUTATION_CHUNK)]
+        seeds = np.random.SeedSequence(random_state).spawn(len(chunks))
+
+        def compute(chunk, seed):
+            start, stop = chunk
+            rng = np.random.default_rng(seed)
+            rows = np.empty_like(square_x)
+            permuted = np.empty_like(square_x)
+            for index in range(start, stop):
+                order = rng.permutation(n)
+                # mode='clip' は out への書き込みで一時配列を作らない（order は範囲内）
+                np.take(square_x, order, axis=0, out=rows, mode='clip')
+                np.take(rows, order, axis=1, out=permuted, mode='clip')
+                r = np.vdot(permuted, square_y) / (2 * size)
+                if z is not None:
+                    r = _partial(r, np.vdot(permuted, square_z) / (2 * size), r_yz)
+                distribution[index] = r
+            return stop - start
+
+        done = 0
+        jobs = min(resolve_n_jobs(n_jobs), len(chunks))
+        if jobs == 1:
+            for chunk, seed in zip(chunks, seeds):
+                done += compute(chunk, seed)
+                if progress:
+                    progress(done, permutations)
+        else:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                for count in executor.map(compute, chunks, seeds):
+                    done += count
+                    if progress:
+                        progress(done, permutations)
+
+        # 浮動小数点の誤差で観測値と同じ値を取りこぼさないよう、わずかに緩めて数える
+        tolerance = 1e-12
+        if alternative == 'greater':
+            exceed = np.sum(distribution >= statistic - tolerance)
+        elif alternative == 'less':
+            exceed = np.sum(distribution <= statistic + tolerance)
+        else:
+            exceed = np.sum(np.abs(distribution) >= abs(statistic) - tolerance)
+        p_value = (int(exceed) + 1) / (permutations + 1)
+
+    return {'r': statistic, 'p_value': p_value, 'distribution': distribution,
+            'n': n, 'method': method}
+
+
+__all__ = ["MANTEL_METHODS", "MANTEL_ALTERNATIVES", "mantel"]
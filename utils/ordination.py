@@ -0,0 +1,329 @@
+"""
+群集データの序列化（PCoA / NMDS）と環境ベクトルの当てはめユーティリティ
+
+非類似度は utils.beta_diversity と同じ condensed 形式（上三角の1次元配列、np.memmap 可）で受け取る。
+
+- PCoA: 二重中心化した行列 B = -1/2·J·D²·J の固有分解。
+  地点数が多い場合は B を作らず、condensed 配列から行ブロックを復元しながら
+  B との積だけを計算するランダム化固有分解（Halko ら）で上位の軸を求める
+- NMDS: 非計量 SMACOF を複数の初期配置から実行し、
+  ストレス（Kruskal の stress-1）が最小の配置を採用する
+- 環境ベクトル: 変数を軸の得点に線形回帰し、方向・決定係数・並べ替え検定の p 値を求める
+  （R vegan の envfit と同じ考え方）
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.beta_diversity import BLOCK_ELEMENTS, resolve_n_jobs
+
+# PCoA を正方行列の固有分解で計算する地点数の上限（超える場合はランダム化固有分解）
+PCOA_EXACT_MAX_SITES = 3000
+
+# ランダム化固有分解の追加次元数とべき乗反復の回数
+# （Bray-Curtis のように固有値の減衰が緩やかな場合でも上位の固有値の誤差が0.1%未満になる値）
+RANDOMIZED_OVERSAMPLES = 20
+RANDOMIZED_POWER_ITERATIONS = 7
+
+
+def condensed_to_n(size: int) -> int:
+    """condensed 形式の長さから地点数 n を求める"""
+    n = int(round((1 + np.sqrt(1 + 8 * size)) / 2))
+    if n * (n - 1) // 2 != size:
+        raise ValueError(f"condensed 形式の長さが不正です: {size}")
+    return n
+
+
+def _square_rows(condensed: np.ndarray, n: int, start: int, stop: int) -> np.ndarray:
+    """condensed 形式から正方行列の行 [start, stop) を復元"""
+    rows = np.arange(start, stop)[:, None]
+    cols = np.arange(n)[None, :]
+    low = np.minimum(rows, cols)
+    high = np.maximum(rows, cols)
+    index = low * n - low * (low + 1) // 2 + (high - low - 1)
+    block = np.asarray(condensed)[np.where(rows == cols, 0, index)]
+    block[rows[:, 0] - start, rows[:, 0]] = 0.0
+    return block
+
+
+def _centered_product(condensed: np.ndarray, n: int, matrix: np.ndarray) -> np.ndarray:
+    """
+    B·M（B = -1/2·J·D²·J）を B を作らずに計算
+
+    J·M は列ごとの平均を引く操作のため、D² との積を行ブロックごとに求めて前後で中心化する。
+    """
+    centered = matrix - matrix.mean(axis=0)
+    product = np.empty_like(centered)
+    step = max(1, BLOCK_ELEMENTS // n)
+    for start in range(0, n, step):
+        stop = min(start + step, n)
+        product[start:stop] = (_square_rows(condensed, n, start, stop) ** 2) @ centered
+    product -= product.mean(axis=0)
+    return -0.5 * product
+
+
+def pcoa(condensed: np.ndarray, n_components: int = 2, solver: str = 'auto',
+         random_state: Optional[int] = 42) -> Dict[str, np.ndarray]:
+    """
+    主座標分析（PCoA）
+
+    寄与率は固有値 / trace(B)。非ユークリッドな非類似度（Bray-Curtis など）では
+    負の固有値があるため、正の軸の寄与率の合計は1を超えることがある。
+
+    Args:
+        condensed: 非類似度（condensed 形式）
+        n_components: 求める軸の数
+        solver: 'auto' / 'exact'（正方行列の固有分解） / 'randomized'
+        random_state: ランダム化固有分解の乱数シード
+
+    Returns:
+        Dict: scores（地点 × 軸）, eigenvalues, explained（寄与率）
+    """
+    if solver not in ('auto', 'exact', 'randomized'):
+        raise ValueError(f"計算方法が不正です: {solver}")
+
+    n = condensed_to_n(len(condensed))
+    n_components = min(n_components, n - 1)
+    if n_components < 1:
+        raise ValueError("序列化には2地点以上が必要です")
+
+    # trace(B) = Σ_{i<j} d² / n
+    trace = float(np.sum(np.square(condensed, dtype=np.float64))) / n
+
+    if solver == 'exact' or (solver == 'auto' and n <= PCOA_EXACT_MAX_SITES):
+        from scipy.linalg import eigh
+        from scipy.spatial.distance import squareform
+        squared = squareform(np.asarray(condensed, dtype=np.float64)) ** 2
+        row_means = squared.mean(axis=0)
+        b = -0.5 * (squared - row_means[:, None] - row_means[None, :] + row_means.mean())
+        del squared
+        eigenvalues, vectors = eigh(b, subset_by_index=[n - n_components, n - 1])
+    else:
+        # ランダム化固有分解: B の値域を少数の列で近似し、小さな行列の固有分解に帰着する
+        rng = np.random.default_rng(random_state)
+        width = min(n, n_components + RANDOMIZED_OVERSAMPLES)
+        basis, _ = np.linalg.qr(_centered_product(condensed, n, rng.standard_normal((n, width))))
+        for _ in range(RANDOMIZED_POWER_ITERATIONS):
+            basis, _ = np.linalg.qr(_centered_product(condensed, n, basis))
+        small = basis.T @ _centered_product(condensed, n, basis)
+        eigenvalues, small_vectors = np.linalg.eigh((small + small.T) / 2)
+        eigenvalues = eigenvalues[-n_components:]
+        vectors = basis @ small_vectors[:, -n_components:]
+
+    # 固有値の大きい順に並べ替え、正の固有値の軸だけを座標にする
+    order = np.argsort(eigenvalues)[::-1]
+    eigenvalues = eigenvalues[order]
+    vectors = vectors[:, order]
+    scores = vectors * np.sqrt(np.maximum(eigenvalues, 0))
+
+    # 軸の向きを揃える（各軸で絶対値最大の得点を正にする）
+    signs = np.sign(scores[np.abs(scores).argmax(axis=0), np.arange(scores.shape[1])])
+    scores = scores * np.where(signs == 0, 1, signs)
+
+    return {
+        'scores': scores,
+        'eigenvalues': eigenvalues,
+        'explained': eigenvalues / trace if trace > 0 else np.zeros_like(eigenvalues),
+    }
+
+
+def _nmds_single(dissimilarities: np.ndarray, order: np.ndarray, tied: np.ndarray,
+                 tie_groups: np.ndarray, init: np.ndarray, max_iter: int, tolerance: float):
+    """
+    非計量 SMACOF を1つの初期配置から実行
+
+    Args:
+        dissimilarities: 非類似度（condensed 形式）
+        order: 非類似度の昇順の並び
+        tied: order の並びで、同順位の組がある位置
+        tie_groups: tied の位置の同順位グループ番号（0 始まりの連番）
+        init: 初期配置（地点 × 軸）
+        max_iter: 最大反復回数
+        tolerance: stress の相対的な改善がこれを下回ったら終了
+
+    Returns:
+        (scores, stress): 配置と stress-1
+    """
+    from scipy.optimize import isotonic_regression
+    from scipy.spatial.distance import pdist, squareform
+
+    n = init.shape[0]
+    n_pairs = len(dissimilarities)
+    scores = init - init.mean(axis=0)
+    positions = order.copy()
+
+    def monotone_fit(distances):
+        # 単調回帰（同順位の組は現在の距離の順に並べる: primary approach）。
+        # 並べ替えるのは同順位の組だけで、グループ番号 + 距離の相対値を1つのキーにする
+        if len(tied):
+            tied_distances = distances[order[tied]]
+            key = tie_groups + tied_distances / (2 * max(float(tied_distances.max()), 1e-300))
+            positions[tied] = order[tied[np.argsort(key)]]
+        fitted = np.empty(n_pairs)
+        fitted[positions] = isotonic_regression(distances[positions]).x
+        stress = np.sqrt(float(np.sum((distances - fitted) ** 2))
+                         / max(float(distances @ distances), 1e-300))
+        return fitted, stress
+
+    distances = pdist(scores)
+    # 最初の反復は非類似度そのものを当てはめ値にする（R の smacof と同じ。
+    # ランダムな初期配置を非類似度の大小に沿った配置に近づけ、局所解に陥りにくくする）
+    fitted = dissimilarities.copy()
+    previous = np.inf
+
+    for _ in range(max_iter):
+        # 配置の大きさが縮まないよう、当てはめ値の二乗和を組の数に揃える
+        fitted *= np.sqrt(n_pairs / max(float(fitted @ fitted), 1e-300))
+
+        # Guttman 変換 X ← B(X)·X / n
+        ratio = squareform(np.divide(fitted, distances, out=np.zeros(n_pairs),
+                                     where=distances > 0))
+        ratio[np.diag_indices(n)] = -ratio.sum(axis=1)
+        scores = -(ratio @ scores) / n
+
+        distances = pdist(scores)
+        fitted, stress = monotone_fit(distances)
+        # 初期の反復では stress が一時的に増えることがあるため、改善が小さい場合だけ終了する
+        if abs(previous - stress) < tolerance * stress:
+            break
+        previous = stress
+
+    return scores, stress
+
+
+def nmds(condensed: np.ndarray, n_components: int = 2, n_init: int = 10,
+         max_iter: int = 200, n_jobs: Optional[int] = 1,
+         random_state: Optional[int] = 42,
+         init: Optional[np.ndarray] = None,
+         tolerance: float = 1e-5) -> Dict[str, np.ndarray]:
+    """
+    非計量多次元尺度構成法（NMDS）
+
+    非類似度の順位は反復ごとに変わらないため、並べ替えは最初に1回だけ行う。
+    初期配置ごとの計算は独立しているため、n_jobs > 1 ではスレッドで並列に実行する
+    （反復の大半は NumPy / SciPy の行列演算で、GIL を解放する）。
+
+    Args:
+        condensed: 非類似度（condensed 形式）
+        n_components: 次元数
+        n_init: 初期配置の数（init を指定した場合はそれを1つ目とする）
+        max_iter: 1回の最大反復回数
+        n_jobs: 並列数（-1 は全コア）
+        random_state: 乱数シード
+        init: 初期配置（PCoA の得点など）
+        tolerance: stress の相対的な改善がこれを下回ったら終了
+
+    Returns:
+        Dict: scores（地点 × 軸）, stress（最良の stress-1）, stresses（初期配置ごと）
+    """
+    n = condensed_to_n(len(condensed))
+    if n < n_components + 2:
+        raise ValueError(f"NMDSには{n_components + 2}地点以上が必要です")
+    if n_init < 1:
+        raise ValueError("初期配置の数は1以上を指定してください")
+
+    dissimilarities = np.asarray(condensed, dtype=np.float64)
+    order = np.argsort(dissimilarities, kind='stable')
+    sorted_values = dissimilarities[order]
+    groups = np.concatenate([[0], np.cumsum(np.diff(sorted_values) > 0)])
+    group_sizes = np.bincount(groups)
+    tied = np.flatnonzero(group_sizes[groups] > 1)
+    _, tie_groups = np.unique(groups[tied], return_inverse=True)
+
+    rng = np.random.default_rng(random_state)
+    starts: List[np.ndarray] = []
+    if init is not None:
+        starts.append(np.asarray(init, dtype=np.float64)[:, :n_components])
+    while len(starts) < n_init:
+        starts.append(rng.uniform(-1, 1, size=(n, n_components)))
+
+    def run(start):
+        return _nmds_single(dissimilarities, order, tied, tie_groups.astype(np.float64),
+                            start, max_iter, tolerance)
+
+    jobs = min(resolve_n_jobs(n_jobs), len(starts))
+    if jobs == 1:
+        results = [run(start) for start in starts]
+    else:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(run, starts))
+
+    stresses = np.array([stress for _, stress in results])
+    best = int(stresses.argmin())
+    scores = results[best][0]
+
+    # 第1軸が最大の広がりになるよう主成分の向きに回転する（NMDS の軸の向きは任意）
+    scores = scores - scores.mean(axis=0)
+    _, _, rotation = np.linalg.svd(scores, full_matrices=False)
+    scores = scores @ rotation.T
+
+    return {'scores': scores, 'stress': stresses[best], 'stresses': stresses}
+
+
+def fit_vectors(scores: np.ndarray, variables: np.ndarray, permutations: int = 999,
+                random_state: Optional[int] = 42) -> Dict[str, np.ndarray]:
+    """
+    環境変数を序列化の得点に線形回帰して当てはめる（envfit）
+
+    各変数を得点で回帰した係数の向き（単位ベクトル）と決定係数 r² を求め、
+    変数の値を並べ替えた r² と比べて p 値を求める。並べ替えた値を列に並べた行列を
+    得点の正規直交基底に射影し、並べ替えごとの r² をまとめて計算する。
+    欠損値を含む地点はその変数の計算から除く。
+
+    Args:
+        scores: 序列化の得点（地点 × 軸）
+        variables: 環境変数（地点 × 変数）
+        permutations: 並べ替えの回数（0 の場合は p 値を計算しない）
+        random_state: 乱数シード
+
+    Returns:
+        Dict: directions（変数 × 軸の単位ベクトル）, r2, p_values（permutations=0 の場合は NaN）,
+              n（変数ごとの地点数）
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    variables = np.asarray(variables, dtype=np.float64)
+    n_variables = variables.shape[1]
+    rng = np.random.default_rng(random_state)
+
+    directions = np.zeros((n_variables, scores.shape[1]))
+    r2 = np.full(n_variables, np.nan)
+    p_values = np.full(n_variables, np.nan)
+    counts = np.zeros(n_variables, dtype=np.int64)
+
+    for index in range(n_variables):
+        valid = np.isfinite(variables[:, index])
+        counts[index] = valid.sum()
+        if counts[index] <= scores.shape[1] + 1:
+            continue
+
+        x = scores[valid] - scores[valid].mean(axis=0)
+        y = variables[valid, index] - variables[valid, index].mean()
+        total = float(y @ y)
+        if total == 0:
+            continue
+
+        coefficients, *_ = np.linalg.lstsq(x, y, rcond=None)
+        norm = np.linalg.norm(coefficients)
+        if norm > 0:
+            directions[index] = coefficients / norm
+
+        basis, _ = np.linalg.qr(x)
+        r2[index] = float(np.sum((basis.T @ y) ** 2)) / total
+
+        if permutations > 0:
+            # 並べ替えた y を列に並べ、射影の大きさで r² をまとめて計算
+            # （地点数 × 並べ替え回数 が BLOCK_ELEMENTS に収まるよう分割）
+            exceed = 0
+            step = max(1, BLOCK_ELEMENTS // len(y))
+            for start in range(0, permutations, step):
+                size = min(step, permutations - start)
+                order = rng.permuted(np.tile(np.arange(len(y)), (size, 1)), axis=1)
+                permuted_r2 = np.sum((basis.T @ y[order].T) ** 2, axis=0) / total
+                exceed += int(np.sum(permuted_r2 >= r2[index] - 1e-12))
+            p_values[index] = (exceed + 1) / (permutations + 1)
+
+    return {'directions': directions, 'r2': r2, 'p_values': p_values, 'n': counts}
+
+
+__all__ = ["PCOA_EXACT_MAX_SITES", "condensed_to_n", "pcoa", "nmds", "fit_vectors"]
@@ -0,0 +1,439 @@
+"""
+処理時間のトレース（スパン計測）ユーティリティ
+
+コントローラーの処理を「取得 / 整形 / 計算 / 描画 / 書き出し」などの
+スパンに分けて計測し、操作ごとのヒストグラムと直近N件のトレースを保持する。
+無効時は span() / traced() がほぼ何もしない（フラグ確認のみ）。
+
+使用例:
+    from utils.perf_trace import span, traced
+
+    @traced('analysis.diversity_indices')
+    def calculate_diversity_indices(self):
+        with span('analysis.diversity_indices.fetch'):
+            df = pd.read_sql_query(sql, self.conn)
+"""
+import functools
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+
+# 計測の有効/無効（無効時の負荷を抑えるためモジュール変数で判定）
+_enabled = False
+
+# ヒストグラムの分解能（1オクターブ（2倍）あたりのバケット数）
+BUCKETS_PER_OCTAVE = 4
+
+DEFAULT_MAX_TRACES = 100
+
+
+class _NullSpan:
+    """無効時に返す何もしないスパン"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """計測中のスパン"""
+
+    __slots__ = ('name', 'attrs', 'start', 'wall_start', 'duration',
+                 'children', 'error')
+
+    def __init__(self, name: str, attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = 0.0
+        self.wall_start = 0.0
+        self.duration = 0.0
+        self.children: List['Span'] = []
+        self.error: Optional[str] = None
+
+    def set(self, **attrs) -> None:
+        """
+        スパンに属性を追加（件数など）
+
+        Args:
+            **attrs: 属性
+        """
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = _tracer.get_stack()
+        if not stack:
+            self.wall_start = time.time()
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        stack = _tracer.get_stack()
+        stack.pop()
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        _tracer.record(self, stack[-1] if stack else None)
+        return False
+
+    def to_dict(self, origin: Optional[float] = None) -> Dict[str, Any]:
+        """
+        JSON出力用の辞書に変換
+
+        Args:
+            origin: ルートスパンの開始時刻（perf_counter）
+
+        Returns:
+            Dict: name, offset_ms, duration_ms, attrs, error, children
+        """
+        origin = self.start if origin is None else origin
+        result = {
+            'name': self.name,
+            'offset_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round(self.duration * 1000, 3),
+        }
+        if self.attrs:
+            result['attrs'] = {key: value if isinstance(value, (int, float, str, bool))
+                               or value is None else str(value)
+                               for key, value in self.attrs.items()}
+        if self.error:
+            result['error'] = self.error
+        if self.children:
+            result['children'] = [child.to_dict(origin) for child in self.children]
+        return result
+
+
+class OperationHistogram:
+    """操作ごとの所要時間ヒストグラム（対数バケット）"""
+
+    __slots__ = ('count', 'total', 'min', 'max', 'errors', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.errors = 0
+        self.buckets: Dict[int, int] = {}
+
+    @staticmethod
+    def bucket_index(seconds: float) -> int:
+        """所要時間（秒）→ バケット番号（1マイクロ秒を0とする対数目盛）"""
+        microseconds = max(seconds * 1e6, 1.0)
+        return int(math.log2(microseconds) * BUCKETS_PER_OCTAVE)
+
+    @staticmethod
+    def bucket_upper_ms(index: int) -> float:
+        """バケットの上限（ミリ秒）"""
+        return 2 ** ((index + 1) / BUCKETS_PER_OCTAVE) / 1000
+
+    def add(self, seconds: float, error: bool = False) -> None:
+        """
+        所要時間を1件追加
+
+        Args:
+            seconds: 所要時間（秒）
+            error: 例外で終了したか
+        """
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        if error:
+            self.errors += 1
+        index = self.bucket_index(seconds)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def percentile_ms(self, q: float) -> float:
+        """
+        パーセンタイル値の近似（バケット上限、最大値で打ち切り）
+
+        Args:
+            q: 0〜1の分位
+
+        Returns:
+            float: 所要時間（ミリ秒）
+        """
+        threshold = q * self.count
+        cumulative = 0
+        for index in sorted(self.buckets):
+            cumulative += self.buckets[index]
+            if cumulative >= threshold:
+                return min(self.bucket_upper_ms(index), self.max * 1000)
+        return self.max * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        """集計値を辞書に変換"""
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'total_ms': round(self.total * 1000, 3),
+            'mean_ms': round(self.total / self.count * 1000, 3),
+            'min_ms': round(self.min * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'p50_ms': round(self.percentile_ms(0.5), 3),
+            'p90_ms': round(self.percentile_ms(0.9), 3),
+            'p99_ms': round(self.percentile_ms(0.99), 3),
+            'buckets': {f"<{self.bucket_upper_ms(index):.3g}ms": count
+                        for index, count in sorted(self.buckets.items())},
+        }
+
+
+class Tracer:
+    """スパンの集計・保持クラス"""
+
+    def __init__(self, max_traces: int = DEFAULT_MAX_TRACES):
+        """
+        初期化
+
+        Args:
+            max_traces: 保持する直近のトレース数
+        """
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, OperationHistogram] = {}
+        self._traces = deque(maxlen=max_traces)
+        self.started_at = datetime.now()
+
+    def get_stack(self) -> List[Span]:
+        """現在のスレッドのスパンスタックを取得"""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def set_max_traces(self, max_traces: int) -> None:
+        """保持するトレース数を変更"""
+        with self._lock:
+            self._traces = deque(self._traces, maxlen=max_traces)
+
+    def record(self, finished: Span, parent: Optional[Span]) -> None:
+        """
+        終了したスパンを記録
+
+        Args:
+            finished: 終了したスパン
+            parent: 親スパン（ルートの場合はNone）
+        """
+        with self._lock:
+            histogram = self._histograms.get(finished.name)
+            if histogram is None:
+                histogram = self._histograms[finished.name] = OperationHistogram()
+            histogram.add(finished.duration, finished.error is not None)
+
+            if parent is not None:
+                parent.children.append(finished)
+            else:
+                self._traces.append(finished)
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """
+        操作ごとの集計値を取得（合計時間の降順）
+
+        Returns:
+            List[Dict]: name, count, total_ms, mean_ms, p50_ms, p90_ms, p99_ms など
+        """
+        with self._lock:
+            stats = [{'name': name, **histogram.to_dict()}
+                     for name, histogram in self._histograms.items()]
+        stats.sort(key=lambda entry: entry['total_ms'], reverse=True)
+        return stats
+
+    def get_traces(self, last: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        直近のトレースを取得（新しい順）
+
+        Args:
+            last: 取得件数（Noneの場合は保持している全て）
+
+        Returns:
+            List[Dict]: トレース（スパンの木構造）
+        """
+        with self._lock:
+            traces = list(self._traces)
+        traces.reverse()
+        if last is not None:
+            traces = traces[:last]
+
+        results = []
+        for root in traces:
+            trace = root.to_dict()
+            trace['started_at'] = datetime.fromtimestamp(root.wall_start).isoformat(
+                timespec='milliseconds')
+            results.append(trace)
+        return results
+
+    def reset(self) -> None:
+        """集計とトレースをクリア"""
+        with self._lock:
+            self._histograms.clear()
+            self._traces.clear()
+            self.started_at = datetime.now()
+
+
+_tracer = Tracer()
+
+
+def span(name: str, **attrs):
+    """
+    処理区間を計測するコンテキストマネージャー
+
+    Args:
+        name: 操作名（'export.ant_matrix.fetch' のようにドット区切り）
+        **attrs: スパンの属性
+
+    Returns:
+        コンテキストマネージャー（無効時は何もしない）
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, attrs)
+
+
+def traced(name=None) -> Callable:
+    """
+    関数全体を1つのスパンとして計測するデコレーター
+
+    Args:
+        name: 操作名（省略時は モジュール.関数名）
+
+    Returns:
+        デコレーター
+    """
+    def decorator(func):
+        operation = name if isinstance(name, str) else f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(operation):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    # @traced と @traced('name') の両方に対応
+    if callable(name):
+        return decorator(name)
+    return decorator
+
+
+def current_span():
+    """
+    現在のスパンを取得（属性の追加用）
+
+    Returns:
+        Span: 現在のスパン（無効時・スパン外では何もしないスパン）
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    stack = _tracer.get_stack()
+    return stack[-1] if stack else _NULL_SPAN
+
+
+def enable(max_traces: int = DEFAULT_MAX_TRACES) -> None:
+    """
+    計測を有効化
+
+    Args:
+        max_traces: 保持する直近のトレース数
+    """
+    global _enabled
+    _tracer.set_max_traces(max_traces)
+    _enabled = True
+
+
+def disable() -> None:
+    """計測を無効化（集計結果は保持）"""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    """計測が有効かどうか"""
+    return _enabled
+
+
+def reset() -> None:
+    """集計とトレースをクリア"""
+    _tracer.reset()
+
+
+def get_stats() -> List[Dict[str, Any]]:
+    """操作ごとの集計値を取得（Tracer.get_stats を参照）"""
+    return _tracer.get_stats()
+
+
+def get_traces(last: Optional[int] = None) -> List[Dict[str, Any]]:
+    """直近のトレースを取得（Tracer.get_traces を参照）"""
+    return _tracer.get_traces(last)
+
+
+def export_traces(filepath: Optional[str] = None, last: Optional[int] = None,
+                  log_dir: str = 'logs') -> str:
+    """
+    集計値と直近のトレースをJSONに出力
+
+    Args:
+        filepath: 出力先（Noneの場合は logs/perf_traces_YYYYMMDD_HHMMSS.json）
+        last: 出力するトレース数（Noneの場合は保持している全て）
+        log_dir: filepath省略時の出力ディレクトリ
+
+    Returns:
+        str: 出力したファイルのパス
+    """
+    if filepath is None:
+        os.makedirs(log_dir, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filepath = os.path.join(log_dir, f'perf_traces_{timestamp}.json')
+
+    data = {
+        'exported_at': datetime.now().isoformat(timespec='seconds'),
+        'started_at': _tracer.started_at.isoformat(timespec='seconds'),
+        'stats': get_stats(),
+        'traces': get_traces(last),
+    }
+
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+    return filepath
+
+
+def configure(config) -> bool:
+    """
+    設定ファイルの [Logging] セクションから計測の有効/無効を設定
+
+    Args:
+        config: ConfigParser
+
+    Returns:
+        bool: 計測を有効にした場合True
+    """
+    if config.getboolean('Logging', 'perf_tracing', fallback=False):
+        enable(config.getint('Logging', 'trace_buffer_size', fallback=DEFAULT_MAX_TRACES))
+        return True
+    disable()
+    return False
+
+
+# エクスポート補助: モジュールから span / traced を明示的にエクスポート
+__all__ = ["span", "traced", "current_span", "enable", "disable", "is_enabled",
+           "reset", "get_stats", "get_traces", "export_traces", "configure",
+           "Span", "Tracer", "OperationHistogram"]
@@ -0,0 +1,418 @@
+"""
+SQLクエリのプロファイリング・スロークエリログ
+
+sqlite3 の接続/カーソルを計測機能付きのサブクラスに差し替え、
+SQL文ごとの実行時間・取得行数・呼び出し元を集計する。
+閾値を超えたクエリは [Logging] 設定に従って logs/ 以下のログに記録する。
+"""
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+# プロジェクトルート（呼び出し元の特定に使用）
+PROJECT_ROOT = os.path.normcase(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_THIS_FILE = os.path.normcase(os.path.abspath(__file__))
+
+SLOW_QUERY_LOGGER_NAME = 'ant_research_system.slow_query'
+
+# 集計するSQL文の種類数の上限（超えた分は1行にまとめる）
+MAX_DISTINCT_STATEMENTS = 2000
+OVERFLOW_KEY = '(その他のSQL文)'
+
+# SQL文の正規化（空白の統一・リテラルのプレースホルダ化）
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+_STRING_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_PATTERN = re.compile(r'(?<![\w.])\d+(?:\.\d+)?(?![\w.])')
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    集計キー用にSQL文を正規化
+
+    f文字列で値が埋め込まれたSQLも同じ文として集計できるよう、
+    数値・文字列リテラルを ? に置き換える。
+
+    Args:
+        sql: SQL文
+
+    Returns:
+        str: 正規化したSQL文
+    """
+    sql = _STRING_LITERAL_PATTERN.sub('?', sql)
+    sql = _NUMBER_LITERAL_PATTERN.sub('?', sql)
+    return _WHITESPACE_PATTERN.sub(' ', sql).strip()
+
+
+class QueryProfiler:
+    """クエリプロファイラクラス"""
+
+    def __init__(self, slow_query_ms: float = 200.0,
+                 slow_query_logger: Optional[logging.Logger] = None):
+        """
+        初期化
+
+        Args:
+            slow_query_ms: スロークエリとして記録する閾値（ミリ秒）
+            slow_query_logger: スロークエリの出力先ロガー（Noneの場合は記録しない）
+        """
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_logger = slow_query_logger
+        self.started_at = datetime.now()
+
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._slow_count = 0
+        self._lock = threading.Lock()
+        self._call_site_cache: Dict[str, str] = {}
+
+    def find_call_site(self) -> str:
+        """
+        SQLを発行したプロジェクト内のコード位置を特定
+
+        Returns:
+            str: 'models/ant_record.py:152 get_all' 形式の呼び出し元
+        """
+        frame = sys._getframe(1)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            relative = self._call_site_cache.get(filename)
+
+            if relative is None:
+                normalized = os.path.normcase(os.path.abspath(filename))
+                if normalized.startswith(PROJECT_ROOT) and normalized != _THIS_FILE:
+                    relative = os.path.relpath(filename, PROJECT_ROOT).replace(os.sep, '/')
+                else:
+                    relative = ''
+                self._call_site_cache[filename] = relative
+
+            if relative:
+                return f"{relative}:{frame.f_lineno} {frame.f_code.co_name}"
+            frame = frame.f_back
+
+        return '(不明)'
+
+    def record(self, sql: str, elapsed: float, rows: int, call_site: str,
+               parameters: Any = None, error: Optional[str] = None) -> None:
+        """
+        1回分の実行結果を記録
+
+        Args:
+            sql: SQL文
+            elapsed: 実行・取得にかかった時間（秒）
+            rows: 取得行数（更新系は影響行数）
+            call_site: 呼び出し元
+            parameters: バインドパラメータ（スロークエリログ用）
+            error: 失敗した場合のエラーメッセージ
+        """
+        key = normalize_sql(sql)
+        elapsed_ms = elapsed * 1000
+
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= MAX_DISTINCT_STATEMENTS:
+                    key = OVERFLOW_KEY
+                    stats = self._stats.get(key)
+                if stats is None:
+                    stats = {'sql': key, 'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                             'rows': 0, 'errors': 0, 'slow_calls': 0,
+                             'call_sites': Counter()}
+                    self._stats[key] = stats
+
+            stats['calls'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['rows'] += rows
+            stats['call_sites'][call_site] += 1
+            if error is not None:
+                stats['errors'] += 1
+
+            is_slow = elapsed_ms >= self.slow_query_ms
+            if is_slow:
+                stats['slow_calls'] += 1
+                self._slow_count += 1
+
+        if is_slow and self.slow_query_logger is not None:
+            params_text = repr(parameters)
+            if len(params_text) > 200:
+                params_text = params_text[:200] + '…'
+            self.slow_query_logger.warning(
+                "%.1fms rows=%d at %s%s | %s | params=%s",
+                elapsed_ms, rows, call_site,
+                f" error={error}" if error else '', key, params_text)
+
+    def get_top_queries(self, limit: int = 50,
+                        order_by: str = 'total_ms') -> List[Dict[str, Any]]:
+        """
+        集計結果を上位から取得
+
+        Args:
+            limit: 最大件数
+            order_by: 並び順（total_ms / max_ms / avg_ms / calls / rows）
+
+        Returns:
+            List[Dict]: sql, calls, total_ms, avg_ms, max_ms, rows, errors,
+                slow_calls, call_site（最多の呼び出し元）, call_sites
+        """
+        if order_by not in ('total_ms', 'max_ms', 'avg_ms', 'calls', 'rows'):
+            raise ValueError(f"不正な並び順です: {order_by}")
+
+        with self._lock:
+            results = []
+            for stats in self._stats.values():
+                entry = dict(stats)
+                entry['avg_ms'] = stats['total_ms'] / stats['calls']
+                entry['call_sites'] = stats['call_sites'].most_common()
+                entry['call_site'] = entry['call_sites'][0][0]
+                results.append(entry)
+
+        results.sort(key=lambda entry: entry[order_by], reverse=True)
+        return results[:limit]
+
+    def get_summary(self) -> Dict[str, Any]:
+        """
+        全体の集計値を取得
+
+        Returns:
+            Dict: statements, calls, total_ms, slow_calls, slow_query_ms, started_at
+        """
+        with self._lock:
+            return {
+                'statements': len(self._stats),
+                'calls': sum(s['calls'] for s in self._stats.values()),
+                'total_ms': sum(s['total_ms'] for s in self._stats.values()),
+                'slow_calls': self._slow_count,
+                'slow_query_ms': self.slow_query_ms,
+                'started_at': self.started_at,
+            }
+
+    def reset(self) -> None:
+        """集計結果をクリア"""
+        with self._lock:
+            self._stats.clear()
+            self._slow_count = 0
+            self.started_at = datetime.now()
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """実行時間・取得行数を計測するカーソル"""
+
+    def __init__(self, connection):
+        super().__init__(connection)
+        self._profiler = connection.profiler
+        # 計測中の文: [sql, parameters, 経過秒, 行数, 呼び出し元]
+        self._pending = None
+
+    def _finish(self, error: Optional[str] = None) -> None:
+        """計測中の文を確定してプロファイラに記録"""
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            sql, parameters, elapsed, rows, call_site = pending
+            self._profiler.record(sql, elapsed, rows, call_site, parameters, error)
+
+    def _timed(self, method, sql, parameters, *args):
+        """execute系メソッドを計測付きで実行"""
+        self._finish()
+        call_site = self._profiler.find_call_site()
+        started = time.perf_counter()
+        try:
+            method(*args)
+        except sqlite3.Error as e:
+            self._pending = [sql, parameters, time.perf_counter() - started, 0, call_site]
+            self._finish(error=str(e))
+            raise
+
+        self._pending = [sql, parameters, time.perf_counter() - started, 0, call_site]
+        if self.description is None:
+            # 更新系は影響行数を記録して確定（SELECTは取得完了時に確定）
+            self._pending[3] = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, sql, None, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._timed(super().executescript, sql_script, None, sql_script)
+
+    def _add_fetch(self, started: float, rows: int, exhausted: bool) -> None:
+        """取得にかかった時間と行数を計測中の文に加算"""
+        pending = self._pending
+        if pending is not None:
+            pending[2] += time.perf_counter() - started
+            pending[3] += rows
+            if exhausted:
+                self._finish()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._add_fetch(started, 0 if row is None else 1, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._add_fetch(started, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._add_fetch(started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._add_fetch(started, 0, True)
+            raise
+        self._add_fetch(started, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # 最後まで取得されずに破棄されたSELECTも記録する
+        self._finish()
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """計測付きカーソルを返すデータベース接続
+
+    sqlite3.connect(path, factory=ProfilingConnection) で生成し、
+    profiler 属性に QueryProfiler を設定して使用する。
+    """
+
+    profiler: Optional[QueryProfiler] = None
+
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = ProfilingCursor if self.profiler is not None else sqlite3.Cursor
+        return super().cursor(factory)
+
+    # Connection.execute 系は内部でカーソルを直接生成するため明示的に委譲する
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def connect(db_path: str, query_profiler: Optional[QueryProfiler] = None,
+            **kwargs) -> sqlite3.Connection:
+    """
+    データベースに接続（プロファイラ指定時は計測付き接続）
+
+    Args:
+        db_path: データベースファイルのパス
+        query_profiler: クエリプロファイラ（Noneの場合は通常の接続）
+        **kwargs: sqlite3.connect に渡す引数
+
+    Returns:
+        sqlite3.Connection: データベース接続
+    """
+    if query_profiler is None:
+        return sqlite3.connect(db_path, **kwargs)
+
+    conn = sqlite3.connect(db_path, factory=ProfilingConnection, **kwargs)
+    conn.profiler = query_profiler
+    return conn
+
+
+def _remove_old_logs(log_dir: Path, pattern: str, max_log_files: int) -> None:
+    """保存数を超えた古いログファイルを削除"""
+    log_files = sorted(log_dir.glob(pattern), reverse=True)
+    for old_file in log_files[max_log_files:]:
+        try:
+            old_file.unlink()
+        except OSError:
+            pass
+
+
+def create_slow_query_logger(log_dir: str = 'logs', log_level: str = 'INFO',
+                             log_format: Optional[str] = None,
+                             max_log_files: int = 30) -> logging.Logger:
+    """
+    スロークエリログのロガーを作成（logs/slow_query_YYYYMMDD.log）
+
+    Args:
+        log_dir: ログディレクトリ
+        log_level: ログレベル
+        log_format: ログの書式
+        max_log_files: 保存するログファイル数
+
+    Returns:
+        logging.Logger: スロークエリ用ロガー
+    """
+    log_path = Path(log_dir)
+    log_path.mkdir(parents=True, exist_ok=True)
+    log_file = log_path / f"slow_query_{datetime.now().strftime('%Y%m%d')}.log"
+
+    logger = logging.getLogger(SLOW_QUERY_LOGGER_NAME)
+    logger.setLevel(getattr(logging, log_level.upper(), logging.INFO))
+    logger.propagate = False
+
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+    handler = logging.FileHandler(log_file, encoding='utf-8')
+    handler.setFormatter(logging.Formatter(
+        log_format or '%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(handler)
+
+    _remove_old_logs(log_path, 'slow_query_*.log', max_log_files)
+
+    return logger
+
+
+def create_query_profiler(config) -> Optional[QueryProfiler]:
+    """
+    設定ファイルの [Logging] セクションからクエリプロファイラを作成
+
+    Args:
+        config: ConfigParser
+
+    Returns:
+        QueryProfiler: プロファイラ（query_profiling = False の場合はNone）
+    """
+    if not config.getboolean('Logging', 'query_profiling', fallback=False):
+        return None
+
+    logger = create_slow_query_logger(
+        log_dir=config.get('Logging', 'log_dir', fallback='logs'),
+        log_level=config.get('Logging', 'log_level', fallback='INFO'),
+        log_format=config.get('Logging', 'log_format', fallback=None),
+        max_log_files=config.getint('Logging', 'max_log_files', fallback=30),
+    )
+    return QueryProfiler(
+        slow_query_ms=config.getfloat('Logging', 'slow_query_ms', fallback=200.0),
+        slow_query_logger=logger,
+    )
+
+
+# エクスポート補助: モジュールから QueryProfiler を明示的にエクスポート
+__all__ = ["QueryProfiler", "ProfilingConnection", "ProfilingCursor",
+           "connect", "create_query_profiler", "create_slow_query_logger",
+           "normalize_sql"]
@@ -0,0 +1,516 @@
+"""
+種数推定（Chao1 / ACE / Chao2 / ジャックナイフ）のベクトル化計算ユーティリティ
+
+調査地ごとの種の個体数（または出現イベント数）を (調査地 × 種) の行列に詰め、
+全調査地の推定値を行方向の配列演算でまとめて計算する。
+
+- 個体数に基づく推定: Chao1（偏り補正）, ACE（稀な種の閾値 ACE_RARE_THRESHOLD）
+- 出現頻度に基づく推定（標本単位は調査イベント）: Chao2（偏り補正）, 1次・2次ジャックナイフ
+- 信頼区間: 推定した群集（未発見の種を含む）から標本を作り直すブートストラップ
+  （Chao ら 2014, iNEXT と同じ方法）の標準誤差から 推定値 ± z·SE とする
+
+観測種数は、個体数が1以上の種の数とする。個体数0の記録だけの種は
+fetch_site_frequencies の段階で除くため、個体数・出現頻度に基づく推定量と
+表示する種数はいずれも同じ種の集合から数える。
+"""
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.beta_diversity import resolve_n_jobs
+
+# 推定量
+RICHNESS_ESTIMATORS = ('chao1', 'ace', 'chao2', 'jackknife1', 'jackknife2')
+
+# 推定量の表示名
+RICHNESS_ESTIMATOR_LABELS = {
+    'chao1': 'Chao1',
+    'ace': 'ACE',
+    'chao2': 'Chao2',
+    'jackknife1': 'ジャックナイフ1次',
+    'jackknife2': 'ジャックナイフ2次',
+}
+
+# ACE で稀な種とみなす個体数の上限
+ACE_RARE_THRESHOLD = 10
+
+# ブートストラップの反復回数の既定値
+DEFAULT_BOOTSTRAP = 100
+
+# ブートストラップを並列に実行する単位（反復回数）
+BOOTSTRAP_CHUNK = 25
+
+# ブートストラップで1回にまとめて乱数を生成する調査地数（種数の近い調査地をまとめる）
+BOOTSTRAP_ROWS = 512
+
+
+def fetch_site_frequencies(conn, survey_site_id: Optional[int] = None,
+                           active_sites_only: bool = False) -> Dict[str, np.ndarray]:
+    """
+    調査地×種 集計テーブルから個体数・出現イベント数を配列で取得
+
+    個体数0の記録だけの（調査地, 種）は観測されていないものとして除く。
+
+    Args:
+        conn: データベース接続
+        survey_site_id: 調査地IDで絞り込み（Noneの場合は全て）
+        active_sites_only: 論理削除された調査地を除くか
+
+    Returns:
+        Dict: 'site_id', 'species_id', 'count', 'n_events'（調査地ID順の行）と
+              'unit_site_id', 'n_units'（調査地ごとの調査イベント数）
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    site_filter = " AND survey_site_id = ?" if survey_site_id is not None else ""
+    params = [survey_site_id] if survey_site_id is not None else []
+
+    cursor.execute(f"""
+        SELECT survey_site_id, species_id, total_count, n_events
+        FROM site_species_summary
+        WHERE total_count > 0{site_filter}
+        ORDER BY survey_site_id, species_id
+    """, params)
+    data = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 4)
+
+    cursor.execute(f"""
+        SELECT survey_site_id, COUNT(*)
+        FROM survey_events
+        WHERE deleted_at IS NULL{site_filter}
+        GROUP BY survey_site_id
+        ORDER BY survey_site_id
+    """, params)
+    units = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+
+    if active_sites_only:
+        cursor.execute("SELECT id FROM survey_sites WHERE deleted_at IS NOT NULL")
+        deleted = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+        if len(deleted):
+            data = data[~np.isin(data[:, 0], deleted)]
+            units = units[~np.isin(units[:, 0], deleted)]
+
+    return {
+        'site_id': data[:, 0],
+        'species_id': data[:, 1],
+        'count': data[:, 2],
+        'n_events': data[:, 3],
+        'unit_site_id': units[:, 0],
+        'n_units': units[:, 1],
+    }
+
+
+def pad_groups(group_index: np.ndarray, values: np.ndarray,
+               n_groups: int) -> np.ndarray:
+    """
+    グループ（調査地）ごとの値を (グループ数 × 最大の行数) の行列に詰める（不足は0）
+
+    Args:
+        group_index: 各行のグループ番号（0〜n_groups-1, 昇順に並んでいること）
+        values: 各行の値
+        n_groups: グループ数
+
+    Returns:
+        ndarray: 各グループの値を左詰めにした行列
+    """
+    sizes = np.bincount(group_index, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    columns = np.arange(len(group_index)) - starts[group_index]
+    matrix = np.zeros((n_groups, max(int(sizes.max(initial=0)), 1)))
+    matrix[group_index, columns] = values
+    return matrix
+
+
+def _frequency_table(matrix: np.ndarray, top: int) -> np.ndarray:
+    """
+    行ごとの頻度表（値が k の種数）を1回の bincount で求める
+
+    Returns:
+        ndarray: (行数 × (top + 2))。列 k（0〜top）は値が k の種数、最後の列は top を超える種数
+    """
+    rows = len(matrix)
+    width = top + 2
+    values = np.clip(matrix, 0, top + 1).astype(np.int64)
+    values += (np.arange(rows) * width)[:, None]
+    return np.bincount(values.ravel(), minlength=rows * width).reshape(rows, width)
+
+
+def _undetected(f1: np.ndarray, f2: np.ndarray, size: np.ndarray) -> np.ndarray:
+    """
+    未発見の種数の推定（偏り補正した Chao1 / Chao2 の追加分）
+
+    f2 > 0 では (n-1)/n · f1²/(2·f2)、f2 = 0 では (n-1)/n · f1(f1-1)/2。
+    """
+    factor = np.divide(size - 1, size, out=np.zeros(len(size)), where=size > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return factor * np.where(f2 > 0, f1 ** 2 / (2 * np.maximum(f2, 1)), f1 * (f1 - 1) / 2)
+
+
+def abundance_estimates(matrix: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    個体数に基づく種数推定（Chao1, ACE）
+
+    Args:
+        matrix: (調査地 × 種) の個体数
+
+    Returns:
+        Dict: 'chao1', 'ace'
+    """
+    matrix = np.asarray(matrix)
+    table = _frequency_table(matrix, ACE_RARE_THRESHOLD)
+    f1 = table[:, 1]
+    f2 = table[:, 2]
+    richness = matrix.shape[1] - table[:, 0]
+    individuals = matrix.sum(axis=1, dtype=np.float64)
+    chao1 = richness + _undetected(f1, f2, individuals)
+
+    # 稀な種（個体数 1〜ACE_RARE_THRESHOLD）の種数・個体数・k(k-1) の和は頻度表から求める
+    k = np.arange(1, ACE_RARE_THRESHOLD + 1)
+    rare = table[:, 1:ACE_RARE_THRESHOLD + 1]
+    rare_species = rare.sum(axis=1)
+    rare_individuals = (rare @ k).astype(np.float64)
+    coverage = 1 - np.divide(f1, rare_individuals, out=np.ones(len(f1)),
+                             where=rare_individuals > 0)
+    pairs = rare @ (k * (k - 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gamma2 = np.maximum(rare_species / coverage * pairs
+                            / (rare_individuals * (rare_individuals - 1)) - 1, 0)
+        ace = (richness - rare_species) + rare_species / coverage + f1 / coverage * gamma2
+
+    # 稀な種が無い場合は観測種数、稀な種がすべて1個体（被覆率0）の場合は Chao1 とする
+    ace = np.where(rare_species == 0, richness, np.where(coverage <= 0, chao1, ace))
+    return {'chao1': chao1, 'ace': ace}
+
+
+def incidence_estimates(matrix: np.ndarray, n_units: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    出現頻度に基づく種数推定（Chao2, 1次・2次ジャックナイフ）
+
+    Args:
+        matrix: (調査地 × 種) の出現した標本単位（調査イベント）数
+        n_units: 調査地ごとの標本単位数
+
+    Returns:
+        Dict: 'chao2', 'jackknife1', 'jackknife2'（標本単位が1の場合のジャックナイフは観測種数）
+    """
+    matrix = np.asarray(matrix)
+    m = np.asarray(n_units, dtype=np.float64)
+    table = _frequency_table(matrix, 2)
+    q1 = table[:, 1]
+    q2 = table[:, 2]
+    richness = matrix.shape[1] - table[:, 0]
+
+    chao2 = richness + _undetected(q1, q2, m)
+    jackknife1 = richness + q1 * np.divide(m - 1, m, out=np.zeros(len(m)), where=m > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        jackknife2 = np.where(
+            m >= 2,
+            richness + q1 * (2 * m - 3) / m - q2 * (m - 2) ** 2 / (m * (m - 1)),
+            richness)
+    return {'chao2': chao2, 'jackknife1': jackknife1, 'jackknife2': jackknife2}
+
+
+def _abundance_assemblage(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    個体数から推定した群集（未発見の種を含む各種の相対優占度）
+
+    観測された種の優占度を標本被覆率で補正し、未発見の種（Chao1 の追加分）に
+    残りの確率 1 - C を等分する（Chao ら 2014）。
+
+    Returns:
+        (probabilities, widths, individuals): 左詰めの確率行列、各行の種数（未発見の種を含む）、
+        各行の個体数
+    """
+    n = matrix.sum(axis=1)
+    table = _frequency_table(matrix, 2)
+    f1 = table[:, 1]
+    f2 = table[:, 2]
+    undetected = np.ceil(np.nan_to_num(_undetected(f1, f2, n))).astype(np.int64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = np.where(f2 > 0, (n - 1) * f1 / ((n - 1) * f1 + 2 * f2),
+                     (n - 1) * (f1 - 1) / ((n - 1) * (f1 - 1) + 2))
+        coverage = 1 - np.nan_to_num(f1 / n * a)
+        relative = np.nan_to_num(matrix / n[:, None])
+        tail = (1 - relative) ** n[:, None]
+        weight = np.where(matrix > 0, relative * tail, 0).sum(axis=1)
+        scale = np.nan_to_num((1 - coverage) / weight)
+    observed = np.where(matrix > 0, relative * (1 - scale[:, None] * tail), 0)
+
+    probabilities, widths = _append_undetected(observed, undetected, 1 - coverage)
+    return probabilities, widths, n.astype(np.int64)
+
+
+def _incidence_assemblage(matrix: np.ndarray,
+                          n_units: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    出現頻度から推定した群集（未発見の種を含む各種の出現確率）
+
+    Returns:
+        (probabilities, widths): 左詰めの出現確率行列と、各行の種数（未発見の種を含む）
+    """
+    m = n_units.astype(np.float64)
+    total = matrix.sum(axis=1)
+    table = _frequency_table(matrix, 2)
+    q1 = table[:, 1]
+    q2 = table[:, 2]
+    undetected = np.ceil(np.nan_to_num(_undetected(q1, q2, m))).astype(np.int64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = np.where(q2 > 0, (m - 1) * q1 / ((m - 1) * q1 + 2 * q2),
+                     (m - 1) * (q1 - 1) / ((m - 1) * (q1 - 1) + 2))
+        coverage = 1 - np.nan_to_num(q1 / total * a)
+        relative = np.nan_to_num(matrix / m[:, None])
+        tail = (1 - relative) ** m[:, None]
+        weight = np.where(matrix > 0, relative * tail, 0).sum(axis=1)
+        scale = np.nan_to_num(total / m * (1 - coverage) / weight)
+    observed = np.where(matrix > 0, relative * (1 - scale[:, None] * tail), 0)
+
+    missing = np.nan_to_num(total / m * (1 - coverage))
+    probabilities, widths = _append_undetected(observed, undetected, missing)
+    return np.clip(probabilities, 0, 1), widths
+
+
+def _append_undetected(observed: np.ndarray, undetected: np.ndarray,
+                       missing: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    各行の観測された種の直後に未発見の種を置き、missing を等分する
+
+    Returns:
+        (probabilities, widths): 左詰めの行列と、各行で値を持つ列数
+    """
+    nonzero = observed > 0
+    last = np.where(nonzero.any(axis=1),
+                    observed.shape[1] - np.argmax(nonzero[:, ::-1], axis=1), 0)
+    widths = last + undetected
+    result = np.zeros((len(observed), max(int(widths.max(initial=0)), observed.shape[1], 1)))
+    result[:, :observed.shape[1]] = observed
+    columns = np.arange(result.shape[1])[None, :]
+    share = np.divide(missing, undetected, out=np.zeros(len(missing)), where=undetected > 0)
+    extra = (columns >= last[:, None]) & (columns < widths[:, None])
+    result[extra] = np.repeat(share, undetected)
+    return result, widths
+
+
+def _row_blocks(widths: np.ndarray) -> List[Tuple[np.ndarray, int]]:
+    """
+    行を種数の順に並べて BOOTSTRAP_ROWS 行ずつに分け、各まとまりの行番号と列数を返す
+
+    種数の近い行をまとめるため、種数の少ない調査地で空の列の乱数を生成しない。
+    """
+    order = np.argsort(widths, kind='stable')
+    blocks = []
+    for start in range(0, len(order), BOOTSTRAP_ROWS):
+        rows = order[start:start + BOOTSTRAP_ROWS]
+        blocks.append((rows, max(int(widths[rows].max()), 1)))
+    return blocks
+
+
+def bootstrap_standard_errors(abundance: Optional[np.ndarray] = None,
+                              incidence: Optional[np.ndarray] = None,
+                              n_units: Optional[np.ndarray] = None,
+                              n_bootstrap: int = DEFAULT_BOOTSTRAP, n_jobs: Optional[int] = 1,
+                              random_state: Optional[int] = 42) -> Dict[str, np.ndarray]:
+    """
+    推定量の標準誤差をブートストラップで求める
+
+    推定した群集から、個体数は多項分布（総個体数は観測と同じ）、出現頻度は
+    標本単位数の二項分布で標本を作り直し、推定量を計算し直した標準偏差を標準誤差とする。
+    種数の近い調査地をまとめた行列ごとに乱数生成・推定を配列演算で行い、反復は
+    BOOTSTRAP_CHUNK 回ずつスレッドで並列に実行する（まとまりごとに乱数の系列を
+    分けるため、結果は並列数によらない）。
+
+    Args:
+        abundance: (調査地 × 種) の個体数（Noneの場合は個体数に基づく推定量を計算しない）
+        incidence: (調査地 × 種) の出現した標本単位数
+        n_units: 調査地ごとの標本単位数（incidence を指定する場合は必須）
+        n_bootstrap: 反復回数
+        n_jobs: 並列数（-1 は全コア）
+        random_state: 乱数シード
+
+    Returns:
+        Dict: 計算した推定量ごとの標準誤差
+    """
+    # (種類, まとまりごとの (行番号, 確率行列, 標本の大きさ)) を事前に作る
+    assemblages = []
+    if abundance is not None:
+        probabilities, widths, individuals = _abundance_assemblage(
+            np.asarray(abundance, dtype=np.float64))
+        assemblages.append(('abundance', [
+            (rows, _normalize(probabilities[rows, :width]), individuals[rows])
+            for rows, width in _row_blocks(widths)]))
+    if incidence is not None:
+        if n_units is None:
+            raise ValueError("出現頻度の推定には標本単位数が必要です")
+        units = np.asarray(n_units, dtype=np.int64)
+        probabilities, widths = _incidence_assemblage(np.asarray(incidence, dtype=np.float64),
+                                                      units)
+        assemblages.append(('incidence', [
+            (rows, probabilities[rows, :width], units[rows])
+            for rows, width in _row_blocks(widths)]))
+
+    n_rows = len(abundance) if abundance is not None else len(incidence)
+    chunks = [(start, min(start + BOOTSTRAP_CHUNK, n_bootstrap))
+              for start in range(0, n_bootstrap, BOOTSTRAP_CHUNK)]
+    seeds = np.random.SeedSequence(random_state).spawn(len(chunks))
+
+    def compute(chunk, seed):
+        rng = np.random.default_rng(seed)
+        sums: Dict[str, np.ndarray] = {}
+        for _ in range(chunk[0], chunk[1]):
+            for kind, blocks in assemblages:
+                for rows, probabilities, sizes in blocks:
+                    if kind == 'abundance':
+                        estimates = abundance_estimates(rng.multinomial(sizes, probabilities))
+                    else:
+                        sample = rng.binomial(sizes[:, None], probabilities)
+                        estimates = incidence_estimates(sample, sizes)
+                    for name, values in estimates.items():
+                        total = sums.setdefault(name, np.zeros((2, n_rows)))
+                        total[0, rows] += values
+                        total[1, rows] += values ** 2
+        return sums
+
+    jobs = min(resolve_n_jobs(n_jobs), max(len(chunks), 1))
+    if jobs == 1:
+        results = [compute(chunk, seed) for chunk, seed in zip(chunks, seeds)]
+    else:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(compute, chunks, seeds))
+
+    errors = {}
+    for name in results[0] if results else []:
+        total = sum(result[name] for result in results)
+        mean = total[0] / n_bootstrap
+        variance = np.maximum(total[1] / n_bootstrap - mean ** 2, 0)
+        errors[name] = np.sqrt(variance * n_bootstrap / max(n_bootstrap - 1, 1))
+    return errors
+
+
+def _normalize(probabilities: np.ndarray) -> np.ndarray:
+    """行の合計を1にする（個体数0の行は最初の種に確率1を置く）"""
+    totals = probabilities.sum(axis=1, keepdims=True)
+    normalized = np.divide(probabilities, totals, out=np.zeros_like(probabilities),
+                           where=totals > 0)
+    normalized[totals[:, 0] <= 0, 0] = 1.0
+    return normalized
+
+
+def confidence_interval(estimate: np.ndarray, standard_error: np.ndarray,
+                        observed: np.ndarray, level: float = 0.95
+                        ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    推定値 ± z·SE の信頼区間（下限は観測種数（推定値が観測種数未満の場合は推定値）を下回らない）
+
+    Args:
+        estimate: 推定値
+        standard_error: 標準誤差
+        observed: 観測種数
+        level: 信頼水準
+
+    Returns:
+        (lower, upper)
+    """
+    z = NormalDist().inv_cdf((1 + level) / 2)
+    # 2次ジャックナイフは観測種数を下回ることがあるため、下限は推定値も超えないようにする
+    return (np.maximum(estimate - z * standard_error, np.minimum(observed, estimate)),
+            estimate + z * standard_error)
+
+
+def site_matrices(frequencies: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    調査地ごとの (調査地 × 種) の個体数・出現イベント数の行列を作る
+
+    Args:
+        frequencies: fetch_site_frequencies の戻り値
+
+    Returns:
+        Dict: 'site_id'（昇順）, 'abundance', 'incidence', 'n_units'
+    """
+    site_ids, inverse = np.unique(frequencies['site_id'], return_inverse=True)
+    n_sites = len(site_ids)
+    units = np.zeros(n_sites, dtype=np.int64)
+    position = np.searchsorted(frequencies['unit_site_id'], site_ids)
+    found = position < len(frequencies['unit_site_id'])
+    found[found] = frequencies['unit_site_id'][position[found]] == site_ids[found]
+    units[found] = frequencies['n_units'][position[found]]
+
+    return {
+        'site_id': site_ids,
+        'abundance': pad_groups(inverse, frequencies['count'], n_sites),
+        'incidence': pad_groups(inverse, frequencies['n_events'], n_sites),
+        'n_units': units,
+    }
+
+
+def pooled_matrices(frequencies: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    全調査地をまとめた（プールした）個体数・出現イベント数の行列（1行）を作る
+
+    種ごとに全調査地の個体数・出現イベント数を合計し、標本単位は全調査イベントとする。
+
+    Args:
+        frequencies: fetch_site_frequencies の戻り値
+
+    Returns:
+        Dict: 'abundance', 'incidence', 'n_units'（いずれも長さ1の行）
+    """
+    species_ids, inverse = np.unique(frequencies['species_id'], return_inverse=True)
+    n_species = len(species_ids)
+    return {
+        'abundance': np.bincount(inverse, weights=frequencies['count'],
+                                 minlength=n_species)[None, :],
+        'incidence': np.bincount(inverse, weights=frequencies['n_events'],
+                                 minlength=n_species)[None, :],
+        'n_units': np.array([int(frequencies['n_units'].sum())]),
+    }
+
+
+def estimate_richness(matrices: Dict[str, np.ndarray], n_bootstrap: int = DEFAULT_BOOTSTRAP,
+                      level: float = 0.95, n_jobs: Optional[int] = 1,
+                      random_state: Optional[int] = 42) -> Dict[str, np.ndarray]:
+    """
+    種数推定値と信頼区間を計算
+
+    Args:
+        matrices: site_matrices / pooled_matrices の戻り値
+        n_bootstrap: ブートストラップの反復回数（0 の場合は信頼区間を計算しない）
+        level: 信頼水準
+        n_jobs: ブートストラップの並列数（-1 は全コア）
+        random_state: 乱数シード
+
+    Returns:
+        Dict: 'n_individuals' と、推定量ごとの推定値・'<推定量>_lower'・'<推定量>_upper' の配列
+    """
+    abundance = matrices['abundance']
+    incidence = matrices['incidence']
+    n_units = matrices['n_units']
+    n_rows = len(abundance)
+
+    abundance_based = abundance_estimates(abundance)
+    estimates = dict(abundance_based)
+    estimates.update(incidence_estimates(incidence, n_units))
+    if n_bootstrap > 0 and n_rows:
+        errors = bootstrap_standard_errors(abundance, incidence, n_units,
+                                           n_bootstrap=n_bootstrap, n_jobs=n_jobs,
+                                           random_state=random_state)
+    else:
+        errors = {name: np.full(n_rows, np.nan) for name in RICHNESS_ESTIMATORS}
+
+    # 信頼区間の下限に使う観測種数（推定量と同じく個体数・出現数が1以上の種の数）
+    observed_abundance = np.count_nonzero(abundance > 0, axis=1)
+    observed_incidence = np.count_nonzero(incidence > 0, axis=1)
+
+    result = {'n_individuals': abundance.sum(axis=1).astype(np.int64)}
+    for name in RICHNESS_ESTIMATORS:
+        observed = observed_abundance if name in abundance_based else observed_incidence
+        lower, upper = confidence_interval(estimates[name], errors[name], observed, level)
+        result[name] = estimates[name]
+        result[f'{name}_lower'] = lower
+        result[f'{name}_upper'] = upper
+    return result
+
+
+__all__ = ["RICHNESS_ESTIMATORS", "RICHNESS_ESTIMATOR_LABELS", "DEFAULT_BOOTSTRAP",
+           "fetch_site_frequencies", "pad_groups",
+           "abundance_estimates", "incidence_estimates", "bootstrap_standard_errors",
+           "confidence_interval", "site_matrices", "pooled_matrices", "estimate_richness"]
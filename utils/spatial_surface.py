@@ -0,0 +1,276 @@
+"""
+調査地の指標値から連続面（ラスター）を計算するユーティリティ
+
+緯度経度の格子の各セルについて、調査地の値からカーネル密度推定（KDE）または
+逆距離加重（IDW）補間の値を計算する。KDE は調査地を分割して行列積で足し込むため、
+調査地数に関わらず使用メモリは一定。
+
+距離は範囲の中央の緯度で経度方向を縮めた平面近似（km）で計算する。
+数百km程度の範囲であれば誤差は表示上問題にならない。
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 連続面の計算方法
+SURFACE_METHODS = ('kde', 'idw')
+
+# KDE で1回に計算する（格子の辺のセル数 × 調査地数）の上限（float64 で約32MB）
+CHUNK_ELEMENTS = 4_000_000
+
+# 緯度・経度1度あたりの距離（km）
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320
+
+
+def surface_grid(bounds: Tuple[float, float, float, float],
+                 resolution: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    範囲を覆う格子（セル中心の緯度・経度）を作成
+
+    長い辺を resolution セルとし、セルがほぼ正方形（km）になるよう短い辺のセル数を決める。
+
+    Args:
+        bounds: (南端緯度, 西端経度, 北端緯度, 東端経度)
+        resolution: 長い辺のセル数
+
+    Returns:
+        (lats, lons): セル中心の緯度（南→北）と経度（西→東）
+    """
+    if resolution < 2:
+        raise ValueError("解像度は2以上を指定してください")
+
+    south, west, north, east = bounds
+    height_km = (north - south) * KM_PER_DEG_LAT
+    width_km = (east - west) * KM_PER_DEG_LON * np.cos(np.radians((south + north) / 2))
+    cell_km = max(height_km, width_km) / resolution
+    if cell_km <= 0:
+        raise ValueError("範囲の大きさが0です")
+
+    n_rows = max(int(round(height_km / cell_km)), 2)
+    n_cols = max(int(round(width_km / cell_km)), 2)
+    lat_step = (north - south) / n_rows
+    lon_step = (east - west) / n_cols
+    lats = south + lat_step * (np.arange(n_rows) + 0.5)
+    lons = west + lon_step * (np.arange(n_cols) + 0.5)
+    return lats, lons
+
+
+def _to_km(lat: np.ndarray, lon: np.ndarray, lat0: float) -> Tuple[np.ndarray, np.ndarray]:
+    """緯度経度を基準緯度での平面座標（km）に変換"""
+    return (np.asarray(lon) * KM_PER_DEG_LON * np.cos(np.radians(lat0)),
+            np.asarray(lat) * KM_PER_DEG_LAT)
+
+
+def compute_surface(lat: np.ndarray, lon: np.ndarray, values: np.ndarray,
+                    grid_lats: np.ndarray, grid_lons: np.ndarray,
+                    method: str = 'kde', bandwidth_km: float = 1.0,
+                    power: float = 2.0, neighbors: int = 12,
+                    max_distance_km: Optional[float] = None) -> np.ndarray:
+    """
+    格子の各セルの値を計算
+
+    kde: ガウスカーネルによる値の重み付き密度 Σ v·K(d) （値/km²）。
+         値を合計する量（種数の多い調査地が集まる場所ほど高い）を表す。
+         カーネルは緯度方向・経度方向の積に分けられるため、
+         (緯度セル×調査地) と (調査地×経度セル) の行列積で全セルを一度に求める。
+    idw: 近傍 neighbors 地点による逆距離加重補間 Σ v/d^p / Σ 1/d^p。
+         max_distance_km 以内に調査地が無いセルは NaN とする。
+
+    Args:
+        lat, lon: 調査地の緯度経度
+        values: 調査地の値
+        grid_lats, grid_lons: 格子セル中心の緯度・経度（surface_grid の戻り値）
+        method: 'kde' / 'idw'
+        bandwidth_km: KDE のバンド幅（ガウスカーネルの標準偏差, km）
+        power: IDW の距離の指数
+        neighbors: IDW で使う近傍の地点数
+        max_distance_km: IDW で値を求める最大距離（Noneの場合はバンド幅の3倍）
+
+    Returns:
+        ndarray: (緯度方向のセル数, 経度方向のセル数) の配列（行は南→北）
+    """
+    if method not in SURFACE_METHODS:
+        raise ValueError(f"計算方法が不正です: {method}")
+    if bandwidth_km <= 0:
+        raise ValueError("バンド幅は正の値を指定してください")
+
+    values = np.asarray(values, dtype=np.float64)
+    lat0 = float(np.mean(grid_lats))
+    site_x, site_y = _to_km(lat, lon, lat0)
+    cell_x, _ = _to_km(grid_lats[:1], grid_lons, lat0)
+    _, cell_y = _to_km(grid_lats, grid_lons[:1], lat0)
+
+    if method == 'kde':
+        surface = np.zeros((len(cell_y), len(cell_x)))
+        # 調査地を分割し、(セル数 × 調査地数) の行列がメモリに収まるようにする
+        chunk = max(1, CHUNK_ELEMENTS // max(len(cell_x), len(cell_y)))
+        for start in range(0, len(values), chunk):
+            stop = min(start + chunk, len(values))
+            kernel_y = np.exp((cell_y[:, None] - site_y[None, start:stop]) ** 2
+                              / (-2.0 * bandwidth_km ** 2))
+            kernel_x = np.exp((site_x[start:stop, None] - cell_x[None, :]) ** 2
+                              / (-2.0 * bandwidth_km ** 2))
+            surface += (kernel_y * values[None, start:stop]) @ kernel_x
+        return surface / (2 * np.pi * bandwidth_km ** 2)
+
+    # IDW: 近傍探索は k-d 木で行う
+    from scipy.spatial import cKDTree
+
+    if max_distance_km is None:
+        max_distance_km = bandwidth_km * 3
+    k = min(neighbors, len(values))
+
+    grid_x, grid_y = np.meshgrid(cell_x, cell_y)
+    tree = cKDTree(np.column_stack([site_x, site_y]))
+    distances, indices = tree.query(np.column_stack([grid_x.ravel(), grid_y.ravel()]),
+                                    k=k, distance_upper_bound=max_distance_km)
+    distances = distances.reshape(len(grid_x.ravel()), k)
+    indices = indices.reshape(len(grid_x.ravel()), k)
+
+    # 範囲内に近傍が無い場合、距離は inf、番号は地点数になる
+    found = np.isfinite(distances)
+    inverse = np.where(found, 1.0 / np.maximum(distances, 1e-6) ** power, 0.0)
+    neighbor_values = np.where(found, values[np.minimum(indices, len(values) - 1)], 0.0)
+    total = inverse.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        surface = (inverse * neighbor_values).sum(axis=1) / total
+    return surface.reshape(grid_x.shape)
+
+
+def surface_to_rgba(surface: np.ndarray, cmap: str = 'YlOrRd', opacity: float = 0.7,
+                    vmin: Optional[float] = None, vmax: Optional[float] = None,
+                    transparent_below: float = 0.02) -> np.ndarray:
+    """
+    連続面を画像（RGBA, uint8）に変換
+
+    NaN のセルと、値の範囲の transparent_below 割合未満のセルは透明にする
+    （KDE で調査地の無い地域が一面に薄く塗られるのを避ける）。
+    行は北→南の順に並べ替える（画像の上が北）。
+
+    Args:
+        surface: compute_surface の戻り値
+        cmap: matplotlib のカラーマップ名
+        opacity: 不透明度
+        vmin, vmax: 色の範囲（Noneの場合は値の最小・最大）
+        transparent_below: 透明にする値の割合（0〜1）
+
+    Returns:
+        ndarray: (行, 列, 4) の uint8 配列
+    """
+    import matplotlib
+
+    finite = np.isfinite(surface)
+    if not finite.any():
+        return np.zeros(surface.shape + (4,), dtype=np.uint8)
+
+    vmin = float(np.nanmin(surface)) if vmin is None else vmin
+    vmax = float(np.nanmax(surface)) if vmax is None else vmax
+    span = vmax - vmin if vmax > vmin else 1.0
+    scaled = np.clip((np.where(finite, surface, vmin) - vmin) / span, 0, 1)
+
+    rgba = matplotlib.colormaps[cmap](scaled)
+    rgba[..., 3] = np.where(finite & (scaled >= transparent_below), opacity, 0)
+    return (rgba[::-1] * 255).astype(np.uint8)
+
+
+def _level_rings(contour_set) -> List[List[np.ndarray]]:
+    """
+    塗り分け領域の輪（閉じた折れ線）を階級ごとに取得
+
+    matplotlib 3.8 以降は ContourSet.get_paths() が階級ごとに1つのパスを返す。
+    それより前は階級ごとの collections[i] に複数のパスがある。
+    """
+    if hasattr(contour_set, 'get_paths'):
+        return [path.to_polygons() for path in contour_set.get_paths()]
+    return [[polygon for path in collection.get_paths() for polygon in path.to_polygons()]
+            for collection in contour_set.collections]
+
+
+def _group_rings(rings: List[np.ndarray]) -> List[List[np.ndarray]]:
+    """
+    輪を外周ごとにまとめて GeoJSON のポリゴン（外周, 穴...）のリストにする
+
+    他の輪に偶数回含まれる輪を外周、奇数回含まれる輪を穴とし、
+    穴はそれを直接囲む（1段浅い）外周に割り当てる。
+
+    Args:
+        rings: 輪のリスト（各輪は (経度, 緯度) の配列）
+
+    Returns:
+        List: ポリゴンごとの輪のリスト（先頭が外周）
+    """
+    from matplotlib.path import Path
+
+    # inside[j, i]: 輪 i の頂点が輪 j の内側にある（輪どうしは交差しないため1点で判定）
+    points = np.array([ring[0] for ring in rings])
+    inside = np.array([Path(ring).contains_points(points) for ring in rings])
+    np.fill_diagonal(inside, False)
+    depth = inside.sum(axis=0)
+
+    polygons: Dict[int, List[np.ndarray]] = {}
+    for i in np.argsort(depth, kind='stable'):
+        if depth[i] % 2 == 0:
+            polygons[i] = [rings[i]]
+            continue
+        parents = [j for j in np.flatnonzero(inside[:, i])
+                   if depth[j] == depth[i] - 1 and j in polygons]
+        if parents:
+            polygons[parents[0]].append(rings[i])
+    return list(polygons.values())
+
+
+def surface_contours(surface: np.ndarray, grid_lats: np.ndarray, grid_lons: np.ndarray,
+                     n_levels: int = 8, cmap: str = 'YlOrRd') -> Dict[str, Any]:
+    """
+    連続面の等値線（塗り分け領域）を GeoJSON の FeatureCollection に変換
+
+    各階級を1つの地物（MultiPolygon）とし、離れた領域はそれぞれ別のポリゴン、
+    領域の中の穴はそれを囲む外周と同じポリゴンの輪にする。
+
+    Args:
+        surface: compute_surface の戻り値
+        grid_lats, grid_lons: 格子セル中心の緯度・経度
+        n_levels: 階級数
+        cmap: matplotlib のカラーマップ名
+
+    Returns:
+        Dict: 地物の属性に lower, upper（階級の範囲）, color を持つ FeatureCollection
+    """
+    import matplotlib
+    from matplotlib.figure import Figure
+
+    finite = surface[np.isfinite(surface)]
+    if len(finite) == 0 or finite.max() <= finite.min():
+        return {'type': 'FeatureCollection', 'features': []}
+
+    # 最下位の階級（ほぼ0の領域）は描かない
+    levels = np.linspace(finite.min(), finite.max(), n_levels + 1)
+    levels[0] = finite.min() + (finite.max() - finite.min()) * 0.02
+
+    # 描画はしないため、pyplot を使わずに Figure を直接作る
+    ax = Figure().add_subplot()
+    contour_set = ax.contourf(grid_lons, grid_lats, surface, levels=levels)
+    colors = matplotlib.colormaps[cmap](np.linspace(0, 1, n_levels))
+
+    features = []
+    for index, level_rings in enumerate(_level_rings(contour_set)):
+        rings = [polygon for polygon in level_rings if len(polygon) >= 4]
+        if not rings:
+            continue
+        polygons = [[np.round(ring, 6).tolist() for ring in polygon]
+                    for polygon in _group_rings(rings)]
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'MultiPolygon', 'coordinates': polygons},
+            'properties': {
+                'lower': float(levels[index]),
+                'upper': float(levels[index + 1]),
+                'color': matplotlib.colors.to_hex(colors[index]),
+            },
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+__all__ = ["SURFACE_METHODS", "surface_grid", "compute_surface",
+           "surface_to_rgba", "surface_contours"]
@@ -0,0 +1,564 @@
+"""
+オフライン地図用のタイルキャッシュとローカルタイルサーバー
+
+地図タイルを MBTiles 形式（SQLite）のファイルに保存し、ローカルのHTTPサーバーから配信する。
+通信できない調査地でも地図を表示できるよう、地図HTMLが読み込む Leaflet 等の
+JavaScript / CSS（と CSS から参照される画像・フォント）も同じファイルに保存して配信する。
+
+タイルは調査地を囲む範囲とズーム範囲を指定して事前に取得する。
+OpenStreetMap のタイルサーバーは大量取得を禁止しているため（タイル利用規約）、
+取得枚数に上限を設け、アプリケーションを識別できる User-Agent を付けて
+1枚ずつ間隔を空けて取得する。サーバーから 429（リクエスト過多）が返った場合は中止する。
+
+参考: https://operations.osmfoundation.org/policies/tiles/
+
+参考: https://github.com/mapbox/mbtiles-spec （MBTiles 1.3）
+"""
+import math
+import re
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+# タイル取得時の User-Agent（タイルサーバーの利用規約で必須。ライブラリ既定の値は拒否される）
+# 連絡先は config.ini の [Map] tile_user_agent で付け加えられる
+USER_AGENT = ('AntCommunityDatabase-TileCache/1.0 '
+              '(offline basemap prefetch for ant community field surveys)')
+
+# タイルを取得する最小間隔（秒）。取得済みで読み飛ばすタイルは待たない
+DEFAULT_REQUEST_INTERVAL = 1.0
+
+# Webメルカトルで表示できる緯度の上限
+MAX_LATITUDE = 85.05112878
+
+# 事前取得で1回に取得するタイル数の既定の上限
+DEFAULT_MAX_TILES = 5000
+
+# CSS 内の url(...) 参照
+_CSS_URL = re.compile(r'url\(\s*[\'"]?([^\'")]+)[\'"]?\s*\)')
+
+# 地図HTML内の外部スクリプト・スタイルシートの参照
+_HTML_ASSET = re.compile(r'((?:src|href)=["\'])(https?://[^"\']+)(["\'])')
+
+_CONTENT_TYPES = {
+    '.js': 'application/javascript',
+    '.css': 'text/css',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.svg': 'image/svg+xml',
+    '.woff': 'font/woff',
+    '.woff2': 'font/woff2',
+    '.ttf': 'font/ttf',
+    '.eot': 'application/vnd.ms-fontobject',
+}
+
+
+def lonlat_to_tile(lat: float, lon: float, zoom: int) -> Tuple[int, int]:
+    """
+    緯度経度を含むタイルの番号を計算（XYZ形式）
+
+    Args:
+        lat: 緯度
+        lon: 経度
+        zoom: ズームレベル
+
+    Returns:
+        (x, y): タイル番号
+    """
+    n = 2 ** zoom
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_ranges(bounds: Tuple[float, float, float, float], min_zoom: int,
+                max_zoom: int) -> List[Tuple[int, int, int, int, int]]:
+    """
+    範囲を覆うタイル番号の範囲をズームレベルごとに求める
+
+    Args:
+        bounds: (南端緯度, 西端経度, 北端緯度, 東端経度)
+        min_zoom: 最小ズームレベル
+        max_zoom: 最大ズームレベル
+
+    Returns:
+        List: (zoom, x_min, x_max, y_min, y_max) のリスト
+    """
+    south, west, north, east = bounds
+    if south > north or west > east:
+        raise ValueError("範囲の指定が不正です（南端 ≤ 北端、西端 ≤ 東端）")
+    if not 0 <= min_zoom <= max_zoom <= 22:
+        raise ValueError("ズームレベルは 0 ≤ 最小 ≤ 最大 ≤ 22 で指定してください")
+
+    ranges = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        x_min, y_min = lonlat_to_tile(north, west, zoom)
+        x_max, y_max = lonlat_to_tile(south, east, zoom)
+        ranges.append((zoom, x_min, x_max, y_min, y_max))
+    return ranges
+
+
+def count_tiles(bounds: Tuple[float, float, float, float], min_zoom: int,
+                max_zoom: int) -> int:
+    """範囲とズーム範囲に含まれるタイル数"""
+    return sum((x_max - x_min + 1) * (y_max - y_min + 1)
+               for _, x_min, x_max, y_min, y_max in tile_ranges(bounds, min_zoom, max_zoom))
+
+
+def _iter_tiles(bounds, min_zoom: int, max_zoom: int) -> Iterator[Tuple[int, int, int]]:
+    """範囲内のタイル番号 (zoom, x, y) を順に返す"""
+    for zoom, x_min, x_max, y_min, y_max in tile_ranges(bounds, min_zoom, max_zoom):
+        for x in range(x_min, x_max + 1):
+            for y in range(y_min, y_max + 1):
+                yield zoom, x, y
+
+
+def _download(url: str, timeout: float = 30.0,
+              user_agent: str = USER_AGENT) -> Tuple[bytes, str]:
+    """
+    URLの内容を取得
+
+    Returns:
+        (内容, Content-Type)
+    """
+    request = urllib.request.Request(url, headers={'User-Agent': user_agent})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        content_type = response.headers.get_content_type()
+        return response.read(), content_type
+
+
+def _guess_content_type(url: str) -> str:
+    """URLの拡張子からContent-Typeを推定"""
+    path = urlsplit(url).path.lower()
+    for extension, content_type in _CONTENT_TYPES.items():
+        if path.endswith(extension):
+            return content_type
+    return 'application/octet-stream'
+
+
+def _strip_query(url: str) -> str:
+    """URLからクエリとフラグメントを除く（フォントの ?v=... 等）"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+class TileCache:
+    """タイルキャッシュ（MBTilesファイル）クラス"""
+
+    def __init__(self, path: str):
+        """
+        初期化（ファイルが無い場合は作成）
+
+        Args:
+            path: MBTilesファイルのパス
+        """
+        self.path = path
+        # タイルサーバーのスレッドからも読むため、接続はロックで保護する
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._ensure_schema_exists()
+
+    def _ensure_schema_exists(self) -> None:
+        """MBTilesのテーブルと、地図HTML用の静的ファイルのテーブルを作成"""
+        with self._lock:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS tiles (
+                    zoom_level INTEGER NOT NULL,
+                    tile_column INTEGER NOT NULL,
+                    tile_row INTEGER NOT NULL,
+                    tile_data BLOB NOT NULL,
+                    PRIMARY KEY (zoom_level, tile_column, tile_row)
+                ) WITHOUT ROWID
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS assets (
+                    url TEXT PRIMARY KEY,
+                    content_type TEXT NOT NULL,
+                    data BLOB NOT NULL
+                ) WITHOUT ROWID
+            """)
+            self.conn.executemany("""
+                INSERT OR IGNORE INTO metadata (name, value) VALUES (?, ?)
+            """, [('name', 'ant-database tiles'), ('format', 'png'), ('type', 'baselayer'),
+                  ('version', '1.0')])
+            self.conn.commit()
+
+    def close(self) -> None:
+        """接続を閉じる"""
+        with self._lock:
+            self.conn.close()
+
+    def get_tile(self, zoom: int, x: int, y: int) -> Optional[bytes]:
+        """
+        タイルを取得
+
+        Args:
+            zoom: ズームレベル
+            x: タイル列（XYZ形式）
+            y: タイル行（XYZ形式。MBTiles内ではTMS形式で南から数える）
+
+        Returns:
+            bytes: タイル画像（無い場合はNone）
+        """
+        with self._lock:
+            row = self.conn.execute("""
+                SELECT tile_data FROM tiles
+                WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?
+            """, (zoom, x, (2 ** zoom - 1) - y)).fetchone()
+        return row[0] if row else None
+
+    def get_asset(self, url: str) -> Optional[Tuple[bytes, str]]:
+        """
+        保存した静的ファイルを取得
+
+        Args:
+            url: 元のURL（クエリは無視）
+
+        Returns:
+            (内容, Content-Type)。無い場合はNone
+        """
+        with self._lock:
+            row = self.conn.execute("""
+                SELECT data, content_type FROM assets WHERE url = ?
+            """, (_strip_query(url),)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def asset_urls(self) -> List[str]:
+        """保存済みの静的ファイルのURL一覧"""
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT url FROM assets")]
+
+    def get_info(self) -> Dict[str, object]:
+        """
+        キャッシュの概要を取得
+
+        Returns:
+            Dict: メタデータ、ズームレベルごとのタイル数、静的ファイル数
+        """
+        with self._lock:
+            metadata = dict(self.conn.execute("SELECT name, value FROM metadata").fetchall())
+            zoom_counts = dict(self.conn.execute("""
+                SELECT zoom_level, COUNT(*) FROM tiles GROUP BY zoom_level ORDER BY zoom_level
+            """).fetchall())
+            n_assets = self.conn.execute("SELECT COUNT(*) FROM assets").fetchone()[0]
+        return {'metadata': metadata, 'tiles_by_zoom': zoom_counts, 'assets': n_assets}
+
+    def prefetch_tiles(self, tile_url: str, bounds: Tuple[float, float, float, float],
+                       min_zoom: int, max_zoom: int,
+                       max_tiles: int = DEFAULT_MAX_TILES,
+                       progress: Optional[Callable[[int, int], None]] = None,
+                       request_interval: float = DEFAULT_REQUEST_INTERVAL,
+                       user_agent: str = USER_AGENT) -> Dict[str, int]:
+        """
+        範囲内のタイルを取得して保存（保存済みのタイルは取得しない）
+
+        タイルサーバーの負荷を抑えるため、取得は request_interval 秒以上の間隔を空けて
+        1枚ずつ行い、429（リクエスト過多）が返った場合は残りを取得せずに終了する。
+
+        Args:
+            tile_url: タイルのURLテンプレート（{z}/{x}/{y} を含む）
+            bounds: (南端緯度, 西端経度, 北端緯度, 東端経度)
+            min_zoom: 最小ズームレベル
+            max_zoom: 最大ズームレベル
+            max_tiles: 取得するタイル数の上限（超える場合は取得しない）
+            progress: 進捗コールバック（処理済み数, 総数）
+            request_interval: タイルを取得する最小間隔（秒）
+            user_agent: タイル取得時の User-Agent
+
+        Returns:
+            Dict: total, downloaded, skipped, failed の件数と
+                  rate_limited（429 により中止した場合は1）
+        """
+        if not all(key in tile_url for key in ('{z}', '{x}', '{y}')):
+            raise ValueError("タイルのURLには {z}, {x}, {y} を含めてください")
+
+        total = count_tiles(bounds, min_zoom, max_zoom)
+        if total > max_tiles:
+            raise ValueError(f"取得するタイルが多すぎます（{total:,}枚 > 上限 {max_tiles:,}枚）。"
+                             "範囲かズームレベルを狭めてください")
+
+        result = {'total': total, 'downloaded': 0, 'skipped': 0, 'failed': 0,
+                  'rate_limited': 0}
+        last_request = None
+        for done, (zoom, x, y) in enumerate(_iter_tiles(bounds, min_zoom, max_zoom), start=1):
+            if self.get_tile(zoom, x, y) is not None:
+                result['skipped'] += 1
+            elif result['rate_limited']:
+                result['failed'] += 1
+            else:
+                if last_request is not None:
+                    wait = request_interval - (time.monotonic() - last_request)
+                    if wait > 0:
+                        time.sleep(wait)
+                last_request = time.monotonic()
+
+                try:
+                    data, _ = _download(tile_url.format(z=zoom, x=x, y=y, s='a'),
+                                        user_agent=user_agent)
+                except urllib.error.HTTPError as e:
+                    # 429 はサーバーからの取得停止の要求のため、残りは取得しない
+                    result['failed'] += 1
+                    if e.code == 429:
+                        result['rate_limited'] = 1
+                except (urllib.error.URLError, OSError):
+                    result['failed'] += 1
+                else:
+                    with self._lock:
+                        self.conn.execute("""
+                            INSERT OR REPLACE INTO tiles
+                                (zoom_level, tile_column, tile_row, tile_data)
+                            VALUES (?, ?, ?, ?)
+                        """, (zoom, x, (2 ** zoom - 1) - y, data))
+                        if result['downloaded'] % 100 == 0:
+                            self.conn.commit()
+                    result['downloaded'] += 1
+
+            if progress is not None:
+                progress(done, total)
+
+        self._update_bounds_metadata(bounds, min_zoom, max_zoom)
+        return result
+
+    def _update_bounds_metadata(self, bounds, min_zoom: int, max_zoom: int) -> None:
+        """取得範囲・ズーム範囲をメタデータに反映（既存の範囲と合わせる）"""
+        with self._lock:
+            metadata = dict(self.conn.execute("SELECT name, value FROM metadata").fetchall())
+            south, west, north, east = bounds
+            if 'bounds' in metadata:
+                old_west, old_south, old_east, old_north = map(float,
+                                                               metadata['bounds'].split(','))
+                south, west = min(south, old_south), min(west, old_west)
+                north, east = max(north, old_north), max(east, old_east)
+            if 'minzoom' in metadata:
+                min_zoom = min(min_zoom, int(metadata['minzoom']))
+                max_zoom = max(max_zoom, int(metadata['maxzoom']))
+
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)
+            """, [('bounds', f"{west:.6f},{south:.6f},{east:.6f},{north:.6f}"),
+                  ('minzoom', str(min_zoom)), ('maxzoom', str(max_zoom))])
+            self.conn.commit()
+
+    def prefetch_assets(self, urls: Iterable[str]) -> Dict[str, int]:
+        """
+        地図HTMLが読み込む静的ファイルを取得して保存
+
+        CSS から url(...) で参照される画像・フォントも併せて取得する。
+
+        Args:
+            urls: JavaScript / CSS のURL
+
+        Returns:
+            Dict: downloaded, failed の件数
+        """
+        result = {'downloaded': 0, 'failed': 0}
+        pending = [_strip_query(url) for url in urls]
+        seen = set()
+
+        while pending:
+            url = pending.pop(0)
+            if url in seen or url.startswith('data:'):
+                continue
+            seen.add(url)
+
+            try:
+                data, content_type = _download(url)
+            except (urllib.error.URLError, OSError):
+                result['failed'] += 1
+                continue
+
+            if content_type in ('application/octet-stream', 'text/plain'):
+                content_type = _guess_content_type(url)
+            if content_type == 'text/css' or url.endswith('.css'):
+                text = data.decode('utf-8', errors='replace')
+                pending.extend(_strip_query(urljoin(url, ref))
+                               for ref in _CSS_URL.findall(text)
+                               if not ref.startswith('data:'))
+
+            with self._lock:
+                self.conn.execute("""
+                    INSERT OR REPLACE INTO assets (url, content_type, data) VALUES (?, ?, ?)
+                """, (url, content_type, data))
+                self.conn.commit()
+            result['downloaded'] += 1
+
+        return result
+
+
+class _TileRequestHandler(BaseHTTPRequestHandler):
+    """タイル（/tiles/{z}/{x}/{y}.png）と静的ファイル（/assets/{ホスト}/{パス}）を返す"""
+
+    cache: TileCache = None
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        body, content_type = None, None
+
+        match = re.fullmatch(r'/tiles/(\d+)/(\d+)/(\d+)\.\w+', path)
+        if match:
+            body = self.cache.get_tile(*map(int, match.groups()))
+            if body is not None:
+                content_type = 'image/jpeg' if body[:2] == b'\xff\xd8' else 'image/png'
+        elif path.startswith('/assets/'):
+            asset = self.cache.get_asset('https://' + path[len('/assets/'):])
+            if asset is not None:
+                body, content_type = asset
+
+        if body is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'max-age=86400')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # タイル1枚ごとのアクセスログは出さない
+        pass
+
+
+class TileServer:
+    """ローカルタイルサーバークラス"""
+
+    def __init__(self, cache_path: str, host: str = '127.0.0.1', port: int = 8765):
+        """
+        初期化（起動は start() / serve_forever() で行う）
+
+        Args:
+            cache_path: MBTilesファイルのパス
+            host: 待ち受けるアドレス
+            port: 待ち受けるポート
+        """
+        self.cache = TileCache(cache_path)
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """サーバーのURL"""
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def tile_url(self) -> str:
+        """Leaflet に渡すタイルのURLテンプレート"""
+        return f"{self.base_url}/tiles/{{z}}/{{x}}/{{y}}.png"
+
+    @property
+    def max_zoom(self) -> Optional[int]:
+        """保存済みタイルの最大ズームレベル（それより拡大すると拡大表示する）"""
+        maxzoom = self.cache.get_info()['metadata'].get('maxzoom')
+        return int(maxzoom) if maxzoom is not None else None
+
+    def _create_server(self) -> ThreadingHTTPServer:
+        """HTTPサーバーを作成（ポートを確保）"""
+        handler = type('TileRequestHandler', (_TileRequestHandler,), {'cache': self.cache})
+        server = ThreadingHTTPServer((self.host, self.port), handler)
+        server.daemon_threads = True
+        return server
+
+    def start(self) -> bool:
+        """
+        バックグラウンドのスレッドで起動
+
+        Returns:
+            bool: 起動したか（ポートが使用中で、別のタイルサーバーが
+                  起動済みと考えられる場合はFalse）
+        """
+        if self._server is not None:
+            return True
+        try:
+            self._server = self._create_server()
+        except OSError:
+            return False
+
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='tile-server', daemon=True)
+        self._thread.start()
+        return True
+
+    def serve_forever(self) -> None:
+        """現在のスレッドで起動（Ctrl+C で終了）"""
+        self._server = self._create_server()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._server = None
+
+    def stop(self) -> None:
+        """停止"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def localize_html(self, html: str) -> str:
+        """
+        地図HTML内の外部スクリプト・スタイルシートの参照を、
+        保存済みのものに限りローカルサーバーの参照に置き換える
+
+        Args:
+            html: 地図HTML
+
+        Returns:
+            str: 置き換え後のHTML
+        """
+        cached = set(self.cache.asset_urls())
+
+        def replace(match):
+            url = match.group(2)
+            if _strip_query(url) not in cached:
+                return match.group(0)
+            parts = urlsplit(url)
+            local = f"{self.base_url}/assets/{parts.netloc}{parts.path}"
+            return match.group(1) + local + match.group(3)
+
+        return _HTML_ASSET.sub(replace, html)
+
+
+def tile_settings_from_config(config) -> Dict[str, object]:
+    """
+    config.ini の [Map] から背景地図の設定を読み込む
+
+    offline_mode が有効な場合はローカルタイルサーバー（未起動）を作成する。
+    起動は呼び出し側で行う（GUIは start()、CLIは tiles serve）。
+
+    Args:
+        config: ConfigParser
+
+    Returns:
+        Dict: MapController に渡す tiles, attribution, tile_server
+    """
+    attribution = config.get('Map', 'tile_attribution',
+                             fallback='© OpenStreetMap contributors')
+    settings = {
+        'tiles': config.get('Map', 'tile_server', fallback=None),
+        'attribution': attribution,
+        'tile_server': None,
+    }
+
+    if config.getboolean('Map', 'offline_mode', fallback=False):
+        settings['tile_server'] = TileServer(
+            config.get('Map', 'tile_cache', fallback='data/map_tiles.mbtiles'),
+            port=config.getint('Map', 'tile_server_port', fallback=8765))
+    return settings
+
+
+__all__ = ["TileCache", "TileServer", "lonlat_to_tile", "tile_ranges", "count_tiles",
+           "tile_settings_from_config", "DEFAULT_MAX_TILES", "DEFAULT_REQUEST_INTERVAL",
+           "USER_AGENT"]
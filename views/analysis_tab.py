@@ -1,12 +1,18 @@
 """
 解析・出力タブ
 """
+import configparser
+import math
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from tkinter import ttk, messagebox
+import numpy as np
 from controllers.export_controller import ExportController
 from controllers.analysis_controller import AnalysisController
+from controllers.ordination_controller import OrdinationController
+from utils.background_query import BackgroundQueryRunner, get_database_path
+from utils.beta_diversity import BETA_METRIC_LABELS
+from utils.richness import fetch_site_frequencies
+from views.figure_window import embed_figure, show_figure_window
 import os
 
 
@@ -28,6 +34,11 @@ class AnalysisTab:
         # メインフレーム
         self.frame = ttk.Frame(parent)
         
+        # グラフはワーカースレッドで作成し、完成した図だけを画面に埋め込む
+        self.figure_runner = BackgroundQueryRunner(
+            self.frame, get_database_path(db_connection),
+            query_profiler=getattr(db_connection, 'profiler', None))
+        
         # サブタブを作成
         self.sub_notebook = ttk.Notebook(self.frame)
         self.sub_notebook.pack(fill='both', expand=True, padx=5, pady=5)
@@ -35,9 +46,16 @@ class AnalysisTab:
         # 各サブタブ
         self._create_export_tab()
         self._create_diversity_tab()
+        self._create_hill_tab()
         self._create_scatter_tab()
+        self._create_ordination_tab()
+        self._create_mantel_tab()
         self._create_stats_tab()
     
+    def shutdown(self):
+        """ワーカースレッドを停止し接続を閉じる（ウィンドウを閉じる際に呼ぶ）"""
+        self.figure_runner.shutdown()
+    
     def _create_export_tab(self):
         """データ出力タブを作成"""
         tab = ttk.Frame(self.sub_notebook)
@@ -120,6 +138,12 @@ class AnalysisTab:
         ttk.Button(excel_frame, text='全データをExcelで出力', 
                   command=self._export_excel,
                   style='Accent.TButton').pack(side='left', padx=5)
+        ttk.Button(excel_frame, text='スナップショット (Parquet) を出力', 
+                  command=self._export_snapshot).pack(side='left', padx=5)
+        ttk.Button(excel_frame, text='前回からの差分を出力', 
+                  command=self._export_changes).pack(side='left', padx=5)
+        ttk.Button(excel_frame, text='Darwin Core Archive を出力', 
+                  command=self._export_dwca).pack(side='left', padx=5)
         
         # 出力先フォルダを開く
         ttk.Button(export_frame, text='📁 出力先フォルダを開く', 
@@ -140,6 +164,8 @@ class AnalysisTab:
         info_text = """
 計算される指標:
 • 種数（Species Richness）
+• 推定種数（Chao1・ACE・Chao2・ジャックナイフ1次）
+  と95%信頼区間（ブートストラップ）
 • Shannon多様度指数
 • Simpson多様度指数
 • Pielou均等度
@@ -177,7 +203,8 @@ class AnalysisTab:
         
         self.diversity_tree = ttk.Treeview(
             tree_frame,
-            columns=('site', 'richness', 'shannon', 'simpson', 'pielou'),
+            columns=('site', 'richness', 'chao1', 'ace', 'chao2', 'jackknife1',
+                     'shannon', 'simpson', 'pielou'),
             show='headings',
             yscrollcommand=scrollbar.set
         )
@@ -185,18 +212,73 @@ class AnalysisTab:
         
         self.diversity_tree.heading('site', text='調査地')
         self.diversity_tree.heading('richness', text='種数')
+        self.diversity_tree.heading('chao1', text='Chao1')
+        self.diversity_tree.heading('ace', text='ACE')
+        self.diversity_tree.heading('chao2', text='Chao2')
+        self.diversity_tree.heading('jackknife1', text='Jack1')
         self.diversity_tree.heading('shannon', text='Shannon')
         self.diversity_tree.heading('simpson', text='Simpson')
         self.diversity_tree.heading('pielou', text='Pielou')
         
         self.diversity_tree.column('site', width=200)
         self.diversity_tree.column('richness', width=80)
+        for column in ('chao1', 'ace', 'chao2', 'jackknife1'):
+            self.diversity_tree.column(column, width=140)
         self.diversity_tree.column('shannon', width=100)
         self.diversity_tree.column('simpson', width=100)
         self.diversity_tree.column('pielou', width=100)
         
+        self.diversity_tree.tag_configure('pooled', background='#e8f0fe')
         self.diversity_tree.pack(fill='both', expand=True)
     
+    def _create_hill_tab(self):
+        """多様度プロファイルタブを作成"""
+        tab = ttk.Frame(self.sub_notebook)
+        self.sub_notebook.add(tab, text='多様度プロファイル')
+        
+        # 左側：設定
+        left_frame = ttk.Frame(tab)
+        left_frame.pack(side='left', fill='y', padx=10, pady=10)
+        
+        ttk.Label(left_frame, text='Hill数プロファイル', 
+                 style='Header.TLabel').pack(anchor='w', pady=(0, 10))
+        
+        info_text = """
+次数 q（0〜3）ごとの有効種数を表示します
+• q = 0: 種数
+• q = 1: exp(Shannon)
+• q = 2: Simpson の逆数
+q が大きいほど優占種を重視します
+        """
+        
+        ttk.Label(left_frame, text=info_text, justify='left').pack(
+            anchor='w', pady=10)
+        
+        option_frame = ttk.LabelFrame(left_frame, text='設定', padding=10)
+        option_frame.pack(fill='x', pady=10)
+        
+        self.hill_standardize = tk.BooleanVar(value=True)
+        ttk.Checkbutton(option_frame, text='標本被覆率で標準化', 
+                       variable=self.hill_standardize).pack(anchor='w')
+        
+        ttk.Label(option_frame, text='目標の被覆率（空欄は最小値）:').pack(anchor='w', pady=(10, 2))
+        self.hill_coverage = tk.StringVar()
+        ttk.Entry(option_frame, textvariable=self.hill_coverage, width=10).pack(anchor='w')
+        
+        ttk.Button(left_frame, text='プロファイルを作成', 
+                  command=self._create_hill_profile).pack(pady=10)
+        
+        # 結果の要約表示
+        self.hill_label = ttk.Label(left_frame, text='', 
+                                   font=('Yu Gothic UI', 10))
+        self.hill_label.pack(pady=10)
+        
+        # 右側：グラフ表示
+        right_frame = ttk.Frame(tab)
+        right_frame.pack(side='right', fill='both', expand=True, padx=10, pady=10)
+        
+        self.hill_canvas_frame = right_frame
+    
     def _create_scatter_tab(self):
         """散布図タブを作成"""
         tab = ttk.Frame(self.sub_notebook)
@@ -264,6 +346,138 @@ class AnalysisTab:
         
         self.scatter_canvas_frame = right_frame
     
+    def _create_ordination_tab(self):
+        """序列化タブを作成"""
+        tab = ttk.Frame(self.sub_notebook)
+        self.sub_notebook.add(tab, text='序列化（PCoA・NMDS）')
+        
+        # 左側：設定
+        left_frame = ttk.Frame(tab)
+        left_frame.pack(side='left', fill='y', padx=10, pady=10)
+        
+        ttk.Label(left_frame, text='群集の序列化', 
+                 style='Header.TLabel').pack(anchor='w', pady=(0, 10))
+        
+        option_frame = ttk.LabelFrame(left_frame, text='設定', padding=10)
+        option_frame.pack(fill='x', pady=10)
+        
+        ttk.Label(option_frame, text='方法:').pack(anchor='w', pady=2)
+        self.ordination_method = tk.StringVar(value='pcoa')
+        ttk.Radiobutton(option_frame, text='PCoA（主座標分析）', variable=self.ordination_method,
+                       value='pcoa').pack(anchor='w')
+        ttk.Radiobutton(option_frame, text='NMDS（非計量多次元尺度法）',
+                       variable=self.ordination_method, value='nmds').pack(anchor='w')
+        
+        ttk.Label(option_frame, text='非類似度:').pack(anchor='w', pady=(10, 2))
+        self.ordination_metric_labels = {label: metric for metric, label
+                                         in BETA_METRIC_LABELS.items()}
+        self.ordination_metric = tk.StringVar()
+        metric_combo = ttk.Combobox(option_frame, textvariable=self.ordination_metric,
+                                    values=list(self.ordination_metric_labels),
+                                    state='readonly', width=25)
+        metric_combo.pack(fill='x', pady=2)
+        metric_combo.current(0)
+        
+        ttk.Label(option_frame, text='地点:').pack(anchor='w', pady=(10, 2))
+        self.ordination_site_type = tk.StringVar(value='survey')
+        ttk.Radiobutton(option_frame, text='調査地', variable=self.ordination_site_type,
+                       value='survey').pack(anchor='w')
+        ttk.Radiobutton(option_frame, text='親調査地', variable=self.ordination_site_type,
+                       value='parent').pack(anchor='w')
+        
+        self.show_vectors = tk.BooleanVar(value=True)
+        ttk.Checkbutton(option_frame, text='植生のベクトルを表示（p < 0.05）', 
+                       variable=self.show_vectors).pack(anchor='w', pady=10)
+        
+        ttk.Button(left_frame, text='序列化を実行', 
+                  command=self._create_ordination).pack(pady=10)
+        
+        # 結果の要約表示
+        self.ordination_label = ttk.Label(left_frame, text='', 
+                                         font=('Yu Gothic UI', 10))
+        self.ordination_label.pack(pady=10)
+        
+        # 右側：グラフ表示
+        right_frame = ttk.Frame(tab)
+        right_frame.pack(side='right', fill='both', expand=True, padx=10, pady=10)
+        
+        self.ordination_canvas_frame = right_frame
+    
+    def _create_mantel_tab(self):
+        """Mantel検定タブを作成"""
+        tab = ttk.Frame(self.sub_notebook)
+        self.sub_notebook.add(tab, text='Mantel検定')
+        
+        # 左側：設定
+        left_frame = ttk.Frame(tab)
+        left_frame.pack(side='left', fill='y', padx=10, pady=10)
+        
+        ttk.Label(left_frame, text='距離行列の相関（Mantel検定）', 
+                 style='Header.TLabel').pack(anchor='w', pady=(0, 10))
+        
+        option_frame = ttk.LabelFrame(left_frame, text='設定', padding=10)
+        option_frame.pack(fill='x', pady=10)
+        
+        self.mantel_distance_labels = {label: name for name, label
+                                       in OrdinationController.MANTEL_DISTANCE_LABELS.items()}
+        distance_labels = list(self.mantel_distance_labels)
+        
+        ttk.Label(option_frame, text='群集の非類似度:').pack(anchor='w', pady=2)
+        self.mantel_x = tk.StringVar()
+        x_combo = ttk.Combobox(option_frame, textvariable=self.mantel_x,
+                               values=distance_labels, state='readonly', width=25)
+        x_combo.pack(fill='x', pady=2)
+        x_combo.current(0)  # Bray-Curtis
+        
+        ttk.Label(option_frame, text='比較する距離:').pack(anchor='w', pady=(10, 2))
+        self.mantel_y = tk.StringVar()
+        y_combo = ttk.Combobox(option_frame, textvariable=self.mantel_y,
+                               values=distance_labels, state='readonly', width=25)
+        y_combo.pack(fill='x', pady=2)
+        y_combo.set(OrdinationController.MANTEL_DISTANCE_LABELS['geographic'])
+        
+        ttk.Label(option_frame, text='影響を除く距離（部分Mantel検定）:').pack(anchor='w', pady=(10, 2))
+        self.mantel_z = tk.StringVar()
+        z_combo = ttk.Combobox(option_frame, textvariable=self.mantel_z,
+                               values=['なし'] + distance_labels, state='readonly', width=25)
+        z_combo.pack(fill='x', pady=2)
+        z_combo.current(0)
+        
+        ttk.Label(option_frame, text='地点:').pack(anchor='w', pady=(10, 2))
+        self.mantel_site_type = tk.StringVar(value='parent')
+        ttk.Radiobutton(option_frame, text='調査地', variable=self.mantel_site_type,
+                       value='survey').pack(anchor='w')
+        ttk.Radiobutton(option_frame, text='親調査地', variable=self.mantel_site_type,
+                       value='parent').pack(anchor='w')
+        
+        ttk.Label(option_frame, text='相関係数:').pack(anchor='w', pady=(10, 2))
+        self.mantel_method = tk.StringVar(value='pearson')
+        ttk.Radiobutton(option_frame, text='Pearson', variable=self.mantel_method,
+                       value='pearson').pack(anchor='w')
+        ttk.Radiobutton(option_frame, text='Spearman（順位）', variable=self.mantel_method,
+                       value='spearman').pack(anchor='w')
+        
+        ttk.Label(option_frame, text='並べ替えの回数:').pack(anchor='w', pady=(10, 2))
+        self.mantel_permutations = tk.IntVar(value=999)
+        ttk.Combobox(option_frame, textvariable=self.mantel_permutations,
+                    values=[99, 999, 9999], state='readonly', width=25).pack(fill='x', pady=2)
+        
+        ttk.Button(left_frame, text='検定を実行', 
+                  command=self._run_mantel).pack(pady=10)
+        
+        # 進捗と結果の表示
+        self.mantel_progress = ttk.Progressbar(left_frame, mode='determinate', length=200)
+        self.mantel_progress.pack(fill='x', pady=5)
+        self.mantel_label = ttk.Label(left_frame, text='', 
+                                     font=('Yu Gothic UI', 10))
+        self.mantel_label.pack(pady=10)
+        
+        # 右側：グラフ表示
+        right_frame = ttk.Frame(tab)
+        right_frame.pack(side='right', fill='both', expand=True, padx=10, pady=10)
+        
+        self.mantel_canvas_frame = right_frame
+    
     def _create_stats_tab(self):
         """基本統計量タブを作成"""
         tab = ttk.Frame(self.sub_notebook)
@@ -352,12 +566,48 @@ class AnalysisTab:
     def _export_excel(self):
         """Excelファイルを出力"""
         try:
-            filepath = self.export_controller.export_to_excel()
+            filepath = self.export_controller.export_to_excel(streaming=True)
             messagebox.showinfo('成功', 
                 f'Excelファイルを出力しました\n\n{filepath}')
         except Exception as e:
             messagebox.showerror('エラー', f'出力に失敗しました：{e}')
     
+    def _export_snapshot(self):
+        """全テーブルをParquet形式のスナップショットとして出力"""
+        try:
+            snapshot_dir = self.export_controller.export_snapshot('parquet')
+            messagebox.showinfo('成功', 
+                f'スナップショットを出力しました\n\n{snapshot_dir}')
+        except ImportError as e:
+            messagebox.showerror('エラー', str(e))
+        except Exception as e:
+            messagebox.showerror('エラー', f'出力に失敗しました：{e}')
+    
+    def _export_changes(self):
+        """前回の差分出力以降に変更されたデータを出力"""
+        try:
+            changes_dir = self.export_controller.export_changes()
+            messagebox.showinfo('成功', 
+                f'差分データを出力しました\n（初回は全件を出力します）\n\n{changes_dir}')
+        except Exception as e:
+            messagebox.showerror('エラー', f'出力に失敗しました：{e}')
+    
+    def _export_dwca(self):
+        """Darwin Core Archive（GBIF等への公開用）を出力"""
+        # eventID等の接頭辞は config.ini の [DarwinCore] で設定
+        config = configparser.ConfigParser()
+        config.read('config.ini', encoding='utf-8')
+        
+        try:
+            filepath = self.export_controller.export_dwca(
+                id_prefix=config.get('DarwinCore', 'id_prefix', fallback='ant-db'),
+                basis_of_record=config.get('DarwinCore', 'basis_of_record',
+                                           fallback='HumanObservation'))
+            messagebox.showinfo('成功', 
+                f'Darwin Core Archive を出力しました\n\n{filepath}')
+        except Exception as e:
+            messagebox.showerror('エラー', f'出力に失敗しました：{e}')
+    
     def _open_export_folder(self):
         """出力先フォルダを開く"""
         import subprocess
@@ -374,51 +624,116 @@ class AnalysisTab:
     
     # 多様度分析関連メソッド
     def _calculate_diversity(self):
-        """多様度指数を計算"""
-        try:
-            df = self.analysis_controller.calculate_diversity_indices()
-            
-            if df.empty:
-                messagebox.showwarning('警告', 'データがありません')
-                return
-            
-            # Treeviewに表示
-            for item in self.diversity_tree.get_children():
-                self.diversity_tree.delete(item)
-            
-            for _, row in df.iterrows():
-                self.diversity_tree.insert('', 'end', values=(
-                    row['site_name'],
-                    row['species_richness'],
-                    row['shannon_index'],
-                    row['simpson_index'],
-                    row['pielou_evenness']
-                ))
-            
-            messagebox.showinfo('成功', f'{len(df)}件の調査地について計算しました')
+        """多様度指数・推定種数を計算（ワーカースレッドで計算）"""
+        def build_diversity(conn):
+            controller = AnalysisController(conn)
+            # 調査地ごとの指数・推定と全体の推定は、1回取得した同じデータから計算する
+            frequencies = fetch_site_frequencies(conn)
+            df = controller.calculate_diversity_indices(include_estimators=True,
+                                                        frequencies=frequencies)
+            pooled = (controller.calculate_pooled_richness(frequencies=frequencies)
+                      if not df.empty else {})
+            return df, pooled
+        
+        self.figure_runner.submit('diversity_indices', build_diversity,
+                                  self._show_diversity, self._show_diversity_error)
+    
+    def _show_diversity(self, payload):
+        """
+        多様度指数・推定種数をTreeviewに表示（先頭行は全調査地をまとめた推定）
+        
+        Args:
+            payload: (調査地ごとのデータフレーム, 全調査地をまとめた推定値)
+        """
+        df, pooled = payload
+        
+        if df.empty:
+            messagebox.showwarning('警告', 'データがありません')
+            return
+        
+        for item in self.diversity_tree.get_children():
+            self.diversity_tree.delete(item)
+        
+        estimators = ('chao1', 'ace', 'chao2', 'jackknife1')
+        self.diversity_tree.insert('', 'end', tags=('pooled',), values=(
+            '全体（全調査地）',
+            pooled['species_richness'],
+            *[self._format_estimate(pooled, name) for name in estimators],
+            '', '', ''
+        ))
+        
+        for row in df.to_dict('records'):
+            self.diversity_tree.insert('', 'end', values=(
+                row['site_name'],
+                row['species_richness'],
+                *[self._format_estimate(row, name) for name in estimators],
+                row['shannon_index'],
+                row['simpson_index'],
+                row['pielou_evenness']
+            ))
+        
+        messagebox.showinfo('成功', f'{len(df)}件の調査地について計算しました')
+    
+    @staticmethod
+    def _format_estimate(row, name):
+        """
+        推定値と信頼区間を「推定値 (下限–上限)」の形式にする
+        
+        Args:
+            row: 推定値の列を含む行（dict）
+            name: 推定量の名前
             
-        except Exception as e:
-            messagebox.showerror('エラー', f'計算に失敗しました：{e}')
+        Returns:
+            str: 表示用の文字列
+        """
+        estimate = row.get(name)
+        if estimate is None or math.isnan(estimate):
+            return ''
+        lower = row.get(f'{name}_lower')
+        upper = row.get(f'{name}_upper')
+        if lower is None or math.isnan(lower):
+            return f'{estimate:.1f}'
+        return f'{estimate:.1f} ({lower:.1f}–{upper:.1f})'
+    
+    def _show_diversity_error(self, error):
+        """
+        多様度指数の計算の失敗を表示
+        
+        Args:
+            error: ワーカースレッドで発生した例外
+        """
+        if isinstance(error, ValueError):
+            messagebox.showerror('エラー', str(error))
+        else:
+            messagebox.showerror('エラー', f'計算に失敗しました：{error}')
     
     def _show_diversity_comparison(self):
-        """多様度比較グラフを表示"""
-        try:
-            fig = self.analysis_controller.create_diversity_comparison()
-            plt.show()
-        except ValueError as e:
-            messagebox.showerror('エラー', str(e))
-        except Exception as e:
-            messagebox.showerror('エラー', f'グラフ作成に失敗しました：{e}')
+        """多様度比較グラフを表示（ワーカースレッドで作成）"""
+        self.figure_runner.submit(
+            'diversity_comparison',
+            lambda conn: AnalysisController(conn).create_diversity_comparison(),
+            lambda fig: show_figure_window(self.frame, fig, '多様度比較'),
+            self._show_figure_error)
     
     def _show_accumulation_curve(self):
-        """種数累積曲線を表示"""
-        try:
-            fig = self.analysis_controller.create_species_accumulation_curve()
-            plt.show()
-        except ValueError as e:
-            messagebox.showerror('エラー', str(e))
-        except Exception as e:
-            messagebox.showerror('エラー', f'グラフ作成に失敗しました：{e}')
+        """種数累積曲線を表示（ワーカースレッドで作成）"""
+        self.figure_runner.submit(
+            'accumulation_curve',
+            lambda conn: AnalysisController(conn).create_species_accumulation_curve(),
+            lambda fig: show_figure_window(self.frame, fig, '種数累積曲線'),
+            self._show_figure_error)
+    
+    def _show_figure_error(self, error):
+        """
+        グラフ作成の失敗を表示
+        
+        Args:
+            error: ワーカースレッドで発生した例外
+        """
+        if isinstance(error, ValueError):
+            messagebox.showerror('エラー', str(error))
+        else:
+            messagebox.showerror('エラー', f'グラフ作成に失敗しました：{error}')
     
     def _export_diversity(self):
         """多様度データをCSV出力"""
@@ -441,47 +756,223 @@ class AnalysisTab:
         except Exception as e:
             messagebox.showerror('エラー', f'出力に失敗しました：{e}')
     
+    # 多様度プロファイル関連メソッド
+    def _create_hill_profile(self):
+        """Hill数プロファイルを作成（ワーカースレッドで計算）"""
+        standardize = self.hill_standardize.get()
+        coverage_text = self.hill_coverage.get().strip()
+        
+        try:
+            coverage = float(coverage_text) if coverage_text else None
+        except ValueError:
+            messagebox.showerror('エラー', '目標の被覆率は数値で入力してください（例: 0.9）')
+            return
+        
+        def build_hill(conn):
+            controller = AnalysisController(conn)
+            result = controller.calculate_hill_profiles(standardize=standardize,
+                                                        coverage=coverage)
+            return controller.create_hill_profile_plot(result), result
+        
+        self.hill_label.config(text='計算中...')
+        self.figure_runner.submit('hill_profile', build_hill,
+                                  self._show_hill_profile, self._show_hill_profile_error)
+    
+    def _show_hill_profile(self, payload):
+        """
+        作成したプロファイルの図と要約を表示
+        
+        Args:
+            payload: (Figure, プロファイルの計算結果)
+        """
+        fig, result = payload
+        
+        for widget in self.hill_canvas_frame.winfo_children():
+            widget.destroy()
+        
+        embed_figure(self.hill_canvas_frame, fig)
+        
+        lines = [f"地点数: {len(result['sites']):,}"]
+        if result['coverage'] is not None:
+            excluded = int(np.isnan(result['profiles']).any(axis=1).sum())
+            lines.append(f"被覆率: {result['coverage']:.1%} で標準化")
+            if excluded:
+                lines.append(f"（被覆率が届かない{excluded:,}地点を除外）")
+        self.hill_label.config(text='\n'.join(lines))
+    
+    def _show_hill_profile_error(self, error):
+        """
+        プロファイル作成の失敗を表示
+        
+        Args:
+            error: ワーカースレッドで発生した例外
+        """
+        self.hill_label.config(text='')
+        self._show_figure_error(error)
+    
     # 散布図関連メソッド
     def _create_scatter(self):
-        """散布図を作成"""
-        try:
-            x_label = self.x_var.get()
-            y_label = self.y_var.get()
-            
-            if not x_label or not y_label:
-                messagebox.showwarning('警告', 'X軸とY軸の変数を選択してください')
-                return
-            
-            # 変数名を取得（逆引き）
-            x_name = [k for k, v in self.var_dict.items() if v == x_label][0]
-            y_name = [k for k, v in self.var_dict.items() if v == y_label][0]
-            
-            fig = self.analysis_controller.create_scatter_plot(
-                x_name, y_name, x_label, y_label, 
-                self.show_regression.get()
-            )
-            
-            # 既存のキャンバスをクリア
-            for widget in self.scatter_canvas_frame.winfo_children():
-                widget.destroy()
-            
-            # 新しいキャンバスを作成
-            canvas = FigureCanvasTkAgg(fig, self.scatter_canvas_frame)
-            canvas.draw()
-            canvas.get_tk_widget().pack(fill='both', expand=True)
-            
-            # 相関係数を表示
-            result = self.analysis_controller.calculate_correlation(x_name, y_name)
-            self.corr_label.config(
-                text=f"相関係数: {result['correlation']:.4f}\n"
-                     f"p値: {result['p_value']:.4f}\n"
-                     f"サンプル数: {result['n']}"
-            )
-            
-        except ValueError as e:
-            messagebox.showerror('エラー', str(e))
-        except Exception as e:
-            messagebox.showerror('エラー', f'グラフ作成に失敗しました：{e}')
+        """散布図を作成（ワーカースレッドで作成）"""
+        x_label = self.x_var.get()
+        y_label = self.y_var.get()
+        
+        if not x_label or not y_label:
+            messagebox.showwarning('警告', 'X軸とY軸の変数を選択してください')
+            return
+        
+        # 変数名を取得（逆引き）
+        x_name = [k for k, v in self.var_dict.items() if v == x_label][0]
+        y_name = [k for k, v in self.var_dict.items() if v == y_label][0]
+        show_regression = self.show_regression.get()
+        
+        def build_scatter(conn):
+            controller = AnalysisController(conn)
+            fig = controller.create_scatter_plot(
+                x_name, y_name, x_label, y_label, show_regression)
+            result = controller.calculate_correlation(x_name, y_name)
+            return fig, result
+        
+        self.figure_runner.submit('scatter_plot', build_scatter,
+                                  self._show_scatter, self._show_figure_error)
+    
+    def _show_scatter(self, payload):
+        """
+        作成した散布図と相関係数を表示
+        
+        Args:
+            payload: (Figure, 相関分析の結果)
+        """
+        fig, result = payload
+        
+        # 既存のキャンバスをクリア
+        for widget in self.scatter_canvas_frame.winfo_children():
+            widget.destroy()
+        
+        # 新しいキャンバスを作成
+        embed_figure(self.scatter_canvas_frame, fig)
+        
+        # 相関係数を表示
+        self.corr_label.config(
+            text=f"相関係数: {result['correlation']:.4f}\n"
+                 f"p値: {result['p_value']:.4f}\n"
+                 f"サンプル数: {result['n']}"
+        )
+    
+    # 序列化関連メソッド
+    def _create_ordination(self):
+        """序列化を実行して散布図を作成（ワーカースレッドで作成）"""
+        method = self.ordination_method.get()
+        metric = self.ordination_metric_labels[self.ordination_metric.get()]
+        site_type = self.ordination_site_type.get()
+        show_vectors = self.show_vectors.get()
+        
+        def build_ordination(conn):
+            controller = OrdinationController(conn)
+            ordination = controller.compute_ordination(method, metric, site_type)
+            vectors = controller.fit_vegetation_vectors(ordination) if show_vectors else None
+            return controller.create_ordination_plot(ordination, vectors), ordination
+        
+        self.ordination_label.config(text='計算中...')
+        self.figure_runner.submit('ordination', build_ordination,
+                                  self._show_ordination, self._show_ordination_error)
+    
+    def _show_ordination(self, payload):
+        """
+        作成した序列化の散布図と要約を表示
+        
+        Args:
+            payload: (Figure, 序列化の結果)
+        """
+        fig, ordination = payload
+        
+        for widget in self.ordination_canvas_frame.winfo_children():
+            widget.destroy()
+        
+        embed_figure(self.ordination_canvas_frame, fig)
+        
+        if ordination['method'] == 'pcoa':
+            explained = ordination['explained']
+            summary = f"寄与率: 軸1 {explained[0]:.1%} / 軸2 {explained[1]:.1%}"
+        else:
+            summary = f"stress: {ordination['stress']:.4f}"
+        lines = [f"地点数: {len(ordination['sites']):,}", summary]
+        if ordination['cached']:
+            lines.append('（保存済みの結果を表示）')
+        self.ordination_label.config(text='\n'.join(lines))
+    
+    def _show_ordination_error(self, error):
+        """
+        序列化の失敗を表示
+        
+        Args:
+            error: ワーカースレッドで発生した例外
+        """
+        self.ordination_label.config(text='')
+        self._show_figure_error(error)
+    
+    # Mantel検定関連メソッド
+    def _run_mantel(self):
+        """Mantel検定を実行（ワーカースレッドで計算し、進捗を表示）"""
+        x = self.mantel_distance_labels[self.mantel_x.get()]
+        y = self.mantel_distance_labels[self.mantel_y.get()]
+        z = self.mantel_distance_labels.get(self.mantel_z.get())
+        site_type = self.mantel_site_type.get()
+        method = self.mantel_method.get()
+        permutations = self.mantel_permutations.get()
+        
+        def build_mantel(conn, report):
+            controller = OrdinationController(conn)
+            result = controller.mantel_test(
+                x, y, z, site_type=site_type, method=method, permutations=permutations,
+                progress=lambda done, total: report((done, total)))
+            return controller.create_mantel_plot(result), result
+        
+        self.mantel_progress.config(value=0, maximum=permutations)
+        self.mantel_label.config(text='距離を計算中...')
+        self.figure_runner.submit('mantel', build_mantel, self._show_mantel,
+                                  self._show_mantel_error, self._update_mantel_progress)
+    
+    def _update_mantel_progress(self, progress):
+        """
+        並べ替えの進捗を表示
+        
+        Args:
+            progress: (計算済みの並べ替え回数, 全回数)
+        """
+        done, total = progress
+        self.mantel_progress.config(value=done, maximum=total)
+        self.mantel_label.config(text=f'並べ替え中... {done:,} / {total:,}')
+    
+    def _show_mantel(self, payload):
+        """
+        Mantel検定の結果と並べ替え分布を表示
+        
+        Args:
+            payload: (Figure, 検定結果)
+        """
+        fig, result = payload
+        
+        for widget in self.mantel_canvas_frame.winfo_children():
+            widget.destroy()
+        
+        embed_figure(self.mantel_canvas_frame, fig)
+        
+        self.mantel_label.config(
+            text=f"Mantel r: {result['r']:.4f}\n"
+                 f"p値: {result['p_value']:.4f}\n"
+                 f"地点数: {result['n']:,}"
+        )
+    
+    def _show_mantel_error(self, error):
+        """
+        Mantel検定の失敗を表示
+        
+        Args:
+            error: ワーカースレッドで発生した例外
+        """
+        self.mantel_progress.config(value=0)
+        self.mantel_label.config(text='')
+        self._show_figure_error(error)
     
     # 統計量関連メソッド
     def _calculate_stats(self):
@@ -0,0 +1,53 @@
+"""
+グラフ表示ウィンドウ
+
+コントローラーが作成した matplotlib の Figure を Tk ウィジェットに埋め込む。
+図の作成（描画内容の組み立て）はワーカースレッドで済ませ、
+ここではメインスレッドでキャンバスに貼り付けるだけにする。
+"""
+import tkinter as tk
+from tkinter import ttk
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+
+
+def embed_figure(parent, fig, toolbar: bool = False) -> FigureCanvasTkAgg:
+    """
+    Figure をフレームに埋め込む
+
+    Args:
+        parent: 親ウィジェット
+        fig: matplotlibのFigureオブジェクト
+        toolbar: 拡大・保存用のツールバーを表示するか
+
+    Returns:
+        FigureCanvasTkAgg: 作成したキャンバス
+    """
+    canvas = FigureCanvasTkAgg(fig, parent)
+    if toolbar:
+        NavigationToolbar2Tk(canvas, parent).update()
+    canvas.draw()
+    canvas.get_tk_widget().pack(fill='both', expand=True)
+    return canvas
+
+
+def show_figure_window(parent, fig, title: str) -> tk.Toplevel:
+    """
+    Figure を別ウィンドウで表示
+
+    Args:
+        parent: 親ウィジェット
+        fig: matplotlibのFigureオブジェクト
+        title: ウィンドウタイトル
+
+    Returns:
+        Toplevel: 作成したウィンドウ
+    """
+    window = tk.Toplevel(parent)
+    window.title(title)
+
+    frame = ttk.Frame(window)
+    frame.pack(fill='both', expand=True)
+    embed_figure(frame, fig, toolbar=True)
+
+    return window
+
@@ -177,6 +177,9 @@ class MainWindow:
     def _on_closing(self):
         """ウィンドウを閉じる際の処理"""
         if messagebox.askokcancel("終了確認", "アプリケーションを終了しますか？"):
+            # バックグラウンド処理のワーカーと専用接続を閉じる
+            for tab in (self.view_tab, self.analysis_tab, self.map_tab):
+                tab.shutdown()
             self.root.destroy()
     
     def run(self):
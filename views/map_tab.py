@@ -1,12 +1,18 @@
 """
 地図・クラスタ解析タブ
 """
+import configparser
+import logging
 import tkinter as tk
 from tkinter import ttk, messagebox
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from controllers.map_controller import MapController
-import pandas as pd
+from utils.background_query import BackgroundQueryRunner, get_database_path
+from utils.beta_diversity import BETA_METRIC_LABELS
+from utils.diversity import DIVERSITY_INDEX_LABELS
+from utils.tile_cache import tile_settings_from_config
+from views.figure_window import show_figure_window
+
+logger = logging.getLogger(__name__)
 
 
 class MapTab:
@@ -21,11 +27,24 @@ class MapTab:
             db_connection: データベース接続
         """
         self.conn = db_connection
-        self.map_controller = MapController(db_connection)
+        
+        # 背景地図は config.ini の [Map] で設定（offline_mode ではローカルタイルサーバーを起動）
+        config = configparser.ConfigParser()
+        config.read('config.ini', encoding='utf-8')
+        settings = tile_settings_from_config(config)
+        if settings['tile_server'] is not None and not settings['tile_server'].start():
+            logger.warning("ポート %d は使用中です。起動済みのタイルサーバーを使用します",
+                           settings['tile_server'].port)
+        self.map_controller = MapController(db_connection, **settings)
         
         # メインフレーム
         self.frame = ttk.Frame(parent)
         
+        # 樹形図はワーカースレッドで作成し、完成した図だけを表示する
+        self.figure_runner = BackgroundQueryRunner(
+            self.frame, get_database_path(db_connection),
+            query_profiler=getattr(db_connection, 'profiler', None))
+        
         # サブタブを作成
         self.sub_notebook = ttk.Notebook(self.frame)
         self.sub_notebook.pack(fill='both', expand=True, padx=5, pady=5)
@@ -35,6 +54,10 @@ class MapTab:
         self._create_cluster_tab()
         self._create_distance_tab()
     
+    def shutdown(self):
+        """ワーカースレッドを停止し接続を閉じる（ウィンドウを閉じる際に呼ぶ）"""
+        self.figure_runner.shutdown()
+    
     def _create_map_display_tab(self):
         """地図表示タブを作成"""
         tab = ttk.Frame(self.sub_notebook)
@@ -70,9 +93,34 @@ class MapTab:
                   command=self._create_map,
                   style='Accent.TButton').pack(pady=10)
         
+        # ヒートマップの指標
+        ttk.Label(left_frame, text='ヒートマップの指標:').pack(anchor='w', pady=(5, 2))
+        self.heatmap_metric_var = tk.StringVar()
+        heatmap_combo = ttk.Combobox(left_frame, textvariable=self.heatmap_metric_var, 
+                                     values=list(DIVERSITY_INDEX_LABELS.values()), 
+                                     state='readonly', width=25)
+        heatmap_combo.pack(fill='x', pady=2)
+        heatmap_combo.current(0)  # 種数
+        
+        self.heatmap_effort_weight = tk.BooleanVar(value=False)
+        ttk.Checkbutton(left_frame, text='調査回数で重み付け', 
+                       variable=self.heatmap_effort_weight).pack(anchor='w', pady=2)
+        
         ttk.Button(left_frame, text='🔥 ヒートマップを生成', 
                   command=self._create_heatmap).pack(pady=5)
         
+        # 同じ指標の連続面（サーバー側で計算した格子）
+        surface_frame = ttk.Frame(left_frame)
+        surface_frame.pack(fill='x', pady=2)
+        self.surface_method_var = tk.StringVar(value='kde')
+        ttk.Radiobutton(surface_frame, text='カーネル密度', value='kde', 
+                       variable=self.surface_method_var).pack(side='left')
+        ttk.Radiobutton(surface_frame, text='IDW補間', value='idw', 
+                       variable=self.surface_method_var).pack(side='left', padx=5)
+        
+        ttk.Button(left_frame, text='🌐 多様度サーフェスを生成', 
+                  command=self._create_surface_map).pack(pady=5)
+        
         # 説明
         info_frame = ttk.LabelFrame(left_frame, text='凡例', padding=10)
         info_frame.pack(fill='x', pady=10)
@@ -167,6 +215,18 @@ class MapTab:
                        variable=self.cluster_method, 
                        value='hierarchical').pack(anchor='w', padx=20, pady=5)
         
+        # 階層的クラスタリング・樹形図の距離
+        ttk.Label(settings_frame, text='距離（階層的クラスタリング）:').pack(anchor='w', pady=(10, 2))
+        self.cluster_distance_labels = {'地理的距離': 'geographic'}
+        self.cluster_distance_labels.update(
+            {f'群集 {label}': metric for metric, label in BETA_METRIC_LABELS.items()})
+        self.cluster_distance_var = tk.StringVar()
+        distance_combo = ttk.Combobox(settings_frame, textvariable=self.cluster_distance_var, 
+                                      values=list(self.cluster_distance_labels), 
+                                      state='readonly', width=20)
+        distance_combo.pack(anchor='w', pady=2)
+        distance_combo.current(0)  # 地理的距離
+        
         ttk.Separator(left_frame, orient='horizontal').pack(fill='x', pady=15)
         
         # 実行ボタン
@@ -310,7 +370,10 @@ K-Means法:
     def _create_heatmap(self):
         """ヒートマップを生成"""
         try:
-            filepath = self.map_controller.create_heatmap('species_richness')
+            labels = {label: metric for metric, label in DIVERSITY_INDEX_LABELS.items()}
+            filepath = self.map_controller.create_heatmap(
+                labels[self.heatmap_metric_var.get()],
+                weighting='events' if self.heatmap_effort_weight.get() else 'none')
             
             self.map_controller.open_map_in_browser(filepath)
             
@@ -322,6 +385,24 @@ K-Means法:
         except Exception as e:
             messagebox.showerror('エラー', f'ヒートマップの生成に失敗しました：{e}')
     
+    def _create_surface_map(self):
+        """多様度サーフェス（KDE / IDW の格子）を生成"""
+        try:
+            labels = {label: metric for metric, label in DIVERSITY_INDEX_LABELS.items()}
+            filepath = self.map_controller.create_diversity_surface_map(
+                labels[self.heatmap_metric_var.get()],
+                method=self.surface_method_var.get())
+            
+            self.map_controller.open_map_in_browser(filepath)
+            
+            messagebox.showinfo('成功', 
+                f'多様度サーフェスを生成しました\n\nブラウザで開いています...\n\n{filepath}')
+            
+        except ValueError as e:
+            messagebox.showerror('エラー', str(e))
+        except Exception as e:
+            messagebox.showerror('エラー', f'多様度サーフェスの生成に失敗しました：{e}')
+    
     # クラスタ解析関連メソッド
     def _perform_clustering(self):
         """クラスタリングを実行"""
@@ -329,10 +410,27 @@ K-Means法:
             n_clusters = self.n_clusters.get()
             target = self.cluster_target.get()
             
-            result = self.map_controller.perform_kmeans_clustering(
-                n_clusters=n_clusters,
-                site_type=target
-            )
+            if self.cluster_method.get() == 'hierarchical':
+                distance = self.cluster_distance_labels[self.cluster_distance_var.get()]
+                method = 'ward' if distance == 'geographic' else 'average'
+                result = self.map_controller.perform_hierarchical_clustering(
+                    n_clusters=n_clusters,
+                    site_type=target,
+                    method=method,
+                    distance=distance
+                )
+                n_clusters = result['n_clusters']
+                stats = f"手法: {method}法  葉の数: {len(result['leaves'])}"
+                if result['aggregation'] == 'parent':
+                    stats += '（親調査地に集約）'
+                elif result['aggregation'] == 'sample':
+                    stats += '（抽出）'
+            else:
+                result = self.map_controller.perform_kmeans_clustering(
+                    n_clusters=n_clusters,
+                    site_type=target
+                )
+                stats = f"Inertia: {result['inertia']:.2f}"
             
             df = result['data']
             
@@ -350,8 +448,7 @@ K-Means法:
             
             # 統計情報
             self.cluster_stats_label.config(
-                text=f"クラスタ数: {n_clusters}  地点数: {len(df)}  "
-                     f"Inertia: {result['inertia']:.2f}"
+                text=f"クラスタ数: {n_clusters}  地点数: {len(df)}  {stats}"
             )
             
             messagebox.showinfo('成功', 
@@ -363,21 +460,31 @@ K-Means法:
             messagebox.showerror('エラー', f'クラスタリングに失敗しました：{e}')
     
     def _show_dendrogram(self):
-        """樹形図を表示"""
-        try:
-            target = self.cluster_target.get()
-            
-            fig = self.map_controller.create_dendrogram(
+        """樹形図を表示（ワーカースレッドで作成）"""
+        target = self.cluster_target.get()
+        distance = self.cluster_distance_labels[self.cluster_distance_var.get()]
+        
+        self.figure_runner.submit(
+            'dendrogram',
+            lambda conn: MapController(conn, self.map_controller.map_dir).create_dendrogram(
                 site_type=target,
-                method='ward'
-            )
-            
-            plt.show()
-            
-        except ValueError as e:
-            messagebox.showerror('エラー', str(e))
-        except Exception as e:
-            messagebox.showerror('エラー', f'樹形図の作成に失敗しました：{e}')
+                method='ward' if distance == 'geographic' else 'average',
+                distance=distance
+            ),
+            lambda fig: show_figure_window(self.frame, fig, '階層的クラスタリング樹形図'),
+            self._show_dendrogram_error)
+    
+    def _show_dendrogram_error(self, error):
+        """
+        樹形図作成の失敗を表示
+        
+        Args:
+            error: ワーカースレッドで発生した例外
+        """
+        if isinstance(error, ValueError):
+            messagebox.showerror('エラー', str(error))
+        else:
+            messagebox.showerror('エラー', f'樹形図の作成に失敗しました：{error}')
     
     def _create_cluster_map(self):
         """クラスタ地図を生成"""
@@ -387,8 +494,9 @@ K-Means法:
             
             filepath = self.map_controller.create_cluster_map(
                 n_clusters=n_clusters,
-                method='kmeans',
-                site_type=target
+                method=self.cluster_method.get(),
+                site_type=target,
+                distance=self.cluster_distance_labels[self.cluster_distance_var.get()]
             )
             
             self.map_controller.open_map_in_browser(filepath)
@@ -2,8 +2,9 @@
 設定・管理タブ
 """
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox
 from utils.integrity_checker import IntegrityChecker
+from utils import perf_trace
 from models.database import Database
 import configparser
 import os
@@ -13,6 +14,15 @@ from pathlib import Path
 class SettingsTab:
     """設定・管理タブクラス"""
     
+    # クエリ性能タブの並び順（表示名 → 集計項目）
+    PROFILE_ORDERS = {
+        '合計時間': 'total_ms',
+        '最大時間': 'max_ms',
+        '平均時間': 'avg_ms',
+        '呼び出し回数': 'calls',
+        '行数': 'rows',
+    }
+    
     def __init__(self, parent, db_connection):
         """
         初期化
@@ -23,6 +33,7 @@ class SettingsTab:
         """
         self.conn = db_connection
         self.integrity_checker = IntegrityChecker(db_connection)
+        self.query_profiler = getattr(db_connection, 'profiler', None)
         
         # メインフレーム
         self.frame = ttk.Frame(parent)
@@ -34,6 +45,8 @@ class SettingsTab:
         # 各サブタブ
         self._create_integrity_tab()
         self._create_backup_tab()
+        self._create_query_profile_tab()
+        self._create_perf_trace_tab()
         self._create_settings_tab()
         self._create_about_tab()
     
@@ -166,6 +179,160 @@ class SettingsTab:
         
         self._update_backup_list()
     
+    def _create_query_profile_tab(self):
+        """クエリ性能（プロファイル）タブを作成"""
+        tab = ttk.Frame(self.sub_notebook)
+        self.sub_notebook.add(tab, text='クエリ性能')
+        
+        ttk.Label(tab, text='クエリ性能', 
+                 style='Header.TLabel').pack(anchor='w', padx=20, pady=10)
+        
+        if self.query_profiler is None:
+            info_text = """
+クエリの計測は無効になっています。
+config.ini の [Logging] セクションで query_profiling = True にすると、
+次回起動時からSQLごとの実行時間を集計し、スロークエリをログに記録します。
+            """
+            ttk.Label(tab, text=info_text, justify='left').pack(anchor='w', padx=20)
+            return
+        
+        # 上部：操作ボタンと概要
+        top_frame = ttk.Frame(tab)
+        top_frame.pack(fill='x', padx=20, pady=5)
+        
+        ttk.Label(top_frame, text='並び順:').pack(side='left')
+        self.profile_order_var = tk.StringVar(value='合計時間')
+        order_combo = ttk.Combobox(top_frame, textvariable=self.profile_order_var,
+                                  values=list(self.PROFILE_ORDERS),
+                                  state='readonly', width=12)
+        order_combo.pack(side='left', padx=5)
+        order_combo.bind('<<ComboboxSelected>>', lambda e: self._update_query_profile())
+        
+        ttk.Button(top_frame, text='更新', 
+                  command=self._update_query_profile).pack(side='left', padx=5)
+        ttk.Button(top_frame, text='集計をリセット', 
+                  command=self._reset_query_profile).pack(side='left', padx=5)
+        ttk.Button(top_frame, text='ログフォルダを開く', 
+                  command=self._open_log_folder).pack(side='left', padx=5)
+        
+        self.profile_summary_label = ttk.Label(tab, text='')
+        self.profile_summary_label.pack(anchor='w', padx=20, pady=5)
+        
+        # 中部：SQL文ごとの集計
+        list_frame = ttk.LabelFrame(tab, text='SQL文ごとの実行時間', padding=10)
+        list_frame.pack(fill='both', expand=True, padx=20, pady=5)
+        
+        tree_frame = ttk.Frame(list_frame)
+        tree_frame.pack(fill='both', expand=True)
+        
+        scrollbar = ttk.Scrollbar(tree_frame)
+        scrollbar.pack(side='right', fill='y')
+        
+        self.profile_tree = ttk.Treeview(
+            tree_frame,
+            columns=('total_ms', 'calls', 'avg_ms', 'max_ms', 'rows', 
+                    'call_site', 'sql'),
+            show='headings',
+            yscrollcommand=scrollbar.set
+        )
+        scrollbar.config(command=self.profile_tree.yview)
+        
+        headings = {
+            'total_ms': ('合計(ms)', 90),
+            'calls': ('回数', 60),
+            'avg_ms': ('平均(ms)', 80),
+            'max_ms': ('最大(ms)', 80),
+            'rows': ('行数', 80),
+            'call_site': ('主な呼び出し元', 260),
+            'sql': ('SQL', 500),
+        }
+        for column, (text, width) in headings.items():
+            self.profile_tree.heading(column, text=text)
+            anchor = 'w' if column in ('call_site', 'sql') else 'e'
+            self.profile_tree.column(column, width=width, anchor=anchor)
+        
+        self.profile_tree.pack(fill='both', expand=True)
+        self.profile_tree.bind('<<TreeviewSelect>>', self._on_profile_select)
+        
+        # 下部：選択したSQLの詳細
+        detail_frame = ttk.LabelFrame(tab, text='詳細', padding=10)
+        detail_frame.pack(fill='x', padx=20, pady=(5, 10))
+        
+        self.profile_detail_text = tk.Text(detail_frame, height=8, 
+                                          state='disabled', wrap='word')
+        self.profile_detail_text.pack(fill='x')
+        
+        self._profile_rows = {}
+        self._update_query_profile()
+    
+    def _create_perf_trace_tab(self):
+        """処理時間（トレース）タブを作成"""
+        tab = ttk.Frame(self.sub_notebook)
+        self.sub_notebook.add(tab, text='処理時間')
+        
+        ttk.Label(tab, text='処理時間', 
+                 style='Header.TLabel').pack(anchor='w', padx=20, pady=10)
+        
+        info_text = """
+解析・地図・出力の各処理を「取得 / 整形 / 計算 / 描画 / 書き出し」に分けて計測します。
+p50 / p90 / p99 はヒストグラムからの近似値です。
+        """
+        ttk.Label(tab, text=info_text, justify='left').pack(anchor='w', padx=20)
+        
+        # 上部：操作ボタン
+        top_frame = ttk.Frame(tab)
+        top_frame.pack(fill='x', padx=20, pady=5)
+        
+        self.perf_trace_var = tk.BooleanVar(value=perf_trace.is_enabled())
+        ttk.Checkbutton(top_frame, text='計測を有効にする', 
+                       variable=self.perf_trace_var,
+                       command=self._toggle_perf_trace).pack(side='left', padx=5)
+        
+        ttk.Button(top_frame, text='更新', 
+                  command=self._update_perf_trace).pack(side='left', padx=5)
+        ttk.Button(top_frame, text='集計をリセット', 
+                  command=self._reset_perf_trace).pack(side='left', padx=5)
+        ttk.Button(top_frame, text='トレースをJSON出力', 
+                  command=self._export_perf_trace).pack(side='left', padx=5)
+        
+        # 中部：操作ごとの集計
+        list_frame = ttk.LabelFrame(tab, text='操作ごとの所要時間', padding=10)
+        list_frame.pack(fill='both', expand=True, padx=20, pady=10)
+        
+        tree_frame = ttk.Frame(list_frame)
+        tree_frame.pack(fill='both', expand=True)
+        
+        scrollbar = ttk.Scrollbar(tree_frame)
+        scrollbar.pack(side='right', fill='y')
+        
+        self.perf_tree = ttk.Treeview(
+            tree_frame,
+            columns=('name', 'count', 'total_ms', 'mean_ms', 'p50_ms', 
+                    'p90_ms', 'p99_ms', 'max_ms'),
+            show='headings',
+            yscrollcommand=scrollbar.set
+        )
+        scrollbar.config(command=self.perf_tree.yview)
+        
+        headings = {
+            'name': ('操作', 320),
+            'count': ('回数', 60),
+            'total_ms': ('合計(ms)', 100),
+            'mean_ms': ('平均(ms)', 90),
+            'p50_ms': ('p50(ms)', 90),
+            'p90_ms': ('p90(ms)', 90),
+            'p99_ms': ('p99(ms)', 90),
+            'max_ms': ('最大(ms)', 90),
+        }
+        for column, (text, width) in headings.items():
+            self.perf_tree.heading(column, text=text)
+            self.perf_tree.column(column, width=width, 
+                                 anchor='w' if column == 'name' else 'e')
+        
+        self.perf_tree.pack(fill='both', expand=True)
+        
+        self._update_perf_trace()
+    
     def _create_settings_tab(self):
         """アプリケーション設定タブを作成"""
         tab = ttk.Frame(self.sub_notebook)
@@ -401,6 +568,120 @@ class SettingsTab:
         # 実装は_save_settingsに統合
         pass
     
+    # クエリ性能関連メソッド
+    def _update_query_profile(self):
+        """クエリの集計結果を表示"""
+        order_by = self.PROFILE_ORDERS[self.profile_order_var.get()]
+        queries = self.query_profiler.get_top_queries(limit=100, order_by=order_by)
+        summary = self.query_profiler.get_summary()
+        
+        self.profile_summary_label.config(
+            text=f"計測開始: {summary['started_at'].strftime('%Y-%m-%d %H:%M:%S')}　"
+                 f"SQL文: {summary['statements']:,}種類　"
+                 f"実行: {summary['calls']:,}回　"
+                 f"合計: {summary['total_ms'] / 1000:,.2f}秒　"
+                 f"スロークエリ: {summary['slow_calls']:,}件"
+                 f"（{summary['slow_query_ms']:g}ms以上）")
+        
+        for item in self.profile_tree.get_children():
+            self.profile_tree.delete(item)
+        self._profile_rows = {}
+        
+        for query in queries:
+            item = self.profile_tree.insert('', 'end', values=(
+                f"{query['total_ms']:,.1f}",
+                f"{query['calls']:,}",
+                f"{query['avg_ms']:,.2f}",
+                f"{query['max_ms']:,.1f}",
+                f"{query['rows']:,}",
+                query['call_site'],
+                query['sql'][:200]
+            ))
+            self._profile_rows[item] = query
+    
+    def _on_profile_select(self, event):
+        """選択したSQLの全文と呼び出し元を表示"""
+        selection = self.profile_tree.selection()
+        if not selection or selection[0] not in self._profile_rows:
+            return
+        
+        query = self._profile_rows[selection[0]]
+        text = f"{query['sql']}\n\n"
+        text += (f"エラー: {query['errors']}回　"
+                 f"スロークエリ: {query['slow_calls']}回\n\n呼び出し元:\n")
+        for call_site, count in query['call_sites'][:10]:
+            text += f"  {count:>6,}回  {call_site}\n"
+        
+        self.profile_detail_text.config(state='normal')
+        self.profile_detail_text.delete('1.0', 'end')
+        self.profile_detail_text.insert('1.0', text)
+        self.profile_detail_text.config(state='disabled')
+    
+    def _reset_query_profile(self):
+        """クエリの集計結果をリセット"""
+        self.query_profiler.reset()
+        self._update_query_profile()
+    
+    def _open_log_folder(self):
+        """ログフォルダを開く"""
+        import subprocess
+        import platform
+        
+        config = configparser.ConfigParser()
+        config.read('config.ini', encoding='utf-8')
+        log_dir = os.path.abspath(config.get('Logging', 'log_dir', fallback='logs'))
+        os.makedirs(log_dir, exist_ok=True)
+        
+        if platform.system() == 'Windows':
+            os.startfile(log_dir)
+        elif platform.system() == 'Darwin':
+            subprocess.Popen(['open', log_dir])
+        else:
+            subprocess.Popen(['xdg-open', log_dir])
+    
+    # 処理時間関連メソッド
+    def _toggle_perf_trace(self):
+        """処理時間の計測を切り替え"""
+        if self.perf_trace_var.get():
+            perf_trace.enable()
+        else:
+            perf_trace.disable()
+    
+    def _update_perf_trace(self):
+        """操作ごとの集計を表示"""
+        for item in self.perf_tree.get_children():
+            self.perf_tree.delete(item)
+        
+        for stats in perf_trace.get_stats():
+            self.perf_tree.insert('', 'end', values=(
+                stats['name'],
+                f"{stats['count']:,}",
+                f"{stats['total_ms']:,.1f}",
+                f"{stats['mean_ms']:,.2f}",
+                f"{stats['p50_ms']:,.2f}",
+                f"{stats['p90_ms']:,.2f}",
+                f"{stats['p99_ms']:,.2f}",
+                f"{stats['max_ms']:,.1f}"
+            ))
+    
+    def _reset_perf_trace(self):
+        """処理時間の集計をリセット"""
+        perf_trace.reset()
+        self._update_perf_trace()
+    
+    def _export_perf_trace(self):
+        """集計値と直近のトレースをJSONに出力"""
+        try:
+            config = configparser.ConfigParser()
+            config.read('config.ini', encoding='utf-8')
+            filepath = perf_trace.export_traces(
+                log_dir=config.get('Logging', 'log_dir', fallback='logs'))
+            
+            messagebox.showinfo('成功', f'トレースを出力しました\n\n{filepath}')
+            
+        except Exception as e:
+            messagebox.showerror('エラー', f'トレースの出力に失敗しました：{e}')
+    
     # 設定関連メソッド
     def _load_settings(self):
         """設定を読み込み"""
@@ -7,11 +7,15 @@ from models.parent_site import ParentSite
 from models.survey_site import SurveySite
 from models.survey_event import SurveyEvent
 from models.ant_record import AntRecord
+from utils.background_query import BackgroundQueryRunner, get_database_path
 
 
 class ViewTab:
     """データ閲覧タブクラス"""
     
+    # 検索入力の確定を待つ時間（ミリ秒）
+    SEARCH_DEBOUNCE_MS = 200
+    
     def __init__(self, parent, db_connection):
         """
         初期化
@@ -29,6 +33,13 @@ class ViewTab:
         # メインフレーム
         self.frame = ttk.Frame(parent)
         
+        # 入力中検索はワーカースレッドで実行
+        self.query_runner = BackgroundQueryRunner(
+            self.frame, get_database_path(db_connection),
+            query_profiler=getattr(db_connection, 'profiler', None))
+        self._search_after_ids = {}
+        self._worker_models = None
+        
         # サブタブを作成
         self.sub_notebook = ttk.Notebook(self.frame)
         self.sub_notebook.pack(fill='both', expand=True, padx=5, pady=5)
@@ -45,6 +56,10 @@ class ViewTab:
         # アリ類出現記録タブ
         self._create_ant_record_tab()
     
+    def shutdown(self):
+        """ワーカースレッドを停止し接続を閉じる（ウィンドウを閉じる際に呼ぶ）"""
+        self.query_runner.shutdown()
+    
     def _create_parent_site_tab(self):
         """親調査地一覧タブを作成"""
         tab = ttk.Frame(self.sub_notebook)
@@ -61,6 +76,10 @@ class ViewTab:
         search_entry = ttk.Entry(toolbar, textvariable=self.ps_search_var, width=30)
         search_entry.pack(side='left', padx=5)
         
+        # 入力に合わせて検索（デバウンス）
+        self.ps_search_var.trace_add('write', lambda *args: self._schedule_search(
+            'parent_site_search', self._search_parent_sites))
+        
         ttk.Button(toolbar, text='🔍 検索', 
                   command=self._search_parent_sites).pack(side='left', padx=5)
         ttk.Button(toolbar, text='🔄 更新', 
@@ -145,6 +164,10 @@ class ViewTab:
         ttk.Entry(toolbar, textvariable=self.ss_search_var, width=30).pack(
             side='left', padx=5)
         
+        # 入力に合わせて検索（デバウンス）
+        self.ss_search_var.trace_add('write', lambda *args: self._schedule_search(
+            'survey_site_search', self._search_survey_sites))
+        
         ttk.Button(toolbar, text='🔍 検索', 
                   command=self._search_survey_sites).pack(side='left', padx=5)
         ttk.Button(toolbar, text='🔄 更新', 
@@ -201,33 +224,16 @@ class ViewTab:
     
     def _refresh_parent_sites(self):
         """親調査地一覧を更新"""
-        # 既存のアイテムをクリア
-        for item in self.ps_view_tree.get_children():
-            self.ps_view_tree.delete(item)
+        self.query_runner.cancel('parent_site_search')
         
         # データを取得
         sites = self.parent_site_model.get_with_site_count()
         
-        for site in sites:
-            self.ps_view_tree.insert('', 'end', values=(
-                site['id'],
-                site['name'],
-                f"{site['latitude']:.6f}",
-                f"{site['longitude']:.6f}",
-                site['altitude'] if site['altitude'] else '',
-                site['site_count'],
-                site['remarks'] if site['remarks'] else ''
-            ))
-        
-        # 統計情報を更新
-        self.ps_stats_label.config(
-            text=f'親調査地: {len(sites)}件'
-        )
+        self._show_parent_sites(sites, '親調査地')
     
     def _refresh_survey_sites(self):
         """調査地一覧を更新"""
-        for item in self.ss_view_tree.get_children():
-            self.ss_view_tree.delete(item)
+        self.query_runner.cancel('survey_site_search')
         
         # フィルタ条件
         filter_value = self.ss_filter_var.get()
@@ -243,82 +249,155 @@ class ViewTab:
         # データを取得
         sites = self.survey_site_model.get_all(parent_site_id=parent_site_id)
         
-        for site in sites:
-            self.ss_view_tree.insert('', 'end', values=(
-                site['id'],
-                site['parent_site_name'],
-                site['name'],
-                f"{site['latitude']:.6f}",
-                f"{site['longitude']:.6f}",
-                site['altitude'] if site['altitude'] else '',
-                site['area'] if site['area'] else '',
-                site['remarks'] if site['remarks'] else ''
-            ))
-        
-        self.ss_stats_label.config(
-            text=f'調査地: {len(sites)}件'
-        )
+        self._show_survey_sites(sites, '調査地')
     
-    def _search_parent_sites(self):
-        """親調査地を検索"""
-        keyword = self.ps_search_var.get().strip()
-        
-        if not keyword:
-            self._refresh_parent_sites()
-            return
+    def _schedule_search(self, channel, search_fn):
+        """
+        検索をデバウンスして予約（入力が止まってから実行）
         
-        for item in self.ps_view_tree.get_children():
-            self.ps_view_tree.delete(item)
+        Args:
+            channel: 検索の系統名
+            search_fn: 実行する検索メソッド
+        """
+        after_id = self._search_after_ids.pop(channel, None)
+        if after_id is not None:
+            self.frame.after_cancel(after_id)
         
-        sites = self.parent_site_model.search(keyword)
+        self._search_after_ids[channel] = self.frame.after(
+            self.SEARCH_DEBOUNCE_MS, search_fn)
+    
+    def _cancel_scheduled_search(self, channel):
+        """予約済みの検索を取り消す"""
+        after_id = self._search_after_ids.pop(channel, None)
+        if after_id is not None:
+            self.frame.after_cancel(after_id)
+    
+    def _get_worker_models(self, conn):
+        """
+        ワーカー接続用のモデルを取得（初回のみ生成し、打鍵ごとのスキーマ確認を省く）
         
-        for site in sites:
-            # 調査地数を取得
-            site_count = self.survey_site_model.count_by_parent_site(site['id'])
+        Args:
+            conn: ワーカー用接続
             
-            self.ps_view_tree.insert('', 'end', values=(
-                site['id'],
-                site['name'],
-                f"{site['latitude']:.6f}",
-                f"{site['longitude']:.6f}",
-                site['altitude'] if site['altitude'] else '',
-                site_count,
-                site['remarks'] if site['remarks'] else ''
-            ))
+        Returns:
+            Tuple: (ParentSite, SurveySite)
+        """
+        if self._worker_models is None or self._worker_models[0] is not conn:
+            self._worker_models = (conn, ParentSite(conn), SurveySite(conn))
+        return self._worker_models[1:]
+    
+    def _search_parent_sites(self):
+        """親調査地を検索（ワーカースレッドで実行）"""
+        self._cancel_scheduled_search('parent_site_search')
+        keyword = self.ps_search_var.get().strip()
         
-        self.ps_stats_label.config(
-            text=f'検索結果: {len(sites)}件'
-        )
+        if keyword:
+            query_fn = lambda conn: self._get_worker_models(conn)[0].search_with_site_count(keyword)
+            label = '検索結果'
+        else:
+            query_fn = lambda conn: self._get_worker_models(conn)[0].get_with_site_count()
+            label = '親調査地'
+        
+        self.query_runner.submit(
+            'parent_site_search', query_fn,
+            lambda sites: self._show_parent_sites(sites, label),
+            self._show_search_error)
     
     def _search_survey_sites(self):
-        """調査地を検索"""
+        """調査地を検索（ワーカースレッドで実行）"""
+        self._cancel_scheduled_search('survey_site_search')
         keyword = self.ss_search_var.get().strip()
         
         if not keyword:
             self._refresh_survey_sites()
             return
         
-        for item in self.ss_view_tree.get_children():
-            self.ss_view_tree.delete(item)
-        
-        sites = self.survey_site_model.search(keyword)
-        
-        for site in sites:
-            self.ss_view_tree.insert('', 'end', values=(
-                site['id'],
-                site['parent_site_name'],
-                site['name'],
-                f"{site['latitude']:.6f}",
-                f"{site['longitude']:.6f}",
-                site['altitude'] if site['altitude'] else '',
-                site['area'] if site['area'] else '',
-                site['remarks'] if site['remarks'] else ''
-            ))
+        self.query_runner.submit(
+            'survey_site_search',
+            lambda conn: self._get_worker_models(conn)[1].search(keyword),
+            lambda sites: self._show_survey_sites(sites, '検索結果'),
+            self._show_search_error)
+    
+    def _show_parent_sites(self, sites, label):
+        """
+        親調査地の一覧をツリーに反映
+        
+        Args:
+            sites: 親調査地データ（調査地数を含む）のリスト
+            label: 件数表示の見出し
+        """
+        rows = [(str(site['id']), (
+            site['id'],
+            site['name'],
+            f"{site['latitude']:.6f}",
+            f"{site['longitude']:.6f}",
+            site['altitude'] if site['altitude'] else '',
+            site['site_count'],
+            site['remarks'] if site['remarks'] else ''
+        )) for site in sites]
+        
+        self._update_tree_incrementally(self.ps_view_tree, rows)
+        
+        self.ps_stats_label.config(
+            text=f'{label}: {len(sites)}件'
+        )
+    
+    def _show_survey_sites(self, sites, label):
+        """
+        調査地の一覧をツリーに反映
+        
+        Args:
+            sites: 調査地データのリスト
+            label: 件数表示の見出し
+        """
+        rows = [(str(site['id']), (
+            site['id'],
+            site['parent_site_name'],
+            site['name'],
+            f"{site['latitude']:.6f}",
+            f"{site['longitude']:.6f}",
+            site['altitude'] if site['altitude'] else '',
+            site['area'] if site['area'] else '',
+            site['remarks'] if site['remarks'] else ''
+        )) for site in sites]
+        
+        self._update_tree_incrementally(self.ss_view_tree, rows)
         
         self.ss_stats_label.config(
-            text=f'検索結果: {len(sites)}件'
+            text=f'{label}: {len(sites)}件'
         )
     
+    def _update_tree_incrementally(self, tree, rows):
+        """
+        ツリーを差分更新（消えた行の削除・新しい行の挿入・変化した行の書き換えのみ）
+        
+        行は同じ並び順（名称順）の結果同士で比較するため、
+        残る行の相対順序は変わらず、新しい行を位置指定で挿入すれば並びが揃う。
+        
+        Args:
+            tree: 対象のTreeview
+            rows: (iid, values) のリスト
+        """
+        new_ids = {iid for iid, _ in rows}
+        stale_ids = [iid for iid in tree.get_children() if iid not in new_ids]
+        if stale_ids:
+            tree.delete(*stale_ids)
+        
+        existing_ids = set(tree.get_children())
+        
+        for index, (iid, values) in enumerate(rows):
+            if iid in existing_ids:
+                current = tuple(str(v) for v in tree.item(iid, 'values'))
+                if current != tuple(str(v) for v in values):
+                    tree.item(iid, values=values)
+            else:
+                tree.insert('', index, iid=iid, values=values)
+    
+    def _show_search_error(self, error):
+        """検索エラーを表示"""
+        from tkinter import messagebox
+        messagebox.showerror('エラー', f'検索に失敗しました：{error}')
+    
     def _update_parent_site_filter(self):
         """親調査地フィルタを更新"""
         sites = self.parent_site_model.get_all()